@@ -0,0 +1,51 @@
+import os
+import sys
+
+# Benchmark do backtest de regras (facebook.backtest.backtest_rules) sobre
+# insights diários sintéticos: campanhas × dias × regras.
+#
+# Uso: python benchmarks/bench_backtest.py [campanhas] [dias]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from facebook.backtest import backtest_rules
+
+RULES = [
+    {"id": 1, "name": "Pausar CPA alto", "primary_metric": "cpa", "primary_operator": ">", "primary_value": 60,
+     "action_type": "pause_campaign", "execution_interval_hours": 24},
+    {"id": 2, "name": "Escalar ROAS", "primary_metric": "roas", "primary_operator": ">", "primary_value": 2.5,
+     "is_composite": 1, "secondary_metric": "purchases", "secondary_operator": ">=", "secondary_value": 3,
+     "join_operator": "AND", "action_type": "custom_budget_multiplier", "action_value": 1.2, "execution_interval_hours": 24},
+    {"id": 3, "name": "Reduzir CTR baixo", "primary_metric": "ctr", "primary_operator": "<", "primary_value": 1.0,
+     "action_type": "halve_budget", "execution_interval_hours": 12},
+]
+
+
+def generate_daily_insights(n_campaigns, n_days, seed=42):
+    """Linhas no formato de campaign_daily_insights."""
+    rng = np.random.default_rng(seed)
+    n_rows = n_campaigns * n_days
+    return pd.DataFrame({
+        "campaign_id": np.repeat(np.arange(n_campaigns).astype(str), n_days),
+        "day": np.tile(pd.date_range("2026-01-01", periods=n_days, freq="D"), n_campaigns),
+        "account_id": "1", "campaign_name": "Campanha",
+        "spend": rng.uniform(0, 200, n_rows), "impressions": rng.integers(0, 20000, n_rows),
+        "clicks": rng.integers(0, 500, n_rows), "purchases": rng.integers(0, 5, n_rows),
+        "purchase_value": rng.uniform(0, 800, n_rows),
+        "daily_budget": np.repeat(rng.integers(1000, 30000, n_campaigns), n_days), "status": "ACTIVE",
+    })
+
+
+if __name__ == "__main__":
+    n_campaigns = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    n_days = int(sys.argv[2]) if len(sys.argv) > 2 else 90
+    daily_df = generate_daily_insights(n_campaigns, n_days)
+
+    result = backtest_rules(daily_df, RULES)
+    print(f"Campanhas: {result['campaigns']} | Dias avaliados: {result['days']} | Regras: {len(RULES)}")
+    print(result["summary"].to_string(index=False))
+    print(f"Gasto real: {result['totals']['real_spend']:,.2f} | Simulado: {result['totals']['simulated_spend']:,.2f}")
+    print(f"Tempo: {result['runtime_s'] * 1000:.1f} ms")
@@ -0,0 +1,59 @@
+import contextlib
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Benchmark da leitura de vários meses de insights diários: consulta à tabela
+# campaign_daily_insights (SQLite) contra o cubo em disco lido por memory-map
+# (facebook.cubo_metricas).
+#
+# Uso: python benchmarks/bench_cubo.py [campanhas] [dias]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_backtest import generate_daily_insights
+from facebook.backtest import DAILY_INSIGHTS_COLUMNS, load_daily_insights
+from facebook.cubo_metricas import cube_to_daily_frame, load_cube, write_partitions
+from facebook.migracoes import apply_pending_migrations
+
+
+def best_of(func, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    n_campaigns = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    n_days = int(sys.argv[2]) if len(sys.argv) > 2 else 180
+    daily_df = generate_daily_insights(n_campaigns, n_days)
+    since, until = daily_df["day"].min().date(), daily_df["day"].max().date()
+
+    work_dir = tempfile.mkdtemp()
+    conn = sqlite3.connect(os.path.join(work_dir, "bench.db"))
+    apply_pending_migrations(conn, "sqlite", log=lambda *_: None)
+    rows = daily_df.assign(day=daily_df["day"].dt.strftime("%Y-%m-%d"))[DAILY_INSIGHTS_COLUMNS]
+    conn.executemany(f"INSERT INTO campaign_daily_insights ({', '.join(DAILY_INSIGHTS_COLUMNS)}) VALUES ({', '.join(['?'] * len(DAILY_INSIGHTS_COLUMNS))})",
+                     rows.itertuples(index=False, name=None))
+    conn.commit()
+
+    @contextlib.contextmanager
+    def connection_factory():
+        yield conn, "sqlite"
+
+    cube_dir = os.path.join(work_dir, "cube")
+    write_partitions(daily_df, base_dir=cube_dir)
+
+    db_s = best_of(lambda: load_daily_insights(connection_factory, since, until))
+    cube_array_s = best_of(lambda: load_cube(since, until, base_dir=cube_dir))
+    cube_frame_s = best_of(lambda: cube_to_daily_frame(since, until, base_dir=cube_dir))
+
+    print(f"Campanhas: {n_campaigns} | Dias: {n_days} | Linhas: {len(daily_df)}")
+    print(f"Tabela campaign_daily_insights (SQLite): {db_s * 1000:.1f} ms")
+    print(f"Cubo por memory-map (array dias × campanhas × métricas): {cube_array_s * 1000:.1f} ms")
+    print(f"Cubo por memory-map (linhas para o backtest): {cube_frame_s * 1000:.1f} ms")
@@ -0,0 +1,42 @@
+import json
+import os
+import sys
+import time
+
+# Tamanho da geometria enviada ao navegador pelo Mapa de Atuação: GeoJSON
+# original contra o simplificado/quantizado de principal.geometria, e o
+# TopoJSON empacotado em assets/ (lido pelo app).
+#
+# Uso: python benchmarks/bench_geometria.py [tolerância_em_graus]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from principal.geometria import (
+    GEOMETRY_TOLERANCE_DEG, WORLD_GEOJSON_PATH, WORLD_TOPOJSON_PATH, compact_json, count_points,
+    geojson_to_topojson, simplify_geojson, topojson_to_geojson,
+)
+
+
+if __name__ == "__main__":
+    tolerance = float(sys.argv[1]) if len(sys.argv) > 1 else GEOMETRY_TOLERANCE_DEG
+    with open(WORLD_GEOJSON_PATH, encoding="utf-8") as f:
+        original = json.load(f)
+
+    start = time.perf_counter()
+    simplified = simplify_geojson(original, tolerance=tolerance)
+    elapsed = time.perf_counter() - start
+
+    original_bytes = len(json.dumps(original))
+    simplified_bytes = len(compact_json(simplified))
+    print(f"Tolerância: {tolerance}° | simplificação em {elapsed * 1000:.0f} ms (feita ao gerar o asset, não no app)")
+    print(f"Países: {len(original['features'])} -> {len(simplified['features'])}")
+    print(f"Pontos: {count_points(original)} -> {count_points(simplified)}")
+    print(f"JSON:   {original_bytes / 1024:.0f} KB -> {simplified_bytes / 1024:.0f} KB ({simplified_bytes / original_bytes:.0%})")
+
+    topology_text = compact_json(geojson_to_topojson(simplified))
+    start = time.perf_counter()
+    topojson_to_geojson(json.loads(topology_text))
+    elapsed = time.perf_counter() - start
+    print(f"TopoJSON: {len(topology_text) / 1024:.0f} KB, leitura em {elapsed * 1000:.0f} ms")
+    if os.path.exists(WORLD_TOPOJSON_PATH) and os.path.getsize(WORLD_TOPOJSON_PATH) != len(topology_text):
+        print("AVISO: assets/world-countries.topo.json difere desta tolerância (python -m principal.geometria para regenerar).")
@@ -0,0 +1,91 @@
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Benchmark da montagem da tabela do histórico de execuções (50 mil linhas):
+# loop por linha com pytz + strftime + reparse (implementação antiga)
+# contra facebook.historico.build_history_dataframe (vetorizada).
+#
+# Uso: python benchmarks/bench_historico.py [linhas]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import pytz
+
+from facebook.historico import build_history_dataframe
+
+
+def generate_executions(n_rows, seed=42):
+    """Gera execuções sintéticas no formato de get_rule_executions_page."""
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1)
+    executions = []
+    for i in range(n_rows):
+        executions.append({
+            "id": i + 1,
+            "rule_name": f"Regra {rng.randint(1, 40)}",
+            "rule_id": rng.randint(1, 40),
+            "ad_object_id": str(rng.randint(10**14, 10**15)),
+            "ad_object_type": rng.choice(["campaign", "adset", "ad"]),
+            "ad_object_name": f"Campanha de teste número {rng.randint(1, 5000)} - público amplo",
+            "executed_at": (base + timedelta(seconds=rng.randint(0, 180 * 86400))).isoformat(),
+            "was_successful": rng.random() > 0.1,
+            "message": "Orçamento ajustado de R$ 100,00 para R$ 120,00" * rng.randint(1, 2),
+        })
+    return executions
+
+
+def build_history_dataframe_legacy(executions):
+    """Implementação anterior (loop Python por linha), mantida só para comparação."""
+    exec_df_data = []
+    brazil_tz = pytz.timezone('America/Sao_Paulo')
+    for execution in executions:
+        executed_at_local_str = "Data inválida"
+        executed_at_dt = execution.get('executed_at')
+        if isinstance(executed_at_dt, str):
+            executed_at_dt = datetime.fromisoformat(executed_at_dt)
+        if isinstance(executed_at_dt, datetime):
+            if executed_at_dt.tzinfo is None:
+                executed_at_dt = pytz.utc.localize(executed_at_dt)
+            executed_at_local_str = executed_at_dt.astimezone(brazil_tz).strftime("%d/%m/%Y %H:%M:%S")
+        message = execution.get('message', '')
+        exec_df_data.append({
+            "Status": "✅ Sucesso" if execution.get('was_successful') else "❌ Falha",
+            "Regra": execution.get('rule_name', 'N/A'),
+            "Alvo": f"{execution.get('ad_object_type', '').capitalize()}: {execution.get('ad_object_name', 'N/A')[:30]}...",
+            "Mensagem": message[:50] + ("..." if len(message) > 50 else ""),
+            "Horário (BRT)": executed_at_local_str,
+        })
+    exec_df = pd.DataFrame(exec_df_data)
+    exec_df['Horário_DT_Local'] = pd.to_datetime(exec_df['Horário (BRT)'], format='%d/%m/%Y %H:%M:%S', errors='coerce')
+    return exec_df.sort_values(by='Horário_DT_Local', ascending=False).drop(columns=['Horário_DT_Local'])
+
+
+def best_of(func, executions, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(executions)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    executions = generate_executions(n_rows)
+
+    legacy_s = best_of(build_history_dataframe_legacy, executions)
+    vectorized_s = best_of(build_history_dataframe, executions)
+
+    # Confere que as duas versões produzem a mesma ordem de linhas
+    legacy_order = build_history_dataframe_legacy(executions)["Horário (BRT)"].tolist()
+    vectorized_order = build_history_dataframe(executions)["Horário (BRT)"].dt.strftime("%d/%m/%Y %H:%M:%S").tolist()
+    same_order = legacy_order == vectorized_order
+
+    print(f"Linhas: {n_rows}")
+    print(f"Loop com pytz (antigo): {legacy_s * 1000:.1f} ms")
+    print(f"Vetorizado (tz_convert): {vectorized_s * 1000:.1f} ms")
+    print(f"Ganho: {legacy_s / vectorized_s:.1f}x | Mesma ordenação: {'sim' if same_order else 'NÃO'}")
@@ -0,0 +1,122 @@
+import os
+import random
+import sys
+import time
+
+# Benchmark da simulação de todas as regras em todas as campanhas:
+# loop por campanha × regra (lógica de simulate_rule_application, gerenciador.py)
+# contra facebook.simulacao.simulate_portfolio (vetorizada).
+#
+# Uso: python benchmarks/bench_simulacao.py [campanhas] [regras]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from facebook.simulacao import simulate_portfolio
+
+# Métricas com valor nas campanhas sintéticas (as derivadas de facebook.metricas ficam de fora)
+BENCH_METRICS = ['cpa', 'purchases', 'roas', 'spend', 'clicks', 'ctr', 'cpc']
+
+OPERATORS = ['<', '<=', '>', '>=', '==']
+ACTIONS = ['duplicate_budget', 'triple_budget', 'pause_campaign', 'activate_campaign',
+           'halve_budget', 'custom_budget_multiplier']
+
+
+def generate_campaigns(n_campaigns, seed=42):
+    """Campanhas sintéticas no formato de fetch_account_campaigns (insights como a API devolve)."""
+    rng = random.Random(seed)
+    campaigns = []
+    for i in range(n_campaigns):
+        campaigns.append({
+            "id": str(10**14 + i),
+            "name": f"Campanha {i}",
+            "account_name": f"Conta {i % 8}",
+            "status": rng.choice(['ACTIVE', 'PAUSED']),
+            "daily_budget": rng.choice([0, rng.randint(1000, 100000)]),
+            "lifetime_budget": 0,
+            "insights": {
+                "cpa": round(rng.uniform(0, 150), 2), "purchases": rng.randint(0, 40),
+                "roas": round(rng.uniform(0, 6), 2), "spend": str(round(rng.uniform(0, 5000), 2)),
+                "clicks": str(rng.randint(0, 5000)), "ctr": str(round(rng.uniform(0, 5), 3)),
+                "cpc": str(round(rng.uniform(0, 4), 2)),
+            },
+        })
+    return campaigns
+
+
+def generate_rules(n_rules, seed=7):
+    rng = random.Random(seed)
+    rules = []
+    for i in range(n_rules):
+        is_composite = rng.random() < 0.5
+        rules.append({
+            "id": i + 1, "name": f"Regra {i + 1}", "is_active": 1,
+            "primary_metric": rng.choice(BENCH_METRICS), "primary_operator": rng.choice(OPERATORS),
+            "primary_value": rng.uniform(0, 100), "is_composite": int(is_composite),
+            "secondary_metric": rng.choice(BENCH_METRICS) if is_composite else None,
+            "secondary_operator": rng.choice(OPERATORS) if is_composite else None,
+            "secondary_value": rng.uniform(0, 100) if is_composite else None,
+            "join_operator": rng.choice(['AND', 'OR']), "action_type": rng.choice(ACTIONS), "action_value": 1.2,
+        })
+    return rules
+
+
+def _compare(operator, campaign_value, rule_value):
+    if operator == '<': return campaign_value < rule_value
+    if operator == '<=': return campaign_value <= rule_value
+    if operator == '>': return campaign_value > rule_value
+    if operator == '>=': return campaign_value >= rule_value
+    if operator == '==': return campaign_value == rule_value
+    return False
+
+
+def simulate_loop(campaigns, rules):
+    """Condições de simulate_rule_application, uma campanha por vez. Retorna {(campanha, regra)}."""
+    matches = set()
+    for campaign in campaigns:
+        metrics = {metric: campaign["insights"].get(metric, 0) for metric in BENCH_METRICS}
+        for rule in rules:
+            try:
+                condition_met = _compare(rule['primary_operator'], float(metrics[rule['primary_metric']]), float(rule['primary_value']))
+            except (TypeError, ValueError):
+                continue
+            if rule.get('is_composite'):
+                secondary_met = _compare(rule['secondary_operator'], float(metrics[rule['secondary_metric']]), float(rule['secondary_value']))
+                if rule['join_operator'] == 'AND': condition_met = condition_met and secondary_met
+                else: condition_met = condition_met or secondary_met
+            if condition_met:
+                matches.add((campaign["id"], rule["name"]))
+    return matches
+
+
+def simulate_vectorized(campaigns, rules):
+    matrix, _ = simulate_portfolio(campaigns, rules)
+    matches = set()
+    for rule in rules:
+        for campaign_id in matrix.loc[matrix[rule["name"]], "ID"]:
+            matches.add((campaign_id, rule["name"]))
+    return matches
+
+
+def best_of(func, *args, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    n_campaigns = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    n_rules = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    campaigns = generate_campaigns(n_campaigns)
+    rules = generate_rules(n_rules)
+
+    loop_s = best_of(simulate_loop, campaigns, rules)
+    vectorized_s = best_of(simulate_portfolio, campaigns, rules)
+    same_matches = simulate_loop(campaigns, rules) == simulate_vectorized(campaigns, rules)
+
+    print(f"Campanhas: {n_campaigns} | Regras: {n_rules}")
+    print(f"Loop por campanha × regra: {loop_s * 1000:.1f} ms")
+    print(f"Vetorizado (simulate_portfolio): {vectorized_s * 1000:.1f} ms")
+    print(f"Ganho: {loop_s / vectorized_s:.1f}x | Mesmas campanhas atingidas: {'sim' if same_matches else 'NÃO'}")
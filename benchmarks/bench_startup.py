@@ -0,0 +1,107 @@
+import ast
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+# Custo de importação na partida a frio do app, medido com `python -X importtime`
+# num interpretador novo para cada cenário:
+#
+# - login: o que iniciar.py importa até mostrar a tela de login;
+# - lista_campanhas: login + as importações de topo de facebook/gerenciador.py
+#   (o que a página carrega antes de listar as campanhas do cache);
+# - mapa: login + principal/mapa.py (página padrão depois do login).
+#
+# As páginas não são executadas: os módulos são lidos das importações de topo
+# de cada arquivo (ast). O tempo de banco/Graph API não entra na conta.
+#
+# Uso: python benchmarks/bench_startup.py [repetições] [top_n]
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Orçamento de partida a frio (ms de importação acima do interpretador vazio)
+COLD_START_BUDGET_MS = {"login": 1500, "lista_campanhas": 3000, "mapa": 2000}
+
+SCENARIOS = {
+    "login": ["iniciar.py"],
+    "lista_campanhas": ["iniciar.py", "facebook/gerenciador.py"],
+    "mapa": ["iniciar.py", "principal/mapa.py"],
+}
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def top_level_imports(path):
+    """Módulos importados no topo do arquivo (fora de funções), na ordem."""
+    with open(os.path.join(REPO_DIR, path), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    # ast.walk não poda subárvores: importações dentro de funções são descartadas pela linha
+    function_lines = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            function_lines.update(range(node.lineno, (node.end_lineno or node.lineno) + 1))
+    for node in ast.walk(tree):
+        if getattr(node, "lineno", None) in function_lines:
+            continue
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def run_importtime(modules):
+    """(tempo_total_s, [(self_us, cumulative_us, profundidade, módulo)], faltando)."""
+    code = "\n".join(
+        f"try:\n    __import__({module!r})\nexcept ImportError as e:\n    print('FALTA', {module!r}, e)"
+        for module in modules
+    ) or "pass"
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_DIR, capture_output=True, text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    elapsed = time.perf_counter() - start
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((int(self_us), int(cumulative_us), len(indent) // 2, module))
+    missing = [line.split(" ", 2)[1] for line in result.stdout.splitlines() if line.startswith("FALTA ")]
+    return elapsed, entries, missing
+
+
+def summarize(entries):
+    """Tempo de importação por pacote de topo (soma do 'self' de cada módulo)."""
+    by_package = defaultdict(int)
+    for self_us, _, _, module in entries:
+        by_package[module.split(".")[0]] += self_us
+    return sorted(by_package.items(), key=lambda item: item[1], reverse=True)
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    top_n = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    baseline = min(run_importtime([])[0] for _ in range(repeat))
+    print(f"Interpretador vazio: {baseline * 1000:.0f} ms\n")
+
+    for scenario, files in SCENARIOS.items():
+        modules = list(dict.fromkeys(module for path in files for module in top_level_imports(path)))
+        runs = [run_importtime(modules) for _ in range(repeat)]
+        elapsed, entries, missing = min(runs, key=lambda run: run[0])
+        import_ms = max(0.0, elapsed - baseline) * 1000
+        budget_ms = COLD_START_BUDGET_MS[scenario]
+        status = "OK" if import_ms <= budget_ms else "ACIMA DO ORÇAMENTO"
+        print(f"== {scenario}: {import_ms:.0f} ms de importação (orçamento {budget_ms} ms) -> {status}")
+        print(f"   {len(entries)} módulos carregados a partir de: {', '.join(modules)}")
+        if missing:
+            print(f"   Não instalados aqui (fora da medição): {', '.join(missing)}")
+        for package, self_us in summarize(entries)[:top_n]:
+            print(f"   {package:<28} {self_us / 1000:8.1f} ms")
+        print()
@@ -0,0 +1,141 @@
+"""
+Ações em massa sobre campanhas via requisições em lote (batch) da Graph API.
+
+Cada lote leva até GRAPH_BATCH_SIZE chamadas numa única requisição HTTP, e os
+lotes de uma conta rodam em paralelo com no máximo BULK_MAX_WORKERS threads.
+Cada thread cria sua própria instância de FacebookAdsApi. Os resultados são
+devolvidos por campanha, para a interface mostrar o que deu certo e o que falhou.
+Sem dependência do Streamlit.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from facebook.graph import make_api
+from facebook.regras import PAUSED_STATUS, compute_rule_action
+
+# Limite da Graph API: 50 chamadas por requisição em lote
+GRAPH_BATCH_SIZE = 50
+BULK_MAX_WORKERS = int(os.getenv("BULK_MAX_WORKERS", "4"))
+# Chamadas sem resposta dentro de um lote (ex.: timeout interno) são reenviadas
+BATCH_MAX_RETRIES = 2
+
+CAMPAIGN_STATE_FIELDS = ['name', 'status', 'daily_budget', 'lifetime_budget']
+
+
+def _error_message(response):
+    """Mensagem legível de uma resposta com erro dentro do lote."""
+    try:
+        error = response.error()
+        return error.api_error_message() or str(error)
+    except Exception:
+        return str(getattr(response, "body", lambda: response)())
+
+
+def execute_batched(config, items, add_request, max_workers=BULK_MAX_WORKERS):
+    """
+    Executa `items` [(chave, payload)] em lotes de GRAPH_BATCH_SIZE.
+
+    `add_request(api, batch, chave, payload, success, failure)` adiciona a chamada
+    ao lote. Retorna {chave: (ok, resposta_json_ou_mensagem_de_erro)}. A chave é o
+    ID da campanha nas ações em massa e o identificador da linha na subida em massa.
+    """
+    results = {}
+    results_lock = threading.Lock()
+
+    def store(key, ok, response):
+        value = response.json() if ok else _error_message(response)
+        with results_lock:
+            results[key] = (ok, value)
+
+    def run_chunk(chunk):
+        api = make_api(config)
+        pending = api.new_batch()
+        for key, payload in chunk:
+            add_request(
+                api, pending, key, payload,
+                lambda response, k=key: store(k, True, response),
+                lambda response, k=key: store(k, False, response),
+            )
+        for _ in range(BATCH_MAX_RETRIES + 1):
+            pending = pending.execute()
+            if not pending:
+                break
+
+    chunks = [items[i:i + GRAPH_BATCH_SIZE] for i in range(0, len(items), GRAPH_BATCH_SIZE)]
+    if chunks:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+            for future, chunk in [(executor.submit(run_chunk, chunk), chunk) for chunk in chunks]:
+                try:
+                    future.result()
+                except Exception as e:
+                    # Falha do lote inteiro (rede, token): marca as chamadas sem resultado
+                    with results_lock:
+                        for key, _ in chunk:
+                            results.setdefault(key, (False, f"Falha na requisição em lote: {e}"))
+
+    for key, _ in items:
+        results.setdefault(key, (False, "Sem resposta da Graph API após novas tentativas"))
+    return results
+
+
+def batch_get_campaigns(config, campaign_ids, fields=CAMPAIGN_STATE_FIELDS):
+    """Lê o estado atual das campanhas. Retorna {campaign_id: (ok, dados_ou_erro)}."""
+    from facebook_business.adobjects.campaign import Campaign
+
+    def add_request(api, batch, campaign_id, payload, success, failure):
+        Campaign(campaign_id, api=api).api_get(fields=fields, batch=batch, success=success, failure=failure)
+    return execute_batched(config, [(cid, None) for cid in campaign_ids], add_request)
+
+
+def batch_update_campaigns(config, updates):
+    """Aplica [(campaign_id, params)] em lote. Retorna {campaign_id: (ok, resposta_ou_erro)}."""
+    from facebook_business.adobjects.campaign import Campaign
+
+    def add_request(api, batch, campaign_id, params, success, failure):
+        Campaign(campaign_id, api=api).api_update(params=params, batch=batch, success=success, failure=failure)
+    return execute_batched(config, updates, add_request)
+
+
+def bulk_set_status(config, campaign_ids, status):
+    """
+    Pausa/ativa várias campanhas de uma conta.
+    Retorna [{"campaign_id", "success", "message"}] na ordem de `campaign_ids`.
+    """
+    verb = "pausada" if status == PAUSED_STATUS else "ativada"
+    results = batch_update_campaigns(config, [(cid, {'status': status}) for cid in campaign_ids])
+    return [
+        {"campaign_id": cid, "success": results[cid][0],
+         "message": f"Campanha {verb} (ação em massa)" if results[cid][0] else f"Erro da API: {results[cid][1]}"}
+        for cid in campaign_ids
+    ]
+
+
+def bulk_apply_rule(config, campaign_ids, rule):
+    """
+    Aplica a ação de `rule` em várias campanhas de uma conta: um lote de leituras
+    do estado atual, o cálculo de cada alteração e um lote de atualizações.
+    Retorna [{"campaign_id", "campaign_name", "success", "message"}].
+    """
+    current = batch_get_campaigns(config, campaign_ids)
+    outcomes = {}
+    updates = []
+    for cid in campaign_ids:
+        ok, data = current[cid]
+        if not ok:
+            outcomes[cid] = {"campaign_id": cid, "campaign_name": None, "success": False,
+                             "message": f"Erro ao ler a campanha: {data}"}
+            continue
+        try:
+            action_params, message, success = compute_rule_action(rule, data)
+        except Exception as e:
+            action_params, message, success = None, f"Erro ao calcular a ação: {e}", False
+        outcomes[cid] = {"campaign_id": cid, "campaign_name": data.get('name'), "success": success, "message": message}
+        if action_params is not None:
+            updates.append((cid, action_params))
+
+    for cid, (ok, error) in batch_update_campaigns(config, updates).items():
+        outcomes[cid]["success"] = ok
+        if not ok:
+            outcomes[cid]["message"] = f"Erro da API ao aplicar ação '{rule['action_type']}': {error}"
+    return [outcomes[cid] for cid in campaign_ids]
@@ -0,0 +1,219 @@
+"""
+Backtest de regras sobre os insights diários guardados em campaign_daily_insights.
+
+Reexecuta as regras dia a dia, como o worker faria, sobre o histórico de todas as
+campanhas de uma vez: os dados viram matrizes dias × campanhas (numpy), as
+métricas da janela de cada avaliação saem de somas acumuladas e as condições
+são avaliadas com as mesmas máscaras da simulação (facebook/condicoes.py).
+
+Modelo (simplificado, para comparar regras entre si):
+  - cada regra é avaliada a cada `execution_interval_hours`; intervalos menores
+    que um dia avaliam várias vezes no mesmo dia com as mesmas métricas (como o
+    worker, que usa "last_7d" e só vê dados do dia anterior);
+  - o gasto, as impressões, os cliques e as compras de um dia escalam na
+    proporção orçamento simulado / orçamento real; campanha pausada não gasta;
+  - orçamento real de cada dia: o gravado pela sincronização em que ele era o
+    último dia (a API só expõe o orçamento atual); dias sem orçamento gravado
+    usam o conhecido mais próximo;
+  - campanha sem gasto real no dia continua sem gasto mesmo se a simulação a
+    ativar (não há dado para estimar).
+Sem dependência do Streamlit.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from facebook.condicoes import ConditionEvaluator, rule_condition
+from facebook.graph import INSIGHT_WINDOW_DAYS
+from facebook.simulacao import apply_budget_multiplier, budget_multiplier
+
+# Janela das métricas avaliadas pelas regras (igual ao "last_7d" do worker)
+BACKTEST_LOOKBACK_DAYS = 7
+
+DAILY_INSIGHTS_COLUMNS = [
+    "campaign_id", "day", "account_id", "campaign_name", "spend", "impressions",
+    "clicks", "purchases", "purchase_value", "daily_budget", "status",
+]
+
+_VOLUME_COLUMNS = ["spend", "impressions", "clicks", "purchases", "purchase_value"]
+
+
+def load_daily_insights(connection_factory, since, until, account_ids=None):
+    """Lê campaign_daily_insights entre `since` e `until` (date), opcionalmente filtrando contas."""
+    with connection_factory() as conn_info:
+        if conn_info is None:
+            raise RuntimeError("banco indisponível")
+        conn, conn_type = conn_info
+        ph = "?" if conn_type == "sqlite" else "%s"
+        query = f"SELECT {', '.join(DAILY_INSIGHTS_COLUMNS)} FROM campaign_daily_insights WHERE day >= {ph} AND day <= {ph}"
+        params = [since.isoformat(), until.isoformat()]
+        if account_ids:
+            query += f" AND account_id IN ({', '.join([ph] * len(account_ids))})"
+            params.extend(str(account_id) for account_id in account_ids)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    daily_df = pd.DataFrame(rows, columns=DAILY_INSIGHTS_COLUMNS)
+    daily_df["day"] = pd.to_datetime(daily_df["day"])
+    return daily_df
+
+
+def build_daily_arrays(daily_df):
+    """
+    Converte as linhas (campanha, dia) em matrizes dias × campanhas.
+    Dias sem linha para a campanha ficam com zero (sem entrega).
+    """
+    days = pd.date_range(daily_df["day"].min(), daily_df["day"].max(), freq="D")
+    campaign_ids = pd.Index(daily_df["campaign_id"].unique())
+    arrays = {}
+    for column in _VOLUME_COLUMNS + ["daily_budget"]:
+        pivot = daily_df.pivot_table(index="day", columns="campaign_id", values=column, aggfunc="sum")
+        arrays[column] = pivot.reindex(index=days, columns=campaign_ids).fillna(0).to_numpy(dtype=float)
+    # Orçamento de dias sem linha: o último conhecido da campanha
+    budgets = pd.DataFrame(arrays["daily_budget"]).replace(0, np.nan).ffill().bfill().fillna(0)
+    arrays["daily_budget"] = budgets.to_numpy(dtype=float)
+    names = daily_df.drop_duplicates("campaign_id", keep="last").set_index("campaign_id")["campaign_name"]
+    return days, campaign_ids, names.reindex(campaign_ids), arrays
+
+
+def window_metrics(cumulative, day_index, lookback_days):
+    """
+    Métricas básicas das regras na janela [dia - lookback, dia). As derivadas
+    (facebook/metricas.py) saem destas colunas na avaliação; as que dependem de
+    alcance, carrinho ou orçamento restante não existem no histórico diário.
+    """
+    start = max(0, day_index - lookback_days)
+    sums = {column: cumulative[column][day_index] - cumulative[column][start] for column in _VOLUME_COLUMNS}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        metrics = {
+            "spend": sums["spend"],
+            "clicks": sums["clicks"],
+            "purchases": sums["purchases"],
+            "impressions": sums["impressions"],
+            "purchase_value": sums["purchase_value"],
+            # Sem conversão/clique/impressão a API não devolve a métrica; o app usa 0
+            "cpa": np.where(sums["purchases"] > 0, sums["spend"] / sums["purchases"], 0.0),
+            "roas": np.where(sums["spend"] > 0, sums["purchase_value"] / sums["spend"], 0.0),
+            "ctr": np.where(sums["impressions"] > 0, sums["clicks"] / sums["impressions"] * 100, 0.0),
+            "cpc": np.where(sums["clicks"] > 0, sums["spend"] / sums["clicks"], 0.0),
+        }
+    return pd.DataFrame(metrics)
+
+
+def _evaluations_on_day(interval_hours, day_offset):
+    """Quantas vezes a regra roda no dia `day_offset` (contado a partir do início do backtest)."""
+    interval_hours = int(interval_hours or 24)
+    if interval_hours < 24:
+        return 24 // interval_hours
+    return 1 if day_offset % round(interval_hours / 24) == 0 else 0
+
+
+def _replay(arrays, rules, lookback_days):
+    """Reexecuta `rules` sobre as matrizes. Retorna (gasto simulado por dia, disparos e alterações por regra)."""
+    hist_budget = arrays["daily_budget"]
+    hist_active = arrays["spend"] > 0
+    n_days, n_campaigns = hist_budget.shape
+
+    sim_budget = hist_budget[0].copy()
+    sim_active = hist_active[0].copy()
+    # Somas acumuladas dos volumes simulados, com uma linha de zeros no início
+    cumulative = {column: np.zeros((n_days + 1, n_campaigns)) for column in _VOLUME_COLUMNS}
+    sim_spend = np.zeros(n_days)
+    matches = {rule["id"]: 0 for rule in rules}
+    changes = {rule["id"]: 0 for rule in rules}
+    activations_per_day = np.zeros(n_days, dtype=int)
+    # Regras ignoradas (condição incompleta) ficam com None
+    conditions = {rule["id"]: rule_condition(rule) for rule in rules}
+
+    for day in range(n_days):
+        if day >= lookback_days:
+            frame = window_metrics(cumulative, day, lookback_days)
+            # As métricas da janela não mudam dentro do dia: comparações repetidas saem do cache
+            # Condições com janela própria (ex.: últimos 30 dias) somam outro trecho do histórico
+            evaluator = ConditionEvaluator(frame, size=len(frame),
+                                           window_columns=lambda window: window_metrics(cumulative, day, INSIGHT_WINDOW_DAYS[window]))
+            for rule in rules:
+                if conditions[rule["id"]] is None:
+                    continue
+                for _ in range(_evaluations_on_day(rule.get("execution_interval_hours"), day - lookback_days)):
+                    mask = evaluator.mask(conditions[rule["id"]])
+                    matches[rule["id"]] += int(mask.sum())
+                    activations_per_day[day] += int(mask.sum())
+                    action_type = rule.get("action_type")
+                    multiplier = budget_multiplier(rule)
+                    if multiplier is not None:
+                        new_budget = np.where(mask, apply_budget_multiplier(rule, sim_budget, multiplier), sim_budget)
+                        changes[rule["id"]] += int((new_budget != sim_budget).sum())
+                        sim_budget = new_budget
+                    elif action_type in ("pause_campaign", "activate_campaign"):
+                        target = action_type == "activate_campaign"
+                        changed = mask & (sim_active != target)
+                        changes[rule["id"]] += int(changed.sum())
+                        sim_active = np.where(changed, target, sim_active)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scale = np.where(hist_budget[day] > 0, sim_budget / hist_budget[day], 1.0)
+        scale = np.where(sim_active, scale, 0.0)
+        for column in _VOLUME_COLUMNS:
+            cumulative[column][day + 1] = cumulative[column][day] + arrays[column][day] * scale
+        sim_spend[day] = cumulative["spend"][day + 1].sum() - cumulative["spend"][day].sum()
+
+    return sim_spend, matches, changes, activations_per_day
+
+
+def backtest_rules(daily_df, rules, lookback_days=BACKTEST_LOOKBACK_DAYS):
+    """
+    Reexecuta `rules` (com seus `execution_interval_hours`) sobre `daily_df`
+    (linhas de campaign_daily_insights) para todas as campanhas.
+
+    Retorna dict com:
+      - summary: por regra, disparos (campanha atendeu a condição), alterações
+        efetivas e variação de gasto com a regra rodando sozinha;
+      - timeline: gasto real × simulado e disparos por dia;
+      - totals: gasto real, simulado e variação no período avaliado;
+      - runtime_s, days, campaigns.
+    """
+    start_time = time.perf_counter()
+    rules = sorted((r for r in rules if isinstance(r, dict) and r.get("id") is not None), key=lambda r: r["id"])
+    if daily_df.empty or not rules:
+        return {"summary": pd.DataFrame(), "timeline": pd.DataFrame(), "totals": {},
+                "runtime_s": time.perf_counter() - start_time, "days": 0, "campaigns": 0}
+
+    days, campaign_ids, _, arrays = build_daily_arrays(daily_df)
+    real_spend = arrays["spend"].sum(axis=1)
+    evaluated = slice(lookback_days, None)
+
+    sim_spend, matches, changes, activations_per_day = _replay(arrays, rules, lookback_days)
+
+    summary_rows = []
+    for rule in rules:
+        # Variação de gasto atribuível a cada regra: replay só com ela
+        rule_spend, _, _, _ = _replay(arrays, [rule], lookback_days)
+        summary_rows.append({
+            "Regra": rule.get("name") or f"Regra {rule['id']}",
+            "Ação": rule.get("action_type"),
+            "Intervalo (h)": int(rule.get("execution_interval_hours") or 24),
+            "Disparos": matches[rule["id"]],
+            "Alterações": changes[rule["id"]],
+            "Variação de gasto sozinha (R$)": float(rule_spend[evaluated].sum() - real_spend[evaluated].sum()),
+        })
+
+    timeline = pd.DataFrame({
+        "Gasto real (R$)": real_spend, "Gasto simulado (R$)": sim_spend, "Disparos": activations_per_day,
+    }, index=days)
+    timeline.index.name = "Dia"
+
+    totals = {
+        "real_spend": float(real_spend[evaluated].sum()),
+        "simulated_spend": float(sim_spend[evaluated].sum()),
+    }
+    totals["spend_delta"] = totals["simulated_spend"] - totals["real_spend"]
+    return {
+        "summary": pd.DataFrame(summary_rows), "timeline": timeline, "totals": totals,
+        "runtime_s": time.perf_counter() - start_time,
+        "days": max(0, len(days) - lookback_days), "campaigns": len(campaign_ids),
+    }
@@ -0,0 +1,280 @@
+"""
+Acesso ao banco de dados do app Streamlit (PostgreSQL com pool, fallback SQLite).
+
+Cada sessão/thread faz checkout de uma conexão própria do pool pelo tempo de
+uma operação e a devolve em seguida, então commit/rollback de um usuário
+nunca afeta a transação de outro.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import streamlit as st
+
+from facebook.migracoes import ensure_schema
+
+# Limites do pool (ajustáveis por variável de ambiente)
+DB_POOL_MIN_CONN = int(os.getenv("DB_POOL_MIN_CONN", "1"))
+DB_POOL_MAX_CONN = int(os.getenv("DB_POOL_MAX_CONN", "10"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+DB_CHECKOUT_TIMEOUT_S = float(os.getenv("DB_CHECKOUT_TIMEOUT_S", "10"))
+
+
+class PoolCheckoutTimeout(Exception):
+    """Nenhuma conexão do pool ficou livre dentro de DB_CHECKOUT_TIMEOUT_S."""
+
+
+class DatabasePool:
+    """
+    Pool de conexões thread-safe com métricas de uso.
+
+    O ThreadedConnectionPool do psycopg2 lança PoolError quando esgotado; aqui um
+    semáforo com o mesmo tamanho faz o chamador esperar (até um timeout) em vez de falhar.
+    No fallback SQLite existe uma única conexão, e o semáforo de tamanho 1 serializa o acesso
+    entre threads. O checkout é reentrante na mesma thread: uma chamada a
+    execute_query/db_connection dentro de um `with db_connection()` recebe a mesma
+    conexão (e compartilha a transação) em vez de esperar por ela até o timeout.
+    """
+
+    def __init__(self, conn_type, pg_pool=None, sqlite_conn=None, maxconn=1):
+        self.conn_type = conn_type
+        self.maxconn = maxconn
+        self._pg_pool = pg_pool
+        self._sqlite_conn = sqlite_conn
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        # SQLite: thread que está com a conexão e quantos checkouts aninhados ela fez
+        self._sqlite_owner = None
+        self._sqlite_depth = 0
+        self._stats = {
+            "checkouts": 0, "in_use": 0, "peak_in_use": 0,
+            "wait_total_s": 0.0, "wait_max_s": 0.0,
+            "timeouts": 0, "discarded": 0,
+        }
+
+    def checkout(self):
+        """Pega uma conexão do pool, esperando até DB_CHECKOUT_TIMEOUT_S."""
+        if self.conn_type == "sqlite" and self._sqlite_owner == threading.get_ident():
+            # Checkout aninhado na mesma thread: reaproveita a conexão que ela já tem
+            self._sqlite_depth += 1
+            with self._lock:
+                self._stats["checkouts"] += 1
+            return self._sqlite_conn
+        wait_start = time.perf_counter()
+        if not self._slots.acquire(timeout=DB_CHECKOUT_TIMEOUT_S):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolCheckoutTimeout(f"Nenhuma conexão livre após {DB_CHECKOUT_TIMEOUT_S:.0f}s ({self.maxconn} em uso).")
+        try:
+            if self.conn_type == "sqlite":
+                conn = self._sqlite_conn
+                self._sqlite_owner = threading.get_ident()
+                self._sqlite_depth = 1
+            else:
+                conn = self._pg_pool.getconn()
+                if conn.closed:
+                    # Conexão derrubada pelo servidor: descarta e pega outra
+                    self._pg_pool.putconn(conn, close=True)
+                    with self._lock:
+                        self._stats["discarded"] += 1
+                    conn = self._pg_pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        waited = time.perf_counter() - wait_start
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._stats["in_use"])
+            self._stats["wait_total_s"] += waited
+            self._stats["wait_max_s"] = max(self._stats["wait_max_s"], waited)
+        return conn
+
+    def checkin(self, conn, broken=False):
+        """Devolve a conexão ao pool sem transação aberta (ou a fecha, se quebrada)."""
+        if self.conn_type == "sqlite":
+            self._sqlite_depth -= 1
+            if self._sqlite_depth > 0:
+                return  # Ainda em uso pelo checkout externo da mesma thread
+            self._sqlite_owner = None
+        try:
+            if self.conn_type == "postgres":
+                if not broken and not conn.closed:
+                    try:
+                        conn.rollback()  # encerra transação implícita de SELECTs
+                    except Exception:
+                        broken = True
+                close = broken or bool(conn.closed)
+                self._pg_pool.putconn(conn, close=close)
+                if close:
+                    with self._lock:
+                        self._stats["discarded"] += 1
+        finally:
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    def stats(self):
+        """Retorna um snapshot das métricas de uso do pool."""
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot["conn_type"] = self.conn_type
+        snapshot["max_conn"] = self.maxconn
+        checkouts = snapshot["checkouts"]
+        snapshot["wait_avg_ms"] = (snapshot["wait_total_s"] / checkouts * 1000) if checkouts else 0.0
+        return snapshot
+
+
+@st.cache_resource
+def get_db_pool():
+    """Cria o pool de conexões (uma vez por processo). Levanta exceção se falhar."""
+    pg_host = os.getenv("PGHOST")
+    pg_user = os.getenv("PGUSER")
+    pg_password = os.getenv("PGPASSWORD")
+
+    # Usar SQLite como fallback se não houver configuração PostgreSQL
+    if not (pg_host and pg_user and pg_password):
+        import sqlite3
+        if not os.path.exists("data"):
+            os.makedirs("data")
+        sqlite_conn = sqlite3.connect("data/gcoperacional.db", check_same_thread=False)
+        return DatabasePool("sqlite", sqlite_conn=sqlite_conn, maxconn=1)
+
+    from psycopg2.pool import ThreadedConnectionPool
+    pg_pool = ThreadedConnectionPool(
+        DB_POOL_MIN_CONN, DB_POOL_MAX_CONN,
+        host=pg_host,
+        port=os.getenv("PGPORT"),
+        database=os.getenv("PGDATABASE"),
+        user=pg_user,
+        password=pg_password,
+        connect_timeout=10,
+        options=f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    )
+    print(f"INFO [DB Pool]: Pool PostgreSQL criado (min={DB_POOL_MIN_CONN}, max={DB_POOL_MAX_CONN}, statement_timeout={DB_STATEMENT_TIMEOUT_MS}ms).")
+    return DatabasePool("postgres", pg_pool=pg_pool, maxconn=DB_POOL_MAX_CONN)
+
+
+def _get_db_pool_or_none():
+    try:
+        return get_db_pool()
+    except Exception as e:
+        print(f"Erro ao criar pool de conexões: {e}")
+        st.error(f"Erro ao conectar ao banco de dados: {e}")
+        return None
+
+
+def db_available():
+    """Indica se o banco está acessível (pool criado)."""
+    return _get_db_pool_or_none() is not None
+
+
+def get_pool_stats():
+    """Métricas de uso do pool, ou None se o banco estiver indisponível."""
+    pool = _get_db_pool_or_none()
+    return pool.stats() if pool else None
+
+
+@contextmanager
+def db_connection():
+    """
+    Faz checkout de uma conexão pelo tempo do bloco `with` e a devolve ao final.
+
+    Produz uma tupla (conn, conn_type), ou None se o banco estiver indisponível
+    ou o pool não liberar uma conexão a tempo.
+    """
+    pool = _get_db_pool_or_none()
+    if pool is None:
+        yield None
+        return
+    try:
+        conn = pool.checkout()
+    except PoolCheckoutTimeout as e:
+        print(f"Erro [DB Pool]: {e}")
+        st.error("Banco de dados ocupado no momento. Tente novamente em instantes.")
+        yield None
+        return
+
+    broken = False
+    try:
+        yield conn, pool.conn_type
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            broken = True
+        raise
+    finally:
+        pool.checkin(conn, broken=broken)
+
+
+def execute_query(query, params=None, fetch_one=False, fetch_all=False, is_dml=False):
+    """Executa uma query no banco de dados com melhor tratamento de erros."""
+    with db_connection() as conn_info:
+        if conn_info is None:
+            return None
+
+        conn, conn_type = conn_info
+        result = None
+        cursor = None
+
+        try:
+            cursor = conn.cursor()
+
+            # Adaptar placeholders conforme o tipo de banco
+            adapted_query = query
+            if params is not None:
+                if conn_type == "sqlite" and "%s" in query:
+                    # Converter placeholders %s para ? no SQLite
+                    adapted_query = query.replace("%s", "?")
+                elif conn_type == "postgres" and "?" in query:
+                    # Converter placeholders ? para %s no PostgreSQL
+                    adapted_query = query.replace("?", "%s")
+
+                cursor.execute(adapted_query, params)
+            else:
+                cursor.execute(adapted_query)
+
+            if is_dml:  # Data Manipulation Language (INSERT, UPDATE, DELETE)
+                result = cursor.rowcount
+            elif fetch_one:
+                result = cursor.fetchone()
+            elif fetch_all:
+                result = cursor.fetchall()
+
+            conn.commit()
+
+        except Exception as e:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            print(f"Erro na query: {e}\nQuery: {query}\nParams: {params}")
+            st.error("Erro na operação do banco de dados")
+            result = None
+
+        finally:
+            if cursor:
+                cursor.close()
+
+        return result
+
+
+@st.cache_resource
+def ensure_db_schema():
+    """
+    Confere (uma vez por processo) se o schema está na versão do código e aplica
+    migrações pendentes se este for o primeiro processo a pegar o lock.
+    Depois da primeira execução as páginas não fazem nenhuma query de schema.
+    Levanta exceção em caso de falha para que o resultado não fique em cache.
+    """
+    with db_connection() as conn_info:
+        if conn_info is None:
+            raise RuntimeError("Falha na conexão com o banco de dados.")
+        conn, conn_type = conn_info
+        applied = ensure_schema(conn, conn_type)
+    if applied:
+        print(f"Migrações aplicadas ({conn_type}): {applied}")
+    return True
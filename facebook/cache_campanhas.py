@@ -0,0 +1,146 @@
+"""
+Cache stale-while-revalidate para os dados de campanhas (por conta).
+
+- Dentro do TTL: devolve o resultado em cache.
+- Depois do TTL: devolve na hora o último resultado bom (com a idade) e dispara
+  uma thread em segundo plano que busca os dados novos e os troca no cache.
+- Sem resultado (ou mais velho que o limite de `max_stale_s`): busca na hora.
+
+Single-flight: existe no máximo uma busca em andamento por chave. Sessões que
+chegam durante uma busca síncrona esperam por ela em vez de repetir a chamada
+à Graph API; durante uma busca em segundo plano recebem o dado antigo.
+"""
+import threading
+import time
+import traceback
+
+
+class StaleWhileRevalidateCache:
+    """Cache por chave com revalidação em segundo plano. Seguro para uso entre threads."""
+
+    def __init__(self, fetch_func, ttl_s, max_stale_s, name="swr", wait_timeout_s=120):
+        self._fetch_func = fetch_func
+        self.ttl_s = ttl_s
+        self.max_stale_s = max_stale_s
+        self.name = name
+        self.wait_timeout_s = wait_timeout_s
+        self._lock = threading.Lock()
+        self._entries = {}    # chave -> {"data", "fetched_at", "error"}
+        self._inflight = {}   # chave -> threading.Event da busca em andamento
+        self._generation = 0  # incrementada em invalidate(); descarta buscas iniciadas antes
+
+    def get(self, key, *args):
+        """
+        Retorna um snapshot da entrada de `key`:
+        {"data", "fetched_at", "age_s", "refreshing", "error"}.
+
+        `args` são repassados a fetch_func(*args) quando uma busca é necessária.
+        Se a busca síncrona falhar e não houver dado anterior, "data" é None e
+        "error" traz a mensagem.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            usable = entry is not None and entry["fetched_at"] is not None
+            age = (time.time() - entry["fetched_at"]) if usable else None
+            if usable and age < self.ttl_s:
+                return self._snapshot(key, entry)
+            if usable and age < self.max_stale_s:
+                # Velho mas utilizável: serve agora e revalida em segundo plano
+                if key not in self._inflight:
+                    self._start_fetch(key, args, background=True)
+                return self._snapshot(key, entry)
+            # Sem dado utilizável: junta-se à busca em andamento ou inicia uma
+            event = self._inflight.get(key)
+            is_owner = event is None
+            if is_owner:
+                event = self._start_fetch(key, args, background=False)
+
+        result = (None, "Busca não concluída.")
+        if is_owner:
+            result = self._run_fetch(key, args, event)
+        elif not event.wait(self.wait_timeout_s):
+            print(f"AVISO [{self.name}]: Tempo esgotado esperando a busca em andamento de {key}.")
+            result = (None, "Tempo esgotado esperando a busca de campanhas.")
+        else:
+            with self._lock:
+                missing = key not in self._entries
+            if missing:
+                # A busca esperada foi descartada por invalidate(): busca de novo (como dona)
+                return self.get(key, *args)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                # Cache invalidado durante a busca: quem buscou ainda usa o próprio resultado
+                data, error = result
+                return {"data": data, "fetched_at": None, "age_s": None, "refreshing": key in self._inflight, "error": error}
+            return self._snapshot(key, entry)
+
+    def invalidate(self, key=None, match=None):
+        """
+        Descarta a entrada de `key`, as chaves para as quais match(chave) é
+        verdadeiro ou, sem nenhum dos dois, todas. Buscas já em andamento não
+        gravam o resultado e deixam de contar como em andamento: a próxima
+        chamada inicia uma busca nova em vez de esperar pela antiga.
+        """
+        with self._lock:
+            self._generation += 1
+            if key is None and match is None:
+                self._entries.clear()
+                self._inflight.clear()
+                return
+            keys = {key} if key is not None else {k for k in set(self._entries) | set(self._inflight) if match(k)}
+            for k in keys:
+                self._entries.pop(k, None)
+                self._inflight.pop(k, None)
+
+    def _snapshot(self, key, entry):
+        fetched_at = entry["fetched_at"]
+        return {
+            "data": entry["data"],
+            "fetched_at": fetched_at,
+            "age_s": (time.time() - fetched_at) if fetched_at else None,
+            "refreshing": key in self._inflight,
+            "error": entry["error"],
+        }
+
+    def _start_fetch(self, key, args, background):
+        """Registra a busca de `key` como em andamento. Chamar com self._lock adquirido."""
+        event = threading.Event()
+        event.generation = self._generation  # geração de quando a busca começou
+        self._inflight[key] = event
+        if background:
+            thread = threading.Thread(target=self._run_fetch, args=(key, args, event),
+                                      name=f"{self.name}-refresh-{key}", daemon=True)
+            thread.start()
+        return event
+
+    def _run_fetch(self, key, args, event):
+        start = time.perf_counter()
+        data, error = None, None
+        try:
+            data = self._fetch_func(*args)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            print(f"ERRO [{self.name}]: Falha ao buscar {key}: {traceback.format_exc()}")
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            try:
+                if event.generation != self._generation:
+                    print(f"INFO [{self.name}]: Resultado de {key} descartado (cache invalidado durante a busca).")
+                elif error is None:
+                    self._entries[key] = {"data": data, "fetched_at": time.time(), "error": None}
+                    print(f"INFO [{self.name}]: {key} atualizado em {elapsed:.1f}s.")
+                elif self._entries.get(key, {}).get("fetched_at") is not None:
+                    # Mantém o último resultado bom e registra a falha da revalidação
+                    self._entries[key]["error"] = error
+                else:
+                    # Sem dado anterior: guarda só o erro; a próxima chamada tenta de novo
+                    self._entries[key] = {"data": None, "fetched_at": None, "error": error}
+            finally:
+                # Depois de invalidate(), a chave pode já ter outra busca em andamento
+                if self._inflight.get(key) is event:
+                    del self._inflight[key]
+                event.set()
+        return data, error
@@ -0,0 +1,273 @@
+"""
+Cache de segundo nível para respostas da Graph API, compartilhado entre processos.
+
+st.cache_data e o cache de campanhas vivem dentro de um processo; este cache fica
+no banco (tabela graph_cache) ou em disco, então todas as réplicas do app e o
+worker reaproveitam a mesma resposta para a mesma consulta.
+
+A chave é o sha256 de (conta, endpoint, campos, parâmetros, período). Períodos
+relativos (date_preset) entram na chave junto com a data do dia, para que
+"last_7d" de ontem não seja servido hoje.
+
+Backend escolhido por GRAPH_CACHE_BACKEND: "db" (padrão quando há conexão com o
+banco), "disk" ou "off". Falhas do cache nunca impedem a busca: são registradas
+no log e a chamada à Graph API segue normalmente. Sem dependência do Streamlit,
+para poder ser usado pelo worker.
+"""
+import hashlib
+import json
+import os
+import time
+from datetime import date
+
+GRAPH_CACHE_BACKEND = os.getenv("GRAPH_CACHE_BACKEND", "").lower()
+GRAPH_CACHE_TTL_S = int(os.getenv("GRAPH_CACHE_TTL_S", "300"))
+GRAPH_CACHE_MAX_BYTES = int(os.getenv("GRAPH_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+GRAPH_CACHE_DIR = os.getenv("GRAPH_CACHE_DIR", os.path.join("data", "graph_cache"))
+
+
+def make_cache_key(account_id, endpoint, fields, params=None, date_range=None):
+    """Chave estável (sha256) para uma consulta à Graph API."""
+    if date_range is None and params:
+        if params.get("time_range"):
+            date_range = params["time_range"]
+        elif params.get("date_preset"):
+            date_range = {"preset": params["date_preset"], "as_of": date.today().isoformat()}
+    key_source = json.dumps({
+        "account_id": str(account_id),
+        "endpoint": endpoint,
+        "fields": sorted(fields or []),
+        "params": params or {},
+        "date_range": date_range,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+
+class DatabaseCacheBackend:
+    """
+    Guarda as respostas na tabela graph_cache (PostgreSQL ou SQLite).
+
+    `connection_factory` é um context manager que produz (conn, conn_type) ou None,
+    como facebook.banco.db_connection no app ou a conexão do worker.
+    """
+
+    name = "db"
+
+    def __init__(self, connection_factory, max_bytes=GRAPH_CACHE_MAX_BYTES):
+        self._connection_factory = connection_factory
+        self.max_bytes = max_bytes
+
+    def _execute(self, query, params, fetch_one=False):
+        with self._connection_factory() as conn_info:
+            if conn_info is None:
+                raise RuntimeError("banco indisponível")
+            conn, conn_type = conn_info
+            if conn_type == "sqlite":
+                query = query.replace("%s", "?")
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                result = cursor.fetchone() if fetch_one else None
+                conn.commit()
+                return result
+            finally:
+                cursor.close()
+
+    def get(self, key):
+        row = self._execute(
+            "SELECT payload FROM graph_cache WHERE cache_key = %s AND expires_at > %s",
+            (key, time.time()), fetch_one=True
+        )
+        return row[0] if row else None
+
+    def invalidate(self, account_id, endpoint=None):
+        if endpoint is None:
+            self._execute("DELETE FROM graph_cache WHERE account_id = %s", (str(account_id),))
+        else:
+            self._execute("DELETE FROM graph_cache WHERE account_id = %s AND endpoint = %s", (str(account_id), endpoint))
+
+    def set(self, key, payload, ttl_s, account_id="", endpoint=""):
+        now = time.time()
+        with self._connection_factory() as conn_info:
+            if conn_info is None:
+                raise RuntimeError("banco indisponível")
+            conn, conn_type = conn_info
+            ph = "?" if conn_type == "sqlite" else "%s"
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f'''
+                    INSERT INTO graph_cache (cache_key, account_id, endpoint, payload, size_bytes, created_at, expires_at)
+                    VALUES ({ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph})
+                    ON CONFLICT (cache_key) DO UPDATE SET
+                        payload = EXCLUDED.payload, size_bytes = EXCLUDED.size_bytes,
+                        created_at = EXCLUDED.created_at, expires_at = EXCLUDED.expires_at
+                ''', (key, str(account_id), endpoint, payload, len(payload.encode("utf-8")), now, now + ttl_s))
+                # Remove expirados e, se passar do limite, as entradas mais antigas
+                cursor.execute(f"DELETE FROM graph_cache WHERE expires_at <= {ph}", (now,))
+                cursor.execute(f'''
+                    DELETE FROM graph_cache WHERE cache_key IN (
+                        SELECT cache_key FROM (
+                            SELECT cache_key, SUM(size_bytes) OVER (ORDER BY created_at DESC, cache_key) AS running_bytes
+                            FROM graph_cache
+                        ) ranked WHERE running_bytes > {ph}
+                    )
+                ''', (self.max_bytes,))
+                conn.commit()
+            finally:
+                cursor.close()
+
+
+class DiskCacheBackend:
+    """
+    Guarda cada resposta num arquivo JSON em `directory`. Só é compartilhado entre
+    processos da mesma máquina (ou com o diretório num volume comum).
+    """
+
+    name = "disk"
+
+    def __init__(self, directory=GRAPH_CACHE_DIR, max_bytes=GRAPH_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        if entry.get("expires_at", 0) <= time.time():
+            return None
+        return entry.get("payload")
+
+    def set(self, key, payload, ttl_s, account_id="", endpoint=""):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"expires_at": time.time() + ttl_s, "account_id": str(account_id),
+                       "endpoint": endpoint, "payload": payload}, f)
+        os.replace(tmp_path, path)  # troca atômica: leitores nunca veem arquivo pela metade
+        self._evict()
+
+    def invalidate(self, account_id, endpoint=None):
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path, encoding="utf-8") as f:
+                    cached = json.load(f)
+                if cached.get("account_id") == str(account_id) and endpoint in (None, cached.get("endpoint")):
+                    os.remove(entry.path)
+            except (FileNotFoundError, ValueError):
+                pass
+
+    def _evict(self):
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        # Mais antigos primeiro: remove os já expirados (mais velhos que o TTL) e, se ainda
+        # passar do limite de tamanho, os mais antigos até caber
+        for mtime, size, path in sorted(files):
+            if total <= self.max_bytes and mtime > now - GRAPH_CACHE_TTL_S:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+
+class SharedGraphCache:
+    """Fachada usada pelas funções de busca: get_or_fetch com TTL e fail-open."""
+
+    def __init__(self, backend, ttl_s=GRAPH_CACHE_TTL_S, log=print):
+        self.backend = backend
+        self.ttl_s = ttl_s
+        self._log = log
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, account_id, endpoint, fields, params):
+        """Resposta em cache para a consulta, ou None (não encontrada, expirada ou falha do backend)."""
+        key = make_cache_key(account_id, endpoint, fields, params)
+        try:
+            payload = self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            self._log(f"AVISO [Cache Graph]: Falha ao ler do cache ({self.backend.name}): {e}")
+            payload = None
+        if payload is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(payload)
+
+    def set(self, account_id, endpoint, fields, params, data, ttl_s=None):
+        """Grava a resposta da consulta (precisa ser serializável em JSON)."""
+        key = make_cache_key(account_id, endpoint, fields, params)
+        try:
+            self.backend.set(key, json.dumps(data, default=str), ttl_s or self.ttl_s,
+                             account_id=account_id, endpoint=endpoint)
+        except Exception as e:
+            self.errors += 1
+            self._log(f"AVISO [Cache Graph]: Falha ao gravar no cache ({self.backend.name}): {e}")
+
+    def invalidate(self, account_id, endpoint=None):
+        """
+        Descarta as respostas em cache da conta (só do `endpoint`, se informado).
+        Chamar depois de toda escrita na conta (pausar/ativar, orçamento, regras),
+        senão as réplicas e o worker continuam lendo o estado anterior até o TTL.
+        """
+        try:
+            self.backend.invalidate(account_id, endpoint)
+        except Exception as e:
+            self.errors += 1
+            self._log(f"AVISO [Cache Graph]: Falha ao invalidar o cache ({self.backend.name}) da conta {account_id}: {e}")
+
+    def get_or_fetch(self, account_id, endpoint, fields, params, fetch_func, ttl_s=None):
+        """
+        Retorna a resposta em cache para a consulta ou chama fetch_func() e grava
+        o resultado (precisa ser serializável em JSON).
+        """
+        data = self.get(account_id, endpoint, fields, params)
+        if data is not None:
+            return data
+        data = fetch_func()
+        self.set(account_id, endpoint, fields, params, data, ttl_s)
+        return data
+
+    def stats(self):
+        return {"backend": self.backend.name, "hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+
+def create_shared_cache(connection_factory=None, log=print):
+    """
+    Cria o cache compartilhado conforme GRAPH_CACHE_BACKEND.
+    Retorna None se desativado ("off") ou se o backend não puder ser criado.
+    """
+    backend_name = GRAPH_CACHE_BACKEND or ("db" if connection_factory else "disk")
+    try:
+        if backend_name == "off":
+            return None
+        if backend_name == "db":
+            if connection_factory is None:
+                raise ValueError("backend 'db' requer uma conexão com o banco")
+            backend = DatabaseCacheBackend(connection_factory)
+        elif backend_name == "disk":
+            backend = DiskCacheBackend()
+        else:
+            raise ValueError(f"GRAPH_CACHE_BACKEND desconhecido: {backend_name}")
+    except Exception as e:
+        log(f"AVISO [Cache Graph]: Cache compartilhado desativado: {e}")
+        return None
+    log(f"INFO [Cache Graph]: Cache compartilhado ativo (backend={backend_name}, ttl={GRAPH_CACHE_TTL_S}s).")
+    return SharedGraphCache(backend, log=log)
@@ -0,0 +1,300 @@
+"""
+Condições de regras como árvore de expressões (E / OU / NÃO), guardada em JSON
+na coluna rules.condition_tree.
+
+Formato dos nós:
+  folha:  {"metric": "cpa", "operator": "<=", "value": 30}
+          {"metric": "roas", "operator": "<", "value": 1, "window": "last_30d"}
+  grupos: {"and": [nó, ...]}, {"or": [nó, ...]}, {"not": nó}
+Um "and" vazio é sempre verdadeiro e um "or" vazio é sempre falso. Sem
+"window", a folha usa DEFAULT_INSIGHT_WINDOW (últimos 7 dias); as janelas
+possíveis são as de graph.INSIGHT_WINDOWS.
+
+Regras antigas (primary_* / secondary_* + join_operator) viram a mesma árvore
+em legacy_condition, com o comportamento de antes: condição primária incompleta
+ignora a regra e condição secundária incompleta anula um "AND".
+
+A árvore é compilada uma vez (em cache pelo JSON canônico) para uma função
+sobre as colunas de métricas, um array numpy com uma posição por campanha.
+ConditionEvaluator guarda a máscara de cada folha, então regras que repetem a
+mesma comparação (ex.: "spend > 50") não varrem a coluna de novo. Métricas
+derivadas (facebook/metricas.py) são calculadas na primeira folha que as usa,
+a partir das colunas básicas.
+Sem dependência do Streamlit.
+"""
+import functools
+import json
+
+import numpy as np
+
+from facebook.graph import DEFAULT_INSIGHT_WINDOW, INSIGHT_WINDOWS
+from facebook.metricas import DERIVED_METRICS, campaign_metric_columns, derived_metric, to_float_array
+
+CONDITION_METRICS = ['cpa', 'purchases', 'roas', 'spend', 'clicks', 'ctr', 'cpc'] + list(DERIVED_METRICS)
+
+COMPARISON_OPERATORS = {
+    '<': np.less, '<=': np.less_equal, '>': np.greater,
+    '>=': np.greater_equal, '==': np.equal,
+}
+
+GROUP_OPERATORS = ('and', 'or', 'not')
+
+# Limites para uma condição digitada no formulário
+MAX_CONDITION_DEPTH = 6
+MAX_CONDITION_LEAVES = 30
+
+
+# --- Leitura e validação ---
+def parse_condition(raw):
+    """Árvore a partir do JSON (texto) ou do dict já carregado. Levanta ValueError se não for JSON válido."""
+    if isinstance(raw, dict):
+        return raw
+    try:
+        return json.loads(raw)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"JSON inválido: {e}")
+
+
+def _node_kind(node):
+    """'and' / 'or' / 'not' / 'leaf'. Levanta ValueError para nós malformados."""
+    if not isinstance(node, dict):
+        raise ValueError(f"cada nó precisa ser um objeto, recebido: {node!r}")
+    groups = [key for key in GROUP_OPERATORS if key in node]
+    if len(groups) > 1 or (groups and len(node) > 1):
+        raise ValueError(f"um grupo tem uma única chave ('and', 'or' ou 'not'): {node!r}")
+    if groups:
+        return groups[0]
+    if set(node) - {"window"} != {"metric", "operator", "value"}:
+        raise ValueError(f"uma condição precisa de 'metric', 'operator' e 'value' (e opcionalmente 'window'): {node!r}")
+    return "leaf"
+
+
+def validate_condition(tree, metrics=CONDITION_METRICS):
+    """Levanta ValueError (mensagem para o usuário) se a árvore não puder ser salva."""
+    leaves = 0
+
+    def visit(node, depth):
+        nonlocal leaves
+        if depth > MAX_CONDITION_DEPTH:
+            raise ValueError(f"a condição passa de {MAX_CONDITION_DEPTH} níveis de grupos")
+        kind = _node_kind(node)
+        if kind == "leaf":
+            leaves += 1
+            if node["metric"] not in metrics:
+                raise ValueError(f"métrica desconhecida '{node['metric']}' (use {', '.join(metrics)})")
+            if node["operator"] not in COMPARISON_OPERATORS:
+                raise ValueError(f"operador desconhecido '{node['operator']}' (use {', '.join(COMPARISON_OPERATORS)})")
+            if isinstance(node["value"], bool) or not isinstance(node["value"], (int, float)):
+                raise ValueError(f"o valor de '{node['metric']}' precisa ser um número")
+            if "window" in node and node["window"] not in INSIGHT_WINDOWS:
+                raise ValueError(f"janela desconhecida '{node['window']}' (use {', '.join(INSIGHT_WINDOWS)})")
+        elif kind == "not":
+            visit(node["not"], depth + 1)
+        else:
+            if not isinstance(node[kind], list) or not node[kind]:
+                raise ValueError(f"'{kind}' precisa de uma lista com pelo menos uma condição")
+            for child in node[kind]:
+                visit(child, depth + 1)
+
+    visit(tree, 0)
+    if leaves > MAX_CONDITION_LEAVES:
+        raise ValueError(f"a condição passa de {MAX_CONDITION_LEAVES} comparações")
+    return tree
+
+
+def condition_leaves(tree):
+    """Folhas da árvore, da esquerda para a direita."""
+    kind = _node_kind(tree)
+    if kind == "leaf":
+        return [tree]
+    if kind == "not":
+        return condition_leaves(tree["not"])
+    return [leaf for child in tree[kind] for leaf in condition_leaves(child)]
+
+
+def condition_metrics(tree):
+    return {leaf["metric"] for leaf in condition_leaves(tree)}
+
+
+def leaf_window(leaf):
+    return leaf.get("window") or DEFAULT_INSIGHT_WINDOW
+
+
+def condition_windows(tree):
+    """Janelas de insights que a condição precisa."""
+    return {leaf_window(leaf) for leaf in condition_leaves(tree)}
+
+
+# --- Regras antigas e regras com árvore ---
+def legacy_condition(rule):
+    """Árvore equivalente às colunas primary_*/secondary_* da regra, ou None se a regra é ignorada."""
+    primary_metric, primary_operator = rule.get('primary_metric'), rule.get('primary_operator')
+    if primary_metric is None or primary_operator is None or primary_metric not in CONDITION_METRICS:
+        return None
+    try:
+        primary = {"metric": primary_metric, "operator": primary_operator, "value": float(rule.get('primary_value'))}
+    except (TypeError, ValueError):
+        return None
+    if not rule.get('is_composite', 0):
+        return primary
+
+    join_operator = rule.get('join_operator', 'AND')
+    secondary_metric, secondary_operator = rule.get('secondary_metric'), rule.get('secondary_operator')
+    secondary_value = rule.get('secondary_value')
+    if secondary_metric not in CONDITION_METRICS or not secondary_operator or secondary_value is None:
+        # Métrica/operador ausentes anulam o AND; no OR vale só a primária
+        return {"and": [primary, {"or": []}]} if join_operator == 'AND' else primary
+    # Valor não numérico fica como está e a folha nunca é atendida
+    secondary = {"metric": secondary_metric, "operator": secondary_operator, "value": secondary_value}
+    if join_operator in ('AND', 'OR'):
+        return {join_operator.lower(): [primary, secondary]}
+    return {"or": []}
+
+
+def rule_condition(rule):
+    """
+    Árvore de condição da regra: a de condition_tree, se houver, senão a das
+    colunas antigas. None quando a regra deve ser ignorada.
+    """
+    raw = rule.get('condition_tree')
+    if not raw:
+        return legacy_condition(rule)
+    try:
+        return validate_condition(parse_condition(raw))
+    except ValueError as e:
+        print(f"AVISO [Condições]: Regra {rule.get('id')} com condition_tree inválida, ignorada: {e}")
+        return None
+
+
+# --- Avaliação vetorizada ---
+def _canonical(tree):
+    return json.dumps(tree, sort_keys=True, separators=(",", ":"))
+
+
+@functools.lru_cache(maxsize=512)
+def _compile_canonical(canonical):
+    return _compile_node(json.loads(canonical))
+
+
+def _compile_node(node):
+    """Função evaluator -> máscara booleana para o nó."""
+    kind = _node_kind(node)
+    if kind == "leaf":
+        metric, operator, value, window = node["metric"], node["operator"], node["value"], leaf_window(node)
+        return lambda evaluator: evaluator.leaf_mask(metric, operator, value, window)
+    if kind == "not":
+        child = _compile_node(node["not"])
+        return lambda evaluator: ~child(evaluator)
+    children = [_compile_node(child) for child in node[kind]]
+    if kind == "and":
+        return lambda evaluator: functools.reduce(np.logical_and, (child(evaluator) for child in children), evaluator.constant(True))
+    return lambda evaluator: functools.reduce(np.logical_or, (child(evaluator) for child in children), evaluator.constant(False))
+
+
+def compile_condition(tree):
+    """Compila a árvore (com cache); a função recebe um ConditionEvaluator."""
+    return _compile_canonical(_canonical(tree))
+
+
+class ConditionEvaluator:
+    """
+    Avalia árvores de condição sobre as mesmas campanhas.
+
+    `columns` mapeia métrica -> valores por campanha (array, lista ou coluna de
+    DataFrame). Valores não numéricos viram NaN e nunca atendem a comparação.
+    Métricas derivadas ausentes de `columns` são calculadas das entradas.
+
+    `columns` é a janela padrão; `window_columns(janela)` devolve as colunas de
+    outra janela (chamada uma vez por janela). Sem ela, folhas de outras
+    janelas nunca são atendidas.
+    """
+
+    def __init__(self, columns, size=None, window_columns=None):
+        self._columns = columns
+        self._arrays = {}
+        self._leaf_masks = {}
+        self._window_columns = window_columns
+        self._window_evaluators = {}
+        if size is None:
+            size = len(next(iter(columns.values()))) if len(columns) else 0
+        self.size = size
+
+    def for_window(self, window):
+        """Avaliador das mesmas campanhas em outra janela."""
+        if window == DEFAULT_INSIGHT_WINDOW:
+            return self
+        if window not in self._window_evaluators:
+            columns = self._window_columns(window) if self._window_columns else None
+            self._window_evaluators[window] = ConditionEvaluator(columns if columns is not None else {}, size=self.size)
+        return self._window_evaluators[window]
+
+    def constant(self, value):
+        return np.full(self.size, value, dtype=bool)
+
+    def column(self, metric):
+        if metric not in self._arrays:
+            if metric in self._columns:
+                self._arrays[metric] = to_float_array(self._columns[metric])
+            elif metric in DERIVED_METRICS:
+                self._arrays[metric] = derived_metric(metric, self.column)
+            else:
+                return None
+        return self._arrays[metric]
+
+    def leaf_mask(self, metric, operator, value, window=DEFAULT_INSIGHT_WINDOW):
+        if window != DEFAULT_INSIGHT_WINDOW:
+            return self.for_window(window).leaf_mask(metric, operator, value)
+        key = (metric, operator, value)
+        if key not in self._leaf_masks:
+            compare = COMPARISON_OPERATORS.get(operator)
+            values = self.column(metric)
+            try:
+                threshold = float(value)
+            except (TypeError, ValueError):
+                compare = None
+            if compare is None or values is None:
+                self._leaf_masks[key] = self.constant(False)
+            else:
+                # NaN comparado com qualquer valor dá False
+                self._leaf_masks[key] = compare(values, threshold)
+        return self._leaf_masks[key]
+
+    def mask(self, tree):
+        return compile_condition(tree)(self)
+
+
+def metric_columns(campaigns, window=None):
+    """Colunas {métrica: array} a partir das campanhas (insights da janela e orçamento; derivadas sob demanda)."""
+    return campaign_metric_columns(campaigns, window)
+
+
+def campaign_evaluator(campaigns):
+    """ConditionEvaluator sobre campanhas (dicts com "insights" e, opcionalmente, "insights_by_window")."""
+    return ConditionEvaluator(metric_columns(campaigns), size=len(campaigns),
+                              window_columns=lambda window: metric_columns(campaigns, window))
+
+
+def condition_matches(tree, campaign):
+    """Avalia a árvore para uma única campanha."""
+    return bool(campaign_evaluator([campaign]).mask(tree)[0])
+
+
+# --- Texto ---
+def format_condition(tree, metric_labels=None, value_format=None):
+    """Texto da árvore, ex.: "(CPA <= 30.00 E Compras >= 2) OU NÃO (ROAS < 1.00)"."""
+    metric_labels = metric_labels or {}
+
+    def text(node, top_level):
+        kind = _node_kind(node)
+        if kind == "leaf":
+            value = value_format(node["metric"], node["value"]) if value_format else node["value"]
+            window = f" ({INSIGHT_WINDOWS[leaf_window(node)]})" if leaf_window(node) != DEFAULT_INSIGHT_WINDOW else ""
+            return f"{metric_labels.get(node['metric'], node['metric'])} {node['operator']} {value}{window}"
+        if kind == "not":
+            return f"NÃO ({text(node['not'], True)})"
+        if not node[kind]:
+            return "verdadeiro" if kind == "and" else "falso"
+        joined = f" {'E' if kind == 'and' else 'OU'} ".join(text(child, False) for child in node[kind])
+        return joined if top_level or len(node[kind]) == 1 else f"({joined})"
+
+    return text(tree, True)
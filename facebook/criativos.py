@@ -0,0 +1,173 @@
+"""
+Envio de imagens e vídeos de criativos com cache endereçado por conteúdo.
+
+O sha256 dos bytes de cada arquivo é a chave. A tabela creative_assets guarda,
+por conta, o hash da imagem (AdImage) ou o ID do vídeo (AdVideo) já enviados.
+Antes de subir, todos os arquivos são procurados no cache com uma única
+consulta. Só os que a conta ainda não tem passam pela rede, e arquivos iguais
+com nomes diferentes viram um único envio.
+Sem dependência do Streamlit.
+"""
+import base64
+import hashlib
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from facebook.acoes_em_massa import BULK_MAX_WORKERS
+from facebook.graph import make_api
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp")
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".m4v", ".webm")
+
+
+def asset_sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def asset_kind(filename):
+    """'image' ou 'video' pela extensão; None se não for um arquivo de criativo."""
+    name = filename.lower()
+    if name.endswith(IMAGE_EXTENSIONS):
+        return "image"
+    if name.endswith(VIDEO_EXTENSIONS):
+        return "video"
+    return None
+
+
+class CreativeAssetCache:
+    """
+    Mapa (sha256, conta) → referência no Facebook, na tabela creative_assets.
+
+    `connection_factory` é um context manager que produz (conn, conn_type) ou None,
+    como facebook.banco.db_connection.
+    """
+
+    def __init__(self, connection_factory):
+        self._connection_factory = connection_factory
+
+    def get_many(self, account_id, sha256_list):
+        """{sha256: (kind, facebook_ref)} dos arquivos que a conta já tem."""
+        if not sha256_list:
+            return {}
+        with self._connection_factory() as conn_info:
+            if conn_info is None:
+                raise RuntimeError("banco indisponível")
+            conn, conn_type = conn_info
+            ph = "?" if conn_type == "sqlite" else "%s"
+            cursor = conn.cursor()
+            try:
+                found = {}
+                # IN em blocos para não passar do limite de parâmetros do SQLite
+                for start in range(0, len(sha256_list), 500):
+                    chunk = list(sha256_list[start:start + 500])
+                    cursor.execute(f"""
+                        SELECT sha256, kind, facebook_ref FROM creative_assets
+                        WHERE account_id = {ph} AND sha256 IN ({', '.join([ph] * len(chunk))})
+                    """, [str(account_id)] + chunk)
+                    found.update({sha: (kind, ref) for sha, kind, ref in cursor.fetchall()})
+                conn.commit()
+                return found
+            finally:
+                cursor.close()
+
+    def put_many(self, account_id, entries):
+        """Grava [(sha256, kind, facebook_ref, size_bytes)] enviados agora."""
+        if not entries:
+            return
+        with self._connection_factory() as conn_info:
+            if conn_info is None:
+                raise RuntimeError("banco indisponível")
+            conn, conn_type = conn_info
+            ph = "?" if conn_type == "sqlite" else "%s"
+            cursor = conn.cursor()
+            try:
+                now = time.time()
+                cursor.executemany(f"""
+                    INSERT INTO creative_assets (sha256, account_id, kind, facebook_ref, size_bytes, created_at)
+                    VALUES ({ph}, {ph}, {ph}, {ph}, {ph}, {ph})
+                    ON CONFLICT (sha256, account_id) DO UPDATE SET
+                        kind = EXCLUDED.kind, facebook_ref = EXCLUDED.facebook_ref, created_at = EXCLUDED.created_at
+                """, [(sha, str(account_id), kind, ref, size, now) for sha, kind, ref, size in entries])
+                conn.commit()
+            finally:
+                cursor.close()
+
+
+def _upload_image(config, data):
+    from facebook_business.adobjects.adimage import AdImage
+    api = make_api(config)
+    image = AdImage(parent_id=f"act_{config['account_id']}", api=api)
+    image[AdImage.Field.bytes] = base64.b64encode(data).decode("ascii")
+    image.remote_create()
+    return image[AdImage.Field.hash]
+
+
+def _upload_video(config, data, filename):
+    from facebook_business.adobjects.advideo import AdVideo
+    api = make_api(config)
+    # AdVideo envia a partir de um caminho em disco
+    suffix = os.path.splitext(filename)[1] or ".mp4"
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        tmp.write(data)
+        tmp_path = tmp.name
+    try:
+        video = AdVideo(parent_id=f"act_{config['account_id']}", api=api)
+        video[AdVideo.Field.filepath] = tmp_path
+        video.remote_create()
+        return video["id"]
+    finally:
+        os.remove(tmp_path)
+
+
+def upload_assets(config, files, cache, max_workers=BULK_MAX_WORKERS):
+    """
+    Garante que os arquivos `files` ({nome: bytes}) existam na conta de `config`.
+
+    Retorna (refs, report): refs = {nome: {"kind", "ref"}} para os arquivos
+    disponíveis; report = {"reused", "uploaded", "bytes_uploaded", "bytes_skipped",
+    "failures": [{"arquivo", "erro"}]}.
+    """
+    account_id = config["account_id"]
+    by_sha = {}
+    for filename, data in files.items():
+        kind = asset_kind(filename)
+        if kind is None:
+            continue
+        by_sha.setdefault(asset_sha256(data), (kind, filename, data, []))[3].append(filename)
+
+    known = cache.get_many(account_id, list(by_sha))
+    report = {"reused": 0, "uploaded": 0, "bytes_uploaded": 0, "bytes_skipped": 0, "failures": []}
+    refs = {}
+    for sha, (kind, _, data, names) in by_sha.items():
+        if sha in known:
+            report["reused"] += len(names)
+            report["bytes_skipped"] += len(data) * len(names)
+            refs.update({name: {"kind": known[sha][0], "ref": known[sha][1]} for name in names})
+
+    def upload(sha):
+        kind, filename, data, _ = by_sha[sha]
+        return _upload_image(config, data) if kind == "image" else _upload_video(config, data, filename)
+
+    pending = [sha for sha in by_sha if sha not in known]
+    uploaded_entries = []
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as executor:
+            futures = {sha: executor.submit(upload, sha) for sha in pending}
+            for sha, future in futures.items():
+                kind, _, data, names = by_sha[sha]
+                try:
+                    ref = future.result()
+                except Exception as e:
+                    report["failures"].extend({"arquivo": name, "erro": str(e)} for name in names)
+                    continue
+                uploaded_entries.append((sha, kind, ref, len(data)))
+                report["uploaded"] += 1
+                report["bytes_uploaded"] += len(data)
+                # Cópias do mesmo conteúdo com outros nomes saem do mesmo envio
+                report["reused"] += len(names) - 1
+                report["bytes_skipped"] += len(data) * (len(names) - 1)
+                refs.update({name: {"kind": kind, "ref": ref} for name in names})
+    cache.put_many(account_id, uploaded_entries)
+    return refs, report
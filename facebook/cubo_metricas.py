@@ -0,0 +1,206 @@
+"""
+Cubo de métricas campanha × dia × métrica em disco, lido por memory-map.
+
+Cada conta e mês vira uma partição em METRICS_CUBE_DIR/<conta>/<AAAA-MM>/ com:
+  - metrics.npy: float64 (dias do mês, campanhas, métricas);
+  - campaign_ids.npy: índice das campanhas (coluna 1 do array);
+  - meta.json: nomes das métricas e primeiro dia da partição.
+
+O worker grava as partições a partir dos insights diários (ver
+worker.sync_daily_insights). Análises de vários meses (backtest, dashboard)
+abrem as partições com np.load(mmap_mode="r"): só as fatias usadas são lidas
+do disco, sem consultar o banco nem a Graph API. Sem dependência do Streamlit.
+
+O cubo só é usado com METRICS_CUBE_DIR definido, apontando para um diretório
+que o worker e o app enxergam (mesma máquina ou volume compartilhado). Em
+dynos com disco efêmero próprio (Procfile/Heroku) o app nunca veria o que o
+worker gravou; sem a variável, o worker não grava o cubo e o backtest lê
+direto da tabela campaign_daily_insights.
+"""
+import calendar
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Sem valor padrão: um diretório local de cada processo nunca seria lido pelo app (ver acima)
+METRICS_CUBE_DIR = os.getenv("METRICS_CUBE_DIR") or None
+
+CUBE_METRICS = ["spend", "impressions", "clicks", "purchases", "purchase_value", "daily_budget"]
+
+
+def _partition_dir(account_id, month_start, base_dir):
+    return os.path.join(base_dir, str(account_id), month_start.strftime("%Y-%m"))
+
+
+def _month_days(month_start):
+    return pd.date_range(month_start, periods=calendar.monthrange(month_start.year, month_start.month)[1], freq="D")
+
+
+def open_partition(account_id, month_start, base_dir=METRICS_CUBE_DIR):
+    """Abre a partição por memory-map. Retorna (campaign_ids, array dias × campanhas × métricas) ou None."""
+    path = _partition_dir(account_id, month_start, base_dir)
+    try:
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        campaign_ids = np.load(os.path.join(path, "campaign_ids.npy"))
+        values = np.load(os.path.join(path, "metrics.npy"), mmap_mode="r")
+    except FileNotFoundError:
+        return None
+    if meta.get("metrics") != CUBE_METRICS:
+        # Partição gravada com outra lista de métricas: ignorada até ser regravada
+        return None
+    return campaign_ids, values
+
+
+def write_partitions(daily_df, base_dir=METRICS_CUBE_DIR):
+    """
+    Grava/atualiza as partições conta × mês com as linhas de `daily_df`
+    (colunas de campaign_daily_insights). Linhas novas sobrescrevem o mesmo
+    campanha × dia (exceto orçamento 0, que mantém o gravado); o restante da
+    partição existente é mantido.
+    Retorna o número de partições gravadas.
+    """
+    if daily_df.empty:
+        return 0
+    daily_df = daily_df.assign(day=pd.to_datetime(daily_df["day"]))
+    daily_df["month"] = daily_df["day"].dt.to_period("M")
+    written = 0
+    for (account_id, month), rows in daily_df.groupby(["account_id", "month"]):
+        month_start = month.to_timestamp().date()
+        days = _month_days(month_start)
+
+        existing = open_partition(account_id, month_start, base_dir)
+        old_ids = existing[0] if existing else np.array([], dtype=str)
+        campaign_ids = np.array(sorted(set(old_ids.tolist()) | set(rows["campaign_id"].astype(str))), dtype=str)
+        values = np.zeros((len(days), len(campaign_ids), len(CUBE_METRICS)))
+        if existing:
+            values[:, np.searchsorted(campaign_ids, old_ids), :] = existing[1]
+
+        day_index = (rows["day"] - days[0]).dt.days.to_numpy()
+        campaign_index = np.searchsorted(campaign_ids, rows["campaign_id"].astype(str).to_numpy())
+        new_values = rows[CUBE_METRICS].to_numpy(dtype=float)
+        # Orçamento 0 = desconhecido (ver worker.sync_daily_insights): mantém o já gravado
+        budget = CUBE_METRICS.index("daily_budget")
+        new_values[:, budget] = np.where(new_values[:, budget] > 0, new_values[:, budget], values[day_index, campaign_index, budget])
+        values[day_index, campaign_index, :] = new_values
+
+        # Grava numa pasta temporária e troca de uma vez: leitores nunca veem a partição pela metade
+        path = _partition_dir(account_id, month_start, base_dir)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(tmp_path, exist_ok=True)
+        np.save(os.path.join(tmp_path, "metrics.npy"), values)
+        np.save(os.path.join(tmp_path, "campaign_ids.npy"), campaign_ids)
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"metrics": CUBE_METRICS, "first_day": month_start.isoformat()}, f)
+        old_path = f"{path}.{os.getpid()}.old"
+        if os.path.isdir(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        written += 1
+    return written
+
+
+def list_accounts(base_dir=METRICS_CUBE_DIR):
+    """Contas com pelo menos uma partição no cubo."""
+    if not base_dir or not os.path.isdir(base_dir):
+        return []
+    return sorted(entry.name for entry in os.scandir(base_dir) if entry.is_dir())
+
+
+def load_cube(since, until, account_ids=None, base_dir=METRICS_CUBE_DIR):
+    """
+    Junta as partições do período num único array.
+
+    Retorna (days, campaign_ids, account_of_campaign, values) com values no
+    formato dias × campanhas × CUBE_METRICS; dias sem partição ficam zerados.
+    """
+    days = pd.date_range(since, until, freq="D")
+    months = pd.period_range(since, until, freq="M")
+    partitions = []
+    for account_id in (account_ids if account_ids is not None else list_accounts(base_dir)):
+        for month in months:
+            month_start = month.to_timestamp().date()
+            partition = open_partition(account_id, month_start, base_dir)
+            if partition is not None:
+                partitions.append((str(account_id), month_start, partition))
+
+    campaign_accounts = {}
+    for account_id, _, (campaign_ids, _) in partitions:
+        for campaign_id in campaign_ids.tolist():
+            campaign_accounts.setdefault(campaign_id, account_id)
+    all_ids = np.array(sorted(campaign_accounts), dtype=str)
+    values = np.zeros((len(days), len(all_ids), len(CUBE_METRICS)))
+
+    for _, month_start, (campaign_ids, partition_values) in partitions:
+        month_days = _month_days(month_start)
+        # Interseção dos dias da partição com o período pedido
+        first = max(month_days[0], days[0])
+        last = min(month_days[-1], days[-1])
+        if first > last:
+            continue
+        src = slice((first - month_days[0]).days, (last - month_days[0]).days + 1)
+        dst = slice((first - days[0]).days, (last - days[0]).days + 1)
+        values[dst, np.searchsorted(all_ids, campaign_ids), :] = partition_values[src]
+
+    accounts = np.array([campaign_accounts[campaign_id] for campaign_id in all_ids.tolist()], dtype=str)
+    return days, all_ids, accounts, values
+
+
+def cube_to_daily_frame(since, until, account_ids=None, base_dir=METRICS_CUBE_DIR):
+    """
+    Linhas campanha × dia (formato de campaign_daily_insights) lidas do cubo,
+    só com os dias em que a campanha teve entrega ou orçamento.
+    """
+    days, campaign_ids, accounts, values = load_cube(since, until, account_ids, base_dir)
+    day_index, campaign_index = np.nonzero(values.any(axis=2))
+    daily_df = pd.DataFrame(values[day_index, campaign_index, :], columns=CUBE_METRICS)
+    daily_df.insert(0, "campaign_id", campaign_ids[campaign_index])
+    daily_df.insert(1, "day", days[day_index])
+    daily_df.insert(2, "account_id", accounts[campaign_index])
+    daily_df["campaign_name"] = None
+    daily_df["status"] = None
+    return daily_df
+
+
+def missing_partitions(since, until, account_ids, base_dir=METRICS_CUBE_DIR):
+    """
+    Trechos do período sem partição legível no cubo: [(conta, primeiro dia,
+    último dia)], um por conta × mês, recortados a `since`..`until`.
+    """
+    missing = []
+    for account_id in account_ids:
+        for month in pd.period_range(since, until, freq="M"):
+            month_start = month.to_timestamp().date()
+            if open_partition(account_id, month_start, base_dir) is None:
+                first = max(month_start, since)
+                last = min(month.to_timestamp(how="end").date(), until)
+                missing.append((str(account_id), first, last))
+    return missing
+
+
+def load_daily_frame(since, until, account_ids, load_table, base_dir=METRICS_CUBE_DIR):
+    """
+    Insights diários das contas no período (formato de campaign_daily_insights):
+    do cubo onde há partição e, para cada conta × mês sem partição (ainda não
+    gravada ou com falha ao gravar na sincronização), da tabela, via
+    load_table(since, until, account_ids). Sem cubo configurado, tudo vem da tabela.
+    """
+    if not base_dir:
+        return load_table(since, until, [str(account_id) for account_id in account_ids] or None)
+    account_ids = sorted({str(account_id) for account_id in account_ids} | set(list_accounts(base_dir)))
+    missing = missing_partitions(since, until, account_ids, base_dir)
+    if not account_ids or len(missing) == len(account_ids) * len(pd.period_range(since, until, freq="M")):
+        return load_table(since, until, account_ids or None)
+
+    frames = [cube_to_daily_frame(since, until, account_ids, base_dir)]
+    accounts_by_range = {}
+    for account_id, first, last in missing:
+        accounts_by_range.setdefault((first, last), []).append(account_id)
+    for (first, last), accounts in accounts_by_range.items():
+        frames.append(load_table(first, last, accounts))
+    non_empty = [frame for frame in frames if not frame.empty]
+    return pd.concat(non_empty, ignore_index=True) if non_empty else frames[0]
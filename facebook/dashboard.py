@@ -1,3 +1,141 @@
 import streamlit as st
+from datetime import date, timedelta
 
-st.subheader("EM BREVE 🚧")
\ No newline at end of file
+from facebook.banco import db_available, db_connection, ensure_db_schema, execute_query
+from facebook.rollups import INSIGHTS_RULE_ID, load_rollups, refresh_rollups
+
+# Dashboard lido dos agregados diários (tabela daily_rollups, ver facebook/rollups.py),
+# atualizados pelo worker: meses de dados viram poucas centenas de linhas.
+
+PERIOD_OPTIONS = {30: "Últimos 30 dias", 90: "Últimos 90 dias", 180: "Últimos 180 dias", 365: "Último ano"}
+DIMENSION_OPTIONS = {"account_name": "Conta", "country": "País", "account_manager": "Gestor"}
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_rollups_cached(since, until):
+    """Agregados do período com o nome da conta (cache de 5 minutos)."""
+    rollup_df = load_rollups(db_connection, since, until)
+    rows = execute_query("SELECT account_id, name FROM api_config", fetch_all=True) or []
+    account_names = {str(account_id): name for account_id, name in rows}
+    rollup_df["account_name"] = rollup_df["account_id"].map(account_names).fillna("Conta não identificada")
+    rollup_df["country"] = rollup_df["country"].fillna("Sem país")
+    rollup_df["account_manager"] = rollup_df["account_manager"].fillna("Sem gestor")
+    return rollup_df
+
+
+def _roas(purchase_value, spend):
+    return purchase_value / spend if spend else 0.0
+
+
+def show_dashboard_page():
+    st.title("Dashboard")
+
+    if not db_available():
+        st.error("Banco de dados indisponível.")
+        return
+    try:
+        ensure_db_schema()
+    except Exception as e:
+        st.error(f"Erro ao inicializar/atualizar o banco de dados: {e}")
+        return
+
+    col_period, col_refresh = st.columns([3, 1])
+    with col_period:
+        period_days = st.selectbox("Período", options=list(PERIOD_OPTIONS), format_func=PERIOD_OPTIONS.get, key="dashboard_period")
+    with col_refresh:
+        st.markdown("<div style='padding-top: 28px;'></div>", unsafe_allow_html=True)
+        if st.button("🔄 Atualizar agregados", use_container_width=True, help="Recalcula agora o que mudou desde a última atualização do worker"):
+            try:
+                refresh_rollups(db_connection)
+                get_rollups_cached.clear()
+            except Exception as e:
+                st.error(f"Erro ao atualizar os agregados: {e}")
+
+    until = date.today()
+    since = until - timedelta(days=period_days - 1)
+    try:
+        rollup_df = get_rollups_cached(since, until)
+    except Exception as e:
+        st.error(f"Erro ao carregar os agregados do Dashboard: {e}")
+        return
+    if rollup_df.empty:
+        st.info("Ainda não há agregados para o período. Eles são gerados pelo worker a partir dos insights diários (`python worker.py --sync-insights`) e do histórico de execuções.")
+        return
+
+    col_country, col_manager = st.columns(2)
+    with col_country:
+        countries = st.multiselect("País", sorted(rollup_df["country"].unique()), key="dashboard_countries")
+    with col_manager:
+        managers = st.multiselect("Gestor", sorted(rollup_df["account_manager"].unique()), key="dashboard_managers")
+    if countries:
+        rollup_df = rollup_df[rollup_df["country"].isin(countries)]
+    if managers:
+        rollup_df = rollup_df[rollup_df["account_manager"].isin(managers)]
+
+    delivery = rollup_df[rollup_df["rule_id"] == INSIGHTS_RULE_ID]
+    executions = rollup_df[rollup_df["rule_id"] != INSIGHTS_RULE_ID]
+
+    # --- Indicadores do período ---
+    total_spend = delivery["spend"].sum()
+    total_value = delivery["purchase_value"].sum()
+    kpi_cols = st.columns(5)
+    kpi_cols[0].metric("Gasto", f"R$ {total_spend:,.2f}")
+    kpi_cols[1].metric("Compras", f"{int(delivery['purchases'].sum()):,}")
+    kpi_cols[2].metric("ROAS", f"{_roas(total_value, total_spend):.2f}")
+    kpi_cols[3].metric("Disparos de regras", f"{int(executions['activations'].sum()):,}")
+    kpi_cols[4].metric("Falhas", f"{int(executions['failures'].sum()):,}")
+
+    # --- Evolução diária ---
+    st.markdown("##### Evolução diária")
+    daily = delivery.groupby("day")[["spend", "purchases", "purchase_value"]].sum()
+    daily["roas"] = (daily["purchase_value"] / daily["spend"]).where(daily["spend"] > 0, 0.0)
+    col_spend_chart, col_roas_chart = st.columns(2)
+    with col_spend_chart:
+        st.caption("Gasto (R$)")
+        st.bar_chart(daily["spend"])
+    with col_roas_chart:
+        st.caption("ROAS")
+        st.line_chart(daily["roas"])
+
+    # --- Quebra por conta / país / gestor ---
+    st.markdown("##### Desempenho por dimensão")
+    dimension = st.radio("Agrupar por", options=list(DIMENSION_OPTIONS), format_func=DIMENSION_OPTIONS.get, horizontal=True, key="dashboard_dimension")
+    by_dimension = delivery.groupby(dimension)[["spend", "purchases", "purchase_value"]].sum()
+    by_dimension = by_dimension.join(executions.groupby(dimension)[["activations", "failures"]].sum(), how="outer").fillna(0)
+    by_dimension["roas"] = (by_dimension["purchase_value"] / by_dimension["spend"]).where(by_dimension["spend"] > 0, 0.0)
+    by_dimension = by_dimension.sort_values("spend", ascending=False).reset_index()
+    st.dataframe(
+        by_dimension[[dimension, "spend", "purchases", "roas", "activations", "failures"]],
+        hide_index=True, use_container_width=True,
+        column_config={
+            dimension: DIMENSION_OPTIONS[dimension],
+            "spend": st.column_config.NumberColumn("Gasto", format="R$ %.2f"),
+            "purchases": st.column_config.NumberColumn("Compras", format="%d"),
+            "roas": st.column_config.NumberColumn("ROAS", format="%.2f"),
+            "activations": st.column_config.NumberColumn("Disparos", format="%d"),
+            "failures": st.column_config.NumberColumn("Falhas", format="%d"),
+        },
+    )
+
+    # --- Regras ---
+    st.markdown("##### Regras")
+    if executions.empty:
+        st.info("Nenhuma execução de regra no período.")
+        return
+    rule_labels = executions["rule_name"].where(executions["rule_id"] > 0, "Ação manual").fillna("Regra excluída")
+    by_rule = executions.assign(rule=rule_labels).groupby("rule")[["activations", "failures"]].sum()
+    by_rule["failure_rate"] = by_rule["failures"] / by_rule["activations"] * 100
+    st.dataframe(
+        by_rule.sort_values("activations", ascending=False).reset_index(),
+        hide_index=True, use_container_width=True,
+        column_config={
+            "rule": "Regra",
+            "activations": st.column_config.NumberColumn("Disparos", format="%d"),
+            "failures": st.column_config.NumberColumn("Falhas", format="%d"),
+            "failure_rate": st.column_config.NumberColumn("Taxa de falha", format="%.1f%%"),
+        },
+    )
+    st.caption(f"{len(rollup_df)} linhas agregadas no período.")
+
+
+show_dashboard_page()
@@ -1,26 +1,27 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
+import hashlib
 import json
 import os
-from datetime import datetime, timedelta, date, timezone 
+from datetime import timedelta, date, timezone 
 import time
-import psycopg2 # Importa o driver PostgreSQL
-from psycopg2 import Error as PgError # Erro específico do psycopg2
 import traceback
-import sqlite3
-import pytz
 
-# Importações da API do Facebook (mantidas)
-try:
-    from facebook_business.api import FacebookAdsApi
-    from facebook_business.adobjects.adaccount import AdAccount
-    from facebook_business.adobjects.campaign import Campaign
-    from facebook_business.adobjects.adset import AdSet
-    from facebook_business.adobjects.ad import Ad
-except ImportError:
-    st.error("Biblioteca 'facebook_business' não encontrada. Instale com: pip install facebook-business")
-    st.stop()
+from facebook.acoes_em_massa import bulk_apply_rule, bulk_set_status
+from facebook.backtest import BACKTEST_LOOKBACK_DAYS, backtest_rules, load_daily_insights
+from facebook.banco import db_available, db_connection, ensure_db_schema, execute_query, get_pool_stats
+from facebook.cache_campanhas import StaleWhileRevalidateCache
+from facebook.cache_compartilhado import create_shared_cache
+from facebook.condicoes import condition_leaves, condition_matches, condition_windows, format_condition, parse_condition, rule_condition, validate_condition
+from facebook.cubo_metricas import load_daily_frame
+from facebook.historico import EXECUTION_COLUMNS, HISTORY_TIME_COLUMN, build_history_dataframe
+from facebook.metricas import DERIVED_METRICS, METRIC_KINDS, attach_derived_metrics, format_metric
+from facebook.graph import DEFAULT_INSIGHT_WINDOW, INSIGHT_WINDOWS, fetch_account_campaigns, make_api, validate_api_config
+from facebook.regras import ACTIVE_STATUS, PAUSED_STATUS, compute_rule_action
+from facebook.simulacao import simulate_portfolio
+
+# O SDK facebook_business (e o psycopg2/sqlite3, em facebook/banco.py) é importado
+# só quando usado: a página abre e lista campanhas do cache sem carregar o SDK.
 
 # CSS (mantido)
 st.markdown("""
@@ -42,332 +43,16 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- Funções do Banco de Dados (ADAPTADAS PARA POSTGRESQL) ---
-
-# Cache para conexão (evita reconectar a cada interação mínima, mas reconecta se der erro)
-@st.cache_resource(ttl=3600)
-def get_db_connection():
-    """Obtém uma conexão com o banco de dados."""
-    # Verificar variáveis de ambiente para PostgreSQL
-    pg_host = os.getenv("PGHOST")
-    pg_user = os.getenv("PGUSER")
-    pg_password = os.getenv("PGPASSWORD")
-    
-    # Usar SQLite como fallback se não houver configuração PostgreSQL
-    if not (pg_host and pg_user and pg_password):
-        try:
-            import sqlite3
-            # Criar pasta data se não existir
-            if not os.path.exists("data"):
-                os.makedirs("data")
-            # Retornar SQLite com uma tupla indicando o tipo
-            return (sqlite3.connect("data/gcoperacional.db", check_same_thread=False), "sqlite")
-        except Exception as e:
-            st.error(f"Erro ao conectar ao SQLite: {e}")
-            return None
-    
-    # Usar PostgreSQL se houver configuração
-    try:
-        import psycopg2
-        conn = psycopg2.connect(
-            host=pg_host,
-            port=os.getenv("PGPORT"),
-            database=os.getenv("PGDATABASE"),
-            user=pg_user,
-            password=pg_password
-        )
-        return (conn, "postgres")
-    except Exception as e:
-        st.error(f"Erro ao conectar ao PostgreSQL: {e}")
-        return None
-
-def close_connection(conn_info):
-    """Fecha a conexão com o banco de dados."""
-    if conn_info is None:
-        return
-    
-    conn, conn_type = conn_info
-    if conn is not None:
-        try:
-            conn.close()
-        except Exception as e:
-            print(f"Erro ao fechar conexão: {e}")
-
-def execute_query(query, params=None, fetch_one=False, fetch_all=False, is_dml=False):
-    """Executa uma query no banco de dados com melhor tratamento de erros."""
-    conn_info = get_db_connection()
-    if conn_info is None:
-        return None
-    
-    conn, conn_type = conn_info
-    result = None
-    cursor = None
-    
-    try:
-        # Verificar e reconectar se necessário
-        if conn_type == "postgres" and conn.closed:
-            get_db_connection.clear()
-            conn_info = get_db_connection()
-            if conn_info is None:
-                return None
-            conn, conn_type = conn_info
-        
-        cursor = conn.cursor()
-        
-        # Adaptar placeholders conforme o tipo de banco
-        adapted_query = query
-        if params is not None:
-            if conn_type == "sqlite" and "%s" in query:
-                # Converter placeholders %s para ? no SQLite
-                adapted_query = query.replace("%s", "?")
-            elif conn_type == "postgres" and "?" in query:
-                # Converter placeholders ? para %s no PostgreSQL
-                adapted_query = query.replace("?", "%s")
-            
-            cursor.execute(adapted_query, params)
-        else:
-            cursor.execute(adapted_query)
-        
-        if is_dml:  # Data Manipulation Language (INSERT, UPDATE, DELETE)
-            conn.commit()
-            result = cursor.rowcount
-        elif fetch_one:
-            result = cursor.fetchone()
-        elif fetch_all:
-            result = cursor.fetchall()
-        
-        if not is_dml:
-            conn.commit()
-    
-    except Exception as e:
-        try:
-            conn.rollback()
-        except:
-            pass
-        print(f"Erro na query: {e}\nQuery: {query}\nParams: {params}")
-        st.error(f"Erro na operação do banco de dados")
-        result = None
-    
-    finally:
-        if cursor:
-            cursor.close()
-    
-    return result
+# Conexões vêm do pool em facebook/banco.py: `with db_connection() as conn_info:`
+# faz checkout de uma conexão por operação e a devolve ao final do bloco.
 
 def init_db():
-    """Inicializa o banco de dados, criando/atualizando tabelas."""
-    conn_info = get_db_connection()
-    if conn_info is None:
-        st.error("Não foi possível inicializar o banco de dados: Falha na conexão.")
-        return
-
-    conn, conn_type = conn_info
-    cursor = None
-    print(f"Inicializando/Verificando DB ({conn_type})...") # Log
-
+    """Garante o schema do banco via migrações versionadas (ver facebook/migracoes)."""
     try:
-        cursor = conn.cursor()
-
-        # --- Tabela api_config com novos campos ---
-        if conn_type == "sqlite":
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS api_config (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, app_id TEXT NOT NULL,
-                    app_secret TEXT NOT NULL, access_token TEXT NOT NULL, account_id TEXT NOT NULL,
-                    business_id TEXT, page_id TEXT, is_active INTEGER DEFAULT 0,
-                    country TEXT, account_manager TEXT, 
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP, token_expires_at DATE
-                )
-            ''')
-            cursor.execute("PRAGMA table_info(api_config)")
-            columns_api = [info[1] for info in cursor.fetchall()]
-            
-            # Verificar e adicionar coluna de país
-            if 'country' not in columns_api:
-                print("Adicionando coluna 'country' em api_config (SQLite)...")
-                cursor.execute('ALTER TABLE api_config ADD COLUMN country TEXT')
-                conn.commit()
-                
-            # Verificar e adicionar coluna de responsável
-            if 'account_manager' not in columns_api:
-                print("Adicionando coluna 'account_manager' em api_config (SQLite)...")
-                cursor.execute('ALTER TABLE api_config ADD COLUMN account_manager TEXT')
-                conn.commit()
-                
-            # Verificar coluna de data de expiração (já existente no código)
-            if 'token_expires_at' not in columns_api:
-                print("Adicionando coluna 'token_expires_at' em api_config (SQLite)...")
-                cursor.execute('ALTER TABLE api_config ADD COLUMN token_expires_at DATE')
-                conn.commit() # Commit após alteração
-        else: # PostgreSQL
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS api_config (
-                    id SERIAL PRIMARY KEY, name TEXT NOT NULL, app_id TEXT NOT NULL,
-                    app_secret TEXT NOT NULL, access_token TEXT NOT NULL, account_id TEXT NOT NULL,
-                    business_id TEXT, page_id TEXT, is_active INTEGER DEFAULT 0,
-                    country TEXT, account_manager TEXT,
-                    last_updated TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP, token_expires_at DATE
-                )
-            ''')
-            
-            # Verificar e adicionar coluna de país
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_schema = current_schema() AND table_name = 'api_config' AND column_name = 'country';
-            """)
-            column_exists_country = cursor.fetchone()
-            if not column_exists_country:
-                print("Adicionando coluna 'country' em api_config (PostgreSQL)...")
-                try:
-                    cursor.execute('ALTER TABLE api_config ADD COLUMN country TEXT')
-                    conn.commit()
-                except psycopg2.Error as e_alter:
-                    conn.rollback()
-                    if "already exists" in str(e_alter).lower(): print("Coluna country já existe (ignorado).")
-                    else: print(f"Erro add coluna country: {e_alter}")
-            
-            # Verificar e adicionar coluna de responsável
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_schema = current_schema() AND table_name = 'api_config' AND column_name = 'account_manager';
-            """)
-            column_exists_manager = cursor.fetchone()
-            if not column_exists_manager:
-                print("Adicionando coluna 'account_manager' em api_config (PostgreSQL)...")
-                try:
-                    cursor.execute('ALTER TABLE api_config ADD COLUMN account_manager TEXT')
-                    conn.commit()
-                except psycopg2.Error as e_alter:
-                    conn.rollback()
-                    if "already exists" in str(e_alter).lower(): print("Coluna account_manager já existe (ignorado).")
-                    else: print(f"Erro add coluna account_manager: {e_alter}")
-            
-            # Verificar coluna de data de expiração (já existente no código)
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_schema = current_schema() AND table_name = 'api_config' AND column_name = 'token_expires_at';
-            """)
-            column_exists_api = cursor.fetchone()
-            if not column_exists_api:
-                print("Adicionando coluna 'token_expires_at' em api_config (PostgreSQL)...")
-                try:
-                    cursor.execute('ALTER TABLE api_config ADD COLUMN token_expires_at DATE')
-                    conn.commit() # Commit após alteração
-                except psycopg2.Error as e_alter_api:
-                    conn.rollback()
-                    if "already exists" in str(e_alter_api).lower(): print("Coluna token_expires_at já existe (ignorado).")
-                    else: print(f"Erro add coluna token_expires_at: {e_alter_api}")
-
-
-        # --- Tabela rules (MODIFICADA PARA INCLUIR NOVOS CAMPOS) ---
-        print("Verificando/Atualizando tabela 'rules'...")
-        rules_columns_to_add = {
-            "execution_mode": "TEXT DEFAULT 'manual'",
-            "execution_interval_hours": "INTEGER",
-            "last_automatic_run_at": "TIMESTAMP WITH TIME ZONE" if conn_type == "postgres" else "TIMESTAMP"
-        }
-
-        if conn_type == "sqlite":
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS rules (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL, description TEXT, condition_type TEXT NOT NULL,
-                    is_composite INTEGER DEFAULT 0, primary_metric TEXT NOT NULL,
-                    primary_operator TEXT NOT NULL, primary_value REAL NOT NULL,
-                    secondary_metric TEXT, secondary_operator TEXT, secondary_value REAL,
-                    join_operator TEXT DEFAULT 'AND', action_type TEXT NOT NULL, action_value REAL,
-                    is_active INTEGER DEFAULT 1,
-                    execution_mode TEXT DEFAULT 'manual', -- NOVO
-                    execution_interval_hours INTEGER, -- NOVO
-                    last_automatic_run_at TIMESTAMP, -- NOVO
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            cursor.execute("PRAGMA table_info(rules)")
-            existing_columns_rules = [info[1] for info in cursor.fetchall()]
-            columns_added_sqlite = False
-            for col_name, col_type_def in rules_columns_to_add.items():
-                 sql_type = col_type_def # Usa a definição padrão
-                 if col_name == 'last_automatic_run_at' and conn_type == 'sqlite': sql_type = 'TIMESTAMP'
-                 if col_name == 'execution_mode' and conn_type == 'sqlite': sql_type = "TEXT DEFAULT 'manual'"
-
-                 if col_name not in existing_columns_rules:
-                     print(f"Adicionando coluna '{col_name}' à tabela 'rules' (SQLite)...")
-                     cursor.execute(f'ALTER TABLE rules ADD COLUMN {col_name} {sql_type}')
-                     columns_added_sqlite = True
-            if columns_added_sqlite: conn.commit() # Commit se adicionou colunas
-
-        else: # PostgreSQL
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS rules (
-                    id SERIAL PRIMARY KEY,
-                    name TEXT NOT NULL, description TEXT, condition_type TEXT NOT NULL,
-                    is_composite INTEGER DEFAULT 0, primary_metric TEXT NOT NULL,
-                    primary_operator TEXT NOT NULL, primary_value REAL NOT NULL,
-                    secondary_metric TEXT, secondary_operator TEXT, secondary_value REAL,
-                    join_operator TEXT DEFAULT 'AND', action_type TEXT NOT NULL, action_value REAL,
-                    is_active INTEGER DEFAULT 1,
-                    execution_mode TEXT DEFAULT 'manual', -- NOVO
-                    execution_interval_hours INTEGER, -- NOVO
-                    last_automatic_run_at TIMESTAMP WITH TIME ZONE, -- NOVO (com timezone)
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_schema = current_schema() AND table_name = 'rules';
-            """)
-            existing_columns_rules = [row[0] for row in cursor.fetchall()]
-            for col_name, col_type_def in rules_columns_to_add.items():
-                 if col_name not in existing_columns_rules:
-                     print(f"Adicionando coluna '{col_name}' à tabela 'rules' (PostgreSQL)...")
-                     try:
-                         cursor.execute(f'ALTER TABLE rules ADD COLUMN {col_name} {col_type_def}')
-                         conn.commit() # Commit após cada ALTER TABLE para segurança
-                     except psycopg2.Error as e_alter_rules:
-                         conn.rollback()
-                         if "already exists" in str(e_alter_rules).lower(): print(f"Coluna '{col_name}' já existe (ignorado).")
-                         else: print(f"Erro add coluna {col_name}: {e_alter_rules}")
-
-
-        # --- Tabela rule_executions (sem alterações aqui, mantenha como está no seu código original) ---
-        if conn_type == "sqlite":
-             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS rule_executions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT, rule_id INTEGER NOT NULL, ad_object_id TEXT NOT NULL,
-                    ad_object_type TEXT NOT NULL, ad_object_name TEXT NOT NULL,
-                    executed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, was_successful INTEGER DEFAULT 0, message TEXT,
-                    FOREIGN KEY (rule_id) REFERENCES rules (id) ON DELETE CASCADE
-                )
-             ''')
-        else: # PostgreSQL
-             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS rule_executions (
-                    id SERIAL PRIMARY KEY, rule_id INTEGER NOT NULL, ad_object_id TEXT NOT NULL,
-                    ad_object_type TEXT NOT NULL, ad_object_name TEXT NOT NULL,
-                    executed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP, was_successful INTEGER DEFAULT 0, message TEXT,
-                    FOREIGN KEY (rule_id) REFERENCES rules (id) ON DELETE CASCADE
-                )
-             ''')
-
-        # Não precisa de commit final aqui, pois fizemos commit após cada ALTER TABLE
-
-        print("Verificação/Atualização do schema do DB concluída.")
-
-    except (psycopg2.Error, sqlite3.Error, Exception) as e: # Adiciona sqlite3.Error
-        error_type = type(e).__name__
-        print(f"Erro Crítico durante init_db ({error_type}): {e}\n{traceback.format_exc()}")
+        ensure_db_schema()
+    except Exception as e:
+        print(f"Erro Crítico durante init_db ({type(e).__name__}): {e}\n{traceback.format_exc()}")
         st.error(f"Erro CRÍTICO ao inicializar/atualizar o banco de dados: {e}")
-        try:
-            if conn: conn.rollback() # Tenta reverter
-            print("Rollback realizado devido a erro na inicialização.")
-        except Exception as rb_err:
-            print(f"Erro durante o rollback na inicialização: {rb_err}")
-
-    finally:
-        if cursor:
-            cursor.close()
 
 init_db()
 
@@ -375,70 +60,70 @@ def save_api_config(name, app_id, app_secret, access_token, account_id, business
                     token_expires_at=None, country=None, account_manager=None):
     """Salva a configuração da API no banco de dados."""
     # Verifica quantas configs existem para definir is_active
-    conn_info = get_db_connection()
-    if conn_info is None:
-        return False
+    with db_connection() as conn_info:
+        if conn_info is None:
+            return False
     
-    conn, conn_type = conn_info
-    cursor = None
+        conn, conn_type = conn_info
+        cursor = None
     
-    try:
-        cursor = conn.cursor()
-        # Contar configs existentes
-        cursor.execute("SELECT COUNT(*) FROM api_config")
-        count_result = cursor.fetchone()
-        count = count_result[0] if count_result else 0
-        is_active = 1 if count == 0 else 0
+        try:
+            cursor = conn.cursor()
+            # Contar configs existentes
+            cursor.execute("SELECT COUNT(*) FROM api_config")
+            count_result = cursor.fetchone()
+            count = count_result[0] if count_result else 0
+            is_active = 1 if count == 0 else 0
         
-        # Formata a data para objeto date ou None
-        expires_at_date = token_expires_at if isinstance(token_expires_at, date) else None
+            # Formata a data para objeto date ou None
+            expires_at_date = token_expires_at if isinstance(token_expires_at, date) else None
         
-        # Ajustar query conforme tipo de banco
-        if conn_type == "sqlite":
-            insert_query = """
-                INSERT INTO api_config
-                (name, app_id, app_secret, access_token, account_id,
-                 business_id, page_id, is_active, token_expires_at, country, account_manager)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """
-        else:  # PostgreSQL
-            insert_query = """
-                INSERT INTO api_config
-                (name, app_id, app_secret, access_token, account_id,
-                 business_id, page_id, is_active, token_expires_at, country, account_manager, last_updated)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
-            """
+            # Ajustar query conforme tipo de banco
+            if conn_type == "sqlite":
+                insert_query = """
+                    INSERT INTO api_config
+                    (name, app_id, app_secret, access_token, account_id,
+                     business_id, page_id, is_active, token_expires_at, country, account_manager)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """
+            else:  # PostgreSQL
+                insert_query = """
+                    INSERT INTO api_config
+                    (name, app_id, app_secret, access_token, account_id,
+                     business_id, page_id, is_active, token_expires_at, country, account_manager, last_updated)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+                """
         
-        params = (
-            name, app_id, app_secret, access_token, account_id,
-            business_id if business_id else None,
-            page_id if page_id else None,
-            is_active,
-            expires_at_date,
-            country, 
-            account_manager
-        )
+            params = (
+                name, app_id, app_secret, access_token, account_id,
+                business_id if business_id else None,
+                page_id if page_id else None,
+                is_active,
+                expires_at_date,
+                country, 
+                account_manager
+            )
         
-        cursor.execute(insert_query, params)
-        conn.commit()
-        return True
+            cursor.execute(insert_query, params)
+            conn.commit()
+            return True
         
-    except Exception as e:
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
-        print(f"Erro ao salvar config: {e}")
-        return False
+        except Exception as e:
+            if conn:
+                try:
+                    conn.rollback()
+                except:
+                    pass
+            print(f"Erro ao salvar config: {e}")
+            return False
         
-    finally:
-        if cursor:
-            cursor.close()
+        finally:
+            if cursor:
+                cursor.close()
 
 @st.cache_data(ttl=60)
 def get_active_api_config():
-    """Obtém a configuração ativa do PostgreSQL."""
+    """Obtém a configuração padrão (is_active), usada como seleção inicial de novas sessões."""
     query = """
         SELECT id, name, app_id, app_secret, access_token, account_id,
                business_id, page_id, token_expires_at, country, account_manager
@@ -471,449 +156,330 @@ def get_all_api_configs():
 
 def set_active_api_config(config_id):
     """
-    Define a configuração de API especificada como ativa no banco de dados.
-    (Versão Otimizada: sem limpar cache de conexão e sem st.rerun explícito)
+    Define a configuração de API especificada como padrão (is_active) no banco de dados.
+    Usada só pelo botão "Tornar padrão": a conta escolhida no seletor fica na sessão
+    do usuário e não passa por aqui.
     """
     print(f"DEBUG: set_active_api_config chamada para ID: {config_id}") # Log para depuração
-    conn_info = get_db_connection()
-    if conn_info is None:
-        st.error("Falha ao obter conexão com o banco de dados para definir config ativa.")
-        return False
-
-    conn, conn_type = conn_info
-    success = False
-    cursor = None
+    with db_connection() as conn_info:
+        if conn_info is None:
+            st.error("Falha ao obter conexão com o banco de dados para definir config ativa.")
+            return False
 
-    try:
-        # Verificar se a conexão está aberta (especialmente para PG)
-        if conn_type == "postgres":
-            # Verifica se conn.closed não é 0 (está fechada)
-            connection_closed = getattr(conn, 'closed', 0) != 0
-            if connection_closed:
-                st.warning("Conexão PG estava fechada ao tentar definir config ativa. Tentando reconectar...")
-                # Limpa APENAS o cache da conexão se ela ESTAVA fechada
-                get_db_connection.clear()
-                conn_info = get_db_connection()
-                if conn_info is None:
-                     st.error("Falha ao reconectar ao banco de dados.")
-                     return False
-                conn, conn_type = conn_info
-                # Não precisa criar cursor aqui ainda
-
-        # Criar cursor agora que temos certeza que a conexão está (ou deveria estar) aberta
-        cursor = conn.cursor()
-
-        print(f"DEBUG: Desativando todas as configs...")
-        # Desativa todas as outras configs
-        if conn_type == "sqlite":
-            sql_deactivate = "UPDATE api_config SET is_active = 0"
-            cursor.execute(sql_deactivate)
-        else: # PostgreSQL
-            sql_deactivate = "UPDATE api_config SET is_active = 0"
-            cursor.execute(sql_deactivate)
-        print(f"DEBUG: {cursor.rowcount} configs desativadas.")
-
-        print(f"DEBUG: Ativando config ID {config_id}...")
-        # Ativa a config selecionada
-        if conn_type == "sqlite":
-            sql_activate = "UPDATE api_config SET is_active = 1 WHERE id = ?"
-            params_activate = (config_id,)
-            cursor.execute(sql_activate, params_activate)
-        else: # PostgreSQL
-            sql_activate = "UPDATE api_config SET is_active = 1 WHERE id = %s"
-            params_activate = (config_id,)
-            cursor.execute(sql_activate, params_activate)
-
-        conn.commit() # Confirma as alterações (desativar e ativar)
-        # Verifica se o UPDATE de ativação afetou alguma linha
-        success = cursor.rowcount > 0
-        print(f"DEBUG: Config ID {config_id} ativada? {'Sim' if success else 'Não'}. Linhas afetadas: {cursor.rowcount}")
-
-    except (PgError, sqlite3.Error, Exception) as e: # Inclui sqlite3.Error
-        error_type = type(e).__name__
-        st.error(f"Erro ({error_type}) ao definir configuração ativa: {e}")
-        print(f"Erro detalhado em set_active_api_config: {traceback.format_exc()}")
-        if conn:
-            try:
-                conn.rollback() # Tenta reverter em caso de erro
-                print("Rollback da transação realizado.")
-            except Exception as rb_err:
-                print(f"Erro durante o rollback da transação: {rb_err}")
+        conn, conn_type = conn_info
         success = False
+        cursor = None
 
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except Exception as cur_close_err:
-                print(f"Erro ao fechar o cursor: {cur_close_err}")
-        # NÃO fechamos a conexão principal aqui, ela é gerenciada pelo @st.cache_resource
+        try:
+            cursor = conn.cursor()
+
+            print(f"DEBUG: Desativando todas as configs...")
+            # Desativa todas as outras configs
+            if conn_type == "sqlite":
+                sql_deactivate = "UPDATE api_config SET is_active = 0"
+                cursor.execute(sql_deactivate)
+            else: # PostgreSQL
+                sql_deactivate = "UPDATE api_config SET is_active = 0"
+                cursor.execute(sql_deactivate)
+            print(f"DEBUG: {cursor.rowcount} configs desativadas.")
+
+            print(f"DEBUG: Ativando config ID {config_id}...")
+            # Ativa a config selecionada
+            if conn_type == "sqlite":
+                sql_activate = "UPDATE api_config SET is_active = 1 WHERE id = ?"
+                params_activate = (config_id,)
+                cursor.execute(sql_activate, params_activate)
+            else: # PostgreSQL
+                sql_activate = "UPDATE api_config SET is_active = 1 WHERE id = %s"
+                params_activate = (config_id,)
+                cursor.execute(sql_activate, params_activate)
+
+            conn.commit() # Confirma as alterações (desativar e ativar)
+            # Verifica se o UPDATE de ativação afetou alguma linha
+            success = cursor.rowcount > 0
+            print(f"DEBUG: Config ID {config_id} ativada? {'Sim' if success else 'Não'}. Linhas afetadas: {cursor.rowcount}")
 
-    # A limpeza de cache e o st.rerun devem acontecer DEPOIS que esta função
-    # for chamada com sucesso, lá na parte do selectbox da interface.
+        except Exception as e:
+            error_type = type(e).__name__
+            st.error(f"Erro ({error_type}) ao definir configuração ativa: {e}")
+            print(f"Erro detalhado em set_active_api_config: {traceback.format_exc()}")
+            if conn:
+                try:
+                    conn.rollback() # Tenta reverter em caso de erro
+                    print("Rollback da transação realizado.")
+                except Exception as rb_err:
+                    print(f"Erro durante o rollback da transação: {rb_err}")
+            success = False
+
+        finally:
+            if cursor:
+                try:
+                    cursor.close()
+                except Exception as cur_close_err:
+                    print(f"Erro ao fechar o cursor: {cur_close_err}")
+            # A conexão volta ao pool ao sair do bloco `with db_connection()`
 
-    return success
+        # A limpeza de cache e o st.rerun devem acontecer DEPOIS que esta função
+        # for chamada com sucesso, lá na parte do selectbox da interface.
+
+        return success
 
 
 def delete_api_config(config_id):
     """Exclui uma configuração do banco de dados."""
-    conn_info = get_db_connection()
-    if conn_info is None: 
-        return False
+    with db_connection() as conn_info:
+        if conn_info is None: 
+            return False
     
-    conn, conn_type = conn_info
-    success = False
-    cursor = None
+        conn, conn_type = conn_info
+        success = False
+        cursor = None
     
-    try:
-        cursor = conn.cursor()
+        try:
+            cursor = conn.cursor()
         
-        # Verifica se a que será excluída é a ativa
-        if conn_type == "sqlite":
-            cursor.execute("SELECT is_active FROM api_config WHERE id = ?", (config_id,))
-        else:
-            cursor.execute("SELECT is_active FROM api_config WHERE id = %s", (config_id,))
+            # Verifica se a que será excluída é a ativa
+            if conn_type == "sqlite":
+                cursor.execute("SELECT is_active FROM api_config WHERE id = ?", (config_id,))
+            else:
+                cursor.execute("SELECT is_active FROM api_config WHERE id = %s", (config_id,))
             
-        row = cursor.fetchone()
-        is_active_to_delete = row and row[0] == 1
+            row = cursor.fetchone()
+            is_active_to_delete = row and row[0] == 1
 
-        # Exclui a configuração
-        if conn_type == "sqlite":
-            cursor.execute("DELETE FROM api_config WHERE id = ?", (config_id,))
-        else:
-            cursor.execute("DELETE FROM api_config WHERE id = %s", (config_id,))
+            # Exclui a configuração
+            if conn_type == "sqlite":
+                cursor.execute("DELETE FROM api_config WHERE id = ?", (config_id,))
+            else:
+                cursor.execute("DELETE FROM api_config WHERE id = %s", (config_id,))
             
-        deleted_count = cursor.rowcount
-
-        # Se excluiu a ativa, tenta ativar outra
-        if deleted_count > 0 and is_active_to_delete:
-            cursor.execute("SELECT id FROM api_config ORDER BY id LIMIT 1")
-            other_config = cursor.fetchone()
-            if other_config:
-                if conn_type == "sqlite":
-                    cursor.execute("UPDATE api_config SET is_active = 1 WHERE id = ?", (other_config[0],))
-                else:
-                    cursor.execute("UPDATE api_config SET is_active = 1 WHERE id = %s", (other_config[0],))
+            deleted_count = cursor.rowcount
+
+            # Se excluiu a ativa, tenta ativar outra
+            if deleted_count > 0 and is_active_to_delete:
+                cursor.execute("SELECT id FROM api_config ORDER BY id LIMIT 1")
+                other_config = cursor.fetchone()
+                if other_config:
+                    if conn_type == "sqlite":
+                        cursor.execute("UPDATE api_config SET is_active = 1 WHERE id = ?", (other_config[0],))
+                    else:
+                        cursor.execute("UPDATE api_config SET is_active = 1 WHERE id = %s", (other_config[0],))
 
-        conn.commit()
-        success = deleted_count > 0
+            conn.commit()
+            success = deleted_count > 0
         
-    except Exception as e:
-        try:
-            conn.rollback()
-        except:
-            pass
-        st.error(f"Erro ao excluir configuração: {e}")
-        success = False
+        except Exception as e:
+            try:
+                conn.rollback()
+            except:
+                pass
+            st.error(f"Erro ao excluir configuração: {e}")
+            success = False
         
-    finally:
-        if cursor:
-            cursor.close()
+        finally:
+            if cursor:
+                cursor.close()
 
-    return success
+        return success
 
 
 # --- Funções da API do Facebook (Adaptadas para checar token_expires_at tipo date) ---
-def init_facebook_api():
-    """Inicializa a API do Facebook com as credenciais ativas do PostgreSQL."""
-    config = get_active_api_config()
-    if config:
-        if not all([config.get("app_id"), config.get("app_secret"), config.get("access_token"), config.get("account_id")]):
-             st.error("Configuração ativa está incompleta (faltam App ID, Secret, Token ou Account ID). Verifique na aba 'Configurações'.")
-             return None
+# Tempo durante o qual um token já verificado não é checado de novo na Graph API
+TOKEN_VERIFY_TTL_S = int(os.getenv("TOKEN_VERIFY_TTL_S", "900"))
 
-        # Verifica se o token expirou (agora compara objetos date)
-        expires_date = config.get('token_expires_at') # Já vem como objeto date ou None
-        if isinstance(expires_date, date):
-            if expires_date < date.today():
-                st.error(f"O Token de Acesso para a conta '{config.get('name')}' expirou em {expires_date.strftime('%d/%m/%Y')}. Atualize-o na aba 'Configurações'.")
-                return None # Impede inicialização com token expirado
+def _credentials_hash(config):
+    """Hash das credenciais: trocar token/secret gera outra chave e invalida a verificação."""
+    raw = f"{config.get('app_id')}:{config.get('app_secret')}:{config.get('access_token')}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
-        try:
-            FacebookAdsApi.init(
-                app_id=config["app_id"],
-                app_secret=config["app_secret"],
-                access_token=config["access_token"],
-                api_version='v22.0'
-            )
-            # Verifica a conexão
-            try:
-                AdAccount(f'act_{config["account_id"]}').api_get(fields=['id'])
-                return config["account_id"]
-            except Exception as conn_err:
-                 st.error(f"Erro ao verificar conexão com a conta act_{config['account_id']}: {conn_err}. Verifique o Token de Acesso e o Account ID.")
-                 return None
-        except Exception as e:
-            st.error(f"Erro CRÍTICO ao inicializar API do Facebook: {e}")
-            return None
-    else:
+@st.cache_data(ttl=TOKEN_VERIFY_TTL_S, show_spinner=False)
+def verify_account_access(config_id, account_id, credentials_hash, _config):
+    """
+    Confere (com uma chamada leve à Graph API) se as credenciais acessam a conta.
+    Cacheado por config/conta/hash das credenciais; levanta exceção em caso de
+    falha para que tokens inválidos não fiquem em cache.
+    """
+    from facebook_business.adobjects.adaccount import AdAccount
+    api = make_api(_config)
+    AdAccount(f'act_{account_id}', api=api).api_get(fields=['id'])
+    return True
+
+def init_facebook_api(config):
+    """
+    Cria uma instância da API do Facebook para a conta de `config` (a conta selecionada
+    na sessão) e verifica a conexão. Retorna a instância ou None.
+
+    Não usa FacebookAdsApi.init: a instância global é compartilhada por todas as sessões
+    do processo, e cada usuário pode estar trabalhando em uma conta diferente.
+    """
+    if not config:
+        st.error("Nenhuma conta selecionada. Selecione ou configure uma conta na aba 'Configurações'.")
+        return None
+    try:
+        validate_api_config(config)
+    except ValueError as e:
+        st.error(str(e))
         return None
 
-# --- Funções de Insights e Campanhas (get_campaign_insights_cached, get_facebook_campaigns_cached) ---
-# NENHUMA ALTERAÇÃO necessária aqui, pois elas dependem de init_facebook_api que já foi adaptada.
-# Cole as funções get_campaign_insights_cached e get_facebook_campaigns_cached do seu código anterior aqui.
-@st.cache_data(ttl=300) # Cache por 5 minutos
-def get_campaign_insights_cached(account_id, campaign_ids_tuple, time_range='last_7d'):
-    """Busca insights para uma lista de campanhas (cacheado)."""
-    campaign_ids = list(campaign_ids_tuple) # Converte tuple de volta para lista
-    if not account_id or not campaign_ids:
-        return []
     try:
-        params = {
-            'level': 'campaign',
-            'filtering': [{'field': 'campaign.id', 'operator': 'IN', 'value': campaign_ids}],
-            'breakdowns': []
-        }
-        # Define o período de tempo
-        if time_range == 'yesterday':
-            yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-            params['time_range'] = {'since': yesterday, 'until': yesterday}
-        elif time_range == 'last_7d': params['date_preset'] = 'last_7d'
-        elif time_range == 'last_30d': params['date_preset'] = 'last_30d'
-        else: params['date_preset'] = 'last_7d' # Default
-
-        account = AdAccount(f'act_{account_id}')
-        insights = account.get_insights(
-            params=params,
-            fields=[
-                'campaign_id', 'campaign_name', 'spend', 'impressions', 'clicks',
-                'ctr', 'cpc', 'actions', 'cost_per_action_type', 'purchase_roas'
-            ]
-        )
-        processed_insights = []
-        for insight in insights:
-            insight_dict = insight.export_all_data()
-            purchases = 0
-            purchase_value = 0.0
-            # Extrai ações de compra e valor
-            if 'actions' in insight_dict:
-                for action in insight_dict['actions']:
-                    if action.get('action_type') == 'purchase':
-                        purchases = int(action.get('value', 0))
-                    # Tenta pegar valor de compra (pode variar nome da action)
-                    if action.get('action_type') in ['offsite_conversion.fb_pixel_purchase', 'purchase', 'omni_purchase']:
-                         action_values = action.get('action_values')
-                         if isinstance(action_values, list) and len(action_values) > 0:
-                             purchase_value += float(action_values[0].get('value', 0.0))
-                         else:
-                             purchase_value += float(action.get('value', 0.0))
-
-
-            # Extrai CPA de compra
-            cpa = 0.0
-            if 'cost_per_action_type' in insight_dict:
-                for cost_action in insight_dict['cost_per_action_type']:
-                    if cost_action.get('action_type') == 'purchase':
-                        cpa = float(cost_action.get('value', 0.0))
-                        break
-
-            # Extrai ROAS
-            roas = 0.0
-            if 'purchase_roas' in insight_dict:
-                 roas_list = insight_dict['purchase_roas']
-                 if roas_list and isinstance(roas_list, list) and len(roas_list) > 0:
-                     roas = float(roas_list[0].get('value', 0.0))
-
-            insight_dict['purchases'] = purchases
-            insight_dict['cpa'] = cpa
-            insight_dict['roas'] = roas
-            insight_dict['purchase_value'] = purchase_value
-
-            processed_insights.append(insight_dict)
-        return processed_insights
+        api = make_api(config)
+        # Verifica a conexão (só chama a Graph API se este token ainda não foi verificado)
+        try:
+            verify_account_access(config["id"], config["account_id"], _credentials_hash(config), config)
+            return api
+        except Exception as conn_err:
+             st.error(f"Erro ao verificar conexão com a conta act_{config['account_id']}: {conn_err}. Verifique o Token de Acesso e o Account ID.")
+             return None
     except Exception as e:
-        st.error(f"Erro ao obter insights de campanhas (ID: {', '.join(campaign_ids)}): {e}")
-        return []
+        st.error(f"Erro CRÍTICO ao inicializar API do Facebook: {e}")
+        return None
+
+def update_campaign_status(campaign_id, config, status):
+    """Pausa/ativa uma campanha usando as credenciais da conta dona da campanha."""
+    api = init_facebook_api(config)
+    if api is None:
+        raise RuntimeError("Não foi possível inicializar a API do Facebook para esta conta")
+    from facebook_business.adobjects.campaign import Campaign
+    Campaign(campaign_id, api=api).api_update(params={'status': status})
+
+# --- Campanhas e Insights (cache stale-while-revalidate por conta) ---
+# Depois do TTL o último resultado bom continua sendo exibido (com a idade) enquanto
+# uma thread busca os dados novos; só a primeira carga de uma conta espera pela Graph API.
+CAMPAIGNS_CACHE_TTL_S = int(os.getenv("CAMPAIGNS_CACHE_TTL_S", "300"))
+CAMPAIGNS_CACHE_MAX_STALE_S = int(os.getenv("CAMPAIGNS_CACHE_MAX_STALE_S", "3600"))
+
+@st.cache_resource
+def get_shared_graph_cache():
+    """Cache de respostas da Graph API compartilhado com as outras réplicas e o worker (ou None)."""
+    return create_shared_cache(connection_factory=db_connection)
+
+def _fetch_account_campaigns(config, windows):
+    # Métricas derivadas calculadas uma vez, antes de os dados irem para o cache
+    # compartilhado: as sessões só leem campaign["insights"], nunca o alteram
+    campaigns = fetch_account_campaigns(config, shared_cache=get_shared_graph_cache(), windows=windows)
+    return attach_derived_metrics(campaigns)
+
+@st.cache_resource
+def get_campaigns_cache():
+    """Cache de campanhas compartilhado entre todas as sessões do processo."""
+    return StaleWhileRevalidateCache(
+        _fetch_account_campaigns,
+        ttl_s=CAMPAIGNS_CACHE_TTL_S,
+        max_stale_s=CAMPAIGNS_CACHE_MAX_STALE_S,
+        name="Campanhas SWR"
+    )
+
+def _campaigns_cache_key(config, windows=()):
+    return f"{config['id']}:{config['account_id']}" + (f":{','.join(windows)}" if windows else "")
+
+def rules_insight_windows():
+    """Janelas extras (além da padrão, últimos 7 dias) usadas pelas condições das regras ativas."""
+    windows = set()
+    for rule in get_all_rules_cached():
+        if not rule.get('is_active'):
+            continue
+        condition = rule_condition(rule)
+        if condition is not None:
+            windows |= condition_windows(condition)
+    windows.discard(DEFAULT_INSIGHT_WINDOW)
+    return tuple(sorted(windows))
 
-@st.cache_data(ttl=300) # Cache por 5 minutos
-def get_facebook_campaigns_cached(account_id_from_main): # O argumento ainda é recebido, mas não será usado para a verificação
+def invalidate_campaigns_cache(config=None):
     """
-    Busca todas as campanhas e seus insights recentes (cacheado).
-    (Versão Modificada: Remove a verificação de inconsistência de ID)
+    Descarta as campanhas em cache da conta de `config` (ex.: após pausar/ativar
+    ou aplicar regra), em qualquer combinação de janelas; sem `config`, de todas as contas.
+    A lista de campanhas da conta no cache compartilhado também é descartada, para
+    a nova busca (e as outras réplicas) não lerem o status/orçamento anterior.
     """
-    print(f"DEBUG [get_facebook_campaigns_cached]: Iniciando busca. Esperado (parâmetro): {account_id_from_main}")
-    campaigns_result = []
-    try:
-        # Chama init_facebook_api() que usa get_active_api_config() internamente
-        # para garantir que a API está configurada para a conta ATIVA no momento.
-        initialized_account_id = init_facebook_api()
-        if not initialized_account_id:
-            st.error("Falha ao inicializar a API do Facebook dentro de get_facebook_campaigns_cached.")
-            return None # Retorna None se a API não inicializar
-
-        print(f"DEBUG [get_facebook_campaigns_cached]: API inicializada com sucesso para conta: {initialized_account_id}")
-
-        # <<< REMOÇÃO DA VERIFICAÇÃO >>>
-        # O if/else abaixo foi removido. Vamos confiar no ID retornado por init_facebook_api.
-        # if account_id_from_main != initialized_account_id:
-        #      st.warning(f"Inconsistência de Account ID: Esperado {account_id_from_main}, API inicializada com {initialized_account_id}. Usando {initialized_account_id}.")
-        #      target_account_id = initialized_account_id
-        # else:
-        #      target_account_id = initialized_account_id
-        # <<< FIM DA REMOÇÃO >>>
-
-        # Usa diretamente o ID retornado pela inicialização da API
-        target_account_id = initialized_account_id
-        print(f"DEBUG [get_facebook_campaigns_cached]: Usando Account ID: {target_account_id} para buscar campanhas.")
-
-        # Cria o objeto AdAccount com o ID correto
-        account = AdAccount(f'act_{target_account_id}')
-        fields_to_fetch = [
-            'id', 'name', 'status', 'objective', 'created_time',
-            'start_time', 'stop_time', 'daily_budget', 'lifetime_budget',
-            'effective_status', 'buying_type', 'budget_remaining'
-        ]
-        # Busca as campanhas
-        campaigns_raw = list(account.get_campaigns(fields=fields_to_fetch, params={'limit': 500}))
-
-        if not campaigns_raw:
-             print(f"INFO [get_facebook_campaigns_cached]: Nenhuma campanha encontrada para conta {target_account_id}.")
-             return [] # Retorna lista vazia se não houver campanhas
-
-        # Pega os IDs das campanhas encontradas
-        campaign_ids = [campaign.get("id") for campaign in campaigns_raw if campaign.get("id")]
-        if not campaign_ids:
-            print(f"INFO [get_facebook_campaigns_cached]: Campanhas encontradas não possuem IDs válidos para conta {target_account_id}.")
-            return []
+    if config is None:
+        get_campaigns_cache().invalidate()
+        return
+    shared_cache = get_shared_graph_cache()
+    if shared_cache is not None:
+        shared_cache.invalidate(config["account_id"], "campaigns")
+    base_key = _campaigns_cache_key(config)
+    get_campaigns_cache().invalidate(match=lambda key: key == base_key or key.startswith(f"{base_key}:"))
 
-        print(f"DEBUG [get_facebook_campaigns_cached]: {len(campaign_ids)} campanhas encontradas. Buscando insights...")
-        # Chama a função de insights (passando o ID correto e convertendo a lista de IDs para tupla para o cache)
-        insights_data = get_campaign_insights_cached(target_account_id, tuple(campaign_ids), "last_7d")
-        if insights_data is None: insights_data = [] # Garante que seja uma lista
-
-        # Mapeia insights por ID de campanha para facilitar a busca
-        insights_map = {insight.get("campaign_id"): insight for insight in insights_data if insight.get("campaign_id")}
-        print(f"DEBUG [get_facebook_campaigns_cached]: {len(insights_map)} insights mapeados.")
-
-        # Combina dados da campanha com insights
-        for campaign in campaigns_raw:
-            campaign_dict = campaign.export_all_data()
-            campaign_id = campaign_dict.get("id")
-            if not campaign_id: continue
-
-            campaign_insights = insights_map.get(campaign_id)
-            # Define um dicionário de insights padrão caso não encontre para a campanha
-            insights_default = {
-                "cpa": 0.0, "purchases": 0, "roas": 0.0, "purchase_value": 0.0,
-                "spend": 0.0, "clicks": 0, "impressions": 0, "ctr": 0.0, "cpc": 0.0
-            }
-            campaign_dict["insights"] = {**insights_default, **(campaign_insights or {})} # Usa o default se campaign_insights for None
-
-            # Converte orçamento para inteiro (centavos)
-            daily_budget_str = campaign_dict.get('daily_budget')
-            lifetime_budget_str = campaign_dict.get('lifetime_budget')
-            campaign_dict['daily_budget'] = int(daily_budget_str) if daily_budget_str and daily_budget_str.isdigit() else 0
-            campaign_dict['lifetime_budget'] = int(lifetime_budget_str) if lifetime_budget_str and lifetime_budget_str.isdigit() else 0
-
-            campaigns_result.append(campaign_dict)
-
-        print(f"DEBUG [get_facebook_campaigns_cached]: Retornando {len(campaigns_result)} campanhas processadas.")
-        return campaigns_result
-
-    except (PgError, sqlite3.Error) as db_err: # Captura erro do DB também
-         st.error(f"Erro de banco de dados em get_facebook_campaigns: {db_err}")
-         print(f"ERRO DB [get_facebook_campaigns_cached]: {traceback.format_exc()}")
-         return None
-    except Exception as e:
-        # Captura outros erros (ex: API do Facebook)
-        st.error(f"Erro CRÍTICO inesperado ao buscar campanhas: {e}")
-        print(f"ERRO API/Outro [get_facebook_campaigns_cached]: {traceback.format_exc()}")
-        return None # Retorna None para indicar erro grave
+def get_facebook_campaigns_cached(config):
+    """
+    Busca as campanhas e insights (últimos 7 dias, mais as janelas usadas pelas
+    regras, na mesma chamada) da conta de `config`.
+    Retorna (campanhas ou None em caso de erro, snapshot do cache com idade/estado).
+    """
+    windows = rules_insight_windows()
+    snapshot = get_campaigns_cache().get(_campaigns_cache_key(config, windows), config, windows)
+    if snapshot["data"] is None:
+        st.error(f"Erro ao buscar campanhas da conta '{config.get('name')}': {snapshot['error']}")
+    return snapshot["data"], snapshot
 
 def get_facebook_campaigns_for_multiple_accounts(config_list):
-    """Busca campanhas de múltiplas contas."""
+    """Busca campanhas de múltiplas contas. Retorna (campanhas, snapshots do cache por conta)."""
     all_campaigns = []
-    
+    snapshots = []
+    cache = get_campaigns_cache()
+    windows = rules_insight_windows()
+
     for config in config_list:
-        try:
-            # Inicializar API para esta conta
-            FacebookAdsApi.init(
-                app_id=config["app_id"],
-                app_secret=config["app_secret"],
-                access_token=config["access_token"],
-                api_version='v22.0'
-            )
-            
-            account_id = config["account_id"]
-            print(f"Buscando campanhas da conta: {config['name']} (ID: {account_id})")
-            
-            # Buscar campanhas desta conta
-            account = AdAccount(f'act_{account_id}')
-            fields_to_fetch = [
-                'id', 'name', 'status', 'objective', 'created_time',
-                'start_time', 'stop_time', 'daily_budget', 'lifetime_budget',
-                'effective_status', 'buying_type', 'budget_remaining'
-            ]
-            
-            campaigns_raw = list(account.get_campaigns(fields=fields_to_fetch, params={'limit': 500}))
-            
-            if not campaigns_raw:
-                print(f"Nenhuma campanha encontrada para conta {config['name']}")
-                continue
-                
-            campaign_ids = [campaign.get("id") for campaign in campaigns_raw if campaign.get("id")]
-            
-            # Buscar insights
-            insights_data = get_campaign_insights_cached(account_id, tuple(campaign_ids), "last_7d")
-            insights_map = {insight.get("campaign_id"): insight for insight in insights_data if insight.get("campaign_id")}
-            
-            for campaign in campaigns_raw:
-                campaign_dict = campaign.export_all_data()
-                campaign_id = campaign_dict.get("id")
-                if not campaign_id: 
-                    continue
-                    
-                # Adicionar informações da conta
-                campaign_dict["account_name"] = config["name"]
-                campaign_dict["account_id"] = account_id
-                campaign_dict["country"] = config.get("country", "")
-                campaign_dict["account_manager"] = config.get("account_manager", "")
-                
-                # Adicionar insights
-                campaign_insights = insights_map.get(campaign_id)
-                insights_default = {
-                    "cpa": 0.0, "purchases": 0, "roas": 0.0, "purchase_value": 0.0,
-                    "spend": 0.0, "clicks": 0, "impressions": 0, "ctr": 0.0, "cpc": 0.0
-                }
-                campaign_dict["insights"] = {**insights_default, **(campaign_insights or {})}
-                
-                # Converter orçamento
-                daily_budget_str = campaign_dict.get('daily_budget')
-                lifetime_budget_str = campaign_dict.get('lifetime_budget')
-                campaign_dict['daily_budget'] = int(daily_budget_str) if daily_budget_str and daily_budget_str.isdigit() else 0
-                campaign_dict['lifetime_budget'] = int(lifetime_budget_str) if lifetime_budget_str and lifetime_budget_str.isdigit() else 0
-                
-                all_campaigns.append(campaign_dict)
-                
-        except Exception as e:
-            print(f"Erro ao buscar campanhas da conta {config.get('name')}: {e}")
+        snapshot = cache.get(_campaigns_cache_key(config, windows), config, windows)
+        if snapshot["data"] is None:
+            print(f"Erro ao buscar campanhas da conta {config.get('name')}: {snapshot['error']}")
             continue
-            
-    return all_campaigns
+        snapshots.append(snapshot)
+
+        # Copia rasa: as listas em cache são compartilhadas entre sessões
+        for campaign in snapshot["data"]:
+            all_campaigns.append({
+                **campaign,
+                "config_id": config["id"],
+                "account_name": config["name"],
+                "account_id": config["account_id"],
+                "country": config.get("country", ""),
+                "account_manager": config.get("account_manager", ""),
+            })
+
+    return all_campaigns, snapshots
+
+def _format_age(seconds):
+    """Formata a idade dos dados: 'agora', 'há 40 s', 'há 3 min', 'há 1 h 05 min'."""
+    if seconds is None or seconds < 5:
+        return "agora"
+    if seconds < 60:
+        return f"há {seconds:.0f} s"
+    if seconds < 3600:
+        return f"há {seconds // 60:.0f} min"
+    return f"há {seconds // 3600:.0f} h {(seconds % 3600) // 60:02.0f} min"
+
+def show_campaigns_freshness(snapshots):
+    """Mostra a idade dos dados de campanhas e se há atualização em segundo plano."""
+    if not snapshots:
+        return
+    ages = [snap["age_s"] for snap in snapshots if snap["age_s"] is not None]
+    text = f"🕒 Dados das campanhas de {_format_age(max(ages) if ages else None)}"
+    if any(snap["refreshing"] for snap in snapshots):
+        text += " · atualizando em segundo plano (os dados novos aparecem na próxima interação)"
+    st.caption(text)
+    errors = [snap["error"] for snap in snapshots if snap["error"] and snap["data"] is not None]
+    if errors:
+        st.warning(f"A última atualização falhou; exibindo os dados anteriores. Erro: {errors[0]}")
 
 # --- Funções de Regras (Adaptadas para PostgreSQL) ---
 def add_rule(name, description, primary_metric, primary_operator,
              primary_value, action_type, action_value, is_composite=0, secondary_metric=None,
              secondary_operator=None, secondary_value=None, join_operator="AND",
-             execution_mode='manual', execution_interval_hours=None): # Novos parâmetros com default
-    """Adiciona uma nova regra ao banco de dados."""
+             execution_mode='manual', execution_interval_hours=None, condition_tree=None): # Novos parâmetros com default
+    """
+    Adiciona uma nova regra ao banco de dados.
+    Com `condition_tree` (árvore de facebook/condicoes.py), a condição vem da
+    árvore e as colunas primary_* guardam só a primeira comparação.
+    """
 
     # --- DEBUG PRINT ---
     print(f"DEBUG [add_rule]: Função recebendo Modo='{execution_mode}', Intervalo={execution_interval_hours}")
     # --- FIM DEBUG PRINT ---
 
-    conn_info = get_db_connection()
-    if conn_info is None:
-        st.error("Falha ao obter conexão com DB para adicionar regra.") # Mensagem para UI
-        return False
-
-    conn, conn_type = conn_info
-    cursor = None
     success = False
 
     try:
-        cursor = conn.cursor()
-
         # Limpa o intervalo se o modo for manual, garantindo consistência
         if execution_mode == 'manual':
             execution_interval_hours = None
@@ -925,34 +491,33 @@ def add_rule(name, description, primary_metric, primary_operator,
                 print(f"AVISO [add_rule]: Intervalo inválido recebido ({execution_interval_hours}), definindo como None.")
                 execution_interval_hours = None # Define como None se não for um inteiro válido
 
-        # Query adaptada para incluir novos campos
-        if conn_type == "sqlite":
-            query = """
-                INSERT INTO rules
-                (name, description, condition_type, is_composite, primary_metric,
-                 primary_operator, primary_value, secondary_metric, secondary_operator,
-                 secondary_value, join_operator, action_type, action_value,
-                 execution_mode, execution_interval_hours, -- Novos campos
-                 updated_at, created_at) -- Adicionado created_at para consistência
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now')) -- 16 placeholders
-            """
-        else: # PostgreSQL
-            query = """
-                INSERT INTO rules
-                (name, description, condition_type, is_composite, primary_metric,
-                 primary_operator, primary_value, secondary_metric, secondary_operator,
-                 secondary_value, join_operator, action_type, action_value,
-                 execution_mode, execution_interval_hours, -- Novos campos
-                 updated_at, created_at) -- Adicionado created_at para consistência
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP) -- 16 placeholders
-            """
+        condition_type = "custom"
+        if condition_tree is not None:
+            condition_type = "expression"
+            first_leaf = condition_leaves(condition_tree)[0]
+            primary_metric, primary_operator, primary_value = first_leaf["metric"], first_leaf["operator"], first_leaf["value"]
+            is_composite, secondary_metric, secondary_operator, secondary_value = 0, None, None, None
+            condition_tree = json.dumps(condition_tree)
+
+        # Query única para os dois bancos: execute_query adapta os placeholders
+        # (%s -> ? no SQLite) e CURRENT_TIMESTAMP existe em ambos
+        query = """
+            INSERT INTO rules
+            (name, description, condition_type, is_composite, primary_metric,
+             primary_operator, primary_value, secondary_metric, secondary_operator,
+             secondary_value, join_operator, action_type, action_value,
+             execution_mode, execution_interval_hours, condition_tree, -- Novos campos
+             updated_at, created_at) -- Adicionado created_at para consistência
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP) -- 18 valores
+        """
 
         params = (
-            name, description, "custom", is_composite, primary_metric,
+            name, description, condition_type, is_composite, primary_metric,
             primary_operator, primary_value, secondary_metric, secondary_operator,
             secondary_value, join_operator, action_type, action_value,
             execution_mode, # Novo
-            execution_interval_hours # Novo
+            execution_interval_hours, # Novo
+            condition_tree
         )
 
         # Usar execute_query para consistência no tratamento de erros e placeholders
@@ -975,7 +540,7 @@ def add_rule(name, description, primary_metric, primary_operator,
         st.error(f"Erro inesperado ao adicionar regra: {e}") # Para UI
         success = False
 
-    # Não precisa fechar cursor ou conexão aqui, execute_query (e get_db_connection) cuidam disso
+    # Não precisa fechar cursor ou conexão aqui, execute_query (e o pool) cuidam disso
 
     return success
 
@@ -983,405 +548,357 @@ def add_rule(name, description, primary_metric, primary_operator,
 def get_all_rules_cached():
     """Busca todas as regras do banco de dados (cacheado), incluindo modo de execução."""
     print("DEBUG: Executando get_all_rules_cached...") # Log para ver se está sendo chamada
-    conn_info = get_db_connection()
-    if conn_info is None:
-        st.error("Falha ao obter conexão com DB para buscar regras.")
-        return []
-
-    conn, conn_type = conn_info
-    rules_list = []
-    cursor = None
-
-    try:
-        cursor = conn.cursor()
+    with db_connection() as conn_info:
+        if conn_info is None:
+            st.error("Falha ao obter conexão com DB para buscar regras.")
+            return []
 
-        # Query SQL - *** CORRIGIDA PARA INCLUIR AS NOVAS COLUNAS ***
-        query = """
-            SELECT
-                id, name, description, condition_type, is_composite,
-                primary_metric, primary_operator, primary_value,
-                secondary_metric, secondary_operator, secondary_value,
-                join_operator, action_type, action_value, is_active,
-                execution_mode, execution_interval_hours, last_automatic_run_at, -- <<< NOVAS COLUNAS AQUI
-                created_at, updated_at
-            FROM rules
-            ORDER BY created_at DESC
-        """
+        conn, conn_type = conn_info
+        rules_list = []
+        cursor = None
 
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        print(f"DEBUG: get_all_rules_cached encontrou {len(rows)} linhas.") # Log
-
-        if rows:
-            # Lista de Nomes de Colunas - *** CORRIGIDA PARA INCLUIR AS NOVAS COLUNAS ***
-            # A ORDEM DEVE SER EXATAMENTE A MESMA DO SELECT ACIMA!
-            columns = [
-                "id", "name", "description", "condition_type", "is_composite",
-                "primary_metric", "primary_operator", "primary_value",
-                "secondary_metric", "secondary_operator", "secondary_value",
-                "join_operator", "action_type", "action_value", "is_active",
-                "execution_mode", "execution_interval_hours", "last_automatic_run_at", # <<< NOVAS COLUNAS AQUI
-                "created_at", "updated_at"
-            ]
-
-            for row in rows:
-                # Cria o dicionário mapeando nome da coluna para valor da linha
-                rule_dict = dict(zip(columns, row))
-                # Debug: Imprime o dicionário para ver se os novos campos estão lá
-                # print(f"DEBUG: Rule Dict: {rule_dict}")
-                rules_list.append(rule_dict)
-
-    except (PgError, sqlite3.Error, Exception) as e: # Captura erros
-        error_type = type(e).__name__
-        print(f"Erro ao buscar regras ({error_type}): {e}")
-        st.error(f"Erro ao buscar regras do banco de dados: {e}") # Mostra erro na UI
-
-    finally:
-        if cursor:
-            cursor.close()
-        # Não fecha a conexão principal aqui (gerenciada pelo cache)
-
-    print(f"DEBUG: get_all_rules_cached retornando {len(rules_list)} regras.") # Log
-    return rules_list
+        try:
+            cursor = conn.cursor()
 
-@st.cache_data(ttl=60)
-def get_rule_executions_cached(limit=20):
-    """Busca as últimas execuções de regras (cacheado)."""
-    conn_info = get_db_connection()
-    if conn_info is None:
-        return []
-    
-    conn, conn_type = conn_info
-    executions_list = []
-    cursor = None
-    
-    try:
-        cursor = conn.cursor()
-        
-        if conn_type == "sqlite":
-            query = """
-                SELECT re.id, r.name as rule_name, re.rule_id, re.ad_object_id, re.ad_object_type,
-                       re.ad_object_name, re.executed_at, re.was_successful, re.message
-                FROM rule_executions re
-                LEFT JOIN rules r ON re.rule_id = r.id
-                ORDER BY re.executed_at DESC
-                LIMIT ?
-            """
-            cursor.execute(query, (limit,))
-        else:
+            # Query SQL - *** CORRIGIDA PARA INCLUIR AS NOVAS COLUNAS ***
             query = """
-                SELECT re.id, r.name as rule_name, re.rule_id, re.ad_object_id, re.ad_object_type,
-                       re.ad_object_name, re.executed_at, re.was_successful, re.message
-                FROM rule_executions re
-                LEFT JOIN rules r ON re.rule_id = r.id
-                ORDER BY re.executed_at DESC
-                LIMIT %s
+                SELECT
+                    id, name, description, condition_type, is_composite,
+                    primary_metric, primary_operator, primary_value,
+                    secondary_metric, secondary_operator, secondary_value,
+                    join_operator, action_type, action_value, is_active,
+                    execution_mode, execution_interval_hours, last_automatic_run_at, -- <<< NOVAS COLUNAS AQUI
+                    condition_tree, created_at, updated_at
+                FROM rules
+                ORDER BY created_at DESC
             """
-            cursor.execute(query, (limit,))
-            
-        rows = cursor.fetchall()
-        
-        if rows:
-            columns = ["id", "rule_name", "rule_id", "ad_object_id", "ad_object_type",
-                       "ad_object_name", "executed_at", "was_successful", "message"]
-            for row in rows:
-                execution_dict = dict(zip(columns, row))
-                if execution_dict.get("rule_name") is None and execution_dict.get("rule_id"):
-                    execution_dict["rule_name"] = f"Regra ID {execution_dict['rule_id']} (Excluída)"
-                elif execution_dict.get("rule_name") is None:
-                    execution_dict["rule_name"] = "Regra Desconhecida"
-                executions_list.append(execution_dict)
-                
-    except Exception as e:
-        print(f"Erro ao buscar execuções: {e}")
-        
-    finally:
-        if cursor:
-            cursor.close()
-            
-    return executions_list
+
+            cursor.execute(query)
+            rows = cursor.fetchall()
+            print(f"DEBUG: get_all_rules_cached encontrou {len(rows)} linhas.") # Log
+
+            if rows:
+                # Lista de Nomes de Colunas - *** CORRIGIDA PARA INCLUIR AS NOVAS COLUNAS ***
+                # A ORDEM DEVE SER EXATAMENTE A MESMA DO SELECT ACIMA!
+                columns = [
+                    "id", "name", "description", "condition_type", "is_composite",
+                    "primary_metric", "primary_operator", "primary_value",
+                    "secondary_metric", "secondary_operator", "secondary_value",
+                    "join_operator", "action_type", "action_value", "is_active",
+                    "execution_mode", "execution_interval_hours", "last_automatic_run_at", # <<< NOVAS COLUNAS AQUI
+                    "condition_tree", "created_at", "updated_at"
+                ]
+
+                for row in rows:
+                    # Cria o dicionário mapeando nome da coluna para valor da linha
+                    rule_dict = dict(zip(columns, row))
+                    # Debug: Imprime o dicionário para ver se os novos campos estão lá
+                    # print(f"DEBUG: Rule Dict: {rule_dict}")
+                    rules_list.append(rule_dict)
+
+        except Exception as e: # Captura erros
+            error_type = type(e).__name__
+            print(f"Erro ao buscar regras ({error_type}): {e}")
+            st.error(f"Erro ao buscar regras do banco de dados: {e}") # Mostra erro na UI
+
+        finally:
+            if cursor:
+                cursor.close()
+            # A conexão volta ao pool ao sair do bloco `with db_connection()`
+
+        print(f"DEBUG: get_all_rules_cached retornando {len(rules_list)} regras.") # Log
+        return rules_list
 
 def delete_rule(rule_id):
     """Exclui uma regra do banco de dados."""
-    conn_info = get_db_connection()
-    if conn_info is None:
-        return False
+    with db_connection() as conn_info:
+        if conn_info is None:
+            return False
     
-    conn, conn_type = conn_info
-    cursor = None
-    success = False
+        conn, conn_type = conn_info
+        cursor = None
+        success = False
     
-    try:
-        cursor = conn.cursor()
+        try:
+            cursor = conn.cursor()
         
-        # Adapta a sintaxe conforme o tipo de banco
-        if conn_type == "sqlite":
-            query = "DELETE FROM rules WHERE id = ?"
-        else:
-            query = "DELETE FROM rules WHERE id = %s"
+            # Adapta a sintaxe conforme o tipo de banco
+            if conn_type == "sqlite":
+                query = "DELETE FROM rules WHERE id = ?"
+            else:
+                query = "DELETE FROM rules WHERE id = %s"
             
-        params = (rule_id,)
-        cursor.execute(query, params)
-        conn.commit()
+            params = (rule_id,)
+            cursor.execute(query, params)
+            conn.commit()
         
-        # Verifica se alguma linha foi afetada
-        success = cursor.rowcount > 0
+            # Verifica se alguma linha foi afetada
+            success = cursor.rowcount > 0
         
-        if success:
-            get_all_rules_cached.clear()  # Limpa cache
+            if success:
+                get_all_rules_cached.clear()  # Limpa cache
         
-    except Exception as e:
-        try:
-            conn.rollback()
-        except:
-            pass
-        print(f"Erro ao excluir regra ID {rule_id}: {e}")
-        st.error(f"Erro ao excluir regra: {str(e)[:100]}")
-        success = False
+        except Exception as e:
+            try:
+                conn.rollback()
+            except:
+                pass
+            print(f"Erro ao excluir regra ID {rule_id}: {e}")
+            st.error(f"Erro ao excluir regra: {str(e)[:100]}")
+            success = False
         
-    finally:
-        if cursor:
-            cursor.close()
+        finally:
+            if cursor:
+                cursor.close()
             
-    return success
+        return success
 
 
 def toggle_rule_status(rule_id, is_active):
     """Ativa ou desativa uma regra no banco de dados."""
-    conn_info = get_db_connection()
-    if conn_info is None:
-        return False
+    with db_connection() as conn_info:
+        if conn_info is None:
+            return False
     
-    conn, conn_type = conn_info
-    cursor = None
-    success = False
+        conn, conn_type = conn_info
+        cursor = None
+        success = False
     
-    try:
-        cursor = conn.cursor()
+        try:
+            cursor = conn.cursor()
         
-        if conn_type == "sqlite":
-            query = "UPDATE rules SET is_active = ?, updated_at = datetime('now') WHERE id = ?"
-            params = (1 if is_active else 0, rule_id)
-        else:
-            query = "UPDATE rules SET is_active = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s"
-            params = (1 if is_active else 0, rule_id)
+            if conn_type == "sqlite":
+                query = "UPDATE rules SET is_active = ?, updated_at = datetime('now') WHERE id = ?"
+                params = (1 if is_active else 0, rule_id)
+            else:
+                query = "UPDATE rules SET is_active = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s"
+                params = (1 if is_active else 0, rule_id)
             
-        cursor.execute(query, params)
-        conn.commit()
-        get_all_rules_cached.clear()
-        success = cursor.rowcount > 0
+            cursor.execute(query, params)
+            conn.commit()
+            get_all_rules_cached.clear()
+            success = cursor.rowcount > 0
         
-    except Exception as e:
-        try:
-            conn.rollback()
-        except:
-            pass
-        print(f"Erro ao alterar status da regra: {e}")
-        success = False
+        except Exception as e:
+            try:
+                conn.rollback()
+            except:
+                pass
+            print(f"Erro ao alterar status da regra: {e}")
+            success = False
         
-    finally:
-        if cursor:
-            cursor.close()
+        finally:
+            if cursor:
+                cursor.close()
             
-    return success
+        return success
 
 def log_rule_execution(rule_id, ad_object_id, ad_object_type, ad_object_name, was_successful, message=""):
     """Registra a execução de uma regra no banco de dados."""
-    conn_info = get_db_connection()
-    if conn_info is None:
-        print(f"Falha ao registrar execução: conexão nula")
-        return False
+    with db_connection() as conn_info:
+        if conn_info is None:
+            print(f"Falha ao registrar execução: conexão nula")
+            return False
     
-    conn, conn_type = conn_info
-    cursor = None
-    success = False
+        conn, conn_type = conn_info
+        cursor = None
+        success = False
     
-    try:
-        cursor = conn.cursor()
+        try:
+            cursor = conn.cursor()
         
-        # Query adaptada por tipo de banco
-        if conn_type == "sqlite":
-            query = """
-                INSERT INTO rule_executions
-                (rule_id, ad_object_id, ad_object_type, ad_object_name, was_successful, message)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """
-        else:
-            query = """
-                INSERT INTO rule_executions
-                (rule_id, ad_object_id, ad_object_type, ad_object_name, was_successful, message)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """
+            # Query adaptada por tipo de banco
+            if conn_type == "sqlite":
+                query = """
+                    INSERT INTO rule_executions
+                    (rule_id, ad_object_id, ad_object_type, ad_object_name, was_successful, message)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """
+            else:
+                query = """
+                    INSERT INTO rule_executions
+                    (rule_id, ad_object_id, ad_object_type, ad_object_name, was_successful, message)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """
             
-        params = (rule_id, ad_object_id, ad_object_type, ad_object_name, 1 if was_successful else 0, message)
-        cursor.execute(query, params)
-        conn.commit()
+            params = (rule_id, ad_object_id, ad_object_type, ad_object_name, 1 if was_successful else 0, message)
+            cursor.execute(query, params)
+            conn.commit()
         
-        # Limpa cache após inserção bem-sucedida
-        get_rule_executions_cached.clear()
-        success = True
+            # Limpa cache após inserção bem-sucedida
+            get_rule_executions_cached.clear()
+            success = True
         
-    except Exception as e:
-        try:
-            conn.rollback()
-        except:
-            pass
-        print(f"Erro ao registrar execução no DB: {e}")
-        success = False
+        except Exception as e:
+            try:
+                conn.rollback()
+            except:
+                pass
+            print(f"Erro ao registrar execução no DB: {e}")
+            success = False
         
-    finally:
-        if cursor:
-            cursor.close()
+        finally:
+            if cursor:
+                cursor.close()
             
-    return success
+        return success
 
 
+# Linhas por INSERT em log_rule_executions (6 parâmetros por linha)
+LOG_INSERT_MAX_ROWS = 1000
+
+def log_rule_executions(rows):
+    """
+    Registra várias execuções com um único INSERT multi-linha (ações em massa).
+    `rows`: [(rule_id, ad_object_id, ad_object_type, ad_object_name, was_successful, message)].
+    """
+    if not rows:
+        return True
+    with db_connection() as conn_info:
+        if conn_info is None:
+            print(f"Falha ao registrar {len(rows)} execuções: conexão nula")
+            return False
+
+        conn, conn_type = conn_info
+        ph = "?" if conn_type == "sqlite" else "%s"
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            for start in range(0, len(rows), LOG_INSERT_MAX_ROWS):
+                chunk = rows[start:start + LOG_INSERT_MAX_ROWS]
+                values = ", ".join([f"({ph}, {ph}, {ph}, {ph}, {ph}, {ph})"] * len(chunk))
+                params = []
+                for rule_id, ad_object_id, ad_object_type, ad_object_name, was_successful, message in chunk:
+                    params.extend((rule_id, ad_object_id, ad_object_type, ad_object_name, 1 if was_successful else 0, message))
+                cursor.execute(f"""
+                    INSERT INTO rule_executions
+                    (rule_id, ad_object_id, ad_object_type, ad_object_name, was_successful, message)
+                    VALUES {values}
+                """, params)
+            conn.commit()
+            get_rule_executions_cached.clear()
+            return True
+        except Exception as e:
+            try:
+                conn.rollback()
+            except:
+                pass
+            print(f"Erro ao registrar {len(rows)} execuções no DB: {e}")
+            return False
+        finally:
+            if cursor:
+                cursor.close()
+
+
+# Tamanho padrão de página do histórico de execuções
+HISTORY_PAGE_SIZE = 50
+
+def _execution_row_to_dict(row):
+    """Mapeia uma linha do histórico para dicionário, tratando regras excluídas."""
+    execution_dict = dict(zip(EXECUTION_COLUMNS, row))
+    if execution_dict.get("rule_name") is None and execution_dict.get("rule_id"):
+        execution_dict["rule_name"] = f"Regra ID {execution_dict['rule_id']} (Excluída)"
+    elif execution_dict.get("rule_name") is None:
+        execution_dict["rule_name"] = "Regra Desconhecida"
+    return execution_dict
+
 @st.cache_data(ttl=60)
 def get_rule_executions_cached(limit=20):
     """Busca as últimas execuções de regras (cacheado)."""
-    conn_info = get_db_connection()
-    if conn_info is None:
-        return []
-    
-    conn, conn_type = conn_info
-    executions_list = []
-    cursor = None
-    
-    try:
-        cursor = conn.cursor()
-        
-        # Query adaptada por tipo de banco
-        if conn_type == "sqlite":
-            query = """
-                SELECT re.id, r.name as rule_name, re.rule_id, re.ad_object_id, re.ad_object_type,
-                       re.ad_object_name, re.executed_at, re.was_successful, re.message
-                FROM rule_executions re
-                LEFT JOIN rules r ON re.rule_id = r.id
-                ORDER BY re.executed_at DESC
-                LIMIT ?
-            """
-            cursor.execute(query, (limit,))
-        else:
-            query = """
-                SELECT re.id, r.name as rule_name, re.rule_id, re.ad_object_id, re.ad_object_type,
-                       re.ad_object_name, re.executed_at, re.was_successful, re.message
-                FROM rule_executions re
-                LEFT JOIN rules r ON re.rule_id = r.id
-                ORDER BY re.executed_at DESC
-                LIMIT %s
-            """
-            cursor.execute(query, (limit,))
-            
-        rows = cursor.fetchall()
-        
-        if rows:
-            columns = ["id", "rule_name", "rule_id", "ad_object_id", "ad_object_type",
-                       "ad_object_name", "executed_at", "was_successful", "message"]
-            for row in rows:
-                execution_dict = dict(zip(columns, row))
-                if execution_dict.get("rule_name") is None and execution_dict.get("rule_id"):
-                    execution_dict["rule_name"] = f"Regra ID {execution_dict['rule_id']} (Excluída)"
-                elif execution_dict.get("rule_name") is None:
-                    execution_dict["rule_name"] = "Regra Desconhecida"
-                executions_list.append(execution_dict)
-                
-    except Exception as e:
-        print(f"Erro ao buscar execuções: {e}")
-        # Não mostra erro na tela para evitar poluição visual
-        
-    finally:
-        if cursor:
-            cursor.close()
-            
-    return executions_list
+    executions, _ = get_rule_executions_page(page_size=limit)
+    return executions
 
-def get_rule_executions_by_date(start_date, end_date):
+def get_rule_executions_page(start_date=None, end_date=None, page_size=HISTORY_PAGE_SIZE, cursor=None):
     """
-    Busca execuções de regras dentro de um intervalo de datas específico.
+    Busca uma página do histórico de execuções usando paginação por cursor (keyset).
+
+    A ordem é (executed_at DESC, id DESC), atendida pelo índice
+    idx_rule_executions_executed_at_id, então o custo depende do tamanho da
+    página e não do total de linhas no período.
 
     Args:
-        start_date (datetime.date): A data de início do intervalo.
-        end_date (datetime.date): A data de fim do intervalo.
+        start_date (datetime.date, opcional): Data de início do intervalo.
+        end_date (datetime.date, opcional): Data de fim do intervalo (inclusiva).
+        page_size (int): Máximo de execuções retornadas.
+        cursor (tuple, opcional): (executed_at, id) da última linha da página anterior.
 
     Returns:
-        list: Uma lista de dicionários representando as execuções encontradas,
-              ou uma lista vazia se ocorrer um erro ou nada for encontrado.
+        tuple: (lista de dicionários da página, cursor da próxima página ou None se acabou).
     """
-    conn_info = get_db_connection()
-    if conn_info is None:
-        st.error("Falha na conexão com o DB para buscar histórico por data.")
-        return []
+    with db_connection() as conn_info:
+        if conn_info is None:
+            st.error("Falha na conexão com o DB para buscar histórico.")
+            return [], None
 
-    conn, conn_type = conn_info
-    executions_list = []
-    cursor = None
+        conn, conn_type = conn_info
+        executions_list = []
+        next_cursor = None
+        db_cursor = None
 
-    try:
-        cursor = conn.cursor()
-
-        # --- IMPORTANTE: Ajuste para incluir o dia final completo ---
-        # Adiciona 1 dia ao end_date para a comparação ser "menor que o dia seguinte"
-        # Isso garante que todos os registros do end_date sejam incluídos.
-        end_date_adjusted = end_date + timedelta(days=1)
-
-        # Query base (igual à da função cacheada, mas sem LIMIT)
-        query_base = """
-            SELECT re.id, r.name as rule_name, re.rule_id, re.ad_object_id, re.ad_object_type,
-                   re.ad_object_name, re.executed_at, re.was_successful, re.message
-            FROM rule_executions re
-            LEFT JOIN rules r ON re.rule_id = r.id
-        """
+        try:
+            db_cursor = conn.cursor()
+            ph = "?" if conn_type == "sqlite" else "%s"
+
+            conditions = []
+            params = []
+            if start_date is not None:
+                conditions.append(f"re.executed_at >= {ph}")
+                params.append(start_date)
+            if end_date is not None:
+                # Adiciona 1 dia ao end_date para incluir o dia final completo
+                conditions.append(f"re.executed_at < {ph}")
+                params.append(end_date + timedelta(days=1))
+            if cursor is not None:
+                # Comparação de tupla (row value) usa o índice composto nos dois bancos
+                conditions.append(f"(re.executed_at, re.id) < ({ph}, {ph})")
+                params.extend(cursor)
+
+            where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            # Busca uma linha a mais só para saber se existe próxima página
+            query = f"""
+                SELECT re.id, r.name as rule_name, re.rule_id, re.ad_object_id, re.ad_object_type,
+                       re.ad_object_name, re.executed_at, re.was_successful, re.message
+                FROM rule_executions re
+                LEFT JOIN rules r ON re.rule_id = r.id
+                {where_clause}
+                ORDER BY re.executed_at DESC, re.id DESC
+                LIMIT {ph}
+            """
+            params.append(page_size + 1)
+
+            db_cursor.execute(query, tuple(params))
+            rows = db_cursor.fetchall()
+
+            has_more = len(rows) > page_size
+            executions_list = [_execution_row_to_dict(row) for row in rows[:page_size]]
+            if has_more and executions_list:
+                last = executions_list[-1]
+                next_cursor = (last["executed_at"], last["id"])
+
+        except Exception as e:
+            st.error(f"Erro ao buscar histórico de execuções: {e}")
+            print(f"Erro detalhado em get_rule_executions_page: {traceback.format_exc()}")
+            executions_list, next_cursor = [], None
+
+        finally:
+            if db_cursor:
+                db_cursor.close()
 
-        # Adiciona a condição WHERE para filtrar por data
-        # Atenção aos placeholders (%s ou ?)
-        if conn_type == "sqlite":
-            query = f"{query_base} WHERE re.executed_at >= ? AND re.executed_at < ? ORDER BY re.executed_at DESC"
-            params = (start_date, end_date_adjusted)
-        else: # PostgreSQL
-            # Assume que executed_at é TIMESTAMP WITH TIME ZONE ou similar
-            query = f"{query_base} WHERE re.executed_at >= %s AND re.executed_at < %s ORDER BY re.executed_at DESC"
-            params = (start_date, end_date_adjusted)
-
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-
-        if rows:
-            columns = ["id", "rule_name", "rule_id", "ad_object_id", "ad_object_type",
-                       "ad_object_name", "executed_at", "was_successful", "message"]
-            for row in rows:
-                execution_dict = dict(zip(columns, row))
-                # Lógica para nome da regra (se excluída)
-                if execution_dict.get("rule_name") is None and execution_dict.get("rule_id"):
-                    execution_dict["rule_name"] = f"Regra ID {execution_dict['rule_id']} (Excluída)"
-                elif execution_dict.get("rule_name") is None:
-                    execution_dict["rule_name"] = "Regra Desconhecida"
-                executions_list.append(execution_dict)
-
-    except (PgError, Exception) as e:
-        st.error(f"Erro ao buscar histórico por data: {e}")
-        print(f"Erro detalhado em get_rule_executions_by_date: {traceback.format_exc()}")
-        executions_list = [] # Retorna lista vazia em caso de erro
-
-    finally:
-        if cursor:
-            cursor.close()
-
-    return executions_list
+        return executions_list, next_cursor
 
 
 # --- Funções de Execução e Simulação de Regras ---
 # NENHUMA ALTERAÇÃO necessária aqui, pois elas dependem das funções de DB/API já adaptadas.
 # Cole as funções execute_rule e simulate_rule_application do seu código anterior aqui.
-def execute_rule(campaign_id, rule_id):
-    """Executa a ação definida por uma regra em uma campanha específica."""
-    get_facebook_campaigns_cached.clear()
-    get_campaign_insights_cached.clear()
+def execute_rule(campaign_id, rule_id, config):
+    """Executa a ação definida por uma regra em uma campanha da conta de `config`."""
+    invalidate_campaigns_cache(config)
     get_rule_executions_cached.clear()
 
     campaign_name = f'Campanha ID {campaign_id}'
     try:
-        account_id = init_facebook_api()
-        if not account_id:
+        api = init_facebook_api(config)
+        if api is None:
             return False, "Não foi possível inicializar a API do Facebook"
 
         rules = get_all_rules_cached()
@@ -1392,82 +909,13 @@ def execute_rule(campaign_id, rule_id):
         if not rule.get('is_active'):
             return False, "Regra está inativa"
 
-        campaign_obj = Campaign(campaign_id)
+        from facebook_business.adobjects.campaign import Campaign
+        campaign_obj = Campaign(campaign_id, api=api)
         campaign_data = campaign_obj.api_get(fields=['name', 'status', 'daily_budget', 'lifetime_budget'])
         campaign_name = campaign_data.get('name', campaign_name)
 
-        success = False
-        message = ""
-        action_params = {}
-
-        current_daily_budget = int(campaign_data.get('daily_budget', 0))
-        current_lifetime_budget = int(campaign_data.get('lifetime_budget', 0))
-
+        action_params, message, success = compute_rule_action(rule, campaign_data)
         action_type = rule['action_type']
-        action_value = rule.get('action_value')
-
-        if action_type == 'duplicate_budget':
-            if current_daily_budget > 0:
-                new_budget = current_daily_budget * 2
-                action_params = {'daily_budget': new_budget}
-                message = f"Orçamento diário duplicado de {current_daily_budget/100:.2f} para {new_budget/100:.2f}"
-            elif current_lifetime_budget > 0:
-                new_budget = current_lifetime_budget * 2
-                action_params = {'lifetime_budget': new_budget}
-                message = f"Orçamento total duplicado de {current_lifetime_budget/100:.2f} para {new_budget/100:.2f}"
-            else: message = "Nenhum orçamento encontrado para duplicar"; success = False; action_params=None
-
-        elif action_type == 'triple_budget':
-            if current_daily_budget > 0:
-                new_budget = current_daily_budget * 3
-                action_params = {'daily_budget': new_budget}
-                message = f"Orçamento diário triplicado de {current_daily_budget/100:.2f} para {new_budget/100:.2f}"
-            elif current_lifetime_budget > 0:
-                new_budget = current_lifetime_budget * 3
-                action_params = {'lifetime_budget': new_budget}
-                message = f"Orçamento total triplicado de {current_lifetime_budget/100:.2f} para {new_budget/100:.2f}"
-            else: message = "Nenhum orçamento encontrado para triplicar"; success = False; action_params=None
-
-        elif action_type == 'pause_campaign':
-            if campaign_data.get('status') == Campaign.Status.active:
-                action_params = {'status': Campaign.Status.paused}
-                message = "Campanha pausada"
-            else: message = "Campanha já não estava ativa"; success = True; action_params=None
-
-        elif action_type == 'activate_campaign':
-             if campaign_data.get('status') == Campaign.Status.paused:
-                action_params = {'status': Campaign.Status.active}
-                message = "Campanha ativada"
-             else: message = "Campanha já não estava pausada"; success = True; action_params=None
-
-        elif action_type == 'halve_budget':
-            min_budget_cents = 100
-            if current_daily_budget > 0:
-                new_budget = max(min_budget_cents, current_daily_budget // 2)
-                action_params = {'daily_budget': new_budget}
-                message = f"Orçamento diário reduzido para {new_budget/100:.2f} (era {current_daily_budget/100:.2f})"
-            elif current_lifetime_budget > 0:
-                new_budget = max(min_budget_cents, current_lifetime_budget // 2)
-                action_params = {'lifetime_budget': new_budget}
-                message = f"Orçamento total reduzido para {new_budget/100:.2f} (era {current_lifetime_budget/100:.2f})"
-            else: message = "Nenhum orçamento encontrado para reduzir"; success = False; action_params=None
-
-        elif action_type == 'custom_budget_multiplier' and action_value is not None:
-            multiplier = float(action_value)
-            min_budget_cents = 100
-            if current_daily_budget > 0:
-                new_budget = max(min_budget_cents, int(current_daily_budget * multiplier))
-                action_params = {'daily_budget': new_budget}
-                message = f"Orçamento diário multiplicado por {multiplier:.2f} para {new_budget/100:.2f} (era {current_daily_budget/100:.2f})"
-            elif current_lifetime_budget > 0:
-                new_budget = max(min_budget_cents, int(current_lifetime_budget * multiplier))
-                action_params = {'lifetime_budget': new_budget}
-                message = f"Orçamento total multiplicado por {multiplier:.2f} para {new_budget/100:.2f} (era {current_lifetime_budget/100:.2f})"
-            else: message = "Nenhum orçamento encontrado para multiplicar"; success = False; action_params=None
-        elif action_type == 'custom_budget_multiplier' and action_value is None:
-             message = "Multiplicador de orçamento personalizado não definido na regra"; success = False; action_params=None
-        else:
-             message = f"Tipo de ação desconhecido ou inválido: {action_type}"; success = False; action_params=None
 
         if action_params is not None:
             try:
@@ -1497,15 +945,6 @@ def simulate_rule_application(campaign, rules):
     if not campaign or not isinstance(campaign, dict) or "insights" not in campaign:
         return []
 
-    metrics = {
-        'cpa': campaign["insights"].get("cpa", 0.0),
-        'purchases': campaign["insights"].get("purchases", 0),
-        'roas': campaign["insights"].get("roas", 0.0),
-        'spend': campaign["insights"].get("spend", 0.0),
-        'clicks': campaign["insights"].get("clicks", 0),
-        'ctr': campaign["insights"].get("ctr", 0.0),
-        'cpc': campaign["insights"].get("cpc", 0.0),
-    }
     current_daily_budget = campaign.get('daily_budget', 0)
     current_lifetime_budget = campaign.get('lifetime_budget', 0)
     current_budget = current_daily_budget if current_daily_budget > 0 else current_lifetime_budget
@@ -1513,55 +952,11 @@ def simulate_rule_application(campaign, rules):
     for rule in rules:
         if not rule.get('is_active', 1) or not isinstance(rule, dict): continue
 
-        primary_metric_key = rule.get('primary_metric')
-        primary_operator = rule.get('primary_operator')
-        primary_value_rule = rule.get('primary_value')
-
-        if None in [primary_metric_key, primary_operator] or primary_value_rule is None or primary_metric_key not in metrics:
+        # Árvore E/OU/NÃO (ou as colunas primary_*/secondary_* das regras antigas)
+        condition = rule_condition(rule)
+        if condition is None:
             continue
-
-        primary_value_campaign = metrics[primary_metric_key]
-        primary_condition_met = False
-        try:
-            rule_val_p = float(primary_value_rule)
-            camp_val_p = float(primary_value_campaign)
-
-            if primary_operator == '<' and camp_val_p < rule_val_p: primary_condition_met = True
-            elif primary_operator == '<=' and camp_val_p <= rule_val_p: primary_condition_met = True
-            elif primary_operator == '>' and camp_val_p > rule_val_p: primary_condition_met = True
-            elif primary_operator == '>=' and camp_val_p >= rule_val_p: primary_condition_met = True
-            elif primary_operator == '==' and camp_val_p == rule_val_p: primary_condition_met = True
-        except (TypeError, ValueError):
-            continue
-
-        condition_met = primary_condition_met
-
-        if rule.get('is_composite', 0):
-            secondary_metric_key = rule.get('secondary_metric')
-            secondary_operator = rule.get('secondary_operator')
-            secondary_value_rule = rule.get('secondary_value')
-            join_operator = rule.get('join_operator', 'AND')
-
-            if None in [secondary_metric_key, secondary_operator] or secondary_value_rule is None or secondary_metric_key not in metrics:
-                 if join_operator == 'AND': condition_met = False
-            else:
-                secondary_value_campaign = metrics[secondary_metric_key]
-                secondary_condition_met = False
-                try:
-                    rule_val_s = float(secondary_value_rule)
-                    camp_val_s = float(secondary_value_campaign)
-
-                    if secondary_operator == '<' and camp_val_s < rule_val_s: secondary_condition_met = True
-                    elif secondary_operator == '<=' and camp_val_s <= rule_val_s: secondary_condition_met = True
-                    elif secondary_operator == '>' and camp_val_s > rule_val_s: secondary_condition_met = True
-                    elif secondary_operator == '>=' and camp_val_s >= rule_val_s: secondary_condition_met = True
-                    elif secondary_operator == '==' and camp_val_s == rule_val_s: secondary_condition_met = True
-                except (TypeError, ValueError):
-                    secondary_condition_met = False
-
-                if join_operator == 'AND': condition_met = primary_condition_met and secondary_condition_met
-                elif join_operator == 'OR': condition_met = primary_condition_met or secondary_condition_met
-                else: condition_met = False
+        condition_met = condition_matches(condition, campaign)
 
         if condition_met:
             action_type = rule['action_type']
@@ -1605,6 +1000,34 @@ def simulate_rule_application(campaign, rules):
     return rule_results
 
 
+# Exemplo exibido ao ativar a condição avançada no formulário
+CONDITION_TREE_EXAMPLE = json.dumps({
+    "or": [
+        {"and": [{"metric": "spend", "operator": ">=", "value": 50}, {"metric": "purchases", "operator": "==", "value": 0}]},
+        {"and": [{"metric": "cpa", "operator": ">", "value": 80}, {"not": {"metric": "roas", "operator": ">=", "value": 2}}]},
+    ]
+}, indent=2)
+
+# Métricas com casas decimais no formulário/texto das regras (as demais são contagens)
+FLOAT_METRICS = [metric for metric, kind in METRIC_KINDS.items() if kind != 'count']
+# Métricas derivadas como opção nas regras e na lista de campanhas
+DERIVED_METRIC_OPTIONS = {name: spec['label'] for name, spec in DERIVED_METRICS.items()}
+
+def _format_metric_value(metric, value):
+    """Valor de uma comparação no texto da regra: 2 casas para métricas em R$/razão, inteiro para contagens."""
+    return f"{float(value):.2f}" if metric in FLOAT_METRICS else str(int(float(value)))
+
+def _window_suffix(window):
+    """Sufixo " (Últimos 30 dias)" para janelas diferentes da padrão; vazio na padrão."""
+    return f" ({INSIGHT_WINDOWS[window]})" if window and window != DEFAULT_INSIGHT_WINDOW else ""
+
+def _leaf(metric, operator, value, window):
+    """Folha da árvore de condição; a janela padrão fica implícita."""
+    leaf = {"metric": metric, "operator": operator, "value": value}
+    if window != DEFAULT_INSIGHT_WINDOW:
+        leaf["window"] = window
+    return leaf
+
 # --- Funções de UI (show_rule_form, format_rule_text) ---
 # NENHUMA ALTERAÇÃO necessária aqui.
 # Cole as funções show_rule_form e format_rule_text do seu código anterior aqui.
@@ -1612,7 +1035,8 @@ def show_rule_form():
     """Exibe o formulário para criar/editar uma regra."""
     METRIC_OPTIONS = {
         "cpa": "CPA (Custo por Aquisição)", "purchases": "Compras", "roas": "ROAS",
-        "spend": "Gasto (7d)", "clicks": "Cliques (7d)", "ctr": "CTR (%)", "cpc": "CPC"
+        "spend": "Gasto (7d)", "clicks": "Cliques (7d)", "ctr": "CTR (%)", "cpc": "CPC",
+        **DERIVED_METRIC_OPTIONS
     }
     OPERATOR_OPTIONS = { "<": "<", "<=": "<=", ">": ">", ">=": ">=", "==": "==" }
     ACTION_OPTIONS = {
@@ -1638,21 +1062,29 @@ def show_rule_form():
     st.session_state.setdefault('rule_form_primary_operator', '<=')
     st.session_state.setdefault('rule_form_secondary_operator', '>=')
     st.session_state.setdefault("rule_form_action_value", 1.2)
+    st.session_state.setdefault('rule_form_use_tree', False)
+    st.session_state.setdefault('rule_form_primary_window', DEFAULT_INSIGHT_WINDOW)
+    st.session_state.setdefault('rule_form_secondary_window', DEFAULT_INSIGHT_WINDOW)
+    st.session_state.setdefault('rule_form_condition_tree', CONDITION_TREE_EXAMPLE)
 
     current_pm_init = st.session_state.get('rule_form_primary_metric', 'cpa')
     current_sm_init = st.session_state.get('rule_form_secondary_metric', 'purchases')
     is_composite_init = st.session_state.get('rule_form_is_composite', False)
-    is_float_p_init = current_pm_init in ['cpa', 'roas', 'cpc', 'ctr', 'spend']
+    is_float_p_init = current_pm_init in FLOAT_METRICS
     st.session_state.setdefault(f"rule_form_primary_value_{current_pm_init}", 0.0 if is_float_p_init else 0)
     if is_composite_init:
-        is_float_s_init = current_sm_init in ['cpa', 'roas', 'cpc', 'ctr', 'spend']
+        is_float_s_init = current_sm_init in FLOAT_METRICS
         st.session_state.setdefault(f"rule_form_secondary_value_{current_sm_init}", 0.0 if is_float_s_init else 0)
     # --- FIM DA INICIALIZAÇÃO ---
 
     # --- CONTROLES EXTERNOS AO FORMULÁRIO ---
     st.markdown("##### Configuração Geral e Modo")
-    st.checkbox("Usar duas condições (regra composta)", key='rule_form_is_composite')
-    is_composite_state = st.session_state['rule_form_is_composite']
+    st.checkbox("Condição avançada (grupos E / OU / NÃO em JSON)", key='rule_form_use_tree',
+                help="Várias condições em uma única regra, avaliadas de uma vez sobre todas as campanhas.")
+    use_tree_state = st.session_state['rule_form_use_tree']
+    if not use_tree_state:
+        st.checkbox("Usar duas condições (regra composta)", key='rule_form_is_composite')
+    is_composite_state = st.session_state['rule_form_is_composite'] and not use_tree_state
     st.radio(
         "Modo de Execução:", options=['manual', 'automatic'],
         format_func=lambda x: {'manual': 'Manual', 'automatic': 'Automático'}.get(x),
@@ -1672,30 +1104,31 @@ def show_rule_form():
             index=default_index_interval, help="Com que frequência o sistema deve verificar?"
         )
     st.markdown("---")
-    st.markdown("##### Seleção de Métricas")
-    col_m1, col_m2 = st.columns(2)
-    with col_m1:
-        st.selectbox(
-            "**1ª Métrica**", options=list(METRIC_OPTIONS.keys()),
-            format_func=lambda x: METRIC_OPTIONS[x], key='rule_form_primary_metric'
-        )
-    with col_m2:
-        if is_composite_state:
+    if not use_tree_state:
+        st.markdown("##### Seleção de Métricas")
+        col_m1, col_m2 = st.columns(2)
+        with col_m1:
             st.selectbox(
-                "**2ª Métrica**", options=list(METRIC_OPTIONS.keys()),
-                format_func=lambda x: METRIC_OPTIONS[x], key='rule_form_secondary_metric'
+                "**1ª Métrica**", options=list(METRIC_OPTIONS.keys()),
+                format_func=lambda x: METRIC_OPTIONS[x], key='rule_form_primary_metric'
             )
-        else: st.markdown("")
+        with col_m2:
+            if is_composite_state:
+                st.selectbox(
+                    "**2ª Métrica**", options=list(METRIC_OPTIONS.keys()),
+                    format_func=lambda x: METRIC_OPTIONS[x], key='rule_form_secondary_metric'
+                )
+            else: st.markdown("")
     # --- FIM DOS CONTROLES EXTERNOS ---
 
     st.markdown("---")
 
     current_primary_metric = st.session_state['rule_form_primary_metric']
     current_secondary_metric = st.session_state.get('rule_form_secondary_metric', 'purchases')
-    is_float_primary = current_primary_metric in ['cpa', 'roas', 'cpc', 'ctr', 'spend']
+    is_float_primary = current_primary_metric in FLOAT_METRICS
     is_float_secondary = False
     if is_composite_state:
-        is_float_secondary = current_secondary_metric in ['cpa', 'roas', 'cpc', 'ctr', 'spend']
+        is_float_secondary = current_secondary_metric in FLOAT_METRICS
 
     # --- INÍCIO DO FORMULÁRIO ---
     with st.form("new_rule_form"):
@@ -1711,26 +1144,41 @@ def show_rule_form():
                 horizontal=True, format_func=lambda x: {"AND": "E (ambas)", "OR": "OU (uma ou ambas)"}.get(x)
             )
         st.markdown("---")
-        st.markdown(f"**1ª Condição:** {METRIC_OPTIONS[current_primary_metric]}")
-        col1_p_form, col2_p_form = st.columns([1, 2])
-        with col1_p_form:
-            primary_operator = st.selectbox("Operador", options=list(OPERATOR_OPTIONS.keys()),
-                                            format_func=lambda x: OPERATOR_OPTIONS[x],
-                                            key="rule_form_primary_operator")
-        with col2_p_form:
-            label_p = "Valor (R$)*" if is_float_primary else "Quantidade*"
-            step_p = 0.01 if is_float_primary else 1
-            format_p = "%.2f" if is_float_primary else "%d"
-            primary_value_key = f"rule_form_primary_value_{current_primary_metric}"
-            min_val_p = 0.0 if is_float_primary else 0
-            if current_primary_metric == 'roas': min_val_p = None
-            primary_value = st.number_input(label_p, min_value=min_val_p, step=step_p, format=format_p, key=primary_value_key)
+        primary_operator = None
+        primary_value = None
+        if use_tree_state:
+            st.markdown("**Condição**")
+            st.text_area(
+                "Árvore da condição (JSON)*", key="rule_form_condition_tree", height=180,
+                help=f"Folha: {{\"metric\": \"cpa\", \"operator\": \"<=\", \"value\": 30}}. "
+                     f"Grupos: {{\"and\": [...]}}, {{\"or\": [...]}}, {{\"not\": {{...}}}}. "
+                     f"Métricas: {', '.join(METRIC_OPTIONS)}. "
+                     f"Janela opcional por folha (\"window\", padrão {DEFAULT_INSIGHT_WINDOW}): {', '.join(INSIGHT_WINDOWS)}."
+            )
+        else:
+            st.markdown(f"**1ª Condição:** {METRIC_OPTIONS[current_primary_metric]}")
+            col1_p_form, col2_p_form, col3_p_form = st.columns([1, 2, 1.5])
+            with col1_p_form:
+                primary_operator = st.selectbox("Operador", options=list(OPERATOR_OPTIONS.keys()),
+                                                format_func=lambda x: OPERATOR_OPTIONS[x],
+                                                key="rule_form_primary_operator")
+            with col2_p_form:
+                label_p = "Valor (R$)*" if is_float_primary else "Quantidade*"
+                step_p = 0.01 if is_float_primary else 1
+                format_p = "%.2f" if is_float_primary else "%d"
+                primary_value_key = f"rule_form_primary_value_{current_primary_metric}"
+                min_val_p = 0.0 if is_float_primary else 0
+                if current_primary_metric in ('roas', 'profit'): min_val_p = None
+                primary_value = st.number_input(label_p, min_value=min_val_p, step=step_p, format=format_p, key=primary_value_key)
+            with col3_p_form:
+                st.selectbox("Janela", options=list(INSIGHT_WINDOWS), format_func=lambda x: INSIGHT_WINDOWS[x],
+                             key="rule_form_primary_window")
 
         secondary_operator = None
         secondary_value = None
         if is_composite_state:
             st.markdown(f"**2ª Condição:** {METRIC_OPTIONS[current_secondary_metric]}")
-            col1_s_form, col2_s_form = st.columns([1, 2])
+            col1_s_form, col2_s_form, col3_s_form = st.columns([1, 2, 1.5])
             with col1_s_form:
                 secondary_operator = st.selectbox("Operador", options=list(OPERATOR_OPTIONS.keys()),
                                                  format_func=lambda x: OPERATOR_OPTIONS[x],
@@ -1741,8 +1189,11 @@ def show_rule_form():
                 format_s = "%.2f" if is_float_secondary else "%d"
                 secondary_value_key = f"rule_form_secondary_value_{current_secondary_metric}"
                 min_val_s = 0.0 if is_float_secondary else 0
-                if current_secondary_metric == 'roas': min_val_s = None
+                if current_secondary_metric in ('roas', 'profit'): min_val_s = None
                 secondary_value = st.number_input(label_s, min_value=min_val_s, step=step_s, format=format_s, key=secondary_value_key)
+            with col3_s_form:
+                st.selectbox("Janela", options=list(INSIGHT_WINDOWS), format_func=lambda x: INSIGHT_WINDOWS[x],
+                             key="rule_form_secondary_window")
 
         st.markdown("---")
         st.markdown("##### Ação")
@@ -1766,7 +1217,7 @@ def show_rule_form():
         try:
             resumo_primary_metric = st.session_state['rule_form_primary_metric']
             resumo_secondary_metric = st.session_state.get('rule_form_secondary_metric', 'purchases')
-            resumo_is_composite = st.session_state['rule_form_is_composite']
+            resumo_is_composite = is_composite_state
             resumo_execution_mode = st.session_state['rule_form_execution_mode']
             resumo_interval_hours = st.session_state.get('rule_form_interval')
             resumo_primary_operator = primary_operator
@@ -1777,15 +1228,19 @@ def show_rule_form():
             resumo_secondary_value = secondary_value
             resumo_action_value = action_value_widget
 
-            resumo_is_float_p = resumo_primary_metric in ['cpa', 'roas', 'cpc', 'ctr', 'spend']
+            resumo_is_float_p = resumo_primary_metric in FLOAT_METRICS
             pv_resumo = resumo_primary_value if resumo_primary_value is not None else (0.0 if resumo_is_float_p else 0)
             val1_fmt_resumo = f"{float(pv_resumo):.2f}" if resumo_is_float_p else str(int(pv_resumo))
-            rule_summary = f"**SE** {METRIC_OPTIONS.get(resumo_primary_metric, '?')} {OPERATOR_OPTIONS.get(resumo_primary_operator, '?')} {val1_fmt_resumo} "
+            if use_tree_state:
+                resumo_tree = validate_condition(parse_condition(st.session_state.get('rule_form_condition_tree', '')))
+                rule_summary = f"**SE** {format_condition(resumo_tree, METRIC_OPTIONS, _format_metric_value)} "
+            else:
+                rule_summary = f"**SE** {METRIC_OPTIONS.get(resumo_primary_metric, '?')} {OPERATOR_OPTIONS.get(resumo_primary_operator, '?')} {val1_fmt_resumo}{_window_suffix(st.session_state.get('rule_form_primary_window'))} "
             if resumo_is_composite:
-                 resumo_is_float_s = resumo_secondary_metric in ['cpa', 'roas', 'cpc', 'ctr', 'spend']
+                 resumo_is_float_s = resumo_secondary_metric in FLOAT_METRICS
                  sv_resumo = resumo_secondary_value if resumo_secondary_value is not None else (0.0 if resumo_is_float_s else 0)
                  val2_fmt_resumo = f"{float(sv_resumo):.2f}" if resumo_is_float_s else str(int(sv_resumo))
-                 rule_summary += f"**{resumo_join_operator}** {METRIC_OPTIONS.get(resumo_secondary_metric, '?')} {OPERATOR_OPTIONS.get(resumo_secondary_operator, '?')} {val2_fmt_resumo} "
+                 rule_summary += f"**{resumo_join_operator}** {METRIC_OPTIONS.get(resumo_secondary_metric, '?')} {OPERATOR_OPTIONS.get(resumo_secondary_operator, '?')} {val2_fmt_resumo}{_window_suffix(st.session_state.get('rule_form_secondary_window'))} "
             action_text_summary = ACTION_OPTIONS.get(resumo_action_type, '?')
             if resumo_action_type == "custom_budget_multiplier":
                  av_resumo = resumo_action_value if resumo_action_value is not None else 1.2
@@ -1799,6 +1254,7 @@ def show_rule_form():
                 else: rule_summary += "Automático (Selecione Intervalo)"
             else: rule_summary += "Manual"
             st.markdown(rule_summary, unsafe_allow_html=True)
+        except ValueError as e: st.caption(f"Condição inválida: {e}")
         except Exception as e: st.caption("Aguardando valores válidos para gerar resumo...")
 
         # --- Botão de Submit ---
@@ -1810,7 +1266,8 @@ def show_rule_form():
             final_execution_mode = st.session_state.get('rule_form_execution_mode', 'manual')
             final_interval_hours = st.session_state.get('rule_form_interval') if final_execution_mode == 'automatic' else None
             final_action_type = st.session_state.get('rule_form_action_type', 'pause_campaign')
-            final_is_composite = st.session_state.get('rule_form_is_composite', False)
+            final_use_tree = st.session_state.get('rule_form_use_tree', False)
+            final_is_composite = st.session_state.get('rule_form_is_composite', False) and not final_use_tree
             final_primary_metric = st.session_state.get('rule_form_primary_metric', 'cpa')
             final_secondary_metric = st.session_state.get('rule_form_secondary_metric', 'purchases')
             final_primary_operator = st.session_state.get('rule_form_primary_operator', '<=')
@@ -1823,9 +1280,18 @@ def show_rule_form():
             submit_secondary_value_final = st.session_state.get(final_sv_key) if final_is_composite else None
             submit_action_value_final = st.session_state.get(final_av_key) if final_action_type == "custom_budget_multiplier" else None
 
+            final_primary_window = st.session_state.get('rule_form_primary_window', DEFAULT_INSIGHT_WINDOW)
+            final_secondary_window = st.session_state.get('rule_form_secondary_window', DEFAULT_INSIGHT_WINDOW) if final_is_composite else DEFAULT_INSIGHT_WINDOW
+            submit_condition_tree = None
+
             error = False
             if not final_name: st.error("O nome da regra é obrigatório."); error = True
-            if submit_primary_value_final is None : st.error("O valor da 1ª condição é obrigatório."); error = True
+            if final_use_tree:
+                try:
+                    submit_condition_tree = validate_condition(parse_condition(st.session_state.get('rule_form_condition_tree', '')))
+                except ValueError as e:
+                    st.error(f"Condição inválida: {e}"); error = True
+            elif submit_primary_value_final is None : st.error("O valor da 1ª condição é obrigatório."); error = True
             if final_is_composite and submit_secondary_value_final is None: st.error("O valor da 2ª condição é obrigatório."); error = True
             if final_action_type == "custom_budget_multiplier" and submit_action_value_final is None: st.error("O valor multiplicador é obrigatório."); error = True
             if final_execution_mode == 'automatic' and final_interval_hours is None: st.error("Selecione um intervalo para execução automática."); error = True
@@ -1835,6 +1301,14 @@ def show_rule_form():
                 sv_submit = float(submit_secondary_value_final) if final_is_composite and submit_secondary_value_final is not None else None
                 av_submit = float(submit_action_value_final) if final_action_type == "custom_budget_multiplier" and submit_action_value_final is not None else None
                 interval_submit = final_interval_hours
+                if not final_use_tree and {final_primary_window, final_secondary_window} != {DEFAULT_INSIGHT_WINDOW}:
+                    # Janela diferente da padrão só existe na árvore de condição: a regra é salva como expressão
+                    submit_condition_tree = _leaf(final_primary_metric, final_primary_operator, pv_submit, final_primary_window)
+                    if final_is_composite:
+                        submit_condition_tree = {final_join_operator.lower(): [
+                            submit_condition_tree,
+                            _leaf(final_secondary_metric, final_secondary_operator, sv_submit, final_secondary_window),
+                        ]}
 
                 print(f"DEBUG [Gerenciador]: Submit-> add_rule. Modo='{final_execution_mode}', Intervalo={interval_submit}, M1='{final_primary_metric}', V1={pv_submit}")
                 add_rule_success = add_rule(
@@ -1844,7 +1318,7 @@ def show_rule_form():
                     secondary_metric=final_secondary_metric if final_is_composite else None,
                     secondary_operator=final_secondary_operator, secondary_value=sv_submit,
                     join_operator=final_join_operator, execution_mode=final_execution_mode,
-                    execution_interval_hours=interval_submit
+                    execution_interval_hours=interval_submit, condition_tree=submit_condition_tree
                 )
                 print(f"DEBUG [Gerenciador]: add_rule retornou: {add_rule_success}")
 
@@ -1867,28 +1341,31 @@ def format_rule_text(rule):
     """Formata a descrição de uma regra para exibição."""
     if not isinstance(rule, dict): return "Regra inválida"
 
-    METRIC_OPTIONS = { "cpa": "CPA", "purchases": "Compras", "roas": "ROAS", "spend": "Gasto", "clicks": "Cliques", "ctr": "CTR", "cpc": "CPC" }
+    METRIC_OPTIONS = { "cpa": "CPA", "purchases": "Compras", "roas": "ROAS", "spend": "Gasto", "clicks": "Cliques", "ctr": "CTR", "cpc": "CPC", **DERIVED_METRIC_OPTIONS }
     OPERATOR_SYMBOLS = { "<": "<", "<=": "<=", ">": ">", ">=": ">=", "==": "==" }
     ACTION_TEXT = { "duplicate_budget": "duplicar orçamento", "triple_budget": "triplicar orçamento", "pause_campaign": "pausar campanha", "activate_campaign": "ativar campanha", "halve_budget": "reduzir orçamento pela metade", "custom_budget_multiplier": "multiplicar orçamento por" }
 
     try:
         rule_text = "SE "
-        metric1 = rule.get('primary_metric')
+        if rule.get('condition_tree'):
+            condition = rule_condition(rule)
+            rule_text += format_condition(condition, METRIC_OPTIONS, _format_metric_value) if condition else "[Condição inválida]"
+        metric1 = None if rule.get('condition_tree') else rule.get('primary_metric')
         op1 = rule.get('primary_operator')
         val1 = rule.get('primary_value')
         if None not in [metric1, op1, val1]:
-            is_float_m1 = metric1 in ['cpa', 'roas', 'cpc', 'ctr', 'spend']
+            is_float_m1 = metric1 in FLOAT_METRICS
             val1_fmt = f"{float(val1):.2f}" if is_float_m1 else str(int(float(val1)))
             rule_text += f"{METRIC_OPTIONS.get(metric1, '?')} {OPERATOR_SYMBOLS.get(op1, '?')} {val1_fmt}"
-        else: rule_text += "[Condição 1 inválida]"
+        elif not rule.get('condition_tree'): rule_text += "[Condição 1 inválida]"
 
-        if rule.get('is_composite'):
+        if rule.get('is_composite') and not rule.get('condition_tree'):
             join_op = rule.get('join_operator', 'AND')
             metric2 = rule.get('secondary_metric')
             op2 = rule.get('secondary_operator')
             val2 = rule.get('secondary_value')
             if None not in [metric2, op2, val2]:
-                is_float_m2 = metric2 in ['cpa', 'roas', 'cpc', 'ctr', 'spend']
+                is_float_m2 = metric2 in FLOAT_METRICS
                 val2_fmt = f"{float(val2):.2f}" if is_float_m2 else str(int(float(val2)))
                 rule_text += f" **{join_op}** {METRIC_OPTIONS.get(metric2, '?')} {OPERATOR_SYMBOLS.get(op2, '?')} {val2_fmt}"
             else: rule_text += f" **{join_op}** [Condição 2 inválida]"
@@ -1912,6 +1389,188 @@ def format_rule_text(rule):
 # ==============================================================================
 # Função Principal da Página (ADAPTADA PARA POSTGRESQL)
 # ==============================================================================
+# --- Backtest de regras sobre os insights diários guardados ---
+@st.cache_data(ttl=600, show_spinner=False)
+def get_daily_insights_cached(since, until):
+    """
+    Insights diários do período (sincronizados pelo worker): do cubo em disco
+    (memory-map) nas partições conta × mês que existem, e da tabela
+    campaign_daily_insights no que faltar.
+    """
+    account_ids = [config["account_id"] for config in get_all_api_configs() if config.get("account_id")]
+    return load_daily_frame(since, until, account_ids,
+                            lambda first, last, accounts: load_daily_insights(db_connection, first, last, accounts))
+
+def show_rules_backtest(rules):
+    """Reexecuta regras sobre o histórico diário para ver como teriam se comportado (ver facebook/backtest.py)."""
+    with st.expander("📈 Backtest de regras"):
+        st.caption("Reexecuta as regras dia a dia sobre os insights diários guardados no banco, sem aplicar nenhuma ação. "
+                   "Os dados são sincronizados pelo worker (`python worker.py --sync-insights 90`).")
+        rules_by_id = {r['id']: r for r in rules if r.get('id') is not None}
+        if not rules_by_id:
+            st.info("Nenhuma regra para testar.")
+            return
+
+        col_rules, col_days = st.columns([3, 1])
+        with col_rules:
+            selected_ids = st.multiselect("Regras", options=list(rules_by_id), key="backtest_rules",
+                                          default=[rid for rid, r in rules_by_id.items() if r.get('is_active')],
+                                          format_func=lambda rid: rules_by_id[rid].get('name', f"Regra {rid}"))
+        with col_days:
+            period_days = st.number_input("Período (dias)", min_value=BACKTEST_LOOKBACK_DAYS + 1, max_value=365, value=60, key="backtest_days")
+        if not st.button("Executar backtest", key="backtest_run", disabled=not selected_ids):
+            return
+
+        until = date.today() - timedelta(days=1)
+        since = until - timedelta(days=int(period_days) - 1)
+        try:
+            daily_df = get_daily_insights_cached(since, until)
+        except Exception as e:
+            st.error(f"Erro ao carregar os insights diários: {e}")
+            return
+        if daily_df.empty:
+            st.info("Nenhum insight diário guardado para o período. Rode a sincronização do worker primeiro.")
+            return
+
+        result = backtest_rules(daily_df, [rules_by_id[rid] for rid in selected_ids])
+        totals = result["totals"]
+        st.caption(f"{result['campaigns']} campanhas × {result['days']} dias avaliados "
+                   f"(janela de {BACKTEST_LOOKBACK_DAYS} dias) em {result['runtime_s'] * 1000:.0f} ms.")
+        col_real, col_sim, col_delta = st.columns(3)
+        col_real.metric("Gasto real", f"R$ {totals['real_spend']:,.2f}")
+        col_sim.metric("Gasto simulado", f"R$ {totals['simulated_spend']:,.2f}")
+        col_delta.metric("Variação", f"R$ {totals['spend_delta']:,.2f}")
+        st.dataframe(result["summary"], hide_index=True, use_container_width=True, column_config={
+            "Variação de gasto sozinha (R$)": st.column_config.NumberColumn(format="R$ %.2f"),
+        })
+        st.line_chart(result["timeline"][["Gasto real (R$)", "Gasto simulado (R$)"]])
+
+
+# --- Simulação de todas as regras (matriz campanhas × regras) ---
+def show_portfolio_simulation(campaigns, rules):
+    """Simula todas as regras ativas em todas as campanhas carregadas (ver facebook/simulacao.py)."""
+    with st.expander("🧪 Simular todas as regras"):
+        if not st.toggle("Calcular simulação", key="portfolio_simulation_toggle",
+                         help="Avalia todas as regras ativas contra todas as campanhas carregadas, sem aplicar nenhuma ação."):
+            return
+        start = time.perf_counter()
+        matrix, summary = simulate_portfolio(campaigns, rules)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if summary.empty:
+            st.info("Nenhuma regra ativa com condições válidas para simular.")
+            return
+
+        st.caption(f"{len(matrix)} campanhas × {len(summary)} regras simuladas em {elapsed_ms:.0f} ms. Nenhuma ação foi aplicada.")
+        st.dataframe(summary, hide_index=True, use_container_width=True, column_config={
+            "Orçamento diário atual (R$)": st.column_config.NumberColumn(format="R$ %.2f"),
+            "Variação projetada (R$/dia)": st.column_config.NumberColumn(format="R$ %.2f"),
+            "Orçamento diário projetado (R$)": st.column_config.NumberColumn(format="R$ %.2f"),
+        })
+
+        rule_columns = list(summary["Regra"])
+        only_matched = st.checkbox("Mostrar só campanhas atingidas por alguma regra", value=True, key="portfolio_simulation_only_matched")
+        if only_matched:
+            matrix = matrix[matrix[rule_columns].any(axis=1)]
+        st.dataframe(matrix, hide_index=True, use_container_width=True)
+
+
+# --- Ações em massa (campanhas selecionadas) ---
+def _selection_key(campaign):
+    """Chave do checkbox de seleção da campanha (única também no modo "Todas as contas")."""
+    return f"sel_{campaign.get('config_id', 'conta')}_{campaign.get('id')}"
+
+def run_bulk_action(selected_campaigns, action, rule, configs_by_id, default_config):
+    """
+    Executa pausar/ativar/aplicar regra nas campanhas selecionadas, em lotes da Graph API
+    por conta, grava todos os logs num único INSERT e guarda o resultado por campanha
+    em st.session_state["bulk_results"] para exibição após o rerun.
+    """
+    by_config = {}
+    for campaign in selected_campaigns:
+        cfg = configs_by_id.get(campaign.get("config_id")) or default_config
+        if not cfg:
+            continue
+        by_config.setdefault(cfg["id"], (cfg, []))[1].append(campaign)
+
+    log_rule_id = {"pause": -1, "activate": -2}.get(action, rule["id"] if rule else None)
+    result_rows, log_rows = [], []
+    start = time.perf_counter()
+    with st.spinner(f"Executando ação em {len(selected_campaigns)} campanhas..."):
+        for cfg, campaigns_cfg in by_config.values():
+            names = {c["id"]: c.get("name") for c in campaigns_cfg}
+            campaign_ids = list(names)
+            if init_facebook_api(cfg) is None:
+                outcomes = [{"campaign_id": cid, "success": False, "message": "Não foi possível inicializar a API do Facebook"}
+                            for cid in campaign_ids]
+            elif action == "pause":
+                outcomes = bulk_set_status(cfg, campaign_ids, PAUSED_STATUS)
+            elif action == "activate":
+                outcomes = bulk_set_status(cfg, campaign_ids, ACTIVE_STATUS)
+            else:
+                outcomes = bulk_apply_rule(cfg, campaign_ids, rule)
+
+            for outcome in outcomes:
+                cid = outcome["campaign_id"]
+                name = outcome.get("campaign_name") or names.get(cid) or f"Campanha ID {cid}"
+                result_rows.append({"Resultado": "✅" if outcome["success"] else "❌", "Campanha": name,
+                                    "ID": cid, "Conta": cfg.get("name"), "Mensagem": outcome["message"]})
+                log_rows.append((log_rule_id, cid, 'campaign', name, outcome["success"], outcome["message"]))
+    elapsed = time.perf_counter() - start
+
+    log_rule_executions(log_rows)
+    ok_count = sum(1 for row in result_rows if row["Resultado"] == "✅")
+    st.session_state["bulk_results"] = {
+        "rows": result_rows,
+        "summary": f"{ok_count} de {len(result_rows)} campanhas com sucesso em {elapsed:.1f}s",
+    }
+    for cfg, _ in by_config.values():
+        invalidate_campaigns_cache(cfg)
+    for campaign in selected_campaigns:
+        st.session_state[_selection_key(campaign)] = False
+    st.rerun()
+
+def show_bulk_actions_bar(campaigns, rules, configs_by_id, default_config):
+    """Barra de ações em massa sobre as campanhas marcadas na lista abaixo."""
+    bulk_results = st.session_state.get("bulk_results")
+    if bulk_results:
+        with st.expander(f"Resultado da ação em massa: {bulk_results['summary']}", expanded=True):
+            st.dataframe(pd.DataFrame(bulk_results["rows"]), hide_index=True, use_container_width=True)
+            if st.button("Fechar resultado", key="bulk_results_close"):
+                del st.session_state["bulk_results"]
+                st.rerun()
+
+    selected = [c for c in campaigns if st.session_state.get(_selection_key(c))]
+    active_rules = [r for r in rules if r.get('is_active')]
+
+    col_sel, col_pause, col_activate, col_rule, col_apply = st.columns([1.8, 1, 1, 2, 1.2])
+    with col_sel:
+        st.markdown(f"**{len(selected)} selecionada(s)**")
+        col_all, col_none = st.columns(2)
+        if col_all.button("Todas", key="bulk_select_all", help="Seleciona todas as campanhas do filtro atual", use_container_width=True):
+            for campaign in campaigns:
+                st.session_state[_selection_key(campaign)] = True
+            st.rerun()
+        if col_none.button("Limpar", key="bulk_select_none", use_container_width=True):
+            for campaign in campaigns:
+                st.session_state[_selection_key(campaign)] = False
+            st.rerun()
+    with col_pause:
+        if st.button("⏸️ Pausar", key="bulk_pause", disabled=not selected, use_container_width=True, help="Pausar as campanhas selecionadas"):
+            run_bulk_action(selected, "pause", None, configs_by_id, default_config)
+    with col_activate:
+        if st.button("▶️ Ativar", key="bulk_activate", disabled=not selected, use_container_width=True, help="Ativar as campanhas selecionadas"):
+            run_bulk_action(selected, "activate", None, configs_by_id, default_config)
+    with col_rule:
+        rules_by_id = {r['id']: r for r in active_rules}
+        bulk_rule_id = st.selectbox("Regra", options=list(rules_by_id), key="bulk_rule",
+                                    format_func=lambda rid: rules_by_id[rid].get('name', f"Regra {rid}"),
+                                    label_visibility="collapsed", placeholder="Nenhuma regra ativa")
+    with col_apply:
+        if st.button("Aplicar regra", key="bulk_apply_rule", disabled=not selected or bulk_rule_id is None,
+                     use_container_width=True, help="Aplicar a regra escolhida às campanhas selecionadas"):
+            run_bulk_action(selected, "apply_rule", rules_by_id[bulk_rule_id], configs_by_id, default_config)
+
+
 def show_gerenciador_page():
     """Renderiza a página completa do Gerenciador de Anúncios."""
     print("DEBUG: Iniciando execução de show_gerenciador_page()")
@@ -1922,9 +1581,9 @@ def show_gerenciador_page():
     # Obter configurações (ativas e todas) - Assumindo que as funções existem e usam cache
     # As funções de cache (@st.cache_data) serão chamadas se o cache estiver vazio ou expirado
     print("DEBUG: Tentando obter configurações da API...")
-    active_config = get_active_api_config()
     all_configs = get_all_api_configs()
-    print(f"DEBUG: Config ativa: {active_config.get('id') if active_config else 'Nenhuma'}. Total de configs: {len(all_configs)}")
+    configs_by_id = {cfg['id']: cfg for cfg in all_configs}
+    print(f"DEBUG: Total de configs: {len(all_configs)}")
 
     # Extrair opções de filtro
     countries = sorted(list(set([cfg.get('country') for cfg in all_configs if cfg.get('country')])))
@@ -1964,20 +1623,24 @@ def show_gerenciador_page():
             for cfg in filtered_configs:
                 config_options[cfg['id']] = f"{cfg['name']} ({cfg['account_id']})"
             
-            active_config_id = active_config['id'] if active_config else None
-            
-            # Índice padrão
-            default_index = 0  # "Todas as contas"
-            if active_config_id in config_options:
-                try: 
-                    default_index = list(config_options.keys()).index(active_config_id)
-                except ValueError: 
-                    default_index = 0
-            
+            # A conta escolhida fica só na sessão deste usuário: trocar de conta não grava
+            # nada no banco nem limpa caches (os caches de campanhas são por conta).
+            if "pending_account_selection" in st.session_state:
+                # Pedido de outra seção (ex.: "Tornar padrão"), aplicado antes de criar o widget
+                st.session_state["account_selector"] = st.session_state.pop("pending_account_selection")
+            if "account_selector" not in st.session_state:
+                # Nova sessão: começa na conta marcada como padrão no banco (somente leitura)
+                default_config = get_active_api_config()
+                default_id = default_config['id'] if default_config else "all"
+                st.session_state["account_selector"] = default_id if default_id in config_options else "all"
+            elif st.session_state["account_selector"] not in config_options:
+                # Conta excluída ou fora dos filtros de país/responsável
+                st.session_state["account_selector"] = "all"
+
             selected_config_id = st.selectbox(
                 "", options=list(config_options.keys()),
                 format_func=lambda x: config_options.get(x, f"ID {x} Inválido"),
-                index=default_index, label_visibility="collapsed", key="account_selector"
+                label_visibility="collapsed", key="account_selector"
             )
 
             # Definir modo de visualização
@@ -1986,44 +1649,40 @@ def show_gerenciador_page():
                 st.session_state["filtered_configs"] = filtered_configs
             else:
                 st.session_state["view_all_accounts"] = False
-                # Ativar conta selecionada se diferente da atual
-                if selected_config_id != active_config_id:
-                    print(f"--- DETECTADA MUDANÇA DE CONTA ---")
-                    print(f"DEBUG: ID selecionado ({selected_config_id}) é diferente do ativo no cache ({active_config_id}).")
-                    print(f"DEBUG: Chamando set_active_api_config({selected_config_id})...")
-                    # Chama a função para atualizar o status 'is_active' no banco de dados
-                    if set_active_api_config(selected_config_id): # Usa a versão OTIMIZADA desta função
-                         st.toast(f"Conta '{config_options.get(selected_config_id, 'Selecionada')}' ativada!", icon="🔄")
-                         # Limpeza de cache ESSENCIAL após mudar a conta ativa
-                         print("DEBUG: set_active_api_config bem-sucedido. Limpando caches relevantes...")
-                         get_active_api_config.clear()
-                         get_all_api_configs.clear()
-                         if 'get_facebook_campaigns_cached' in globals(): get_facebook_campaigns_cached.clear()
-                         if 'get_campaign_insights_cached' in globals(): get_campaign_insights_cached.clear()
-                    else:
-                         st.error("Falha ao ativar a conta no banco de dados.")
-                         print(f"DEBUG: set_active_api_config({selected_config_id}) retornou False.")
-        elif not active_config and get_db_connection() is not None: # Se não há configs e DB está ok
+        elif db_available(): # Se não há configs e DB está ok
              st.info("Nenhuma conta configurada...")
-        elif get_db_connection() is None: # Se a conexão inicial falhou
+        elif not db_available(): # Se a conexão inicial falhou
              st.warning("⚠️ DB offline.")
 
+    # Conta selecionada nesta sessão (None no modo "Todas as contas")
+    active_config = None
+    if all_configs and not st.session_state.get("view_all_accounts", False):
+        active_config = configs_by_id.get(st.session_state.get("account_selector"))
+
     # Mensagem se não há conta ativa configurada
-    if not active_config and not st.session_state.get("view_all_accounts", False) and get_db_connection() is not None:
-        st.warning("⚠️ Nenhuma conta do Facebook Ads está ativa. Vá para a aba '🔧 Configurações' para adicionar ou ativar uma conta.")
+    if not active_config and not st.session_state.get("view_all_accounts", False) and db_available():
+        st.warning("⚠️ Nenhuma conta do Facebook Ads selecionada. Escolha uma conta acima ou vá para a aba '🔧 Configurações' para adicionar uma conta.")
         # Poderia parar aqui com st.stop() se quisesse impedir o resto da página de carregar sem conta ativa
         # st.stop()
 
-    # --- Interface principal com abas ---
+    # --- Interface principal com seções ---
     # Só mostra as abas se tivermos conexão com o DB e, idealmente, uma conta ativa
-    if get_db_connection() is not None: # Verifica se o DB está acessível
-        # Criando as abas
-        tabs = st.tabs(["📢 Campanhas", "⚙️ Regras", "🔧 Configurações"])
+    if db_available(): # Verifica se o DB está acessível
+        # Seletor de seção (substitui st.tabs): o Streamlit executa o corpo de TODAS as abas
+        # a cada run, então só a seção escolhida é executada e busca seus dados.
+        secoes = ["📢 Campanhas", "⚙️ Regras", "🔧 Configurações"]
+        secoes_url = {"campanhas": secoes[0], "regras": secoes[1], "configuracoes": secoes[2]}
+        if "gerenciador_secao" not in st.session_state:
+            # Permite abrir direto numa seção via ?secao=regras / ?secao=configuracoes
+            st.session_state["gerenciador_secao"] = secoes_url.get(st.query_params.get("secao", ""), secoes[0])
+        secao_atual = st.radio("Seção", secoes, key="gerenciador_secao", horizontal=True, label_visibility="collapsed")
+        st.query_params["secao"] = next(k for k, v in secoes_url.items() if v == secao_atual)
+        st.markdown("<hr style='margin: 0 0 1rem 0;'>", unsafe_allow_html=True)
 
         # ==========================
-        # Aba 1: Campanhas (e Histórico)
+        # Seção 1: Campanhas (e Histórico)
         # ==========================
-        with tabs[0]:
+        if secao_atual == secoes[0]:
             print("DEBUG: Entrando na Aba Campanhas")
             
             # Verificar se estamos no modo "Todas as contas"
@@ -2040,18 +1699,20 @@ def show_gerenciador_page():
                 if view_all_accounts and filtered_configs:
                     data_placeholder.info(f"🔄 Carregando dados de {len(filtered_configs)} contas...")
                     # Buscar campanhas de todas as contas filtradas
-                    campaigns = get_facebook_campaigns_for_multiple_accounts(filtered_configs)
+                    campaigns, campaign_snapshots = get_facebook_campaigns_for_multiple_accounts(filtered_configs)
                     data_placeholder.empty()
                     
                     if not campaigns:
                         st.warning("Nenhuma campanha encontrada nas contas selecionadas.")
                 else:
-                    # Código original para buscar campanhas da conta ativa
-                    account_id_para_buscar = active_config.get("account_id")
-                    data_placeholder.info(f"🔄 Carregando dados das campanhas da conta {account_id_para_buscar}...")
-                    campaigns = get_facebook_campaigns_cached(account_id_para_buscar)
+                    # Busca as campanhas da conta ativa
+                    data_placeholder.info(f"🔄 Carregando dados das campanhas da conta {active_config.get('account_id')}...")
+                    campaigns, campaign_snapshot = get_facebook_campaigns_cached(active_config)
+                    campaign_snapshots = [campaign_snapshot]
                     data_placeholder.empty()
 
+                show_campaigns_freshness(campaign_snapshots)
+
                 rules = get_all_rules_cached()
 
                 if campaigns is None:
@@ -2075,6 +1736,9 @@ def show_gerenciador_page():
                         else: count_text = f"<strong>Total: {total_campaigns}</strong> ({active_campaigns_count} Ativas, {inactive_campaigns_count} Inativas)"
                         st.markdown(f"<div style='padding-top: 28px;'>{count_text}</div>", unsafe_allow_html=True)
 
+                    # Simulação de todas as regras em todas as campanhas carregadas (antes do filtro de status)
+                    show_portfolio_simulation(campaigns, rules)
+
                     st.markdown("<hr style='margin: 0.5rem 0;'>", unsafe_allow_html=True)
 
                     # --- Filtragem ---
@@ -2086,6 +1750,16 @@ def show_gerenciador_page():
                     if not filtered_campaigns:
                         st.info(f"Nenhuma campanha encontrada com o status '{status_filter}'.")
                     else:
+                        # Ações em massa sobre as campanhas marcadas
+                        show_bulk_actions_bar(filtered_campaigns, rules, configs_by_id, active_config)
+                        st.markdown("<hr style='margin: 0.5rem 0;'>", unsafe_allow_html=True)
+
+                        # Métricas derivadas exibidas abaixo do nome (já calculadas na busca, ver _fetch_account_campaigns)
+                        extra_metrics = st.multiselect(
+                            "Métricas extras na lista:", options=list(DERIVED_METRIC_OPTIONS),
+                            format_func=lambda x: DERIVED_METRIC_OPTIONS[x], key="campaign_list_extra_metrics"
+                        )
+
                         # Se estamos no modo "Todas as contas", agrupar campanhas por conta
                         if st.session_state.get("view_all_accounts", False):
                             # Agrupar campanhas por account_id
@@ -2124,11 +1798,13 @@ def show_gerenciador_page():
 
                                     # Usar chaves únicas combinando account_id e campaign_id
                                     unique_prefix = f"{account_id}_{campaign_id}"
+                                    # Ações usam as credenciais da conta dona da campanha
+                                    campaign_config = configs_by_id.get(campaign.get("config_id"))
                                     
                                     cols = st.columns([3, 1.2, 0.8, 0.8, 0.8, 1.2, 2.5])
 
                                     # Col 0: Nome, ID e Orçamento
-                                    cols[0].markdown(f"**{campaign.get('name', 'N/A')}**")
+                                    cols[0].checkbox(f"**{campaign.get('name', 'N/A')}**", key=_selection_key(campaign))
                                     cols[0].caption(f"ID: `{campaign_id}`")
                                     
                                     budget_text = ""
@@ -2137,6 +1813,8 @@ def show_gerenciador_page():
                                     if daily_budget_cents > 0: budget_text = f"Diário: R$ {daily_budget_cents/100:.2f}"
                                     elif lifetime_budget_cents > 0: budget_text = f"Total: R$ {lifetime_budget_cents/100:.2f}"
                                     if budget_text: cols[0].caption(budget_text)
+                                    if extra_metrics:
+                                        cols[0].caption(" · ".join(f"{DERIVED_METRIC_OPTIONS[m]}: {format_metric(m, campaign['insights'].get(m))}" for m in extra_metrics))
 
                                     # Col 1: Status Efetivo
                                     effective_status = campaign.get("effective_status", campaign.get("status", "UNKNOWN"))
@@ -2171,12 +1849,11 @@ def show_gerenciador_page():
                                             if effective_status in ["ACTIVE", "LIMITED"]:
                                                 if st.button("⏸️ Pausar", key=f"pause_{unique_prefix}", type="secondary", use_container_width=True, help="Pausar esta campanha"):
                                                     try:
-                                                        Campaign(campaign_id).api_update(params={'status': Campaign.Status.paused})
+                                                        update_campaign_status(campaign_id, campaign_config, PAUSED_STATUS)
                                                         st.success("Campanha pausada!")
                                                         log_rule_execution(-1, campaign_id, 'campaign', campaign.get('name'), True, "Pausado manualmente via UI")
                                                         # Limpeza de cache após ação manual
-                                                        if 'get_facebook_campaigns_cached' in globals(): get_facebook_campaigns_cached.clear()
-                                                        if 'get_campaign_insights_cached' in globals(): get_campaign_insights_cached.clear()
+                                                        invalidate_campaigns_cache(campaign_config)
                                                         if 'get_rule_executions_cached' in globals(): get_rule_executions_cached.clear()
                                                         time.sleep(1.5)
                                                         st.rerun()
@@ -2186,12 +1863,11 @@ def show_gerenciador_page():
                                             elif effective_status == "PAUSED":
                                                 if st.button("▶️ Ativar", key=f"activate_{unique_prefix}", type="primary", use_container_width=True, help="Ativar esta campanha"):
                                                     try:
-                                                        Campaign(campaign_id).api_update(params={'status': Campaign.Status.active})
+                                                        update_campaign_status(campaign_id, campaign_config, ACTIVE_STATUS)
                                                         st.success("Campanha ativada!")
                                                         log_rule_execution(-2, campaign_id, 'campaign', campaign.get('name'), True, "Ativado manualmente via UI")
                                                         # Limpeza de cache após ação manual
-                                                        if 'get_facebook_campaigns_cached' in globals(): get_facebook_campaigns_cached.clear()
-                                                        if 'get_campaign_insights_cached' in globals(): get_campaign_insights_cached.clear()
+                                                        invalidate_campaigns_cache(campaign_config)
                                                         if 'get_rule_executions_cached' in globals(): get_rule_executions_cached.clear()
                                                         time.sleep(1.5)
                                                         st.rerun()
@@ -2236,13 +1912,12 @@ def show_gerenciador_page():
                                                                     use_container_width=True, type="secondary",
                                                                     disabled=not enable_apply_button):
                                                             st.info(f"Aplicando regra '{rule_name_sim}'...")
-                                                            success_exec, message_exec = execute_rule(campaign_id, rule_id_sim)
+                                                            success_exec, message_exec = execute_rule(campaign_id, rule_id_sim, campaign_config)
                                                             if success_exec:
                                                                 st.success(f"✅ {message_exec}")
                                                                 st.toast(f"Regra '{rule_name_sim}' aplicada!", icon="🎉")
                                                                 # Limpeza de cache após ação manual
-                                                                if 'get_facebook_campaigns_cached' in globals(): get_facebook_campaigns_cached.clear()
-                                                                if 'get_campaign_insights_cached' in globals(): get_campaign_insights_cached.clear()
+                                                                invalidate_campaigns_cache(campaign_config)
                                                                 if 'get_rule_executions_cached' in globals(): get_rule_executions_cached.clear()
                                                                 time.sleep(2)
                                                                 st.rerun()
@@ -2278,11 +1953,12 @@ def show_gerenciador_page():
                                 if not isinstance(campaign, dict): continue
                                 campaign_id = campaign.get('id')
                                 if not campaign_id: continue
+                                campaign_config = active_config
 
                                 cols = st.columns([3, 1.2, 0.8, 0.8, 0.8, 1.2, 2.5])
 
                                 # Col 0: Nome, ID e Orçamento
-                                cols[0].markdown(f"**{campaign.get('name', 'N/A')}**")
+                                cols[0].checkbox(f"**{campaign.get('name', 'N/A')}**", key=_selection_key(campaign))
                                 cols[0].caption(f"ID: `{campaign_id}`")
                                 
                                 budget_text = ""
@@ -2291,6 +1967,8 @@ def show_gerenciador_page():
                                 if daily_budget_cents > 0: budget_text = f"Diário: R$ {daily_budget_cents/100:.2f}"
                                 elif lifetime_budget_cents > 0: budget_text = f"Total: R$ {lifetime_budget_cents/100:.2f}"
                                 if budget_text: cols[0].caption(budget_text)
+                                if extra_metrics:
+                                    cols[0].caption(" · ".join(f"{DERIVED_METRIC_OPTIONS[m]}: {format_metric(m, campaign['insights'].get(m))}" for m in extra_metrics))
 
                                 # Col 1: Status Efetivo
                                 effective_status = campaign.get("effective_status", campaign.get("status", "UNKNOWN"))
@@ -2327,12 +2005,11 @@ def show_gerenciador_page():
                                         if effective_status in ["ACTIVE", "LIMITED"]:
                                             if st.button("⏸️ Pausar", key=f"pause_{campaign_id}", type="secondary", use_container_width=True, help="Pausar esta campanha"):
                                                 try:
-                                                    Campaign(campaign_id).api_update(params={'status': Campaign.Status.paused})
+                                                    update_campaign_status(campaign_id, campaign_config, PAUSED_STATUS)
                                                     st.success("Campanha pausada!")
                                                     log_rule_execution(-1, campaign_id, 'campaign', campaign.get('name'), True, "Pausado manualmente via UI")
                                                     # Limpeza de cache após ação manual
-                                                    if 'get_facebook_campaigns_cached' in globals(): get_facebook_campaigns_cached.clear()
-                                                    if 'get_campaign_insights_cached' in globals(): get_campaign_insights_cached.clear()
+                                                    invalidate_campaigns_cache(campaign_config)
                                                     if 'get_rule_executions_cached' in globals(): get_rule_executions_cached.clear()
                                                     time.sleep(1.5)
                                                     st.rerun()
@@ -2342,12 +2019,11 @@ def show_gerenciador_page():
                                         elif effective_status == "PAUSED":
                                             if st.button("▶️ Ativar", key=f"activate_{campaign_id}", type="primary", use_container_width=True, help="Ativar esta campanha"):
                                                 try:
-                                                    Campaign(campaign_id).api_update(params={'status': Campaign.Status.active})
+                                                    update_campaign_status(campaign_id, campaign_config, ACTIVE_STATUS)
                                                     st.success("Campanha ativada!")
                                                     log_rule_execution(-2, campaign_id, 'campaign', campaign.get('name'), True, "Ativado manualmente via UI")
                                                     # Limpeza de cache após ação manual
-                                                    if 'get_facebook_campaigns_cached' in globals(): get_facebook_campaigns_cached.clear()
-                                                    if 'get_campaign_insights_cached' in globals(): get_campaign_insights_cached.clear()
+                                                    invalidate_campaigns_cache(campaign_config)
                                                     if 'get_rule_executions_cached' in globals(): get_rule_executions_cached.clear()
                                                     time.sleep(1.5)
                                                     st.rerun()
@@ -2391,13 +2067,12 @@ def show_gerenciador_page():
                                                                 use_container_width=True, type="secondary",
                                                                 disabled=not enable_apply_button):
                                                         st.info(f"Aplicando regra '{rule_name_sim}'...")
-                                                        success_exec, message_exec = execute_rule(campaign_id, rule_id_sim)
+                                                        success_exec, message_exec = execute_rule(campaign_id, rule_id_sim, campaign_config)
                                                         if success_exec:
                                                             st.success(f"✅ {message_exec}")
                                                             st.toast(f"Regra '{rule_name_sim}' aplicada!", icon="🎉")
                                                             # Limpeza de cache após ação manual
-                                                            if 'get_facebook_campaigns_cached' in globals(): get_facebook_campaigns_cached.clear()
-                                                            if 'get_campaign_insights_cached' in globals(): get_campaign_insights_cached.clear()
+                                                            invalidate_campaigns_cache(campaign_config)
                                                             if 'get_rule_executions_cached' in globals(): get_rule_executions_cached.clear()
                                                             time.sleep(2)
                                                             st.rerun()
@@ -2418,78 +2093,71 @@ def show_gerenciador_page():
                     st.markdown("---")
                     st.markdown("##### Histórico de Execuções Recentes")
 
-                    col_date1_hist, col_date2_hist, col_info_hist = st.columns([1, 1, 2])
+                    col_date1_hist, col_date2_hist, col_size_hist, col_info_hist = st.columns([1, 1, 0.8, 1.7])
                     with col_date1_hist:
                         start_date_filter = st.date_input("Data Início", value=date.today() - timedelta(days=7), key="exec_start_date") # Default 7 dias atrás
                     with col_date2_hist:
                         end_date_filter = st.date_input("Data Fim", value=date.today(), key="exec_end_date") # Default hoje
+                    with col_size_hist:
+                        page_size_hist = st.selectbox("Por página", [HISTORY_PAGE_SIZE, 100, 200], key="exec_page_size")
 
                     executions = []
+                    hist_cursors = [None]
+                    next_cursor_hist = None
                     if start_date_filter and end_date_filter:
                         if start_date_filter > end_date_filter:
                             with col_info_hist:
                                 st.markdown("<div style='height: 30px;'></div>", unsafe_allow_html=True)
                                 st.warning("Data de início não pode ser maior que a data fim.")
                         else:
-                            print(f"DEBUG: Buscando histórico de {start_date_filter} a {end_date_filter}")
-                            executions = get_rule_executions_by_date(start_date_filter, end_date_filter)
+                            # Pilha de cursores: a posição i guarda o cursor que abre a página i.
+                            # Reinicia quando o período ou o tamanho da página mudam.
+                            hist_filter_key = (start_date_filter, end_date_filter, page_size_hist)
+                            if st.session_state.get("exec_hist_filter") != hist_filter_key:
+                                st.session_state["exec_hist_filter"] = hist_filter_key
+                                st.session_state["exec_hist_cursors"] = [None]
+                            hist_cursors = st.session_state["exec_hist_cursors"]
+                            hist_page_number = len(hist_cursors)
+
+                            print(f"DEBUG: Buscando histórico de {start_date_filter} a {end_date_filter} (página {hist_page_number})")
+                            executions, next_cursor_hist = get_rule_executions_page(
+                                start_date_filter, end_date_filter, page_size=page_size_hist, cursor=hist_cursors[-1]
+                            )
                             with col_info_hist:
                                 st.markdown("<div style='height: 30px;'></div>", unsafe_allow_html=True)
-                                if start_date_filter == end_date_filter: st.caption(f"Exibindo {len(executions)} execuções de {start_date_filter.strftime('%d/%m/%Y')}.")
-                                else: st.caption(f"Exibindo {len(executions)} execuções de {start_date_filter.strftime('%d/%m/%Y')} a {end_date_filter.strftime('%d/%m/%Y')}.")
+                                if start_date_filter == end_date_filter: periodo_hist = start_date_filter.strftime('%d/%m/%Y')
+                                else: periodo_hist = f"{start_date_filter.strftime('%d/%m/%Y')} a {end_date_filter.strftime('%d/%m/%Y')}"
+                                st.caption(f"Página {hist_page_number}: {len(executions)} execuções de {periodo_hist}.")
 
                     if executions:
-                        exec_df_data = []
-                        try:
-                            brazil_tz = pytz.timezone('America/Sao_Paulo')
-                        except pytz.UnknownTimeZoneError:
-                            st.error("Erro: Fuso horário 'America/Sao_Paulo' não reconhecido.")
-                            brazil_tz = None
-
-                        for ex in executions:
-                             if not isinstance(ex, dict): continue
-                             executed_at_ts = ex.get("executed_at")
-                             local_time_str = "N/A"
-
-                             if isinstance(executed_at_ts, datetime) and brazil_tz:
-                                try:
-                                    if executed_at_ts.tzinfo is None: utc_time = pytz.utc.localize(executed_at_ts)
-                                    else: utc_time = executed_at_ts.astimezone(pytz.utc)
-                                    local_time = utc_time.astimezone(brazil_tz)
-                                    local_time_str = local_time.strftime('%d/%m/%Y %H:%M:%S')
-                                except Exception as tz_err:
-                                     try: local_time_str = executed_at_ts.strftime('%d/%m/%Y %H:%M:%S') + " (UTC?)"
-                                     except: pass
-
-                             exec_df_data.append({
-                                  "Status": "✅ Sucesso" if ex.get("was_successful") else "❌ Falha",
-                                  "Regra": ex.get("rule_name", "N/A"),
-                                  "Alvo": f"{ex.get('ad_object_type', '').capitalize()}: {ex.get('ad_object_name', 'N/A')[:30]}...",
-                                  "Mensagem": ex.get("message", "")[:50] + ('...' if len(ex.get('message', '')) > 50 else ''),
-                                  "Horário (BRT)": local_time_str
-                             })
-
-                        if exec_df_data:
-                            exec_df = pd.DataFrame(exec_df_data)
-                            # Ordenação (opcional, mas boa prática)
-                            try:
-                                exec_df['Horário_DT_Local'] = pd.to_datetime(exec_df['Horário (BRT)'], format='%d/%m/%Y %H:%M:%S', errors='coerce')
-                                exec_df = exec_df.sort_values(by='Horário_DT_Local', ascending=False).drop(columns=['Horário_DT_Local'])
-                            except Exception: pass # Ignora erro na ordenação
-                            st.dataframe(exec_df, use_container_width=True, hide_index=True, height=350,
-                                         column_config={"Horário (BRT)": st.column_config.TextColumn("Horário (BRT)")})
-                        else:
-                            st.info("Nenhuma execução válida encontrada para processar no período.")
+                        # Conversão de fuso, ordenação e truncamento vetorizados (ver facebook/historico.py)
+                        exec_df = build_history_dataframe(executions)
+                        st.dataframe(exec_df, use_container_width=True, hide_index=True, height=350,
+                                     column_config={HISTORY_TIME_COLUMN: st.column_config.DatetimeColumn(HISTORY_TIME_COLUMN, format="DD/MM/YYYY HH:mm:ss")})
                     elif start_date_filter and end_date_filter and start_date_filter <= end_date_filter:
                          st.info(f"Nenhuma execução de regra encontrada entre {start_date_filter.strftime('%d/%m/%Y')} e {end_date_filter.strftime('%d/%m/%Y')}.")
                     elif not (start_date_filter and end_date_filter):
                          st.info("Selecione as datas de início e fim para ver o histórico.")
 
+                    # --- Navegação entre páginas do histórico ---
+                    if executions and (next_cursor_hist is not None or len(hist_cursors) > 1):
+                        col_prev_hist, col_page_hist, col_next_hist = st.columns([1, 2, 1])
+                        with col_prev_hist:
+                            if st.button("◀ Anterior", key="exec_prev_page", disabled=len(hist_cursors) <= 1, use_container_width=True):
+                                hist_cursors.pop()
+                                st.rerun()
+                        with col_page_hist:
+                            st.markdown(f"<div style='text-align: center; padding-top: 8px;'><small>Página {len(hist_cursors)}</small></div>", unsafe_allow_html=True)
+                        with col_next_hist:
+                            if st.button("Próxima ▶", key="exec_next_page", disabled=next_cursor_hist is None, use_container_width=True):
+                                hist_cursors.append(next_cursor_hist)
+                                st.rerun()
+
 
         # ==========================
-        # Aba 2: Regras
+        # Seção 2: Regras
         # ==========================
-        with tabs[1]:
+        elif secao_atual == secoes[1]:
             print("DEBUG: Entrando na Aba Regras")
             # (Seu código original da aba de regras aqui)
             # O código desta aba (criar, listar, ativar/desativar, excluir regras)
@@ -2555,10 +2223,13 @@ def show_gerenciador_page():
             else:
                 st.info("Nenhuma regra criada ainda. Clique em '➕ Nova Regra' para começar.")
 
+            if rules_list_tab2:
+                show_rules_backtest(rules_list_tab2)
+
         # ==========================
-        # Aba 3: Configurações
+        # Seção 3: Configurações
         # ==========================
-        with tabs[2]:
+        elif secao_atual == secoes[2]:
             print("DEBUG: Entrando na Aba Configurações")
             # (Seu código original da aba de configurações aqui)
             # O código desta aba (adicionar, listar, ativar, excluir contas)
@@ -2635,7 +2306,7 @@ def show_gerenciador_page():
                         col_details, col_actions_cfg = st.columns([4, 1])
                         with col_details:
                             # Detalhes da conta (nome, IDs, token)
-                            active_badge = '<span class="success-badge">Ativa</span>' if is_currently_active else ''
+                            active_badge = '<span class="success-badge">Padrão</span>' if is_currently_active else ''
                             st.markdown(f"**{config_name}** {active_badge}", unsafe_allow_html=True)
                             st.caption(f"Account ID: `{config.get('account_id', 'N/A')}` | App ID: `{config.get('app_id', 'N/A')}`")
                             
@@ -2659,18 +2330,17 @@ def show_gerenciador_page():
                             if config.get('page_id'): st.caption(f"Page ID: `{config['page_id']}`")
 
                         with col_actions_cfg:
-                            # Botão Ativar
+                            # Botão Tornar padrão: única ação que grava a conta ativa no banco
                             if not is_currently_active:
-                                if st.button("✅ Ativar", key=f"activate_cfg_{config_id}", use_container_width=True):
-                                    # Chamada a set_active_api_config JÁ limpa os caches necessários
-                                    # e o rerun está no bloco principal do selectbox
-                                    if set_active_api_config(config_id): # Chama a função otimizada
-                                        st.toast(f"Conta '{config_name}' ativada!", icon="✅")
-                                        # Limpeza de Cache e Rerun são feitos pela lógica do Selectbox agora
-                                        # Apenas garantir que a página recarregue para refletir visualmente
-                                        time.sleep(0.1) # Pequena pausa pode ajudar visualmente
-                                        st.rerun() # Adicionado RERUN aqui também para forçar atualização da UI
-                                    else: st.error("Falha ao ativar a conta.")
+                                if st.button("⭐ Tornar padrão", key=f"activate_cfg_{config_id}", use_container_width=True,
+                                             help="Conta aberta por padrão em novas sessões. Também seleciona a conta nesta sessão."):
+                                    if set_active_api_config(config_id):
+                                        st.toast(f"Conta '{config_name}' definida como padrão!", icon="✅")
+                                        get_active_api_config.clear()
+                                        get_all_api_configs.clear()
+                                        st.session_state["pending_account_selection"] = config_id
+                                        st.rerun()
+                                    else: st.error("Falha ao definir a conta padrão.")
                             else: st.write("") # Espaço vazio
 
                             # Botão Excluir
@@ -2679,13 +2349,30 @@ def show_gerenciador_page():
                                      st.toast(f"Conta '{config_name}' excluída!", icon="🗑️")
                                      if 'get_all_api_configs' in globals(): get_all_api_configs.clear()
                                      if 'get_active_api_config' in globals(): get_active_api_config.clear()
-                                     if is_currently_active and 'get_facebook_campaigns_cached' in globals(): get_facebook_campaigns_cached.clear()
+                                     invalidate_campaigns_cache(config)
                                      time.sleep(1)
                                      st.rerun() # Rerun EXPLÍCITO necessário aqui
                                  else: st.error("Falha ao excluir a conta.")
             elif not st.session_state.get('show_add_config_form', False):
                 st.info("Nenhuma conta configurada. Clique em '➕ Adicionar Conta'.")
 
+            # --- Métricas do pool de conexões ---
+            pool_stats = get_pool_stats()
+            if pool_stats:
+                with st.expander("Banco de dados: uso do pool de conexões"):
+                    col_p1, col_p2, col_p3, col_p4 = st.columns(4)
+                    col_p1.metric("Em uso", f"{pool_stats['in_use']}/{pool_stats['max_conn']}")
+                    col_p2.metric("Pico", pool_stats['peak_in_use'])
+                    col_p3.metric("Espera média", f"{pool_stats['wait_avg_ms']:.1f} ms")
+                    col_p4.metric("Timeouts", pool_stats['timeouts'])
+                    st.caption(f"Banco: {pool_stats['conn_type']} | Checkouts: {pool_stats['checkouts']} | "
+                               f"Espera máx.: {pool_stats['wait_max_s'] * 1000:.0f} ms | Conexões descartadas: {pool_stats['discarded']}")
+                    shared_cache = get_shared_graph_cache()
+                    if shared_cache:
+                        cache_stats = shared_cache.stats()
+                        st.caption(f"Cache compartilhado da Graph API ({cache_stats['backend']}): {cache_stats['hits']} acertos, "
+                                   f"{cache_stats['misses']} buscas na API, {cache_stats['errors']} falhas do cache")
+
     else:
          # Mensagem se a conexão com o DB falhou inicialmente
          st.error("🔴 **Falha na conexão com o Banco de Dados.** Verifique as variáveis de ambiente e o status do serviço.")
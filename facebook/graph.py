@@ -0,0 +1,308 @@
+"""
+Busca de campanhas e insights na Graph API sem dependência do Streamlit.
+
+As funções recebem a configuração da conta e criam uma instância própria de
+FacebookAdsApi (em vez de usar a instância global de FacebookAdsApi.init), então
+podem rodar em threads em segundo plano sem que uma conta "vaze" para a outra.
+Erros são levantados como exceção; quem chama decide como exibi-los.
+
+As chamadas brutas (campanhas e insights) passam opcionalmente pelo cache
+compartilhado entre réplicas e worker (`shared_cache`, ver cache_compartilhado.py).
+
+Condições de regra podem usar outras janelas além de "last_7d" (INSIGHT_WINDOWS).
+Toda janela é pedida com o período explícito (window_range), nunca com
+date_preset: a chave de cache diz exatamente quais dias a resposta cobre, seja
+ela de uma busca de uma janela só ou da chamada única com `time_ranges` que
+traz todas as janelas de um ciclo (só as que faltam no cache vão para a API).
+"Hoje" é a data no fuso da conta de anúncios (timezone_name, como a API faz
+com date_preset), não a do servidor (UTC no Heroku): à noite no Brasil,
+"ontem" pelo relógio do servidor seria o dia atual, ainda incompleto.
+
+O SDK facebook_business só é importado na primeira chamada que fala com a
+Graph API: páginas que servem a lista de campanhas do cache abrem sem pagar
+a importação do SDK inteiro.
+"""
+import os
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+GRAPH_API_VERSION = 'v22.0'
+
+CAMPAIGN_FIELDS = [
+    'id', 'name', 'status', 'objective', 'created_time',
+    'start_time', 'stop_time', 'daily_budget', 'lifetime_budget',
+    'effective_status', 'buying_type', 'budget_remaining'
+]
+
+INSIGHT_FIELDS = [
+    'campaign_id', 'campaign_name', 'spend', 'impressions', 'reach', 'clicks',
+    'ctr', 'cpc', 'actions', 'cost_per_action_type', 'purchase_roas'
+]
+
+# Janelas de métricas: os últimos N dias até ontem, como os date_preset da API
+INSIGHT_WINDOW_DAYS = {'yesterday': 1, 'last_3d': 3, 'last_7d': 7, 'last_14d': 14, 'last_30d': 30}
+INSIGHT_WINDOWS = {
+    'yesterday': "Ontem", 'last_3d': "Últimos 3 dias", 'last_7d': "Últimos 7 dias",
+    'last_14d': "Últimos 14 dias", 'last_30d': "Últimos 30 dias",
+}
+# Janela dos insights da lista de campanhas e das condições sem janela própria
+DEFAULT_INSIGHT_WINDOW = 'last_7d'
+
+# Fuso usado quando não é possível ler o timezone_name da conta
+ACCOUNT_TIMEZONE_DEFAULT = os.getenv("ACCOUNT_TIMEZONE_DEFAULT", "America/Sao_Paulo")
+# account_id -> timezone_name (lido uma vez por conta e processo)
+_account_timezones = {}
+
+INSIGHTS_DEFAULT = {
+    "cpa": 0.0, "purchases": 0, "roas": 0.0, "purchase_value": 0.0,
+    "spend": 0.0, "clicks": 0, "impressions": 0, "reach": 0, "add_to_cart": 0,
+    "ctr": 0.0, "cpc": 0.0
+}
+
+
+def validate_api_config(config):
+    """Levanta ValueError com a mensagem para o usuário se a configuração não puder ser usada."""
+    if not all([config.get("app_id"), config.get("app_secret"), config.get("access_token"), config.get("account_id")]):
+        raise ValueError("Configuração ativa está incompleta (faltam App ID, Secret, Token ou Account ID). Verifique na aba 'Configurações'.")
+    expires_date = config.get('token_expires_at')
+    if isinstance(expires_date, date) and expires_date < date.today():
+        raise ValueError(f"O Token de Acesso para a conta '{config.get('name')}' expirou em {expires_date.strftime('%d/%m/%Y')}. Atualize-o na aba 'Configurações'.")
+
+
+def make_api(config, api_version=GRAPH_API_VERSION):
+    """Cria uma instância de FacebookAdsApi só para esta conta (não altera a instância padrão)."""
+    from facebook_business.api import FacebookAdsApi, FacebookSession
+    session = FacebookSession(config["app_id"], config["app_secret"], config["access_token"])
+    return FacebookAdsApi(session, api_version=api_version)
+
+
+def process_insight(insight_dict):
+    """Extrai compras, adições ao carrinho, valor de compra, CPA e ROAS de um insight exportado (dict)."""
+    purchases = 0
+    add_to_cart = 0
+    purchase_value = 0.0
+    # Extrai ações de compra e valor
+    for action in insight_dict.get('actions') or []:
+        if action.get('action_type') == 'purchase':
+            purchases = int(action.get('value', 0))
+        if action.get('action_type') == 'add_to_cart':
+            add_to_cart = int(action.get('value', 0))
+        # Tenta pegar valor de compra (pode variar nome da action)
+        if action.get('action_type') in ['offsite_conversion.fb_pixel_purchase', 'purchase', 'omni_purchase']:
+            action_values = action.get('action_values')
+            if isinstance(action_values, list) and len(action_values) > 0:
+                purchase_value += float(action_values[0].get('value', 0.0))
+            else:
+                purchase_value += float(action.get('value', 0.0))
+
+    # Extrai CPA de compra
+    cpa = 0.0
+    for cost_action in insight_dict.get('cost_per_action_type') or []:
+        if cost_action.get('action_type') == 'purchase':
+            cpa = float(cost_action.get('value', 0.0))
+            break
+
+    # Extrai ROAS
+    roas = 0.0
+    roas_list = insight_dict.get('purchase_roas')
+    if roas_list and isinstance(roas_list, list):
+        roas = float(roas_list[0].get('value', 0.0))
+
+    insight_dict['purchases'] = purchases
+    insight_dict['add_to_cart'] = add_to_cart
+    insight_dict['cpa'] = cpa
+    insight_dict['roas'] = roas
+    insight_dict['purchase_value'] = purchase_value
+    return insight_dict
+
+
+def _cached_call(shared_cache, account_id, endpoint, fields, params, fetch_func):
+    """Passa a chamada pelo cache compartilhado (facebook/cache_compartilhado.py), se houver."""
+    if shared_cache is None:
+        return fetch_func()
+    return shared_cache.get_or_fetch(account_id, endpoint, fields, params, fetch_func)
+
+
+def insights_params(campaign_ids, time_range='last_7d', today=None):
+    """Parâmetros da consulta de insights por campanha para a janela (período explícito, ver window_range)."""
+    params = {
+        'level': 'campaign',
+        # IDs ordenados: a mesma lista gera a mesma chave de cache no app e no worker
+        'filtering': [{'field': 'campaign.id', 'operator': 'IN', 'value': sorted(campaign_ids)}],
+        'breakdowns': []
+    }
+    # Define o período de tempo
+    if time_range not in INSIGHT_WINDOW_DAYS:
+        time_range = DEFAULT_INSIGHT_WINDOW
+    params['time_range'] = window_range(time_range, today)
+    return params
+
+
+def account_today(account, account_id):
+    """Data de hoje no fuso da conta de anúncios (timezone_name, buscado uma vez por conta)."""
+    tz_name = _account_timezones.get(str(account_id))
+    if tz_name is None:
+        try:
+            tz_name = account.api_get(fields=['timezone_name']).get('timezone_name') or ACCOUNT_TIMEZONE_DEFAULT
+            _account_timezones[str(account_id)] = tz_name
+        except Exception as e:
+            print(f"AVISO [Graph]: Fuso da conta {account_id} não obtido ({e}); usando {ACCOUNT_TIMEZONE_DEFAULT}.")
+            tz_name = ACCOUNT_TIMEZONE_DEFAULT
+    try:
+        return datetime.now(ZoneInfo(tz_name)).date()
+    except Exception as e:
+        print(f"AVISO [Graph]: Fuso '{tz_name}' inválido ({e}); usando {ACCOUNT_TIMEZONE_DEFAULT}.")
+        return datetime.now(ZoneInfo(ACCOUNT_TIMEZONE_DEFAULT)).date()
+
+
+def window_range(window, today=None):
+    """Período {'since', 'until'} da janela: os últimos N dias até ontem."""
+    until = (today or date.today()) - timedelta(days=1)
+    since = until - timedelta(days=INSIGHT_WINDOW_DAYS[window] - 1)
+    return {'since': since.strftime('%Y-%m-%d'), 'until': until.strftime('%Y-%m-%d')}
+
+
+def fetch_campaigns_raw(account, account_id, shared_cache=None):
+    """Lista as campanhas da conta (dicts exportados da Graph API, sem processamento)."""
+    params = {'limit': 500}
+    return _cached_call(
+        shared_cache, account_id, "campaigns", CAMPAIGN_FIELDS, params,
+        lambda: [campaign.export_all_data() for campaign in account.get_campaigns(fields=CAMPAIGN_FIELDS, params=params)]
+    )
+
+
+def fetch_insights_raw(account, account_id, campaign_ids, time_range='last_7d', shared_cache=None, today=None):
+    """
+    Busca os insights das campanhas (dicts exportados da Graph API, sem processamento).
+    `today` padrão: hoje no fuso da conta (account_today).
+    """
+    if not campaign_ids:
+        return []
+    params = insights_params(campaign_ids, time_range, today or account_today(account, account_id))
+    return _cached_call(
+        shared_cache, account_id, "insights", INSIGHT_FIELDS, params,
+        lambda: [insight.export_all_data() for insight in account.get_insights(params=params, fields=INSIGHT_FIELDS)]
+    )
+
+
+def fetch_insights_windows_raw(account, account_id, campaign_ids, windows, shared_cache=None, today=None):
+    """
+    Insights brutos das campanhas em várias janelas, com uma única chamada à API
+    (`time_ranges`) para as janelas que não estão no cache compartilhado.
+    `today` padrão: hoje no fuso da conta (account_today). Retorna {janela: [insights]}.
+    """
+    windows = list(dict.fromkeys(windows))
+    if not campaign_ids:
+        return {window: [] for window in windows}
+    # Um "hoje" só para todas as janelas: a chave de cache e o período pedido sempre coincidem
+    today = today or account_today(account, account_id)
+    window_params = {window: insights_params(campaign_ids, window, today) for window in windows}
+    by_window = {}
+    if shared_cache is not None:
+        for window in windows:
+            cached = shared_cache.get(account_id, "insights", INSIGHT_FIELDS, window_params[window])
+            if cached is not None:
+                by_window[window] = cached
+    missing = [window for window in windows if window not in by_window]
+    if len(missing) == 1:
+        params = window_params[missing[0]]
+        by_window[missing[0]] = [insight.export_all_data() for insight in account.get_insights(params=params, fields=INSIGHT_FIELDS)]
+    elif missing:
+        ranges = {window: window_params[window]['time_range'] for window in missing}
+        params = {key: value for key, value in window_params[missing[0]].items() if key != 'time_range'}
+        params['time_ranges'] = list(ranges.values())
+        window_by_range = {(time_range['since'], time_range['until']): window for window, time_range in ranges.items()}
+        by_window.update({window: [] for window in missing})
+        for insight in account.get_insights(params=params, fields=INSIGHT_FIELDS):
+            insight_dict = insight.export_all_data()
+            # Cada linha vem com o período (date_start/date_stop) da janela a que pertence
+            window = window_by_range.get((insight_dict.get('date_start'), insight_dict.get('date_stop')))
+            if window is not None:
+                by_window[window].append(insight_dict)
+    if shared_cache is not None:
+        for window in missing:
+            shared_cache.set(account_id, "insights", INSIGHT_FIELDS, window_params[window], by_window[window])
+    return by_window
+
+
+def fetch_campaign_insights(account, account_id, campaign_ids, time_range='last_7d', shared_cache=None):
+    """Busca e processa os insights de uma lista de campanhas de `account` (AdAccount)."""
+    raw = fetch_insights_raw(account, account_id, campaign_ids, time_range, shared_cache)
+    return [process_insight(insight) for insight in raw]
+
+
+def fetch_daily_insights(account, campaign_ids, since, until):
+    """
+    Insights por campanha e por dia (time_increment=1) entre `since` e `until` (date).
+    Retorna dicts com 'day' (AAAA-MM-DD) e as métricas já processadas.
+    """
+    if not campaign_ids:
+        return []
+    params = {
+        'level': 'campaign',
+        'filtering': [{'field': 'campaign.id', 'operator': 'IN', 'value': sorted(campaign_ids)}],
+        'time_range': {'since': since.strftime('%Y-%m-%d'), 'until': until.strftime('%Y-%m-%d')},
+        'time_increment': 1,
+        'limit': 500,
+    }
+    daily = []
+    for insight in account.get_insights(params=params, fields=INSIGHT_FIELDS):
+        insight_dict = process_insight(insight.export_all_data())
+        insight_dict['day'] = insight_dict.get('date_start')
+        daily.append(insight_dict)
+    return daily
+
+
+def fetch_account_campaigns(config, time_range='last_7d', shared_cache=None, windows=None):
+    """
+    Busca todas as campanhas da conta de `config` com os insights do período.
+
+    Retorna a lista de campanhas (dicts) no formato usado pelo Gerenciador:
+    orçamentos em centavos (int) e insights em campaign["insights"]. As
+    janelas extras de `windows` (usadas pelas condições das regras) vêm na
+    mesma chamada de insights, em campaign["insights_by_window"][janela].
+    """
+    from facebook_business.adobjects.adaccount import AdAccount
+    validate_api_config(config)
+    account_id = config["account_id"]
+    api = make_api(config)
+    account = AdAccount(f'act_{account_id}', api=api)
+
+    campaigns_raw = fetch_campaigns_raw(account, account_id, shared_cache)
+    campaign_ids = [campaign.get("id") for campaign in campaigns_raw if campaign.get("id")]
+    if not campaign_ids:
+        return []
+
+    extra_windows = [window for window in dict.fromkeys(windows or []) if window != time_range]
+    window_maps = {}
+    if extra_windows:
+        raw_by_window = fetch_insights_windows_raw(account, account_id, campaign_ids, [time_range] + extra_windows, shared_cache)
+        insights_data = [process_insight(insight) for insight in raw_by_window[time_range]]
+        window_maps = {
+            window: {insight.get("campaign_id"): process_insight(insight) for insight in raw_by_window[window] if insight.get("campaign_id")}
+            for window in extra_windows
+        }
+    else:
+        insights_data = fetch_campaign_insights(account, account_id, campaign_ids, time_range, shared_cache)
+    # Mapeia insights por ID de campanha para facilitar a busca
+    insights_map = {insight.get("campaign_id"): insight for insight in insights_data if insight.get("campaign_id")}
+
+    campaigns_result = []
+    for campaign_dict in campaigns_raw:
+        campaign_id = campaign_dict.get("id")
+        if not campaign_id:
+            continue
+        campaign_dict["insights"] = {**INSIGHTS_DEFAULT, **(insights_map.get(campaign_id) or {})}
+        if window_maps:
+            campaign_dict["insights_by_window"] = {
+                window: {**INSIGHTS_DEFAULT, **(window_map.get(campaign_id) or {})} for window, window_map in window_maps.items()
+            }
+
+        # Converte orçamento para inteiro (centavos)
+        daily_budget_str = campaign_dict.get('daily_budget')
+        lifetime_budget_str = campaign_dict.get('lifetime_budget')
+        campaign_dict['daily_budget'] = int(daily_budget_str) if daily_budget_str and daily_budget_str.isdigit() else 0
+        campaign_dict['lifetime_budget'] = int(lifetime_budget_str) if lifetime_budget_str and lifetime_budget_str.isdigit() else 0
+
+        campaigns_result.append(campaign_dict)
+    return campaigns_result
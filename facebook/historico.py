@@ -0,0 +1,45 @@
+"""
+Montagem da tabela do histórico de execuções de regras.
+
+Tudo é feito por coluna (vetorizado): conversão de fuso com tz_convert,
+ordenação no timestamp nativo e truncamento com operações de string do pandas,
+sem loop Python por linha.
+"""
+import numpy as np
+import pandas as pd
+
+BRAZIL_TZ = "America/Sao_Paulo"
+
+EXECUTION_COLUMNS = ["id", "rule_name", "rule_id", "ad_object_id", "ad_object_type",
+                     "ad_object_name", "executed_at", "was_successful", "message"]
+
+HISTORY_TIME_COLUMN = "Horário (BRT)"
+
+
+def build_history_dataframe(executions, tz=BRAZIL_TZ):
+    """
+    Converte execuções (dicts ou tuplas na ordem de EXECUTION_COLUMNS) na tabela exibida.
+
+    `executed_at` sem fuso é tratado como UTC (como o banco grava); valores com
+    fuso são convertidos. A coluna de horário continua sendo timestamp (com fuso
+    de `tz`), então a ordenação não depende de formatar e reparsear texto.
+    """
+    df = pd.DataFrame.from_records(executions, columns=EXECUTION_COLUMNS)
+    if df.empty:
+        return pd.DataFrame(columns=["Status", "Regra", "Alvo", "Mensagem", HISTORY_TIME_COLUMN])
+
+    executed_local = pd.to_datetime(df["executed_at"], errors="coerce", utc=True).dt.tz_convert(tz)
+
+    object_types = df["ad_object_type"].fillna("").astype(str).str.capitalize()
+    object_names = df["ad_object_name"].fillna("N/A").astype(str)
+    messages = df["message"].fillna("").astype(str)
+    successful = df["was_successful"].fillna(0).astype(bool).to_numpy()
+
+    table = pd.DataFrame({
+        "Status": np.where(successful, "✅ Sucesso", "❌ Falha"),
+        "Regra": df["rule_name"].fillna("N/A").astype(str),
+        "Alvo": object_types + ": " + object_names.str.slice(0, 30) + "...",
+        "Mensagem": messages.str.slice(0, 50) + np.where(messages.str.len().to_numpy() > 50, "...", ""),
+        HISTORY_TIME_COLUMN: executed_local,
+    })
+    return table.sort_values(HISTORY_TIME_COLUMN, ascending=False, kind="stable", na_position="last")
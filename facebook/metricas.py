@@ -0,0 +1,163 @@
+"""
+Métricas derivadas das métricas básicas da Graph API (CPM, frequência,
+custo por adição ao carrinho, lucro, uso do orçamento).
+
+Cada métrica é declarada em DERIVED_METRICS com as entradas e uma fórmula
+sobre colunas numpy (um valor por campanha, ou por campanha × dia), então o
+cálculo é feito de uma vez para todas as campanhas. Divisão por zero e
+entradas ausentes dão NaN: a métrica fica sem valor e nunca atende uma
+condição de regra.
+
+As entradas vêm de campaign["insights"] (ou de insights_by_window, em outra
+janela) e, para orçamento, da própria campanha (ver campaign_base_values). Sem dependência do Streamlit.
+"""
+import numpy as np
+
+from facebook.graph import DEFAULT_INSIGHT_WINDOW
+
+# Métricas vindas direto dos insights (já processados em graph.process_insight)
+INSIGHT_METRICS = [
+    'cpa', 'purchases', 'roas', 'spend', 'clicks', 'ctr', 'cpc',
+    'impressions', 'reach', 'add_to_cart', 'purchase_value',
+]
+# Métricas da campanha (centavos, como daily_budget/lifetime_budget)
+CAMPAIGN_METRICS = ['budget', 'budget_remaining']
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+# nome -> rótulo, tipo de valor (money/ratio/percent/count), entradas e fórmula.
+# Uma métrica pode usar outra derivada declarada antes dela.
+DERIVED_METRICS = {
+    'cpm': {
+        'label': "CPM", 'kind': 'money', 'inputs': ['spend', 'impressions'],
+        'compute': lambda spend, impressions: _ratio(spend * 1000, impressions),
+    },
+    'frequency': {
+        'label': "Frequência", 'kind': 'ratio', 'inputs': ['impressions', 'reach'],
+        'compute': lambda impressions, reach: _ratio(impressions, reach),
+    },
+    'cost_per_add_to_cart': {
+        'label': "Custo por Adição ao Carrinho", 'kind': 'money', 'inputs': ['spend', 'add_to_cart'],
+        'compute': lambda spend, add_to_cart: _ratio(spend, add_to_cart),
+    },
+    'profit': {
+        'label': "Lucro (Valor de Compra - Gasto)", 'kind': 'money', 'inputs': ['purchase_value', 'spend'],
+        'compute': lambda purchase_value, spend: purchase_value - spend,
+    },
+    'budget_utilization': {
+        'label': "Uso do Orçamento (%)", 'kind': 'percent', 'inputs': ['budget', 'budget_remaining'],
+        'compute': lambda budget, budget_remaining: _ratio((budget - budget_remaining) * 100, budget),
+    },
+}
+
+METRIC_KINDS = {
+    'cpa': 'money', 'purchases': 'count', 'roas': 'ratio', 'spend': 'money', 'clicks': 'count',
+    'ctr': 'percent', 'cpc': 'money', 'impressions': 'count', 'reach': 'count',
+    'add_to_cart': 'count', 'purchase_value': 'money', 'budget': 'money', 'budget_remaining': 'money',
+    **{name: spec['kind'] for name, spec in DERIVED_METRICS.items()},
+}
+
+
+def to_float_array(values):
+    """Array float com NaN no lugar de valores não numéricos (None, string vazia da API...)."""
+    try:
+        return np.asarray(values, dtype=float)
+    except (TypeError, ValueError):
+        converted = []
+        for value in values:
+            try:
+                converted.append(float(value))
+            except (TypeError, ValueError):
+                converted.append(np.nan)
+        return np.asarray(converted, dtype=float)
+
+
+def derived_metric(name, column):
+    """
+    Calcula a métrica derivada `name`; `column(métrica)` devolve a coluna de
+    uma entrada (ou None se não existir). Retorna None se faltar entrada.
+    """
+    spec = DERIVED_METRICS[name]
+    inputs = [column(metric) for metric in spec['inputs']]
+    if any(values is None for values in inputs):
+        return None
+    return spec['compute'](*(to_float_array(values) for values in inputs))
+
+
+def add_derived_metrics(columns, metrics=None):
+    """
+    Acrescenta as métricas derivadas (todas, ou só `metrics`) em `columns`
+    (dict de arrays ou DataFrame) e o devolve. Derivadas sem entrada ficam de fora.
+    """
+    for name in DERIVED_METRICS:
+        if metrics is not None and name not in metrics:
+            continue
+        values = derived_metric(name, lambda metric: columns[metric] if metric in columns else None)
+        if values is not None:
+            columns[name] = values
+    return columns
+
+
+def campaign_insights(campaign, window=None):
+    """
+    Insights da campanha na janela (campaign["insights"] para a padrão). Janela
+    não buscada dá {}: as métricas ficam sem valor e não atendem condições.
+    """
+    if window is None or window == DEFAULT_INSIGHT_WINDOW:
+        return campaign.get("insights") or {}
+    return (campaign.get("insights_by_window") or {}).get(window) or {}
+
+
+def campaign_base_values(campaign, window=None):
+    """Métricas básicas de uma campanha: insights da janela + orçamento vigente e restante (centavos)."""
+    insights = campaign_insights(campaign, window)
+    values = {metric: insights.get(metric) for metric in INSIGHT_METRICS}
+    daily_budget = campaign.get('daily_budget') or 0
+    lifetime_budget = campaign.get('lifetime_budget') or 0
+    values['budget'] = daily_budget if daily_budget > 0 else lifetime_budget
+    values['budget_remaining'] = campaign.get('budget_remaining')
+    return values
+
+
+def campaign_metric_columns(campaigns, window=None):
+    """Colunas {métrica: array} das métricas básicas na janela, uma posição por campanha."""
+    rows = [campaign_base_values(campaign, window) for campaign in campaigns]
+    return {metric: to_float_array([row[metric] for row in rows]) for metric in INSIGHT_METRICS + CAMPAIGN_METRICS}
+
+
+def attach_derived_metrics(campaigns):
+    """
+    Calcula as métricas derivadas para todas as campanhas de uma vez e grava
+    cada valor em campaign["insights"] (NaN vira None). Devolve `campaigns`.
+    Altera os dicts: chamar antes de compartilhá-los (ex.: antes de irem para
+    o cache de campanhas do app).
+    """
+    campaigns = [campaign for campaign in campaigns if isinstance(campaign, dict)]
+    if not campaigns:
+        return campaigns
+    derived = add_derived_metrics(campaign_metric_columns(campaigns))
+    for name in DERIVED_METRICS:
+        for campaign, value in zip(campaigns, derived[name].tolist()):
+            campaign.setdefault("insights", {})[name] = None if np.isnan(value) else value
+    return campaigns
+
+
+def format_metric(metric, value):
+    """Valor para exibição: "R$ 12.34", "1.85", "45.0%", "12" ou "-" sem valor."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return "-"
+    kind = METRIC_KINDS.get(metric, 'ratio')
+    value = float(value)
+    if metric in CAMPAIGN_METRICS:
+        value /= 100
+    if kind == 'money':
+        return f"R$ {value:.2f}"
+    if kind == 'percent':
+        return f"{value:.1f}%"
+    if kind == 'count':
+        return str(int(value))
+    return f"{value:.2f}"
@@ -0,0 +1,134 @@
+"""
+Migrações versionadas do schema do banco (PostgreSQL, com fallback SQLite).
+
+Cada migração é um módulo `mNNNN_descricao.py` deste pacote que define
+`upgrade(cursor, conn_type)`. As versões aplicadas ficam registradas na tabela
+`schema_version`, então cada script roda uma única vez por banco.
+
+As migrações são aplicadas no release (`python migrar.py`, fase `release` do
+Procfile) ou pelo primeiro processo que conseguir o lock; o app apenas confere
+a versão uma vez por processo.
+"""
+import importlib
+import pkgutil
+import re
+
+# Chave arbitrária (fixa) do pg_advisory_lock que serializa quem aplica migrações
+MIGRATION_LOCK_KEY = 720260027
+
+_MODULE_PATTERN = re.compile(r"^m(\d{4})_(\w+)$")
+
+
+def list_migrations():
+    """Retorna as migrações do pacote como [(versão, nome, módulo)] em ordem crescente."""
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = _MODULE_PATTERN.match(module_info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f"{__name__}.{module_info.name}")
+        migrations.append((int(match.group(1)), match.group(2), module))
+    migrations.sort(key=lambda item: item[0])
+    return migrations
+
+
+def latest_version():
+    """Versão mais recente disponível no código."""
+    migrations = list_migrations()
+    return migrations[-1][0] if migrations else 0
+
+
+def _ensure_version_table(cursor, conn_type):
+    if conn_type == "sqlite":
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY, name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY, name TEXT NOT NULL,
+                applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+
+def get_current_version(conn, conn_type):
+    """
+    Lê a versão aplicada no banco com uma única query.
+    Retorna 0 se a tabela `schema_version` ainda não existir.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        row = cursor.fetchone()
+        return int(row[0]) if row and row[0] is not None else 0
+    except Exception:
+        # Tabela inexistente: banco nunca migrado
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return 0
+    finally:
+        cursor.close()
+
+
+def apply_pending_migrations(conn, conn_type, log=print):
+    """
+    Aplica, em ordem, as migrações com versão maior que a registrada no banco.
+
+    No PostgreSQL, segura um advisory lock durante o processo para que apenas um
+    processo (release ou primeira instância) aplique as migrações; os demais
+    esperam o lock e, ao obtê-lo, encontram o schema já atualizado.
+    Cada migração é confirmada junto com o seu registro em `schema_version`.
+
+    Returns:
+        list: Versões aplicadas nesta chamada (vazia se já estava atualizado).
+    """
+    applied = []
+    cursor = conn.cursor()
+    try:
+        if conn_type == "postgres":
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        _ensure_version_table(cursor, conn_type)
+        conn.commit()
+
+        current = get_current_version(conn, conn_type)
+        for version, name, module in list_migrations():
+            if version <= current:
+                continue
+            log(f"Aplicando migração {version:04d} ({name}) em {conn_type}...")
+            try:
+                module.upgrade(cursor, conn_type)
+                placeholder = "?" if conn_type == "sqlite" else "%s"
+                cursor.execute(
+                    f"INSERT INTO schema_version (version, name) VALUES ({placeholder}, {placeholder})",
+                    (version, name)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(version)
+    finally:
+        if conn_type == "postgres":
+            try:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+                conn.commit()
+            except Exception as unlock_err:
+                log(f"Aviso: falha ao liberar lock de migração: {unlock_err}")
+        cursor.close()
+    return applied
+
+
+def ensure_schema(conn, conn_type, log=print):
+    """
+    Caminho rápido: uma query para comparar a versão do banco com a do código;
+    só entra no fluxo com lock se houver migração pendente.
+    """
+    if get_current_version(conn, conn_type) >= latest_version():
+        return []
+    return apply_pending_migrations(conn, conn_type, log=log)
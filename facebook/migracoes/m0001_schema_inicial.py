@@ -0,0 +1,110 @@
+"""
+Schema inicial: api_config, rules e rule_executions.
+
+Idempotente para bancos criados pelo antigo init_db(): as tabelas usam
+IF NOT EXISTS e as colunas adicionadas depois só são criadas se faltarem.
+"""
+
+
+def _add_missing_columns_sqlite(cursor, table, columns):
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {info[1] for info in cursor.fetchall()}
+    for col_name, col_type in columns.items():
+        if col_name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col_name} {col_type}")
+
+
+def _add_missing_columns_postgres(cursor, table, columns):
+    for col_name, col_type in columns.items():
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {col_name} {col_type}")
+
+
+def upgrade(cursor, conn_type):
+    if conn_type == "sqlite":
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS api_config (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, app_id TEXT NOT NULL,
+                app_secret TEXT NOT NULL, access_token TEXT NOT NULL, account_id TEXT NOT NULL,
+                business_id TEXT, page_id TEXT, is_active INTEGER DEFAULT 0,
+                country TEXT, account_manager TEXT,
+                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP, token_expires_at DATE
+            )
+        ''')
+        _add_missing_columns_sqlite(cursor, "api_config", {
+            "country": "TEXT", "account_manager": "TEXT", "token_expires_at": "DATE"
+        })
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL, description TEXT, condition_type TEXT NOT NULL,
+                is_composite INTEGER DEFAULT 0, primary_metric TEXT NOT NULL,
+                primary_operator TEXT NOT NULL, primary_value REAL NOT NULL,
+                secondary_metric TEXT, secondary_operator TEXT, secondary_value REAL,
+                join_operator TEXT DEFAULT 'AND', action_type TEXT NOT NULL, action_value REAL,
+                is_active INTEGER DEFAULT 1,
+                execution_mode TEXT DEFAULT 'manual',
+                execution_interval_hours INTEGER,
+                last_automatic_run_at TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        _add_missing_columns_sqlite(cursor, "rules", {
+            "execution_mode": "TEXT DEFAULT 'manual'",
+            "execution_interval_hours": "INTEGER",
+            "last_automatic_run_at": "TIMESTAMP"
+        })
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rule_executions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, rule_id INTEGER NOT NULL, ad_object_id TEXT NOT NULL,
+                ad_object_type TEXT NOT NULL, ad_object_name TEXT NOT NULL,
+                executed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, was_successful INTEGER DEFAULT 0, message TEXT,
+                FOREIGN KEY (rule_id) REFERENCES rules (id) ON DELETE CASCADE
+            )
+        ''')
+    else:  # PostgreSQL
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS api_config (
+                id SERIAL PRIMARY KEY, name TEXT NOT NULL, app_id TEXT NOT NULL,
+                app_secret TEXT NOT NULL, access_token TEXT NOT NULL, account_id TEXT NOT NULL,
+                business_id TEXT, page_id TEXT, is_active INTEGER DEFAULT 0,
+                country TEXT, account_manager TEXT,
+                last_updated TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP, token_expires_at DATE
+            )
+        ''')
+        _add_missing_columns_postgres(cursor, "api_config", {
+            "country": "TEXT", "account_manager": "TEXT", "token_expires_at": "DATE"
+        })
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rules (
+                id SERIAL PRIMARY KEY,
+                name TEXT NOT NULL, description TEXT, condition_type TEXT NOT NULL,
+                is_composite INTEGER DEFAULT 0, primary_metric TEXT NOT NULL,
+                primary_operator TEXT NOT NULL, primary_value REAL NOT NULL,
+                secondary_metric TEXT, secondary_operator TEXT, secondary_value REAL,
+                join_operator TEXT DEFAULT 'AND', action_type TEXT NOT NULL, action_value REAL,
+                is_active INTEGER DEFAULT 1,
+                execution_mode TEXT DEFAULT 'manual',
+                execution_interval_hours INTEGER,
+                last_automatic_run_at TIMESTAMP WITH TIME ZONE,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        _add_missing_columns_postgres(cursor, "rules", {
+            "execution_mode": "TEXT DEFAULT 'manual'",
+            "execution_interval_hours": "INTEGER",
+            "last_automatic_run_at": "TIMESTAMP WITH TIME ZONE"
+        })
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rule_executions (
+                id SERIAL PRIMARY KEY, rule_id INTEGER NOT NULL, ad_object_id TEXT NOT NULL,
+                ad_object_type TEXT NOT NULL, ad_object_name TEXT NOT NULL,
+                executed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP, was_successful INTEGER DEFAULT 0, message TEXT,
+                FOREIGN KEY (rule_id) REFERENCES rules (id) ON DELETE CASCADE
+            )
+        ''')
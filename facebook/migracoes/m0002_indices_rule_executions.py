@@ -0,0 +1,18 @@
+"""
+Índices de rule_executions.
+
+- (executed_at DESC, id DESC): atende o ORDER BY do histórico e a paginação
+  por cursor (keyset) sem ordenar a tabela inteira.
+- (rule_id): evita varredura sequencial no ON DELETE CASCADE ao excluir uma regra.
+"""
+
+
+def upgrade(cursor, conn_type):
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_rule_executions_executed_at_id
+        ON rule_executions (executed_at DESC, id DESC)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_rule_executions_rule_id
+        ON rule_executions (rule_id)
+    ''')
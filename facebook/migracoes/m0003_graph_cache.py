@@ -0,0 +1,24 @@
+"""
+Tabela graph_cache: cache de respostas da Graph API compartilhado entre as
+réplicas do app e o worker (ver facebook/cache_compartilhado.py).
+
+Horários em epoch (segundos, float) para comparar igual no PostgreSQL e no SQLite.
+"""
+
+
+def upgrade(cursor, conn_type):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS graph_cache (
+            cache_key TEXT PRIMARY KEY,
+            account_id TEXT,
+            endpoint TEXT,
+            payload TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            created_at DOUBLE PRECISION NOT NULL,
+            expires_at DOUBLE PRECISION NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_graph_cache_expires_at
+        ON graph_cache (expires_at)
+    ''')
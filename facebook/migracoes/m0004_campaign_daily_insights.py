@@ -0,0 +1,31 @@
+"""
+Tabela campaign_daily_insights: métricas diárias por campanha guardadas localmente,
+usadas pelo backtest de regras (facebook/backtest.py).
+
+Preenchida pelo worker (`python worker.py --sync-insights [dias]`). `daily_budget`
+(centavos) e `status` são os da campanha no momento da sincronização; os
+anteriores não são expostos pela Graph API.
+"""
+
+
+def upgrade(cursor, conn_type):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS campaign_daily_insights (
+            campaign_id TEXT NOT NULL,
+            day DATE NOT NULL,
+            account_id TEXT NOT NULL,
+            campaign_name TEXT,
+            spend DOUBLE PRECISION NOT NULL DEFAULT 0,
+            impressions INTEGER NOT NULL DEFAULT 0,
+            clicks INTEGER NOT NULL DEFAULT 0,
+            purchases INTEGER NOT NULL DEFAULT 0,
+            purchase_value DOUBLE PRECISION NOT NULL DEFAULT 0,
+            daily_budget INTEGER NOT NULL DEFAULT 0,
+            status TEXT,
+            PRIMARY KEY (campaign_id, day)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_campaign_daily_insights_day
+        ON campaign_daily_insights (day)
+    ''')
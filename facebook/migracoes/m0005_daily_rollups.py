@@ -0,0 +1,34 @@
+"""
+Tabelas de agregados diários do Dashboard (ver facebook/rollups.py).
+
+- daily_rollups: uma linha por dia × conta × regra. rule_id = 0 guarda as
+  métricas de entrega da conta (gasto, compras, valor de compra); as demais
+  linhas guardam as execuções da regra (disparos e falhas). País e gestor são
+  copiados de api_config para filtrar sem join.
+- rollup_watermarks: até onde cada fonte já foi agregada, para o worker
+  atualizar só o que mudou.
+"""
+
+
+def upgrade(cursor, conn_type):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_rollups (
+            day DATE NOT NULL,
+            account_id TEXT NOT NULL,
+            rule_id INTEGER NOT NULL,
+            country TEXT,
+            account_manager TEXT,
+            spend DOUBLE PRECISION NOT NULL DEFAULT 0,
+            purchases INTEGER NOT NULL DEFAULT 0,
+            purchase_value DOUBLE PRECISION NOT NULL DEFAULT 0,
+            activations INTEGER NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, account_id, rule_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_watermarks (
+            source TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''')
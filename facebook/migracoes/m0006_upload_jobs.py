@@ -0,0 +1,32 @@
+"""
+Checkpoints da subida em massa de campanhas (ver facebook/upload_massa.py).
+
+- upload_jobs: um job por arquivo × conta (id = sha256 do conteúdo + conta), com
+  status e o último relatório.
+- upload_job_objects: cada objeto já criado no Facebook (campanha, conjunto,
+  criativo, anúncio) com o ID devolvido, para retomar o job do ponto da falha
+  sem criar nada em duplicidade.
+"""
+
+
+def upgrade(cursor, conn_type):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS upload_jobs (
+            id TEXT PRIMARY KEY,
+            account_id TEXT NOT NULL,
+            filename TEXT,
+            status TEXT NOT NULL,
+            total_rows INTEGER NOT NULL DEFAULT 0,
+            report TEXT,
+            created_at DOUBLE PRECISION NOT NULL,
+            updated_at DOUBLE PRECISION NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS upload_job_objects (
+            job_id TEXT NOT NULL,
+            object_key TEXT NOT NULL,
+            object_id TEXT NOT NULL,
+            PRIMARY KEY (job_id, object_key)
+        )
+    ''')
@@ -0,0 +1,22 @@
+"""
+Tabela creative_assets: cache endereçado por conteúdo dos arquivos de criativo
+(ver facebook/criativos.py).
+
+sha256 dos bytes da imagem/vídeo + conta → hash da imagem (AdImage) ou ID do
+vídeo (AdVideo) no Facebook. O mesmo arquivo reutilizado em várias campanhas da
+mesma conta é enviado uma única vez.
+"""
+
+
+def upgrade(cursor, conn_type):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS creative_assets (
+            sha256 TEXT NOT NULL,
+            account_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            facebook_ref TEXT NOT NULL,
+            size_bytes BIGINT NOT NULL,
+            created_at DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (sha256, account_id)
+        )
+    ''')
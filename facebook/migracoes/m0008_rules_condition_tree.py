@@ -0,0 +1,17 @@
+"""
+Coluna rules.condition_tree: condição da regra como árvore E/OU/NÃO em JSON
+(ver facebook/condicoes.py).
+
+Regras com a coluna vazia continuam usando primary_*/secondary_*. Nas regras
+com árvore, condition_type = 'expression' e as colunas primary_* (NOT NULL)
+guardam a primeira comparação da árvore, só para exibição em versões antigas.
+"""
+
+
+def upgrade(cursor, conn_type):
+    if conn_type == "sqlite":
+        cursor.execute("PRAGMA table_info(rules)")
+        if "condition_tree" not in {info[1] for info in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE rules ADD COLUMN condition_tree TEXT")
+    else:
+        cursor.execute("ALTER TABLE rules ADD COLUMN IF NOT EXISTS condition_tree TEXT")
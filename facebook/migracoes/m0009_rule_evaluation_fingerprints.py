@@ -0,0 +1,18 @@
+"""
+Tabela rule_evaluation_fingerprints: última avaliação de cada par regra ×
+campanha pelo worker (ver facebook/mudancas.py). Pares com a mesma impressão
+digital no ciclo seguinte não são avaliados de novo.
+"""
+
+
+def upgrade(cursor, conn_type):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rule_evaluation_fingerprints (
+            rule_id INTEGER NOT NULL,
+            campaign_id TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            matched INTEGER NOT NULL DEFAULT 0,
+            evaluated_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (rule_id, campaign_id)
+        )
+    ''')
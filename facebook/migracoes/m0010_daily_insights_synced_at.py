@@ -0,0 +1,25 @@
+"""
+Coluna campaign_daily_insights.synced_at: quando a linha foi gravada pela
+última vez pelo worker (`--sync-insights`).
+
+Os agregados do Dashboard (facebook/rollups.py) usam a maior synced_at já
+agregada como marca d'água, então dias antigos gravados depois (ex.:
+`--sync-insights 90` ou conta nova) também são agregados. Linhas anteriores
+a esta migração ficam com NULL e entram no primeiro recálculo completo
+(a marca d'água antiga, por dia, é descartada).
+"""
+
+
+def upgrade(cursor, conn_type):
+    if conn_type == "sqlite":
+        cursor.execute("PRAGMA table_info(campaign_daily_insights)")
+        if "synced_at" not in {info[1] for info in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE campaign_daily_insights ADD COLUMN synced_at TIMESTAMP")
+    else:
+        cursor.execute("ALTER TABLE campaign_daily_insights ADD COLUMN IF NOT EXISTS synced_at TIMESTAMP")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_campaign_daily_insights_synced_at
+        ON campaign_daily_insights (synced_at)
+    ''')
+    # Marca d'água antiga (último dia agregado), substituída pela de synced_at
+    cursor.execute("DELETE FROM rollup_watermarks WHERE source = 'campaign_daily_insights'")
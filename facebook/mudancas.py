@@ -0,0 +1,133 @@
+"""
+Detecção de mudanças para as regras automáticas do worker.
+
+A cada ciclo, o worker calcula uma impressão digital (sha256) para cada par
+regra × campanha a partir de:
+  - a versão da regra: condição (árvore), ação e valor da ação;
+  - o estado da campanha: status e orçamentos;
+  - o orçamento restante, só quando a condição depende dele (budget_remaining,
+    budget_utilization): ele cai a cada centavo gasto e, sempre no hash, faria
+    toda campanha com entrega mudar a cada ciclo;
+  - as métricas da campanha nas janelas que a condição da regra usa.
+
+Os pares avaliados ficam em rule_evaluation_fingerprints. No ciclo seguinte,
+pares com a mesma impressão digital são pulados: nem avaliados, nem
+executados, nem registrados em rule_executions. Qualquer mudança nas métricas
+(inclusive a janela "últimos 7 dias" andando um dia), no orçamento/status
+(ex.: depois de uma ação) ou na regra faz o par ser avaliado de novo.
+
+Ações que falharam não gravam impressão digital, para serem tentadas de novo
+no ciclo seguinte. Sem dependência do Streamlit.
+"""
+import hashlib
+import json
+from datetime import datetime, timezone
+
+from facebook.condicoes import condition_metrics, condition_windows
+from facebook.metricas import DERIVED_METRICS, INSIGHT_METRICS, campaign_insights
+
+# Campos da campanha (fora dos insights) que mudam o resultado de qualquer regra
+CAMPAIGN_STATE_FIELDS = ['status', 'effective_status', 'daily_budget', 'lifetime_budget']
+# Campos que só entram no hash quando a condição usa uma métrica que depende deles
+VOLATILE_STATE_FIELDS = ['budget_remaining']
+
+
+def _digest(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _metric_inputs(metric):
+    """Métrica e, para as derivadas, todas as entradas (recursivamente)."""
+    inputs = {metric}
+    for name in DERIVED_METRICS.get(metric, {}).get('inputs', []):
+        inputs |= _metric_inputs(name)
+    return inputs
+
+
+def uses_volatile_state(condition):
+    """True se a condição depende de algum campo de VOLATILE_STATE_FIELDS."""
+    inputs = set().union(*(_metric_inputs(metric) for metric in condition_metrics(condition)))
+    return bool(inputs & set(VOLATILE_STATE_FIELDS))
+
+
+def rule_fingerprint(rule, condition):
+    """Versão da regra: muda se a condição, a ação ou o valor da ação mudarem."""
+    return _digest({
+        "condition": condition,
+        "action_type": rule.get('action_type'),
+        "action_value": rule.get('action_value'),
+    })
+
+
+class CampaignFingerprints:
+    """Impressões digitais do estado e das métricas por janela de uma campanha, calculadas sob demanda."""
+
+    def __init__(self, campaign):
+        self._campaign = campaign
+        self._parts = {}
+
+    def part(self, window=None):
+        """Estado da campanha (window=None), orçamento restante ("volatile") ou métricas da janela."""
+        if window not in self._parts:
+            if window is None:
+                data = {field: self._campaign.get(field) for field in CAMPAIGN_STATE_FIELDS}
+            elif window == "volatile":
+                data = {field: self._campaign.get(field) for field in VOLATILE_STATE_FIELDS}
+            else:
+                insights = campaign_insights(self._campaign, window)
+                data = {metric: insights.get(metric) for metric in INSIGHT_METRICS}
+            self._parts[window] = _digest(data)
+        return self._parts[window]
+
+    def for_rule(self, rule_fp, condition):
+        """Impressão digital do par (regra, campanha)."""
+        windows = sorted(condition_windows(condition))
+        state = [self.part(), self.part("volatile")] if uses_volatile_state(condition) else [self.part()]
+        return _digest([rule_fp] + state + [self.part(window) for window in windows])
+
+
+def load_fingerprints(connection_factory, rule_ids):
+    """{(rule_id, campaign_id): impressão digital} das últimas avaliações das regras."""
+    if not rule_ids:
+        return {}
+    with connection_factory() as conn_info:
+        if conn_info is None:
+            raise RuntimeError("banco indisponível")
+        conn, conn_type = conn_info
+        ph = "?" if conn_type == "sqlite" else "%s"
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f"SELECT rule_id, campaign_id, fingerprint FROM rule_evaluation_fingerprints "
+                f"WHERE rule_id IN ({', '.join([ph] * len(rule_ids))})",
+                tuple(rule_ids)
+            )
+            return {(int(rule_id), str(campaign_id)): fingerprint for rule_id, campaign_id, fingerprint in cursor.fetchall()}
+        finally:
+            cursor.close()
+
+
+def save_fingerprints(connection_factory, rows):
+    """Grava/atualiza (rule_id, campaign_id, impressão digital, atendeu) das avaliações do ciclo."""
+    if not rows:
+        return 0
+    evaluated_at = datetime.now(timezone.utc)
+    with connection_factory() as conn_info:
+        if conn_info is None:
+            raise RuntimeError("banco indisponível")
+        conn, conn_type = conn_info
+        ph = "?" if conn_type == "sqlite" else "%s"
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(f"""
+                INSERT INTO rule_evaluation_fingerprints (rule_id, campaign_id, fingerprint, matched, evaluated_at)
+                VALUES ({ph}, {ph}, {ph}, {ph}, {ph})
+                ON CONFLICT (rule_id, campaign_id) DO UPDATE SET
+                    fingerprint = EXCLUDED.fingerprint, matched = EXCLUDED.matched,
+                    evaluated_at = EXCLUDED.evaluated_at
+            """, [(int(rule_id), str(campaign_id), fingerprint, int(matched), evaluated_at)
+                  for rule_id, campaign_id, fingerprint, matched in rows])
+            conn.commit()
+            return len(rows)
+        finally:
+            cursor.close()
@@ -0,0 +1,105 @@
+"""
+Plano de ações por campanha para o worker: quando várias regras atendem a
+condição na mesma campanha no mesmo ciclo, as ações viram uma única alteração
+líquida, aplicada com uma leitura e no máximo uma escrita na API.
+
+Prioridade (não depende da ordem/id das regras):
+  1. Pausar vence tudo: ativação e mudanças de orçamento das outras regras são
+     descartadas (registradas como substituídas pela pausa).
+  2. Ativar combina com orçamento: status e orçamento vão na mesma escrita.
+  3. Orçamento: os fatores das regras (duplicar ×2, triplicar ×3, metade ×0,5,
+     personalizado) são multiplicados, o mesmo efeito de aplicá-las uma após a
+     outra; o resultado respeita MIN_BUDGET_CENTS. Fatores que se anulam
+     (ex.: duplicar + metade) não alteram o orçamento.
+
+Sem Streamlit e sem chamadas à API (ver facebook/regras.py).
+"""
+from facebook.regras import ACTIVE_STATUS, MIN_BUDGET_CENTS, PAUSED_STATUS, budget_multiplier
+
+STATUS_ACTIONS = {'pause_campaign': PAUSED_STATUS, 'activate_campaign': ACTIVE_STATUS}
+
+
+def _rule_label(rule):
+    return f"'{rule.get('name')}' (ID {rule['id']})"
+
+
+def plan_campaign_actions(rules):
+    """
+    Junta as ações das `rules` (regras que atenderam a condição na campanha).
+
+    Retorna o plano: {'status': PAUSED_STATUS/ACTIVE_STATUS/None,
+    'status_rules': [...], 'multiplier': fator líquido do orçamento ou None,
+    'budget_rules': [...], 'outcomes': {rule_id: (success, message)}} — em
+    'outcomes' ficam as regras já resolvidas no planejamento (substituídas ou
+    com ação inválida), que não entram na escrita.
+    """
+    plan = {'status': None, 'status_rules': [], 'multiplier': None, 'budget_rules': [], 'outcomes': {}}
+    pause_rules = [rule for rule in rules if rule.get('action_type') == 'pause_campaign']
+
+    for rule in rules:
+        action_type = rule.get('action_type')
+        if pause_rules and action_type != 'pause_campaign':
+            plan['outcomes'][rule['id']] = (True, f"Não aplicada: a pausa da regra {_rule_label(pause_rules[0])} tem prioridade")
+        elif action_type in STATUS_ACTIONS:
+            plan['status'] = STATUS_ACTIONS[action_type]
+            plan['status_rules'].append(rule)
+        elif action_type in ('duplicate_budget', 'triple_budget', 'halve_budget', 'custom_budget_multiplier'):
+            multiplier = budget_multiplier(rule)
+            if multiplier is None or multiplier <= 0:
+                plan['outcomes'][rule['id']] = (False, f"Multiplicador de orçamento inválido ({rule.get('action_value')}) na regra.")
+                continue
+            plan['multiplier'] = (plan['multiplier'] or 1.0) * multiplier
+            plan['budget_rules'].append(rule)
+        else:
+            plan['outcomes'][rule['id']] = (False, f"Tipo de ação desconhecido ou inválido: {action_type}")
+    return plan
+
+
+def compute_plan_action(plan, campaign_data):
+    """
+    Alteração líquida do plano na campanha, como compute_rule_action.
+
+    `campaign_data` precisa de 'status', 'daily_budget' e 'lifetime_budget' (centavos).
+    Retorna (action_params, outcomes): action_params é o dict para uma única
+    api_update (None se não há nada a alterar) e outcomes tem
+    {rule_id: (success, message)} para todas as regras do plano.
+    """
+    action_params = {}
+    outcomes = dict(plan['outcomes'])
+
+    if plan['status'] is not None:
+        current_status = campaign_data.get('status')
+        if plan['status'] == PAUSED_STATUS:
+            changed, message = current_status == ACTIVE_STATUS, "Campanha pausada" if current_status == ACTIVE_STATUS else "Campanha já não estava ativa"
+        else:
+            changed, message = current_status == PAUSED_STATUS, "Campanha ativada" if current_status == PAUSED_STATUS else "Campanha já não estava pausada"
+        if changed:
+            action_params['status'] = plan['status']
+        outcomes.update({rule['id']: (True, message) for rule in plan['status_rules']})
+
+    if plan['budget_rules']:
+        multiplier = plan['multiplier']
+        current_daily_budget = int(campaign_data.get('daily_budget') or 0)
+        current_lifetime_budget = int(campaign_data.get('lifetime_budget') or 0)
+        if current_daily_budget > 0:
+            field, current, label = 'daily_budget', current_daily_budget, "diário"
+        elif current_lifetime_budget > 0:
+            field, current, label = 'lifetime_budget', current_lifetime_budget, "total"
+        else:
+            field = None
+        if field is None:
+            success, message = False, "Nenhum orçamento encontrado para alterar"
+        elif abs(multiplier - 1.0) < 1e-9:
+            success, message = True, f"Ações de orçamento se anulam (×{multiplier:g}): orçamento {label} mantido em {current/100:.2f}"
+        else:
+            new_budget = max(MIN_BUDGET_CENTS, int(current * multiplier))
+            action_params[field] = new_budget
+            success, message = True, f"Orçamento {label} de {current/100:.2f} para {new_budget/100:.2f} (×{multiplier:g})"
+        outcomes.update({rule['id']: (success, message) for rule in plan['budget_rules']})
+
+    return action_params or None, outcomes
+
+
+def plan_rule_ids(plan):
+    """Ids das regras cujas ações entram na escrita do plano."""
+    return [rule['id'] for rule in plan['status_rules'] + plan['budget_rules']]
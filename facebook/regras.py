@@ -0,0 +1,84 @@
+"""
+Lógica pura das ações de regras (sem Streamlit e sem chamadas à API).
+
+Usada tanto pela execução de uma regra em uma campanha quanto pelas ações em
+massa, para que as duas calculem exatamente a mesma alteração.
+"""
+
+# Orçamento mínimo (centavos) ao reduzir/multiplicar orçamento
+MIN_BUDGET_CENTS = 100
+
+ACTIVE_STATUS = 'ACTIVE'
+PAUSED_STATUS = 'PAUSED'
+
+BUDGET_MULTIPLIERS = {'duplicate_budget': 2.0, 'triple_budget': 3.0, 'halve_budget': 0.5}
+
+
+def budget_multiplier(rule):
+    """Fator aplicado ao orçamento pela ação de `rule`, ou None se a ação não mexe no orçamento."""
+    action_type = rule.get('action_type')
+    if action_type == 'custom_budget_multiplier':
+        try:
+            return float(rule.get('action_value'))
+        except (TypeError, ValueError):
+            return None
+    return BUDGET_MULTIPLIERS.get(action_type)
+
+
+def compute_rule_action(rule, campaign_data):
+    """
+    Calcula a alteração que a ação de `rule` faz na campanha.
+
+    `campaign_data` precisa de 'status', 'daily_budget' e 'lifetime_budget' (centavos).
+    Retorna (action_params, message, success): action_params é o dict para
+    api_update, ou None quando não há nada a alterar; nesse caso `success` diz se
+    isso conta como sucesso (ex.: campanha já pausada) ou falha (sem orçamento).
+    """
+    current_daily_budget = int(campaign_data.get('daily_budget') or 0)
+    current_lifetime_budget = int(campaign_data.get('lifetime_budget') or 0)
+
+    action_type = rule['action_type']
+    action_value = rule.get('action_value')
+
+    if action_type in ('duplicate_budget', 'triple_budget'):
+        factor, verb = (2, "duplicado") if action_type == 'duplicate_budget' else (3, "triplicado")
+        if current_daily_budget > 0:
+            new_budget = current_daily_budget * factor
+            return {'daily_budget': new_budget}, f"Orçamento diário {verb} de {current_daily_budget/100:.2f} para {new_budget/100:.2f}", True
+        if current_lifetime_budget > 0:
+            new_budget = current_lifetime_budget * factor
+            return {'lifetime_budget': new_budget}, f"Orçamento total {verb} de {current_lifetime_budget/100:.2f} para {new_budget/100:.2f}", True
+        return None, f"Nenhum orçamento encontrado para {'duplicar' if factor == 2 else 'triplicar'}", False
+
+    if action_type == 'pause_campaign':
+        if campaign_data.get('status') == ACTIVE_STATUS:
+            return {'status': PAUSED_STATUS}, "Campanha pausada", True
+        return None, "Campanha já não estava ativa", True
+
+    if action_type == 'activate_campaign':
+        if campaign_data.get('status') == PAUSED_STATUS:
+            return {'status': ACTIVE_STATUS}, "Campanha ativada", True
+        return None, "Campanha já não estava pausada", True
+
+    if action_type == 'halve_budget':
+        if current_daily_budget > 0:
+            new_budget = max(MIN_BUDGET_CENTS, current_daily_budget // 2)
+            return {'daily_budget': new_budget}, f"Orçamento diário reduzido para {new_budget/100:.2f} (era {current_daily_budget/100:.2f})", True
+        if current_lifetime_budget > 0:
+            new_budget = max(MIN_BUDGET_CENTS, current_lifetime_budget // 2)
+            return {'lifetime_budget': new_budget}, f"Orçamento total reduzido para {new_budget/100:.2f} (era {current_lifetime_budget/100:.2f})", True
+        return None, "Nenhum orçamento encontrado para reduzir", False
+
+    if action_type == 'custom_budget_multiplier':
+        if action_value is None:
+            return None, "Multiplicador de orçamento personalizado não definido na regra", False
+        multiplier = float(action_value)
+        if current_daily_budget > 0:
+            new_budget = max(MIN_BUDGET_CENTS, int(current_daily_budget * multiplier))
+            return {'daily_budget': new_budget}, f"Orçamento diário multiplicado por {multiplier:.2f} para {new_budget/100:.2f} (era {current_daily_budget/100:.2f})", True
+        if current_lifetime_budget > 0:
+            new_budget = max(MIN_BUDGET_CENTS, int(current_lifetime_budget * multiplier))
+            return {'lifetime_budget': new_budget}, f"Orçamento total multiplicado por {multiplier:.2f} para {new_budget/100:.2f} (era {current_lifetime_budget/100:.2f})", True
+        return None, "Nenhum orçamento encontrado para multiplicar", False
+
+    return None, f"Tipo de ação desconhecido ou inválido: {action_type}", False
@@ -0,0 +1,194 @@
+"""
+Agregados diários do Dashboard (tabela daily_rollups), atualizados pelo worker.
+
+O Dashboard lê algumas centenas de linhas já agregadas por dia × conta × regra,
+em vez de varrer rule_executions e buscar insights na Graph API a cada visita.
+
+A atualização é incremental e idempotente. Cada fonte tem uma marca d'água em
+rollup_watermarks: o maior id de rule_executions e a maior synced_at de
+campaign_daily_insights já agregados. A cada rodada, os dias a partir da
+primeira novidade são recalculados por inteiro e substituídos. Como a marca
+é a hora da gravação (e não o dia), dias antigos sincronizados depois (ex.:
+`--sync-insights 90`, conta nova) e os dias recentes regravados com as
+conversões ajustadas pela Graph API entram no recálculo.
+
+As execuções são atribuídas à conta da campanha pelo campaign_daily_insights;
+campanhas que ainda não passaram pela sincronização ficam com conta "".
+Sem dependência do Streamlit.
+"""
+import pandas as pd
+
+ROLLUP_COLUMNS = [
+    "day", "account_id", "rule_id", "country", "account_manager",
+    "spend", "purchases", "purchase_value", "activations", "failures",
+]
+
+# rule_id das linhas com as métricas de entrega da conta
+INSIGHTS_RULE_ID = 0
+
+
+def _fetch_all(cursor, query, params=()):
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+
+def _get_watermark(cursor, ph, source):
+    rows = _fetch_all(cursor, f"SELECT value FROM rollup_watermarks WHERE source = {ph}", (source,))
+    return rows[0][0] if rows else None
+
+
+def _set_watermark(cursor, ph, source, value):
+    cursor.execute(f"""
+        INSERT INTO rollup_watermarks (source, value) VALUES ({ph}, {ph})
+        ON CONFLICT (source) DO UPDATE SET value = EXCLUDED.value
+    """, (source, str(value)))
+
+
+def _account_dimensions(cursor):
+    """{account_id: (país, gestor)} a partir de api_config."""
+    rows = _fetch_all(cursor, "SELECT account_id, country, account_manager FROM api_config")
+    return {str(account_id): (country, manager) for account_id, country, manager in rows}
+
+
+def _replace_rows(cursor, ph, rollup_df, since_day, insights):
+    """Substitui as linhas de daily_rollups a partir de `since_day` (só insights ou só regras)."""
+    rule_filter = f"rule_id = {INSIGHTS_RULE_ID}" if insights else f"rule_id <> {INSIGHTS_RULE_ID}"
+    cursor.execute(f"DELETE FROM daily_rollups WHERE day >= {ph} AND {rule_filter}", (since_day.isoformat(),))
+    if rollup_df.empty:
+        return 0
+    rows = [
+        (day.isoformat(), str(account_id), int(rule_id), country, manager,
+         float(spend), int(purchases), float(purchase_value), int(activations), int(failures))
+        for day, account_id, rule_id, country, manager, spend, purchases, purchase_value, activations, failures
+        in rollup_df[ROLLUP_COLUMNS].itertuples(index=False, name=None)
+    ]
+    cursor.executemany(
+        f"INSERT INTO daily_rollups ({', '.join(ROLLUP_COLUMNS)}) VALUES ({', '.join([ph] * len(ROLLUP_COLUMNS))})",
+        rows
+    )
+    return len(rows)
+
+
+def _with_dimensions(rollup_df, dimensions):
+    rollup_df["country"] = rollup_df["account_id"].map(lambda account_id: dimensions.get(account_id, (None, None))[0])
+    rollup_df["account_manager"] = rollup_df["account_id"].map(lambda account_id: dimensions.get(account_id, (None, None))[1])
+    return rollup_df
+
+
+def _refresh_insights(cursor, ph, dimensions):
+    """Recalcula as linhas de entrega (rule_id 0) a partir do dia mais antigo gravado desde a última rodada."""
+    watermark = _get_watermark(cursor, ph, "campaign_daily_insights_synced_at")
+    if watermark:
+        pending = _fetch_all(cursor, f"SELECT MIN(day), MAX(synced_at) FROM campaign_daily_insights WHERE synced_at > {ph}", (watermark,))
+    else:
+        # Primeira rodada com synced_at: recalcula tudo (inclui linhas antigas, com NULL)
+        pending = _fetch_all(cursor, "SELECT MIN(day), MAX(synced_at) FROM campaign_daily_insights")
+    first_day, max_synced_at = pending[0] if pending else (None, None)
+    if first_day is None:
+        return 0
+
+    since_day = pd.to_datetime(first_day).date()
+    rows = _fetch_all(cursor, f"""
+        SELECT day, account_id, SUM(spend), SUM(purchases), SUM(purchase_value)
+        FROM campaign_daily_insights WHERE day >= {ph}
+        GROUP BY day, account_id
+    """, (since_day.isoformat(),))
+    rollup_df = pd.DataFrame(rows, columns=["day", "account_id", "spend", "purchases", "purchase_value"])
+    rollup_df["day"] = pd.to_datetime(rollup_df["day"]).dt.date
+    rollup_df["account_id"] = rollup_df["account_id"].astype(str)
+    rollup_df["rule_id"] = INSIGHTS_RULE_ID
+    rollup_df["activations"] = 0
+    rollup_df["failures"] = 0
+    saved = _replace_rows(cursor, ph, _with_dimensions(rollup_df, dimensions), since_day, insights=True)
+    if max_synced_at is not None:
+        _set_watermark(cursor, ph, "campaign_daily_insights_synced_at", max_synced_at)
+    return saved
+
+
+def _refresh_rule_executions(cursor, ph, dimensions):
+    """Recalcula as linhas de regras a partir do dia da execução mais antiga ainda não agregada."""
+    watermark = int(_get_watermark(cursor, ph, "rule_executions") or 0)
+    pending = _fetch_all(cursor, f"SELECT MIN(executed_at), MAX(id) FROM rule_executions WHERE id > {ph}", (watermark,))
+    first_new, max_id = pending[0] if pending else (None, None)
+    if max_id is None:
+        return 0
+
+    since_day = pd.to_datetime(first_new, utc=True).date()
+    rows = _fetch_all(cursor, f"""
+        SELECT rule_id, ad_object_id, executed_at, was_successful
+        FROM rule_executions WHERE executed_at >= {ph}
+    """, (since_day.isoformat(),))
+    executions = pd.DataFrame(rows, columns=["rule_id", "ad_object_id", "executed_at", "was_successful"])
+    executions["day"] = pd.to_datetime(executions["executed_at"], utc=True).dt.date
+
+    campaign_ids = executions["ad_object_id"].astype(str).unique().tolist()
+    campaign_accounts = {}
+    # IN em blocos para não passar do limite de parâmetros do SQLite
+    for start in range(0, len(campaign_ids), 500):
+        chunk = campaign_ids[start:start + 500]
+        for campaign_id, account_id in _fetch_all(cursor, f"""
+            SELECT DISTINCT campaign_id, account_id FROM campaign_daily_insights
+            WHERE campaign_id IN ({', '.join([ph] * len(chunk))})
+        """, chunk):
+            campaign_accounts[str(campaign_id)] = str(account_id)
+    executions["account_id"] = executions["ad_object_id"].astype(str).map(campaign_accounts).fillna("")
+    executions["failed"] = executions["was_successful"].astype(int) == 0
+
+    rollup_df = executions.groupby(["day", "account_id", "rule_id"], as_index=False).agg(
+        activations=("failed", "size"), failures=("failed", "sum")
+    )
+    rollup_df["spend"] = 0.0
+    rollup_df["purchases"] = 0
+    rollup_df["purchase_value"] = 0.0
+    saved = _replace_rows(cursor, ph, _with_dimensions(rollup_df, dimensions), since_day, insights=False)
+    _set_watermark(cursor, ph, "rule_executions", max_id)
+    return saved
+
+
+def refresh_rollups(connection_factory, log=print):
+    """
+    Atualiza daily_rollups com o que mudou desde a última rodada.
+    `connection_factory` produz (conn, conn_type) ou None (db_connection / db_connection_worker).
+    Retorna {"insights": linhas, "rules": linhas}.
+    """
+    with connection_factory() as conn_info:
+        if conn_info is None:
+            raise RuntimeError("banco indisponível")
+        conn, conn_type = conn_info
+        ph = "?" if conn_type == "sqlite" else "%s"
+        cursor = conn.cursor()
+        try:
+            dimensions = _account_dimensions(cursor)
+            saved = {
+                "insights": _refresh_insights(cursor, ph, dimensions),
+                "rules": _refresh_rule_executions(cursor, ph, dimensions),
+            }
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    log(f"INFO [Rollups]: {saved['insights']} linhas de entrega e {saved['rules']} linhas de regras recalculadas.")
+    return saved
+
+
+def load_rollups(connection_factory, since, until):
+    """Linhas de daily_rollups entre `since` e `until` (date), com o nome da regra."""
+    with connection_factory() as conn_info:
+        if conn_info is None:
+            raise RuntimeError("banco indisponível")
+        conn, conn_type = conn_info
+        ph = "?" if conn_type == "sqlite" else "%s"
+        cursor = conn.cursor()
+        try:
+            rows = _fetch_all(cursor, f"""
+                SELECT {', '.join(f'dr.{column}' for column in ROLLUP_COLUMNS)}, r.name
+                FROM daily_rollups dr LEFT JOIN rules r ON r.id = dr.rule_id
+                WHERE dr.day >= {ph} AND dr.day <= {ph}
+            """, (since.isoformat(), until.isoformat()))
+        finally:
+            cursor.close()
+    rollup_df = pd.DataFrame(rows, columns=ROLLUP_COLUMNS + ["rule_name"])
+    rollup_df["day"] = pd.to_datetime(rollup_df["day"])
+    return rollup_df
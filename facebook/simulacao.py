@@ -0,0 +1,139 @@
+"""
+Simulação de todas as regras contra todas as campanhas carregadas, de uma vez.
+
+Em vez de chamar simulate_rule_application campanha por campanha, as métricas
+viram colunas de um DataFrame e a condição de cada regra (árvore E/OU/NÃO de
+condicoes.py) é avaliada de forma vetorizada (numpy) sobre a coluna inteira;
+comparações repetidas entre regras são calculadas uma vez só. O resultado é a matriz
+campanhas × regras e o impacto projetado de cada regra no orçamento diário.
+
+Segue as mesmas regras de simulate_rule_application (gerenciador.py): regras
+com condição primária incompleta são ignoradas, métricas não numéricas nunca
+atendem a condição e condição secundária incompleta anula um "AND".
+Sem dependência do Streamlit.
+"""
+import numpy as np
+import pandas as pd
+
+from facebook.condicoes import CONDITION_METRICS, ConditionEvaluator, rule_condition
+from facebook.metricas import CAMPAIGN_METRICS, INSIGHT_METRICS, add_derived_metrics, campaign_base_values
+from facebook.regras import ACTIVE_STATUS, MIN_BUDGET_CENTS, PAUSED_STATUS, budget_multiplier
+
+SIMULATION_METRICS = CONDITION_METRICS
+
+
+def campaigns_metrics_frame(campaigns, window=None):
+    """
+    Uma linha por campanha: identificação, status, orçamentos (centavos),
+    métricas básicas da janela e as derivadas de facebook/metricas.py
+    (calculadas por coluna).
+    """
+    rows = []
+    for campaign in campaigns:
+        if not isinstance(campaign, dict) or "insights" not in campaign:
+            continue
+        row = {
+            "id": campaign.get("id"),
+            "name": campaign.get("name", "N/A"),
+            "account_name": campaign.get("account_name", ""),
+            "status": campaign.get("status"),
+            "daily_budget": campaign.get("daily_budget") or 0,
+            "lifetime_budget": campaign.get("lifetime_budget") or 0,
+        }
+        row.update(campaign_base_values(campaign, window))
+        rows.append(row)
+
+    base_metrics = INSIGHT_METRICS + CAMPAIGN_METRICS
+    frame = pd.DataFrame(rows, columns=["id", "name", "account_name", "status", "daily_budget", "lifetime_budget"] + base_metrics)
+    # Valores que não são números (ex.: string vazia da API) viram NaN e nunca atendem a condição
+    for column in ["daily_budget", "lifetime_budget"] + base_metrics:
+        frame[column] = pd.to_numeric(frame[column], errors="coerce")
+    frame[["daily_budget", "lifetime_budget"]] = frame[["daily_budget", "lifetime_budget"]].fillna(0)
+    return add_derived_metrics(frame)
+
+
+def rule_match_mask(rule, frame, evaluator=None):
+    """
+    Campanhas de `frame` que atendem a condição de `rule` (árvore de
+    facebook/condicoes.py). Retorna None quando a regra é ignorada.
+    `evaluator` permite reaproveitar as comparações entre regras do mesmo frame.
+    """
+    condition = rule_condition(rule)
+    if condition is None:
+        return None
+    if evaluator is None:
+        evaluator = ConditionEvaluator(frame, size=len(frame))
+    return evaluator.mask(condition)
+
+
+def apply_budget_multiplier(rule, budgets, multiplier):
+    """Novos orçamentos (centavos) como em compute_rule_action; orçamento zero continua zero."""
+    new_budgets = np.floor(budgets * multiplier)
+    if rule.get('action_type') in ('halve_budget', 'custom_budget_multiplier'):
+        new_budgets = np.maximum(MIN_BUDGET_CENTS, new_budgets)
+    return np.where(budgets > 0, new_budgets, budgets)
+
+
+def projected_daily_budget_delta(rule, frame):
+    """
+    Variação do orçamento diário (centavos) por campanha se a ação de `rule` fosse aplicada.
+    Campanhas com orçamento total (lifetime) não entram na conta do orçamento diário.
+    """
+    daily = frame["daily_budget"].to_numpy(dtype=float)
+    action_type = rule.get('action_type')
+
+    multiplier = budget_multiplier(rule)
+    if multiplier is not None:
+        return apply_budget_multiplier(rule, daily, multiplier) - daily
+
+    status = frame["status"].to_numpy()
+    if action_type == 'pause_campaign':
+        return np.where(status == ACTIVE_STATUS, -daily, 0.0)
+    if action_type == 'activate_campaign':
+        return np.where(status == PAUSED_STATUS, daily, 0.0)
+    return np.zeros(len(frame))
+
+
+def simulate_portfolio(campaigns, rules):
+    """
+    Avalia todas as regras ativas contra todas as campanhas.
+
+    Retorna (matrix, summary):
+      - matrix: uma linha por campanha ("Campanha", "Conta", "ID") e uma coluna booleana por regra;
+      - summary: por regra, campanhas atingidas e orçamento diário atual/projetado (R$).
+    """
+    frame = campaigns_metrics_frame(campaigns)
+    matrix = pd.DataFrame({"Campanha": frame["name"], "Conta": frame["account_name"], "ID": frame["id"]})
+    summary_rows = []
+    # Condições com outra janela leem as mesmas campanhas em insights_by_window
+    evaluator = ConditionEvaluator(frame, size=len(frame),
+                                   window_columns=lambda window: campaigns_metrics_frame(campaigns, window))
+
+    for rule in rules:
+        if not isinstance(rule, dict) or not rule.get('is_active', 1):
+            continue
+        mask = rule_match_mask(rule, frame, evaluator)
+        if mask is None:
+            continue
+
+        column = rule.get('name') or f"Regra {rule.get('id')}"
+        if column in matrix.columns:
+            column = f"{column} (#{rule.get('id')})"
+        matrix[column] = mask
+
+        delta = projected_daily_budget_delta(rule, frame)[mask]
+        current_daily = frame["daily_budget"].to_numpy(dtype=float)[mask]
+        summary_rows.append({
+            "Regra": column,
+            "Ação": rule.get('action_type'),
+            "Campanhas atingidas": int(mask.sum()),
+            "Orçamento diário atual (R$)": current_daily.sum() / 100,
+            "Variação projetada (R$/dia)": delta.sum() / 100,
+            "Orçamento diário projetado (R$)": (current_daily.sum() + delta.sum()) / 100,
+        })
+
+    summary = pd.DataFrame(summary_rows, columns=[
+        "Regra", "Ação", "Campanhas atingidas", "Orçamento diário atual (R$)",
+        "Variação projetada (R$/dia)", "Orçamento diário projetado (R$)",
+    ])
+    return matrix, summary
@@ -1,3 +1,165 @@
 import streamlit as st
+import pandas as pd
 
-st.subheader("EM BREVE 🚧")
\ No newline at end of file
+from facebook.banco import db_available, db_connection, ensure_db_schema, execute_query
+from facebook.criativos import IMAGE_EXTENSIONS, VIDEO_EXTENSIONS, CreativeAssetCache, upload_assets
+from facebook.upload_massa import (
+    OPTIONAL_COLUMNS, REQUIRED_COLUMNS, UPLOAD_PHASES, UploadCheckpoint,
+    iter_rows, resolve_creative_assets, run_upload, upload_job_id, validate_upload,
+)
+
+# Subida em massa de campanhas a partir de planilha (ver facebook/upload_massa.py)
+
+TEMPLATE_ROWS = [
+    {"campaign_name": "Black Friday - Vendas", "objective": "OUTCOME_SALES", "adset_name": "Brasil 25-45",
+     "adset_daily_budget": "50,00", "countries": "BR", "ad_name": "Vídeo oferta 1", "page_id": "123456789012345",
+     "link": "https://loja.exemplo.com/oferta", "pixel_id": "", "age_min": "25", "age_max": "45",
+     "message": "Só hoje: 50% de desconto", "headline": "Oferta relâmpago", "image_url": "", "image_file": "oferta.jpg", "call_to_action": "SHOP_NOW"},
+]
+
+
+@st.cache_data(ttl=300)
+def get_upload_accounts():
+    """Contas cadastradas no Gerenciador (com credenciais) para escolher o destino da subida."""
+    rows = execute_query("""
+        SELECT id, name, app_id, app_secret, access_token, account_id, token_expires_at
+        FROM api_config ORDER BY name
+    """, fetch_all=True) or []
+    keys = ["id", "name", "app_id", "app_secret", "access_token", "account_id", "token_expires_at"]
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def template_csv():
+    columns = REQUIRED_COLUMNS + [c for c in OPTIONAL_COLUMNS if c not in REQUIRED_COLUMNS]
+    return pd.DataFrame(TEMPLATE_ROWS).reindex(columns=columns).to_csv(index=False, sep=";").encode("utf-8-sig")
+
+
+def show_upload_report(report):
+    """Resumo por fase, vazão e falhas de uma subida."""
+    phase_names = dict(UPLOAD_PHASES)
+    summary = pd.DataFrame([
+        {"Fase": phase_names[phase], "Total": data["total"], "Criados agora": data["created"],
+         "Já existiam (checkpoint)": data["skipped"], "Falhas": data["failed"]}
+        for phase, data in report["phases"].items()
+    ])
+    st.dataframe(summary, hide_index=True, use_container_width=True)
+    st.caption(f"Tempo: {report['elapsed_s']:.1f}s | Vazão: {report['objects_per_s']:.1f} objetos/s")
+    if report["failures"]:
+        st.warning(f"{len(report['failures'])} objetos falharam. Envie o mesmo arquivo novamente para tentar só o que faltou.")
+        st.dataframe(pd.DataFrame(report["failures"]), hide_index=True, use_container_width=True)
+    else:
+        st.success("Todos os objetos foram criados.")
+
+
+def show_asset_report(asset_report):
+    """Quantos arquivos de criativo foram reaproveitados do cache e quantos subiram."""
+    st.caption(
+        f"Criativos: {asset_report['uploaded']} arquivos enviados ({asset_report['bytes_uploaded'] / 1e6:.1f} MB), "
+        f"{asset_report['reused']} reaproveitados ({asset_report['bytes_skipped'] / 1e6:.1f} MB sem reenviar)"
+    )
+    if asset_report["failures"]:
+        st.warning(f"{len(asset_report['failures'])} arquivos de criativo não subiram; os anúncios que os usam falharão.")
+        st.dataframe(pd.DataFrame(asset_report["failures"]), hide_index=True, use_container_width=True)
+
+
+def show_upload_page():
+    st.title("Subir Campanha")
+    st.caption("Crie campanhas, conjuntos e anúncios em massa a partir de uma planilha (uma linha por anúncio). "
+               "Tudo é criado pausado, a menos que a planilha diga o contrário.")
+
+    if not db_available():
+        st.error("Banco de dados indisponível.")
+        return
+    try:
+        ensure_db_schema()
+    except Exception as e:
+        st.error(f"Erro ao inicializar/atualizar o banco de dados: {e}")
+        return
+
+    accounts = get_upload_accounts()
+    if not accounts:
+        st.info("Nenhuma conta cadastrada. Adicione uma conta em 'Gerenciador' > '🔧 Configurações'.")
+        return
+
+    col_account, col_template = st.columns([3, 1])
+    with col_account:
+        accounts_by_id = {account["id"]: account for account in accounts}
+        account_key = st.selectbox("Conta de destino", options=list(accounts_by_id), key="upload_account",
+                                   format_func=lambda cid: f"{accounts_by_id[cid]['name']} ({accounts_by_id[cid]['account_id']})")
+        config = accounts_by_id[account_key]
+    with col_template:
+        st.markdown("<div style='padding-top: 28px;'></div>", unsafe_allow_html=True)
+        st.download_button("📄 Modelo CSV", data=template_csv(), file_name="modelo_subida_campanhas.csv",
+                           mime="text/csv", use_container_width=True)
+
+    uploaded = st.file_uploader("Planilha (CSV ou XLSX)", type=["csv", "xlsx"], key="upload_file")
+    if uploaded is None:
+        with st.expander("Colunas da planilha"):
+            st.markdown(f"**Obrigatórias:** {', '.join(REQUIRED_COLUMNS)}")
+            st.markdown(f"**Opcionais:** {', '.join(OPTIONAL_COLUMNS)}")
+        return
+
+    data = uploaded.getvalue()
+    try:
+        plan, errors, total_rows = validate_upload(iter_rows(data, uploaded.name))
+    except Exception as e:
+        st.error(f"Não foi possível ler a planilha: {e}")
+        return
+
+    col_rows, col_campaigns, col_adsets, col_ads = st.columns(4)
+    col_rows.metric("Linhas", total_rows)
+    col_campaigns.metric("Campanhas", len(plan["campaigns"]))
+    col_adsets.metric("Conjuntos", len(plan["adsets"]))
+    col_ads.metric("Anúncios", len(plan["ads"]))
+
+    if errors:
+        st.error("A planilha tem erros. Corrija e envie novamente; nada foi criado.")
+        st.dataframe(pd.DataFrame(errors), hide_index=True, use_container_width=True)
+        return
+
+    asset_files = {}
+    if plan["asset_files"]:
+        asset_uploads = st.file_uploader(
+            "Imagens e vídeos dos criativos", accept_multiple_files=True, key="upload_assets",
+            type=[ext.lstrip(".") for ext in IMAGE_EXTENSIONS + VIDEO_EXTENSIONS],
+            help="Arquivos citados nas colunas image_file e video_file. Arquivos já enviados para a conta não sobem de novo."
+        )
+        asset_files = {asset.name: asset.getvalue() for asset in asset_uploads or []}
+        missing = sorted(plan["asset_files"] - set(asset_files))
+        if missing:
+            st.error(f"Faltam {len(missing)} arquivos de criativo citados na planilha: {', '.join(missing[:20])}")
+            return
+
+    job_id = upload_job_id(data, config["account_id"])
+    checkpoint = UploadCheckpoint(db_connection, job_id, config["account_id"], uploaded.name, total_rows)
+    already_created = execute_query("SELECT COUNT(*) FROM upload_job_objects WHERE job_id = %s", (job_id,), fetch_one=True)
+    if already_created and already_created[0]:
+        st.info(f"Este arquivo já foi enviado para esta conta: {already_created[0]} objetos criados serão reaproveitados e a subida continua de onde parou.")
+
+    if not st.button("🚀 Subir campanhas", type="primary", key="upload_start"):
+        return
+
+    progress_bar = st.progress(0.0, text="Iniciando...")
+    phase_names = dict(UPLOAD_PHASES)
+    phase_order = [phase for phase, _ in UPLOAD_PHASES]
+
+    def update_progress(phase, done, total, elapsed):
+        # Cada fase ocupa uma fração igual da barra
+        fraction = (phase_order.index(phase) + (done / total if total else 1)) / len(phase_order)
+        progress_bar.progress(min(fraction, 1.0), text=f"{phase_names[phase]}: {done}/{total} ({elapsed:.0f}s)")
+
+    try:
+        if asset_files:
+            progress_bar.progress(0.0, text="Enviando imagens e vídeos...")
+            refs, asset_report = upload_assets(config, asset_files, CreativeAssetCache(db_connection))
+            plan = resolve_creative_assets(plan, refs)
+            show_asset_report(asset_report)
+        report = run_upload(config, plan, checkpoint, progress=update_progress)
+    except Exception as e:
+        st.error(f"A subida foi interrompida: {e}. Envie o mesmo arquivo para continuar de onde parou.")
+        return
+    progress_bar.progress(1.0, text="Concluído")
+    show_upload_report(report)
+
+
+show_upload_page()
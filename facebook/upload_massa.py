@@ -0,0 +1,463 @@
+"""
+Subida em massa de campanhas a partir de uma planilha (CSV ou XLSX).
+
+Uma linha por anúncio; as colunas de campanha e de conjunto se repetem nas
+linhas que compartilham a mesma campanha/conjunto (como na planilha de
+importação do Gerenciador de Anúncios). O fluxo tem três etapas:
+
+1. Validação em uma única passada sobre as linhas (sem carregar a planilha
+   inteira num DataFrame). Gera o plano: campanhas, conjuntos e anúncios
+   únicos, com os parâmetros da Graph API já prontos.
+2. Criação por fase (campanhas → conjuntos → criativos → anúncios) em
+   requisições em lote da Graph API, com paralelismo limitado (execute_batched
+   de acoes_em_massa.py).
+3. Checkpoint a cada janela de UPLOAD_WINDOW_SIZE objetos na tabela
+   upload_job_objects. Se a subida cair na linha 800, a próxima execução do
+   mesmo arquivo na mesma conta pula o que já foi criado e continua dali.
+
+Sem dependência do Streamlit.
+"""
+import csv
+import hashlib
+import io
+import json
+import time
+from datetime import datetime
+
+from facebook.acoes_em_massa import BULK_MAX_WORKERS, GRAPH_BATCH_SIZE, execute_batched
+from facebook.criativos import asset_kind
+
+REQUIRED_COLUMNS = [
+    "campaign_name", "objective", "adset_name", "adset_daily_budget",
+    "countries", "ad_name", "page_id", "link",
+]
+OPTIONAL_COLUMNS = [
+    "campaign_status", "adset_status", "ad_status", "billing_event", "optimization_goal",
+    "pixel_id", "age_min", "age_max", "start_time", "message", "headline",
+    "image_url", "image_hash", "image_file", "video_file", "call_to_action",
+]
+
+CAMPAIGN_OBJECTIVES = {
+    "OUTCOME_SALES", "OUTCOME_TRAFFIC", "OUTCOME_LEADS",
+    "OUTCOME_ENGAGEMENT", "OUTCOME_AWARENESS", "OUTCOME_APP_PROMOTION",
+}
+OBJECT_STATUSES = {"ACTIVE", "PAUSED"}
+CALL_TO_ACTIONS = {"SHOP_NOW", "LEARN_MORE", "BUY_NOW", "ORDER_NOW", "SIGN_UP", "CONTACT_US", "GET_OFFER"}
+
+# Objetos criados entre dois checkpoints (um lote por worker)
+UPLOAD_WINDOW_SIZE = GRAPH_BATCH_SIZE * BULK_MAX_WORKERS
+# Erros de validação guardados para exibição (a contagem continua além disso)
+MAX_REPORTED_ERRORS = 500
+
+UPLOAD_PHASES = [("campaigns", "Campanhas"), ("adsets", "Conjuntos"), ("creatives", "Criativos"), ("ads", "Anúncios")]
+
+
+# --- Leitura da planilha ---
+def _cell_to_text(value):
+    """Normaliza uma célula (CSV ou XLSX) para texto sem espaços nas pontas."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        # IDs numéricos lidos do Excel chegam como float (ex.: 1.23e14)
+        return str(int(value))
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).strip()
+
+
+def iter_rows(data, filename):
+    """Gera (número_da_linha, {coluna: texto}) lendo o arquivo linha a linha."""
+    if filename.lower().endswith(".xlsx"):
+        try:
+            import openpyxl
+        except ImportError:
+            raise ValueError("Leitura de XLSX requer o pacote 'openpyxl' (pip install openpyxl). Envie um CSV ou instale o pacote.")
+        workbook = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [_cell_to_text(cell).lower() for cell in next(rows, ())]
+            for line_number, values in enumerate(rows, start=2):
+                yield line_number, dict(zip(header, (_cell_to_text(value) for value in values)))
+        finally:
+            workbook.close()
+        return
+
+    text = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", newline="")
+    sample = text.read(4096)
+    text.seek(0)
+    # Planilhas exportadas com Excel em português costumam usar ";"
+    delimiter = ";" if sample.count(";") > sample.count(",") else ","
+    reader = csv.reader(text, delimiter=delimiter)
+    header = [column.strip().lower() for column in next(reader, [])]
+    for line_number, values in enumerate(reader, start=2):
+        yield line_number, dict(zip(header, (_cell_to_text(value) for value in values)))
+
+
+# --- Validação ---
+def parse_money_to_cents(text):
+    """'50', '50,00', '1.234,56' ou '1234.56' → centavos (int)."""
+    cleaned = text.replace("R$", "").replace(" ", "")
+    if "," in cleaned:
+        cleaned = cleaned.replace(".", "").replace(",", ".")
+    return int(round(float(cleaned) * 100))
+
+
+def _parse_countries(text):
+    return [code.strip().upper() for code in text.replace(";", ",").replace("/", ",").split(",") if code.strip()]
+
+
+def _build_row_plan(row):
+    """Parâmetros da Graph API de uma linha. Levanta ValueError(coluna, mensagem) no primeiro problema."""
+    for column in REQUIRED_COLUMNS:
+        if not row.get(column):
+            raise ValueError(column, "obrigatória")
+
+    objective = row["objective"].upper()
+    if objective not in CAMPAIGN_OBJECTIVES:
+        raise ValueError("objective", f"'{row['objective']}' inválido (use {', '.join(sorted(CAMPAIGN_OBJECTIVES))})")
+    statuses = {}
+    for column in ("campaign_status", "adset_status", "ad_status"):
+        statuses[column] = (row.get(column) or "PAUSED").upper()
+        if statuses[column] not in OBJECT_STATUSES:
+            raise ValueError(column, "use ACTIVE ou PAUSED")
+
+    try:
+        budget = parse_money_to_cents(row["adset_daily_budget"])
+    except ValueError:
+        raise ValueError("adset_daily_budget", f"'{row['adset_daily_budget']}' não é um valor")
+    if budget < 100:
+        raise ValueError("adset_daily_budget", "mínimo de 1,00")
+
+    countries = _parse_countries(row["countries"])
+    if not countries or any(len(code) != 2 or not code.isalpha() for code in countries):
+        raise ValueError("countries", "use códigos de 2 letras separados por vírgula (ex.: BR, CL)")
+    targeting = {"geo_locations": {"countries": countries}}
+    for column, default in (("age_min", 18), ("age_max", 65)):
+        try:
+            age = int(float(row.get(column) or default))
+        except ValueError:
+            raise ValueError(column, "não é um número")
+        if not 13 <= age <= 65:
+            raise ValueError(column, "entre 13 e 65")
+        targeting[column] = age
+    if targeting["age_min"] > targeting["age_max"]:
+        raise ValueError("age_min", "maior que age_max")
+
+    if not row["link"].startswith(("http://", "https://")):
+        raise ValueError("link", "precisa começar com http:// ou https://")
+    if not row["page_id"].isdigit():
+        raise ValueError("page_id", "precisa ser numérico")
+    if row.get("image_file") and asset_kind(row["image_file"]) != "image":
+        raise ValueError("image_file", "extensão de imagem não suportada")
+    if row.get("video_file"):
+        if asset_kind(row["video_file"]) != "video":
+            raise ValueError("video_file", "extensão de vídeo não suportada")
+        if not (row.get("image_file") or row.get("image_url")):
+            raise ValueError("video_file", "vídeo precisa de miniatura em image_file ou image_url")
+    call_to_action = (row.get("call_to_action") or "SHOP_NOW").upper()
+    if call_to_action not in CALL_TO_ACTIONS:
+        raise ValueError("call_to_action", f"use {', '.join(sorted(CALL_TO_ACTIONS))}")
+
+    campaign = {"name": row["campaign_name"], "objective": objective, "status": statuses["campaign_status"],
+                "special_ad_categories": []}
+    adset = {
+        "name": row["adset_name"], "daily_budget": budget, "targeting": targeting,
+        "billing_event": (row.get("billing_event") or "IMPRESSIONS").upper(),
+        "optimization_goal": (row.get("optimization_goal") or ("OFFSITE_CONVERSIONS" if row.get("pixel_id") else "LINK_CLICKS")).upper(),
+        "bid_strategy": "LOWEST_COST_WITHOUT_CAP", "status": statuses["adset_status"],
+    }
+    if row.get("pixel_id"):
+        adset["promoted_object"] = {"pixel_id": row["pixel_id"], "custom_event_type": "PURCHASE"}
+    if row.get("start_time"):
+        try:
+            adset["start_time"] = datetime.fromisoformat(row["start_time"]).isoformat()
+        except ValueError:
+            raise ValueError("start_time", "use o formato AAAA-MM-DD HH:MM")
+
+    link_data = {"link": row["link"], "call_to_action": {"type": call_to_action, "value": {"link": row["link"]}}}
+    if row.get("message"):
+        link_data["message"] = row["message"]
+    if row.get("headline"):
+        link_data["name"] = row["headline"]
+    if row.get("image_hash"):
+        link_data["image_hash"] = row["image_hash"]
+    elif row.get("image_url"):
+        link_data["picture"] = row["image_url"]
+    creative = {"name": f"{row['ad_name']} - criativo", "object_story_spec": {"page_id": row["page_id"], "link_data": link_data}}
+    if row.get("image_file") or row.get("video_file"):
+        # Resolvidos para hash/ID do Facebook por resolve_creative_assets depois do envio dos arquivos
+        creative["asset_files"] = {"image": row.get("image_file") or None, "video": row.get("video_file") or None}
+    ad = {"name": row["ad_name"], "status": statuses["ad_status"]}
+    return campaign, adset, creative, ad
+
+
+def validate_upload(rows):
+    """
+    Valida as linhas numa única passada e monta o plano de criação.
+
+    Retorna (plan, errors, total_rows). `plan` tem "campaigns" {chave: params},
+    "adsets" {chave: (chave_da_campanha, params)} e "ads" [(linha, chave_do_conjunto,
+    params_do_criativo, params_do_anúncio)]. `errors` traz até MAX_REPORTED_ERRORS
+    itens {"linha", "coluna", "erro"}; o plano só deve ser executado sem erros.
+    Os arquivos de criativo citados (image_file/video_file) ficam em plan["asset_files"].
+    """
+    plan = {"campaigns": {}, "adsets": {}, "ads": [], "asset_files": set()}
+    errors = []
+    error_count = 0
+    total_rows = 0
+
+    def add_error(line_number, column, message):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"linha": line_number, "coluna": column, "erro": message})
+
+    header_checked = False
+    for line_number, row in rows:
+        if not header_checked:
+            missing = [column for column in REQUIRED_COLUMNS if column not in row]
+            if missing:
+                add_error(1, ", ".join(missing), "colunas obrigatórias ausentes no cabeçalho")
+                break
+            header_checked = True
+        if not any(row.values()):
+            continue  # linha em branco
+        total_rows += 1
+        try:
+            campaign, adset, creative, ad = _build_row_plan(row)
+        except ValueError as e:
+            column, message = e.args
+            add_error(line_number, column, message)
+            continue
+
+        campaign_key = f"campaign:{campaign['name']}"
+        existing_campaign = plan["campaigns"].setdefault(campaign_key, campaign)
+        if existing_campaign != campaign:
+            add_error(line_number, "objective", f"campanha '{campaign['name']}' aparece com objetivo/status diferentes em outra linha")
+            continue
+        adset_key = f"adset:{campaign['name']}\x1f{adset['name']}"
+        existing_adset = plan["adsets"].setdefault(adset_key, (campaign_key, adset))
+        if existing_adset[1] != adset:
+            add_error(line_number, "adset_name", f"conjunto '{adset['name']}' aparece com orçamento/público diferentes em outra linha")
+            continue
+        plan["ads"].append((line_number, adset_key, creative, ad))
+        plan["asset_files"].update(name for name in creative.get("asset_files", {}).values() if name)
+
+    if total_rows == 0 and not errors:
+        add_error(1, "", "planilha sem linhas de anúncio")
+    if error_count > len(errors):
+        errors.append({"linha": None, "coluna": "", "erro": f"... e mais {error_count - len(errors)} erros"})
+    return plan, errors, total_rows
+
+
+def upload_job_id(data, account_id):
+    """Identificador do job: o mesmo arquivo na mesma conta retoma o mesmo job."""
+    return hashlib.sha256(data + f"|{account_id}".encode("utf-8")).hexdigest()
+
+
+def _creative_with_assets(creative, files, refs):
+    """Troca os nomes de arquivo do criativo pelo hash da imagem / ID do vídeo no Facebook."""
+    spec = creative["object_story_spec"]
+    link_data = dict(spec["link_data"])
+    image_hash = refs[files["image"]]["ref"] if files["image"] else None
+    if files["video"]:
+        video_data = {"video_id": refs[files["video"]]["ref"], "call_to_action": link_data["call_to_action"]}
+        if link_data.get("message"):
+            video_data["message"] = link_data["message"]
+        if link_data.get("name"):
+            video_data["title"] = link_data["name"]
+        if image_hash:
+            video_data["image_hash"] = image_hash
+        else:
+            video_data["image_url"] = link_data["picture"]
+        new_spec = {"page_id": spec["page_id"], "video_data": video_data}
+    else:
+        link_data.pop("picture", None)
+        link_data["image_hash"] = image_hash
+        new_spec = {"page_id": spec["page_id"], "link_data": link_data}
+    return {"name": creative["name"], "object_story_spec": new_spec}
+
+
+def resolve_creative_assets(plan, refs):
+    """
+    Novo plano com os criativos apontando para os arquivos já enviados
+    (`refs` de criativos.upload_assets). Criativos com arquivo faltando ficam
+    como None e seus anúncios falham sem ir para a Graph API.
+    """
+    ads = []
+    for line_number, adset_key, creative, ad in plan["ads"]:
+        files = creative.get("asset_files")
+        if files:
+            if any(name and name not in refs for name in files.values()):
+                creative = None
+            else:
+                creative = _creative_with_assets(creative, files, refs)
+        ads.append((line_number, adset_key, creative, ad))
+    return {**plan, "ads": ads}
+
+
+# --- Checkpoints ---
+class UploadCheckpoint:
+    """
+    Registro dos objetos já criados de um job (tabelas upload_jobs e upload_job_objects).
+
+    `connection_factory` é um context manager que produz (conn, conn_type) ou None,
+    como facebook.banco.db_connection.
+    """
+
+    def __init__(self, connection_factory, job_id, account_id, filename, total_rows):
+        self._connection_factory = connection_factory
+        self.job_id = job_id
+        self.account_id = str(account_id)
+        self.filename = filename
+        self.total_rows = total_rows
+
+    def _run(self, func):
+        with self._connection_factory() as conn_info:
+            if conn_info is None:
+                raise RuntimeError("banco indisponível para o checkpoint da subida")
+            conn, conn_type = conn_info
+            ph = "?" if conn_type == "sqlite" else "%s"
+            cursor = conn.cursor()
+            try:
+                result = func(cursor, ph)
+                conn.commit()
+                return result
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def start(self):
+        """Cria (ou reabre) o job e retorna {chave_do_objeto: id_no_facebook} do que já foi criado."""
+        def start_job(cursor, ph):
+            now = time.time()
+            cursor.execute(f"""
+                INSERT INTO upload_jobs (id, account_id, filename, status, total_rows, created_at, updated_at)
+                VALUES ({ph}, {ph}, {ph}, 'running', {ph}, {ph}, {ph})
+                ON CONFLICT (id) DO UPDATE SET status = 'running', updated_at = EXCLUDED.updated_at
+            """, (self.job_id, self.account_id, self.filename, self.total_rows, now, now))
+            cursor.execute(f"SELECT object_key, object_id FROM upload_job_objects WHERE job_id = {ph}", (self.job_id,))
+            return dict(cursor.fetchall())
+        return self._run(start_job)
+
+    def save(self, created):
+        """Grava os objetos criados numa janela ({chave: id})."""
+        if not created:
+            return
+        def save_objects(cursor, ph):
+            cursor.executemany(f"""
+                INSERT INTO upload_job_objects (job_id, object_key, object_id) VALUES ({ph}, {ph}, {ph})
+                ON CONFLICT (job_id, object_key) DO NOTHING
+            """, [(self.job_id, key, object_id) for key, object_id in created.items()])
+            cursor.execute(f"UPDATE upload_jobs SET updated_at = {ph} WHERE id = {ph}", (time.time(), self.job_id))
+        self._run(save_objects)
+
+    def finish(self, status, report):
+        def finish_job(cursor, ph):
+            cursor.execute(f"UPDATE upload_jobs SET status = {ph}, report = {ph}, updated_at = {ph} WHERE id = {ph}",
+                           (status, json.dumps(report, default=str), time.time(), self.job_id))
+        self._run(finish_job)
+
+
+# --- Criação na Graph API ---
+def _phase_items(phase, plan, created):
+    """(chave, params) ainda não criados da fase; itens cujo pai falhou voltam como erro."""
+    items, blocked = [], []
+    if phase == "campaigns":
+        items = [(key, params) for key, params in plan["campaigns"].items() if key not in created]
+    elif phase == "adsets":
+        for key, (campaign_key, params) in plan["adsets"].items():
+            if key in created:
+                continue
+            if campaign_key not in created:
+                blocked.append((key, "campanha não foi criada"))
+            else:
+                items.append((key, {**params, "campaign_id": created[campaign_key]}))
+    elif phase == "creatives":
+        for line_number, _, creative, _ in plan["ads"]:
+            key = f"creative:{line_number}"
+            if key in created:
+                continue
+            if creative is None or "asset_files" in creative:
+                blocked.append((key, "arquivo de imagem/vídeo do criativo não foi enviado"))
+            else:
+                items.append((key, creative))
+    else:
+        for line_number, adset_key, _, ad in plan["ads"]:
+            key = f"ad:{line_number}"
+            if key in created:
+                continue
+            if adset_key not in created:
+                blocked.append((key, "conjunto não foi criado"))
+            elif f"creative:{line_number}" not in created:
+                blocked.append((key, "criativo não foi criado"))
+            else:
+                items.append((key, {**ad, "adset_id": created[adset_key], "creative": {"creative_id": created[f"creative:{line_number}"]}}))
+    return items, blocked
+
+
+def _phase_total(phase, plan):
+    if phase in ("campaigns", "adsets"):
+        return len(plan[phase])
+    return len(plan["ads"])
+
+
+def _make_add_request(phase, account_id):
+    from facebook_business.adobjects.adaccount import AdAccount
+
+    create_method = {"campaigns": "create_campaign", "adsets": "create_ad_set",
+                     "creatives": "create_ad_creative", "ads": "create_ad"}[phase]
+
+    def add_request(api, batch, key, params, success, failure):
+        account = AdAccount(f"act_{account_id}", api=api)
+        getattr(account, create_method)(params=params, batch=batch, success=success, failure=failure)
+    return add_request
+
+
+def run_upload(config, plan, checkpoint, progress=None):
+    """
+    Cria os objetos do plano na conta de `config`, retomando o que o checkpoint já registrou.
+
+    `progress(fase, feitos, total, segundos)` é chamado a cada janela. Retorna o
+    relatório: por fase, criados/já existentes/falhas; tempo, objetos por segundo e
+    as falhas ({"objeto", "erro"}).
+    """
+    start_time = time.perf_counter()
+    created = checkpoint.start()
+    report = {"phases": {}, "failures": []}
+    created_now = 0
+
+    for phase, _ in UPLOAD_PHASES:
+        items, blocked = _phase_items(phase, plan, created)
+        total = _phase_total(phase, plan)
+        phase_report = {"total": total, "skipped": total - len(items) - len(blocked), "created": 0, "failed": len(blocked)}
+        report["failures"].extend({"objeto": key, "erro": message} for key, message in blocked)
+        add_request = _make_add_request(phase, config["account_id"])
+
+        for start in range(0, len(items), UPLOAD_WINDOW_SIZE):
+            window = items[start:start + UPLOAD_WINDOW_SIZE]
+            results = execute_batched(config, window, add_request)
+            window_created = {}
+            for key, (ok, value) in results.items():
+                if ok and isinstance(value, dict) and value.get("id"):
+                    window_created[key] = value["id"]
+                else:
+                    report["failures"].append({"objeto": key, "erro": value if not ok else "resposta sem ID"})
+            # Checkpoint antes da próxima janela: uma queda aqui perde no máximo uma janela
+            checkpoint.save(window_created)
+            created.update(window_created)
+            created_now += len(window_created)
+            phase_report["created"] += len(window_created)
+            phase_report["failed"] += len(window) - len(window_created)
+            if progress:
+                progress(phase, phase_report["skipped"] + start + len(window), total, time.perf_counter() - start_time)
+        report["phases"][phase] = phase_report
+
+    elapsed = time.perf_counter() - start_time
+    report["elapsed_s"] = elapsed
+    report["objects_per_s"] = created_now / elapsed if elapsed > 0 else 0.0
+    report["status"] = "failed" if report["failures"] else "done"
+    checkpoint.finish(report["status"], report)
+    return report
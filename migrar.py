@@ -0,0 +1,51 @@
+import os
+import sys
+
+from facebook.migracoes import apply_pending_migrations, get_current_version, latest_version
+
+# Aplica as migrações pendentes do schema. Roda na fase `release` do Procfile
+# (uma vez por deploy), antes de web e worker subirem com o código novo.
+
+
+def get_db_connection_migrar():
+    """Obtém uma conexão com o banco (mesma regra do app: PostgreSQL ou fallback SQLite)."""
+    pg_host = os.getenv("PGHOST")
+    pg_user = os.getenv("PGUSER")
+    pg_password = os.getenv("PGPASSWORD")
+
+    if not (pg_host and pg_user and pg_password):
+        import sqlite3
+        if not os.path.exists("data"):
+            os.makedirs("data")
+        return sqlite3.connect("data/gcoperacional.db"), "sqlite"
+
+    import psycopg2
+    conn = psycopg2.connect(
+        host=pg_host,
+        port=os.getenv("PGPORT"),
+        database=os.getenv("PGDATABASE"),
+        user=pg_user,
+        password=pg_password
+    )
+    return conn, "postgres"
+
+
+if __name__ == "__main__":
+    try:
+        conn, conn_type = get_db_connection_migrar()
+    except Exception as e:
+        print(f"ERRO FATAL [Migrar]: Falha ao conectar ao banco: {e}")
+        sys.exit(1)
+
+    try:
+        print(f"INFO [Migrar]: Schema em {conn_type} na versão {get_current_version(conn, conn_type)} (código: {latest_version()}).")
+        applied = apply_pending_migrations(conn, conn_type, log=lambda msg: print(f"INFO [Migrar]: {msg}"))
+        if applied:
+            print(f"INFO [Migrar]: {len(applied)} migração(ões) aplicada(s): {', '.join(str(v) for v in applied)}.")
+        else:
+            print("INFO [Migrar]: Schema já estava atualizado.")
+    except Exception as e:
+        print(f"ERRO FATAL [Migrar]: Falha ao aplicar migrações: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
@@ -0,0 +1,214 @@
+"""
+Geometria dos países para o Mapa de Atuação.
+
+O mapa abre entre os zooms 2 e 5. Nessa escala, um pixel cobre entre ~0,35° e
+~0,04°, então o contorno original dos países tem muito mais pontos do que a
+tela consegue mostrar. Antes de ir para o navegador, a geometria é:
+
+- simplificada com Douglas-Peucker na tolerância GEOMETRY_TOLERANCE_DEG
+  (cerca de dois pixels no zoom 5, menos de meio pixel no zoom 2);
+- filtrada: ilhas menores que MIN_RING_AREA_DEG2 somem (o maior polígono de
+  cada país fica sempre);
+- quantizada em COORD_DECIMALS casas decimais (~1 km), o que também encurta o
+  JSON;
+- enxugada para a única propriedade usada pelo mapa ("name").
+
+O resultado vai versionado em assets/ como TopoJSON (coordenadas inteiras
+em delta), que é o que o app lê: uma vez por processo, sem rede e sem
+simplificar nada em tempo de execução. Para regenerar a partir do GeoJSON
+original: python -m principal.geometria
+
+Sem dependência do Streamlit.
+"""
+import functools
+import json
+import os
+from itertools import accumulate
+
+import numpy as np
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+WORLD_GEOJSON_PATH = os.path.join(ASSETS_DIR, "world-countries.json")
+WORLD_TOPOJSON_PATH = os.path.join(ASSETS_DIR, "world-countries.topo.json")
+
+GEOMETRY_TOLERANCE_DEG = 0.1
+MIN_RING_AREA_DEG2 = 0.02
+COORD_DECIMALS = 2
+
+
+def simplify_line(points, tolerance):
+    """Douglas-Peucker iterativo sobre um array (n, 2); mantém sempre o primeiro e o último ponto."""
+    n_points = len(points)
+    if n_points < 3:
+        return points
+    keep = np.zeros(n_points, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n_points - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(segment[0], segment[1])
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return points[keep]
+
+
+def ring_area(points):
+    """Área (em graus²) de um anel fechado, pela fórmula do laço."""
+    x, y = points[:, 0], points[:, 1]
+    return abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2
+
+
+def _simplify_ring(ring, tolerance, decimals):
+    """Anel simplificado e quantizado, ou None se degenerar (menos de 4 pontos)."""
+    points = simplify_line(np.asarray(ring, dtype=float), tolerance).round(decimals)
+    # A quantização pode repetir pontos consecutivos
+    distinct = np.ones(len(points), dtype=bool)
+    distinct[1:] = np.any(points[1:] != points[:-1], axis=1)
+    points = points[distinct]
+    if len(points) < 4:
+        return None
+    return points
+
+
+def simplify_geometry(geometry, tolerance=GEOMETRY_TOLERANCE_DEG, min_area=MIN_RING_AREA_DEG2, decimals=COORD_DECIMALS):
+    """Polygon/MultiPolygon simplificado; o maior polígono é mantido mesmo se ficar abaixo de `min_area`."""
+    polygons = geometry["coordinates"] if geometry["type"] == "MultiPolygon" else [geometry["coordinates"]]
+    simplified = []
+    for polygon in polygons:
+        outer = _simplify_ring(polygon[0], tolerance, decimals)
+        if outer is None:
+            # Simplificado demais: guarda o contorno original quantizado para não perder o país
+            outer = np.asarray(polygon[0], dtype=float).round(decimals)
+        holes = [hole for hole in (_simplify_ring(ring, tolerance, decimals) for ring in polygon[1:])
+                 if hole is not None and ring_area(hole) >= min_area]
+        simplified.append((ring_area(outer), [outer] + holes))
+
+    largest = max(area for area, _ in simplified)
+    kept = [rings for area, rings in simplified if area >= min_area or area == largest]
+    coordinates = [[ring.tolist() for ring in rings] for rings in kept]
+    if len(coordinates) == 1:
+        return {"type": "Polygon", "coordinates": coordinates[0]}
+    return {"type": "MultiPolygon", "coordinates": coordinates}
+
+
+def simplify_geojson(geojson, tolerance=GEOMETRY_TOLERANCE_DEG, min_area=MIN_RING_AREA_DEG2, decimals=COORD_DECIMALS):
+    """FeatureCollection só com o nome de cada país e a geometria simplificada."""
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "id": feature.get("id"), "properties": {"name": feature["properties"]["name"]},
+             "geometry": simplify_geometry(feature["geometry"], tolerance, min_area, decimals)}
+            for feature in geojson["features"]
+            if feature.get("geometry")
+        ],
+    }
+
+
+def count_points(geojson):
+    total = 0
+    for feature in geojson["features"]:
+        geometry = feature["geometry"]
+        polygons = geometry["coordinates"] if geometry["type"] == "MultiPolygon" else [geometry["coordinates"]]
+        total += sum(len(ring) for polygon in polygons for ring in polygon)
+    return total
+
+
+def load_simplified_geojson(path):
+    with open(path, encoding="utf-8") as f:
+        return simplify_geojson(json.load(f))
+
+
+def compact_json(data):
+    """JSON sem espaços, como vai para o HTML do mapa."""
+    return json.dumps(data, separators=(",", ":"))
+
+
+# --- TopoJSON ---
+def geojson_to_topojson(geojson, decimals=COORD_DECIMALS):
+    """
+    TopoJSON quantizado na grade de `decimals` casas, um arco por anel
+    (sem compartilhar fronteiras: o ganho vem dos inteiros em delta).
+    """
+    scale = 10.0 ** -decimals
+    translate = (-180.0, -90.0)
+    arcs = []
+    geometries = []
+
+    def encode_ring(ring):
+        points = np.rint((np.asarray(ring, dtype=float) - translate) / scale).astype(np.int64)
+        deltas = np.diff(points, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+        arcs.append(deltas.tolist())
+        return [len(arcs) - 1]
+
+    for feature in geojson["features"]:
+        geometry = feature["geometry"]
+        polygons = geometry["coordinates"] if geometry["type"] == "MultiPolygon" else [geometry["coordinates"]]
+        encoded = [[encode_ring(ring) for ring in polygon] for polygon in polygons]
+        geometries.append({
+            "type": geometry["type"], "id": feature.get("id"), "properties": feature["properties"],
+            "arcs": encoded if geometry["type"] == "MultiPolygon" else encoded[0],
+        })
+    return {
+        "type": "Topology",
+        "transform": {"scale": [scale, scale], "translate": list(translate)},
+        "objects": {"countries": {"type": "GeometryCollection", "geometries": geometries}},
+        "arcs": arcs,
+    }
+
+
+def topojson_to_geojson(topology, object_name="countries"):
+    """FeatureCollection de um objeto do TopoJSON (arcos em delta, com `transform`)."""
+    (scale_x, scale_y), (translate_x, translate_y) = topology["transform"]["scale"], topology["transform"]["translate"]
+    decimals = max(0, round(-np.log10(min(scale_x, scale_y))))
+    arcs = []
+    for arc in topology["arcs"]:
+        xs = accumulate(dx for dx, _ in arc)
+        ys = accumulate(dy for _, dy in arc)
+        arcs.append([[round(x * scale_x + translate_x, decimals), round(y * scale_y + translate_y, decimals)] for x, y in zip(xs, ys)])
+
+    def decode_ring(arc_indexes):
+        ring = []
+        for index in arc_indexes:
+            points = arcs[index] if index >= 0 else arcs[~index][::-1]
+            # Arcos seguidos compartilham o ponto de junção
+            ring.extend(points[1:] if ring else points)
+        return ring
+
+    features = []
+    for geometry in topology["objects"][object_name]["geometries"]:
+        if geometry["type"] == "MultiPolygon":
+            coordinates = [[decode_ring(ring) for ring in polygon] for polygon in geometry["arcs"]]
+        else:
+            coordinates = [decode_ring(ring) for ring in geometry["arcs"]]
+        features.append({"type": "Feature", "id": geometry.get("id"), "properties": geometry.get("properties", {}),
+                         "geometry": {"type": geometry["type"], "coordinates": coordinates}})
+    return {"type": "FeatureCollection", "features": features}
+
+
+@functools.lru_cache(maxsize=None)
+def world_geojson(path=WORLD_TOPOJSON_PATH):
+    """
+    Países já simplificados, lidos do TopoJSON em assets/ uma única vez por
+    processo. Levanta OSError se o arquivo não existir (nunca baixa nada).
+    """
+    with open(path, encoding="utf-8") as f:
+        return topojson_to_geojson(json.load(f))
+
+
+if __name__ == "__main__":
+    topology = geojson_to_topojson(load_simplified_geojson(WORLD_GEOJSON_PATH))
+    with open(WORLD_TOPOJSON_PATH, "w", encoding="utf-8") as f:
+        f.write(compact_json(topology))
+    print(f"INFO [Geometria]: {WORLD_TOPOJSON_PATH} gerado ({os.path.getsize(WORLD_TOPOJSON_PATH) / 1024:.0f} KB).")
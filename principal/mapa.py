@@ -1,10 +1,8 @@
 # principal/home.py
 import streamlit as st
-import folium
-from streamlit_folium import st_folium
-import os
-import pandas as pd
-import requests # To download the GeoJSON if needed
+import streamlit.components.v1 as components
+
+from principal.geometria import WORLD_TOPOJSON_PATH, world_geojson
 
 # --- Configuration ---
 # Define country lists directly in the code
@@ -42,43 +40,65 @@ STATUS_COLORS_HEX = { # Hex codes for HTML legend/lists and map fill (UPDATED)
     "default": "#D3D3D3"    # Light Gray
 }
 
-# GeoJSON configuration
-GEOJSON_URL = "https://raw.githubusercontent.com/python-visualization/folium/master/examples/data/world-countries.json"
-GEOJSON_LOCAL_PATH = "assets/world-countries.json"
+MAP_HEIGHT = 650
+STATUS_DESCRIPTIONS = {
+    "active": "Atuando Atualmente", "past": "Já Atuamos (Não Ativo)", "expanding": "Em Expansão / Validação"
+}
 
 # --- Helper Functions ---
 
-def download_geojson(url, path):
-    """Downloads the GeoJSON file if it doesn't exist locally."""
-    if not os.path.exists(path):
-        st.warning(f"Arquivo GeoJSON não encontrado em {path}. Baixando de {url}...")
-        try:
-            os.makedirs(os.path.dirname(path), exist_ok=True)
-            response = requests.get(url)
-            response.raise_for_status()
-            with open(path, 'wb') as f:
-                f.write(response.content)
-            st.success(f"GeoJSON baixado e salvo em {path}")
-        except requests.exceptions.RequestException as e:
-            st.error(f"Falha ao baixar o arquivo GeoJSON: {e}")
-        except OSError as e:
-             st.error(f"Erro ao criar diretório ou salvar arquivo GeoJSON: {e}")
-
-    if not os.path.exists(path):
-         st.error(f"Não foi possível obter ou salvar o arquivo GeoJSON em {path}.")
-         return None
-    return path
-
-def create_country_status_df(country_data_dict, name_mapping):
-    """Creates a DataFrame mapping country names to statuses, using the provided name_mapping."""
-    data = []
-    for status, countries in country_data_dict.items():
-        for country in countries:
-            normalized_name = name_mapping.get(country, country)
-            data.append({"country": normalized_name, "status": status})
-    if not data:
-        return pd.DataFrame(columns=['country', 'status'])
-    return pd.DataFrame(data)
+@st.cache_data(show_spinner=False)
+def build_map_html(country_data):
+    """
+    HTML completo do mapa para `country_data` (cache por conteúdo do dicionário).
+    Retorna (html, países_sem_coordenadas).
+    """
+    # folium só é importado quando o HTML ainda não está em cache
+    import folium
+
+    # País normalizado (nome do GeoJSON) -> cor de preenchimento
+    country_to_fill_color = {
+        NAME_MAP.get(country, country): STATUS_COLORS_HEX[status]
+        for status, countries in country_data.items()
+        for country in countries
+    }
+
+    m = folium.Map(location=[20, -30], zoom_start=2.5, min_zoom=2, max_zoom=5, tiles="CartoDB positron", prefer_canvas=True)
+    missing_coordinates = []
+    if country_to_fill_color:
+        style_function = lambda x: {
+            'fillColor': country_to_fill_color.get(x['properties']['name'], STATUS_COLORS_HEX['default']),
+            'color': 'black', 'weight': 0.5,
+            'fillOpacity': 0.65 if x['properties']['name'] in country_to_fill_color else 0.2 # Slightly more opaque fill
+        }
+        tooltip_geojson = folium.features.GeoJsonTooltip(
+            fields=['name'], aliases=['País:'], localize=True, sticky=False,
+             style=("background-color: white; color: black; font-family: arial; font-size: 12px; padding: 5px;")
+        )
+        folium.GeoJson(
+            world_geojson(), name='Status dos Países', style_function=style_function,
+            tooltip=tooltip_geojson,
+            highlight_function=lambda x: {'weight': 1, 'fillOpacity': 0.85 if x['properties']['name'] in country_to_fill_color else 0.4},
+        ).add_to(m)
+
+        # --- Add Markers with Icons ---
+        marker_group = folium.FeatureGroup(name="Ícones de Status")
+        name_map_reverse = {v: k for k, v in NAME_MAP.items()}
+        for status, countries in country_data.items():
+            status_description = STATUS_DESCRIPTIONS.get(status, status.capitalize())
+            for country_orig in countries:
+                country_norm = NAME_MAP.get(country_orig, country_orig)
+                if country_norm not in COUNTRY_COORDINATES:
+                    missing_coordinates.append((country_orig, country_norm))
+                    continue
+                display_name = name_map_reverse.get(country_norm, country_norm)
+                folium.Marker(
+                    location=COUNTRY_COORDINATES[country_norm], tooltip=f"{display_name} - {status_description}",
+                    icon=folium.Icon(color=STATUS_COLORS[status], icon='flag', prefix='fa'),
+                ).add_to(marker_group)
+        marker_group.add_to(m)
+
+    return m.get_root().render(), missing_coordinates
 
 # --- Streamlit Page ---
 
@@ -86,79 +106,30 @@ st.title("🗺️ Mapa de Atuação")
 st.markdown("Visualize os países onde o Grupo Chegou opera, operou ou está expandindo.")
 
 # --- Load Data & GeoJSON ---
-local_geojson_path = download_geojson(GEOJSON_URL, GEOJSON_LOCAL_PATH)
+# Geometria empacotada em assets/ e memorizada no processo; nada é baixado durante a página
+try:
+    world_geojson()
+    geometry_available = True
+except (OSError, ValueError) as e:
+    print(f"ERRO [Mapa]: Falha ao ler {WORLD_TOPOJSON_PATH}: {e}")
+    geometry_available = False
 
 # Create columns: 4 parts for the map, 1 part for the legend (adjust ratio if needed)
 map_col, legend_col = st.columns([4, 1])
 
 with map_col:
-    if local_geojson_path:
-        # Prepare data for coloring countries
-        country_status_df = create_country_status_df(COUNTRY_DATA, NAME_MAP)
-
-        # Create the base map
-        m = folium.Map(location=[20, -30], zoom_start=2.5, tiles="CartoDB positron", prefer_canvas=True) # Added prefer_canvas
-
-        if not country_status_df.empty:
-            # Dict for country fill colors
-            country_to_fill_color = {
-                row['country']: STATUS_COLORS_HEX[row['status']]
-                for index, row in country_status_df.iterrows()
-            }
-
-            # --- Add GeoJson Layer for Country Coloring ---
-            style_function = lambda x: {
-                'fillColor': country_to_fill_color.get(x['properties']['name'], STATUS_COLORS_HEX['default']),
-                'color': 'black', 'weight': 0.5,
-                'fillOpacity': 0.65 if x['properties']['name'] in country_to_fill_color else 0.2 # Slightly more opaque fill
-            }
-            tooltip_geojson = folium.features.GeoJsonTooltip(
-                fields=['name'], aliases=['País:'], localize=True, sticky=False,
-                 style=("background-color: white; color: black; font-family: arial; font-size: 12px; padding: 5px;")
-            )
-            folium.GeoJson(
-                local_geojson_path, name='Status dos Países', style_function=style_function,
-                tooltip=tooltip_geojson,
-                highlight_function=lambda x: {'weight': 1, 'fillOpacity': 0.85 if x['properties']['name'] in country_to_fill_color else 0.4},
-            ).add_to(m)
-
-            # --- Add Markers with Icons ---
-            marker_group = folium.FeatureGroup(name="Ícones de Status")
-            name_map_reverse = {v: k for k, v in NAME_MAP.items()}
-
-            for status, countries in COUNTRY_DATA.items():
-                 icon_color = STATUS_COLORS[status]
-                 icon_symbol = 'flag'
-                 status_description = {
-                     "active": "Atuando Atualmente", "past": "Já Atuamos (Não Ativo)", "expanding": "Em Expansão / Validação"
-                 }.get(status, status.capitalize())
-
-                 for country_orig in countries:
-                     country_norm = NAME_MAP.get(country_orig, country_orig)
-                     if country_norm in COUNTRY_COORDINATES:
-                         coords = COUNTRY_COORDINATES[country_norm]
-                         display_name = name_map_reverse.get(country_norm, country_norm)
-                         folium.Marker(
-                             location=coords, tooltip=f"{display_name} - {status_description}",
-                             icon=folium.Icon(color=icon_color, icon=icon_symbol, prefix='fa'),
-                         ).add_to(marker_group)
-                     else:
-                         # Display warning in the main area, not just console
-                         st.warning(f"Coordenadas não encontradas para '{country_orig}' (Normalizado: '{country_norm}'). Ícone não adicionado.")
-
-            marker_group.add_to(m)
-
-            # Display the map in the map column
-            st_folium(m, use_container_width=True, height=650, returned_objects=[]) # Adjusted height slightly
-
-        else:
+    if geometry_available:
+        if not any(COUNTRY_DATA.values()):
             st.warning("Nenhum dado de país definido no código para exibir no mapa.")
-            m = folium.Map(location=[20, -30], zoom_start=2, tiles="CartoDB positron")
-            st_folium(m, use_container_width=True, height=650, returned_objects=[])
+        map_html, missing_coordinates = build_map_html(COUNTRY_DATA)
+        for country_orig, country_norm in missing_coordinates:
+            st.warning(f"Coordenadas não encontradas para '{country_orig}' (Normalizado: '{country_norm}'). Ícone não adicionado.")
+        # HTML pronto em cache: a página não remonta o mapa nem reenvia a geometria a cada execução
+        components.html(map_html, height=MAP_HEIGHT)
 
     else:
         st.error("Não foi possível carregar o mapa devido à falta do arquivo GeoJSON.")
-        st.info("Verifique a conexão com a internet ou se o arquivo `assets/world-countries.json` existe.")
+        st.info("Verifique se o arquivo `assets/world-countries.topo.json` existe (gere com `python -m principal.geometria`).")
 
 with legend_col:
     # --- Custom Legend in the legend column ---
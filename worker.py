@@ -1,21 +1,43 @@
+import time
+# Início da importação do worker (relatório de --profile-startup)
+_STARTUP_T0 = time.perf_counter()
 import os
 import sys
-import time
+import importlib
 from datetime import datetime, timedelta, timezone, date
 import traceback
+from contextlib import contextmanager
 
 try:
     import psycopg2
     from psycopg2 import Error as PgError
-    import sqlite3
-    import pandas as pd
-    from facebook_business.api import FacebookAdsApi
-    from facebook_business.adobjects.adaccount import AdAccount
-    from facebook_business.adobjects.campaign import Campaign
+    from facebook.graph import (
+        DEFAULT_INSIGHT_WINDOW, INSIGHTS_DEFAULT, fetch_campaigns_raw, fetch_daily_insights, fetch_insights_raw,
+        fetch_insights_windows_raw, make_api,
+    )
 except ImportError as import_err:
     print(f"ERRO FATAL [Worker]: Biblioteca necessária não encontrada: {import_err}")
     sys.exit(1)
 
+_STARTUP_IMPORTS_S = time.perf_counter() - _STARTUP_T0
+
+# Módulos pesados carregados só pelo modo escolhido (SDK do Facebook, pandas/numpy).
+# As funções importam localmente o que usam; main() carrega a lista do modo antes
+# de começar, para falhar cedo se faltar biblioteca e para medir o custo.
+MODE_DEPENDENCIES = {
+    "rules": [
+        "facebook_business.api", "facebook_business.adobjects.adaccount",
+        "facebook_business.adobjects.campaign", "facebook.cache_compartilhado",
+        "facebook.condicoes", "facebook.mudancas", "facebook.plano_acoes",
+    ],
+    "sync-insights": [
+        "facebook_business.api", "facebook_business.adobjects.adaccount",
+        "pandas", "facebook.backtest", "facebook.cubo_metricas",
+    ],
+}
+# Os dois modos terminam atualizando os agregados do Dashboard
+COMMON_DEPENDENCIES = ["facebook.rollups"]
+
 # --- Bloco de Funções Reutilizadas (ADAPTADAS PARA WORKER) ---
 # <<<======================================================================>>>
 # <<<  COLE AQUI AS VERSÕES COMPLETAS E ADAPTADAS (SEM st., SEM CACHE)     >>>
@@ -23,7 +45,7 @@ except ImportError as import_err:
 # <<<  get_active_api_config (RENOMEAR para get_api_config_by_id talvez?),>>>
 # <<<  get_all_api_configs_worker (NOVA), init_facebook_api_worker,        >>>
 # <<<  get_campaign_insights, get_facebook_campaigns,                      >>>
-# <<<  simulate_rule_application, log_rule_execution, execute_rule        >>>
+# <<<  log_rule_execution, execute_campaign_plan (condições em facebook.condicoes) >>>
 # <<<======================================================================>>>
 
 # Exemplo de get_db_connection_worker (COLE A SUA VERSÃO COMPLETA)
@@ -81,6 +103,18 @@ def close_connection_worker(conn_info):
         print(f"AVISO [Worker DB]: Erro ao fechar conexão {conn_type}: {e}")
 
 # Exemplo de execute_query (COLE A SUA VERSÃO COMPLETA)
+@contextmanager
+def db_connection_worker():
+    """Conexão pelo tempo do bloco `with`, no formato esperado pelo cache compartilhado da Graph API."""
+    conn_info = get_db_connection_worker()
+    if conn_info is None or conn_info[0] is None:
+        yield None
+        return
+    try:
+        yield conn_info
+    finally:
+        close_connection_worker(conn_info)
+
 def execute_query(query, params=None, fetch_one=False, fetch_all=False, is_dml=False):
     """Executa uma query no banco de dados (VERSÃO WORKER)."""
     conn_info = get_db_connection_worker()
@@ -133,7 +167,7 @@ def execute_query(query, params=None, fetch_one=False, fetch_all=False, is_dml=F
 
         # print(f"DEBUG [Execute Query]: Resultado: {result}") # Log detalhado
 
-    except (PgError, sqlite3.Error, Exception) as e:
+    except Exception as e:
         error_type = type(e).__name__
         print(f"ERRO [Execute Query] ({error_type}): {e}")
         print(f"  Query: {query}")
@@ -194,6 +228,8 @@ def init_facebook_api_worker(config):
             return None # Retorna None se o token expirou
     # else: print(f"AVISO [Worker Init FB]: Data de expiração do token não definida para config ID {config.get('id')}.")
 
+    from facebook_business.api import FacebookAdsApi
+    from facebook_business.adobjects.adaccount import AdAccount
     try:
         # REMOVA a linha com clear_instance=True - NÃO É NECESSÁRIA/SUPORTADA
         # FacebookAdsApi.init(clear_instance=True) # <<< LINHA REMOVIDA
@@ -219,81 +255,70 @@ def init_facebook_api_worker(config):
         # print(f"Traceback: {traceback.format_exc()}")
         return None # Retorna None em caso de erro
 
-def get_campaign_insights(account_id, campaign_ids_list, time_range='last_7d'):
-     """Busca insights (VERSÃO WORKER - sem cache)."""
+def process_worker_insight(insight_dict):
+    """Extrai compras, carrinho, CPA, ROAS e converte as métricas de um insight bruto (VERSÃO WORKER)."""
+    purchases = 0
+    purchase_value = 0.0
+    add_to_cart = 0
+    if 'actions' in insight_dict:
+        for action in insight_dict['actions']:
+            if action.get('action_type') == 'add_to_cart':
+                add_to_cart = int(float(action.get('value', 0)))
+            # Simplificado para pegar qualquer tipo de compra principal
+            if 'purchase' in action.get('action_type', ''):
+                 # Tenta pegar valor de compra mais específico primeiro
+                 action_values = action.get('action_values')
+                 if isinstance(action_values, list) and len(action_values) > 0:
+                     purchase_value += float(action_values[0].get('value', 0.0))
+                 else: # Fallback para o valor geral da ação
+                     purchase_value += float(action.get('value', 0.0))
+                 # Conta as compras (pode ser impreciso se houver vários tipos 'purchase')
+                 purchases += int(float(action.get('value', 0))) # Tenta converter valor para int
+
+
+    # Extrai CPA de compra (pode precisar de ajuste fino nos action_types)
+    cpa = 0.0
+    if 'cost_per_action_type' in insight_dict:
+        for cost_action in insight_dict['cost_per_action_type']:
+            if 'purchase' in cost_action.get('action_type', ''):
+                cpa = float(cost_action.get('value', 0.0))
+                break # Pega o primeiro CPA de compra encontrado
+
+    # Extrai ROAS
+    roas = 0.0
+    if 'purchase_roas' in insight_dict:
+         roas_list = insight_dict['purchase_roas']
+         if roas_list and isinstance(roas_list, list) and len(roas_list) > 0:
+             roas = float(roas_list[0].get('value', 0.0))
+
+    insight_dict['purchases'] = purchases
+    insight_dict['cpa'] = cpa
+    insight_dict['roas'] = roas
+    insight_dict['purchase_value'] = purchase_value # Valor total de compra
+    insight_dict['add_to_cart'] = add_to_cart
+
+    # Adiciona outras métricas importantes que já vêm
+    insight_dict['spend'] = float(insight_dict.get('spend', 0.0))
+    insight_dict['clicks'] = int(insight_dict.get('clicks', 0))
+    insight_dict['impressions'] = int(insight_dict.get('impressions', 0))
+    insight_dict['reach'] = int(insight_dict.get('reach', 0))
+    insight_dict['ctr'] = float(insight_dict.get('ctr', 0.0))
+    insight_dict['cpc'] = float(insight_dict.get('cpc', 0.0))
+    return insight_dict
+
+def get_campaign_insights(account_id, campaign_ids_list, time_range='last_7d', shared_cache=None):
+     """Busca insights (VERSÃO WORKER - via cache compartilhado com o app, se disponível)."""
      # (Copiado de gerenciador.py, removido @st.cache_data, adaptado logs)
      if not account_id or not campaign_ids_list:
         print("WARN [Worker insights]: Account ID ou lista de IDs de campanha vazia.")
         return []
      print(f"INFO [Worker insights]: Buscando insights para {len(campaign_ids_list)} campanhas (conta {account_id}, período {time_range})...")
+     from facebook_business.adobjects.adaccount import AdAccount
      try:
-        params = {
-            'level': 'campaign',
-            'filtering': [{'field': 'campaign.id', 'operator': 'IN', 'value': campaign_ids_list}],
-            'breakdowns': []
-        }
-        if time_range == 'yesterday':
-            yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-            params['time_range'] = {'since': yesterday, 'until': yesterday}
-        elif time_range == 'last_7d': params['date_preset'] = 'last_7d'
-        elif time_range == 'last_30d': params['date_preset'] = 'last_30d'
-        else: params['date_preset'] = 'last_7d' # Default
-
+        # Mesma consulta (campos, filtro e período) do app, então a resposta é compartilhada pelo cache
         account = AdAccount(f'act_{account_id}')
-        insights = account.get_insights(
-            params=params,
-            fields=[ # Campos essenciais para as regras
-                'campaign_id', 'campaign_name', 'spend', 'impressions', 'clicks',
-                'ctr', 'cpc', 'actions', 'cost_per_action_type', 'purchase_roas'
-            ]
-        )
-        processed_insights = []
-        for insight in insights:
-            insight_dict = insight.export_all_data()
-            purchases = 0
-            purchase_value = 0.0
-            if 'actions' in insight_dict:
-                for action in insight_dict['actions']:
-                    # Simplificado para pegar qualquer tipo de compra principal
-                    if 'purchase' in action.get('action_type', ''):
-                         # Tenta pegar valor de compra mais específico primeiro
-                         action_values = action.get('action_values')
-                         if isinstance(action_values, list) and len(action_values) > 0:
-                             purchase_value += float(action_values[0].get('value', 0.0))
-                         else: # Fallback para o valor geral da ação
-                             purchase_value += float(action.get('value', 0.0))
-                         # Conta as compras (pode ser impreciso se houver vários tipos 'purchase')
-                         purchases += int(float(action.get('value', 0))) # Tenta converter valor para int
-
-
-            # Extrai CPA de compra (pode precisar de ajuste fino nos action_types)
-            cpa = 0.0
-            if 'cost_per_action_type' in insight_dict:
-                for cost_action in insight_dict['cost_per_action_type']:
-                    if 'purchase' in cost_action.get('action_type', ''):
-                        cpa = float(cost_action.get('value', 0.0))
-                        break # Pega o primeiro CPA de compra encontrado
-
-            # Extrai ROAS
-            roas = 0.0
-            if 'purchase_roas' in insight_dict:
-                 roas_list = insight_dict['purchase_roas']
-                 if roas_list and isinstance(roas_list, list) and len(roas_list) > 0:
-                     roas = float(roas_list[0].get('value', 0.0))
-
-            insight_dict['purchases'] = purchases
-            insight_dict['cpa'] = cpa
-            insight_dict['roas'] = roas
-            insight_dict['purchase_value'] = purchase_value # Valor total de compra
-
-            # Adiciona outras métricas importantes que já vêm
-            insight_dict['spend'] = float(insight_dict.get('spend', 0.0))
-            insight_dict['clicks'] = int(insight_dict.get('clicks', 0))
-            insight_dict['impressions'] = int(insight_dict.get('impressions', 0))
-            insight_dict['ctr'] = float(insight_dict.get('ctr', 0.0))
-            insight_dict['cpc'] = float(insight_dict.get('cpc', 0.0))
-
-            processed_insights.append(insight_dict)
+        insights = fetch_insights_raw(account, account_id, campaign_ids_list, time_range, shared_cache)
+        processed_insights = [process_worker_insight(insight_dict) for insight_dict in insights]
         print(f"INFO [Worker insights]: {len(processed_insights)} insights processados.")
         return processed_insights
      except Exception as e:
@@ -301,10 +326,36 @@ def get_campaign_insights(account_id, campaign_ids_list, time_range='last_7d'):
         print(f"Traceback: {traceback.format_exc()}")
         return [] # Retorna lista vazia em caso de erro
 
-def get_facebook_campaigns(account_id_from_worker):
-    """Busca campanhas e insights (VERSÃO WORKER - sem cache)."""
+def get_campaign_insights_windows(account_id, campaign_ids_list, windows, shared_cache=None):
+    """
+    Insights processados de várias janelas ({janela: [insights]}) com uma única
+    chamada à Graph API (time_ranges); cada janela fica no cache compartilhado
+    com a mesma chave usada pelo app.
+    """
+    print(f"INFO [Worker insights]: Buscando insights para {len(campaign_ids_list)} campanhas (conta {account_id}, janelas {', '.join(windows)})...")
+    from facebook_business.adobjects.adaccount import AdAccount
+    try:
+        account = AdAccount(f'act_{account_id}')
+        raw_by_window = fetch_insights_windows_raw(account, account_id, campaign_ids_list, windows, shared_cache)
+        return {window: [process_worker_insight(insight_dict) for insight_dict in rows] for window, rows in raw_by_window.items()}
+    except Exception as e:
+        print(f"ERRO [Worker insights]: Falha ao obter insights por janela para a conta {account_id}: {e}")
+        print(f"Traceback: {traceback.format_exc()}")
+        return {window: [] for window in windows}
+
+# Status de campanha considerados pelo worker (filtrados localmente para que a consulta
+# à Graph API seja a mesma do app e a resposta venha do cache compartilhado)
+WORKER_CAMPAIGN_STATUSES = ['ACTIVE', 'PAUSED', 'PENDING_REVIEW', 'WITH_ISSUES', 'DISAPPROVED']
+
+def get_facebook_campaigns(account_id_from_worker, shared_cache=None, windows=()):
+    """
+    Busca campanhas e insights (VERSÃO WORKER - via cache compartilhado com o app, se disponível).
+    Janelas extras de `windows` vêm na mesma chamada de insights, em campaign["insights_by_window"].
+    """
     # (Copiado de gerenciador.py, removido @st.cache_data, chama init_facebook_api_worker e get_campaign_insights, adaptado logs)
     print(f"INFO [Worker campaigns]: Buscando campanhas da conta {account_id_from_worker}...")
+    from facebook_business.api import FacebookAdsApi
+    from facebook_business.adobjects.adaccount import AdAccount
     campaigns_result = []
     try:
         # API já deve estar inicializada por init_facebook_api_worker chamado antes
@@ -314,14 +365,9 @@ def get_facebook_campaigns(account_id_from_worker):
              return None
 
         account = AdAccount(f'act_{account_id_from_worker}')
-        fields_to_fetch = [
-            'id', 'name', 'status', 'objective', 'created_time',
-            'start_time', 'stop_time', 'daily_budget', 'lifetime_budget',
-            'effective_status', # Importante para saber se está realmente ativa/pausada
-            'buying_type', 'budget_remaining'
-        ]
-        # Aumenta o limite para buscar mais campanhas se necessário
-        campaigns_raw = list(account.get_campaigns(fields=fields_to_fetch, params={'limit': 500, 'filtering': "[{'field':'effective_status','operator':'IN','value':['ACTIVE','PAUSED','PENDING_REVIEW','WITH_ISSUES','DISAPPROVED']}]"})) # Filtra status relevantes
+        all_campaigns_raw = fetch_campaigns_raw(account, account_id_from_worker, shared_cache)
+        # Filtra status relevantes
+        campaigns_raw = [c for c in all_campaigns_raw if c.get('effective_status') in WORKER_CAMPAIGN_STATUSES]
 
         if not campaigns_raw:
              print("INFO [Worker campaigns]: Nenhuma campanha encontrada (ou nenhuma com status relevante).")
@@ -331,23 +377,33 @@ def get_facebook_campaigns(account_id_from_worker):
         if not campaign_ids: return []
         print(f"INFO [Worker campaigns]: {len(campaign_ids)} campanhas encontradas. Buscando insights...")
 
-        # Chama a versão worker de get_campaign_insights
-        insights_data = get_campaign_insights(account_id_from_worker, campaign_ids, "last_7d") # Usando last_7d como padrão
+        # Insights de todas as campanhas da conta (mesma consulta do app, compartilhada pelo cache)
+        all_campaign_ids = [campaign.get("id") for campaign in all_campaigns_raw if campaign.get("id")]
+        extra_windows = [window for window in windows if window != DEFAULT_INSIGHT_WINDOW]
+        window_maps = {}
+        if extra_windows:
+            by_window = get_campaign_insights_windows(account_id_from_worker, all_campaign_ids, [DEFAULT_INSIGHT_WINDOW] + extra_windows, shared_cache)
+            insights_data = by_window[DEFAULT_INSIGHT_WINDOW]
+            window_maps = {
+                window: {insight.get("campaign_id"): insight for insight in by_window[window] if insight.get("campaign_id")}
+                for window in extra_windows
+            }
+        else:
+            insights_data = get_campaign_insights(account_id_from_worker, all_campaign_ids, DEFAULT_INSIGHT_WINDOW, shared_cache)
         insights_map = {insight.get("campaign_id"): insight for insight in insights_data if insight.get("campaign_id")}
         print(f"INFO [Worker campaigns]: {len(insights_map)} insights encontrados.")
 
-        for campaign in campaigns_raw:
-            campaign_dict = campaign.export_all_data()
+        for campaign_dict in campaigns_raw:
             campaign_id = campaign_dict.get("id")
             if not campaign_id: continue
 
             campaign_insights = insights_map.get(campaign_id)
-            insights_default = {
-                "cpa": 0.0, "purchases": 0, "roas": 0.0, "purchase_value": 0.0,
-                "spend": 0.0, "clicks": 0, "impressions": 0, "ctr": 0.0, "cpc": 0.0
-            }
-            # Combina insights ou usa default
-            campaign_dict["insights"] = {**insights_default, **(campaign_insights or {})}
+            # Combina insights ou usa default (mesmas chaves do app)
+            campaign_dict["insights"] = {**INSIGHTS_DEFAULT, **(campaign_insights or {})}
+            if window_maps:
+                campaign_dict["insights_by_window"] = {
+                    window: {**INSIGHTS_DEFAULT, **(window_map.get(campaign_id) or {})} for window, window_map in window_maps.items()
+                }
 
             # Converte orçamento para centavos (int)
             daily_budget_str = campaign_dict.get('daily_budget')
@@ -367,120 +423,6 @@ def get_facebook_campaigns(account_id_from_worker):
 
 
 # --- Funções de Regras (ADAPTADAS PARA WORKER) ---
-def simulate_rule_application(campaign, rules):
-    """Verifica quais regras ativas teriam suas condições atendidas (VERSÃO WORKER - sem st.)."""
-    # (Copiado de gerenciador.py - geralmente não precisa de adaptação significativa)
-    rule_results = []
-    if not campaign or not isinstance(campaign, dict) or "insights" not in campaign:
-        # print("DEBUG [Simulate]: Campanha inválida ou sem insights.")
-        return []
-
-    # Extrai métricas da campanha (garante que são float/int)
-    insights = campaign.get("insights", {})
-    metrics = {
-        'cpa': float(insights.get("cpa", 0.0)),
-        'purchases': int(insights.get("purchases", 0)),
-        'roas': float(insights.get("roas", 0.0)),
-        'spend': float(insights.get("spend", 0.0)),
-        'clicks': int(insights.get("clicks", 0)),
-        'ctr': float(insights.get("ctr", 0.0)),
-        'cpc': float(insights.get("cpc", 0.0)),
-    }
-    current_daily_budget = int(campaign.get('daily_budget', 0))
-    current_lifetime_budget = int(campaign.get('lifetime_budget', 0))
-    current_budget = current_daily_budget if current_daily_budget > 0 else current_lifetime_budget
-
-    for rule in rules:
-        # Worker só deve simular regras ativas passadas para ele
-        if not isinstance(rule, dict) or not rule.get('is_active', 1): continue # Pula se não for dict ou inativa
-
-        primary_metric_key = rule.get('primary_metric')
-        primary_operator = rule.get('primary_operator')
-        primary_value_rule = rule.get('primary_value') # Vem como float/real do DB
-
-        if None in [primary_metric_key, primary_operator] or primary_value_rule is None or primary_metric_key not in metrics:
-            # print(f"DEBUG [Simulate Rule {rule.get('id')}]: Condição primária inválida ou métrica não encontrada.")
-            continue
-
-        primary_value_campaign = metrics[primary_metric_key]
-        primary_condition_met = False
-        try:
-            # Comparação direta (ambos devem ser numéricos)
-            if primary_operator == '<' and primary_value_campaign < primary_value_rule: primary_condition_met = True
-            elif primary_operator == '<=' and primary_value_campaign <= primary_value_rule: primary_condition_met = True
-            elif primary_operator == '>' and primary_value_campaign > primary_value_rule: primary_condition_met = True
-            elif primary_operator == '>=' and primary_value_campaign >= primary_value_rule: primary_condition_met = True
-            elif primary_operator == '==' and primary_value_campaign == primary_value_rule: primary_condition_met = True
-        except TypeError as te:
-            print(f"WARN [Simulate Rule {rule.get('id')}]: Erro de tipo na comparação primária - Campanha: {primary_value_campaign}, Regra: {primary_value_rule}. {te}")
-            continue
-
-        condition_met = primary_condition_met
-
-        if rule.get('is_composite'): # is_composite é 0 ou 1
-            secondary_metric_key = rule.get('secondary_metric')
-            secondary_operator = rule.get('secondary_operator')
-            secondary_value_rule = rule.get('secondary_value') # Vem como float/real
-            join_operator = rule.get('join_operator', 'AND')
-
-            if None in [secondary_metric_key, secondary_operator] or secondary_value_rule is None or secondary_metric_key not in metrics:
-                 if join_operator == 'AND': condition_met = False # Se AND, falha se secundária for inválida
-                 # Se OR, o resultado da primária ainda vale
-            else:
-                secondary_value_campaign = metrics[secondary_metric_key]
-                secondary_condition_met = False
-                try:
-                    # Comparação secundária
-                    if secondary_operator == '<' and secondary_value_campaign < secondary_value_rule: secondary_condition_met = True
-                    elif secondary_operator == '<=' and secondary_value_campaign <= secondary_value_rule: secondary_condition_met = True
-                    elif secondary_operator == '>' and secondary_value_campaign > secondary_value_rule: secondary_condition_met = True
-                    elif secondary_operator == '>=' and secondary_value_campaign >= secondary_value_rule: secondary_condition_met = True
-                    elif secondary_operator == '==' and secondary_value_campaign == secondary_value_rule: secondary_condition_met = True
-                except TypeError as te2:
-                    print(f"WARN [Simulate Rule {rule.get('id')}]: Erro de tipo na comparação secundária - Campanha: {secondary_value_campaign}, Regra: {secondary_value_rule}. {te2}")
-                    secondary_condition_met = False # Considera falso se der erro
-
-                if join_operator == 'AND': condition_met = primary_condition_met and secondary_condition_met
-                elif join_operator == 'OR': condition_met = primary_condition_met or secondary_condition_met
-                else: condition_met = False # Operador desconhecido
-
-        if condition_met:
-            action_type = rule.get('action_type')
-            action_value = rule.get('action_value') # Vem como float/real
-            action_text = ""
-            new_budget_simulated = None
-            min_budget_cents = 100 # Orçamento mínimo (ex: R$ 1,00)
-
-            # Lógica para determinar texto da ação e orçamento simulado
-            if action_type == 'duplicate_budget':
-                action_text = "Duplicar orçamento"
-                if current_budget > 0: new_budget_simulated = max(min_budget_cents, current_budget * 2)
-            elif action_type == 'triple_budget':
-                action_text = "Triplicar orçamento"
-                if current_budget > 0: new_budget_simulated = max(min_budget_cents, current_budget * 3)
-            elif action_type == 'pause_campaign': action_text = "Pausar campanha"
-            elif action_type == 'activate_campaign': action_text = "Ativar campanha"
-            elif action_type == 'halve_budget':
-                action_text = "Reduzir orçamento pela metade"
-                if current_budget > 0: new_budget_simulated = max(min_budget_cents, current_budget // 2)
-            elif action_type == 'custom_budget_multiplier' and action_value is not None:
-                 multiplier = float(action_value) # Já deve ser float
-                 action_text = f"Multiplicar orçamento por {multiplier:.2f}"
-                 if current_budget > 0: new_budget_simulated = max(min_budget_cents, int(current_budget * multiplier))
-            elif action_type == 'custom_budget_multiplier' and action_value is None:
-                 action_text = "Multiplicar orçamento (VALOR NÃO DEFINIDO!)"
-            else:
-                 action_text = f"Ação desconhecida ({action_type})"
-
-            rule_results.append({
-                "rule_id": rule.get('id'),
-                "rule_name": rule.get('name', 'Regra sem nome'),
-                "action": action_text,
-                "new_budget_simulated": new_budget_simulated # Pode ser None
-            })
-
-    return rule_results
-
 def log_rule_execution(rule_id, ad_object_id, ad_object_type, ad_object_name, was_successful, message=""):
     """Registra a execução de uma regra no banco (VERSÃO WORKER - sem st.)."""
     # (Copiado de gerenciador.py, adaptado para usar execute_query worker)
@@ -507,173 +449,80 @@ def log_rule_execution(rule_id, ad_object_id, ad_object_type, ad_object_name, wa
         # print(f"DEBUG [Log exec]: Log inserido com sucesso.")
         return True
 
-def execute_rule(campaign_id, rule_id):
-    """Executa a ação definida por uma regra (VERSÃO WORKER - sem st.)."""
-    # (Copiado de gerenciador.py, adaptado para usar funções worker e logging)
-    print(f"INFO [Exec Rule]: Tentando executar Regra ID {rule_id} na Campanha ID {campaign_id}")
-    campaign_name = f'Campanha ID {campaign_id}' # Nome default
-    success = False
-    message = ""
-    rule = None # Para garantir que rule está definida
+def execute_campaign_plan(campaign_id, campaign_name, rules):
+    """
+    Aplica numa campanha as ações de todas as `rules` que atenderam a condição
+    neste ciclo (VERSÃO WORKER - sem st.): uma leitura e no máximo uma escrita
+    na API, com a ação líquida de facebook/plano_acoes.py. Registra uma linha
+    em rule_executions por regra. Retorna ({rule_id: (success, message)}, escreveu).
+    """
+    from facebook_business.api import FacebookAdsApi
+    from facebook_business.adobjects.campaign import Campaign
+    from facebook.plano_acoes import compute_plan_action, plan_campaign_actions, plan_rule_ids
+    rule_ids = [rule['id'] for rule in rules]
+    print(f"INFO [Exec Plano]: Regras {rule_ids} na Campanha ID {campaign_id}")
+    plan = plan_campaign_actions(rules)
+    wrote = False
 
     try:
-        # 1. Buscar a regra específica no DB (não precisamos de todas)
-        query_rule = """
-            SELECT id, name, action_type, action_value, is_active
-            FROM rules WHERE id = %s
-        """
-        # execute_query retorna tupla ou None
-        rule_data = execute_query(query_rule, (rule_id,), fetch_one=True)
-        if not rule_data:
-            message = f"Regra ID {rule_id} não encontrada no banco de dados."
-            print(f"ERRO [Exec Rule]: {message}")
-            log_rule_execution(rule_id, campaign_id, 'campaign', campaign_name, False, message)
-            return False, message
-
-        # Mapeia para dict
-        rule_keys_exec = ["id", "name", "action_type", "action_value", "is_active"]
-        rule = dict(zip(rule_keys_exec, rule_data))
-
-        # 2. Verificar se a regra está ativa
-        if not rule.get('is_active'):
-            message = f"Regra '{rule.get('name')}' (ID: {rule_id}) está inativa."
-            print(f"AVISO [Exec Rule]: {message}")
-            # Não logamos como falha de execução, apenas não executamos
-            return False, message # Indica que não executou, mas não foi um erro
-
-        # 3. Garantir que a API está inicializada (embora já deva estar)
-        if not FacebookAdsApi.get_default_api():
-             message = "API do Facebook não inicializada antes de executar regra."
-             print(f"ERRO [Exec Rule]: {message}")
-             log_rule_execution(rule_id, campaign_id, 'campaign', rule.get('name', 'N/A'), False, message)
-             return False, message
-
-        # 4. Obter dados atuais da campanha via API
-        try:
-            print(f"  -> Buscando dados da campanha {campaign_id} via API...")
-            campaign_obj = Campaign(campaign_id)
-            # Campos necessários para aplicar ações e logar nome
-            campaign_data = campaign_obj.api_get(fields=['name', 'status', 'daily_budget', 'lifetime_budget', 'effective_status'])
-            campaign_name = campaign_data.get('name', campaign_name) # Atualiza nome
-            print(f"  -> Dados encontrados para '{campaign_name}'. Status: {campaign_data.get('effective_status')}")
-        except Exception as api_get_err:
-            message = f"Erro ao buscar dados da campanha {campaign_id} na API: {api_get_err}"
-            print(f"ERRO [Exec Rule]: {message}")
-            log_rule_execution(rule_id, campaign_id, 'campaign', campaign_name, False, message)
-            return False, message
-
-        # 5. Determinar e aplicar a ação
-        action_params = {} # Parâmetros para a chamada api_update
-        current_daily_budget = int(campaign_data.get('daily_budget', 0))
-        current_lifetime_budget = int(campaign_data.get('lifetime_budget', 0))
-        current_status = campaign_data.get('status') # Status configurado (ACTIVE/PAUSED)
-        effective_status = campaign_data.get('effective_status') # Status real (pode ser afetado por conta, adset, etc.)
-        min_budget_cents = 100 # R$ 1,00
-
-        action_type = rule['action_type']
-        action_value = rule.get('action_value') # Vem como float/real
-
-        if action_type == 'duplicate_budget':
-            if current_daily_budget > 0:
-                new_budget = max(min_budget_cents, current_daily_budget * 2)
-                action_params = {'daily_budget': new_budget}
-                message = f"Orçamento diário duplicado para {new_budget/100:.2f}"
-            elif current_lifetime_budget > 0:
-                new_budget = max(min_budget_cents, current_lifetime_budget * 2)
-                action_params = {'lifetime_budget': new_budget}
-                message = f"Orçamento total duplicado para {new_budget/100:.2f}"
-            else: message = "Nenhum orçamento (diário/total) encontrado para duplicar"; action_params=None; success=False # Não executa API
-
-        elif action_type == 'triple_budget':
-            if current_daily_budget > 0:
-                new_budget = max(min_budget_cents, current_daily_budget * 3)
-                action_params = {'daily_budget': new_budget}
-                message = f"Orçamento diário triplicado para {new_budget/100:.2f}"
-            elif current_lifetime_budget > 0:
-                new_budget = max(min_budget_cents, current_lifetime_budget * 3)
-                action_params = {'lifetime_budget': new_budget}
-                message = f"Orçamento total triplicado para {new_budget/100:.2f}"
-            else: message = "Nenhum orçamento encontrado para triplicar"; action_params=None; success=False
-
-        elif action_type == 'pause_campaign':
-            if current_status == Campaign.Status.active:
-                action_params = {'status': Campaign.Status.paused}
-                message = "Campanha pausada"
-            else: # Se já está pausada ou outro status, considera sucesso (não fazer nada)
-                 message = f"Campanha já estava com status '{current_status}'. Nenhuma ação necessária."
-                 action_params=None; success = True # Não executa API, mas loga como sucesso
-
-        elif action_type == 'activate_campaign':
-             if current_status == Campaign.Status.paused:
-                action_params = {'status': Campaign.Status.active}
-                message = "Campanha ativada"
-             else: # Se já ativa ou outro status, considera sucesso
-                 message = f"Campanha já estava com status '{current_status}'. Nenhuma ação necessária."
-                 action_params=None; success = True # Não executa API, mas loga como sucesso
-
-        elif action_type == 'halve_budget':
-            if current_daily_budget > 0:
-                new_budget = max(min_budget_cents, current_daily_budget // 2)
-                action_params = {'daily_budget': new_budget}
-                message = f"Orçamento diário reduzido para {new_budget/100:.2f}"
-            elif current_lifetime_budget > 0:
-                new_budget = max(min_budget_cents, current_lifetime_budget // 2)
-                action_params = {'lifetime_budget': new_budget}
-                message = f"Orçamento total reduzido para {new_budget/100:.2f}"
-            else: message = "Nenhum orçamento encontrado para reduzir"; action_params=None; success=False
-
-        elif action_type == 'custom_budget_multiplier':
-            if action_value is None or action_value <= 0:
-                 message = f"Multiplicador de orçamento inválido ({action_value}) na regra."
-                 action_params=None; success = False
-            else:
-                multiplier = float(action_value) # Garante float
-                if current_daily_budget > 0:
-                    new_budget = max(min_budget_cents, int(current_daily_budget * multiplier))
-                    action_params = {'daily_budget': new_budget}
-                    message = f"Orçamento diário multiplicado por {multiplier:.2f} para {new_budget/100:.2f}"
-                elif current_lifetime_budget > 0:
-                    new_budget = max(min_budget_cents, int(current_lifetime_budget * multiplier))
-                    action_params = {'lifetime_budget': new_budget}
-                    message = f"Orçamento total multiplicado por {multiplier:.2f} para {new_budget/100:.2f}"
-                else: message = "Nenhum orçamento encontrado para multiplicar"; action_params=None; success=False
+        if not plan_rule_ids(plan):
+            outcomes = plan['outcomes'] # Nada a aplicar (substituídas ou inválidas): sem chamadas à API
+        elif not FacebookAdsApi.get_default_api():
+            message = "API do Facebook não inicializada antes de executar regra."
+            print(f"ERRO [Exec Plano]: {message}")
+            outcomes = {**plan['outcomes'], **{rule_id: (False, message) for rule_id in plan_rule_ids(plan)}}
         else:
-             message = f"Tipo de ação desconhecido ou inválido na regra: {action_type}"; action_params=None; success = False
-
-        # 6. Executar chamada à API se houver parâmetros
-        if action_params:
-            print(f"  -> Aplicando Ação API: {action_params} para Campanha ID {campaign_id}")
+            # Uma leitura do estado atual para todas as regras do plano
+            campaign_obj = Campaign(campaign_id)
             try:
-                campaign_obj.api_update(params=action_params)
-                success = True
-                print(f"  -> Ação API aplicada com sucesso.")
-                # Mensagem já foi definida acima
-            except Exception as api_update_err:
-                message = f"Erro da API ao aplicar ação '{action_type}': {api_update_err}"
-                print(f"ERRO [Exec Rule]: {message}")
-                success = False
-        elif success: # Caso onde a ação era "não fazer nada" e foi considerado sucesso
-             print(f"  -> Nenhuma chamada API necessária: {message}")
-        else: # Caso onde a ação não pôde ser determinada (ex: sem orçamento)
-             print(f"  -> Nenhuma chamada API executada: {message}")
-
-
+                campaign_data = campaign_obj.api_get(fields=['name', 'status', 'daily_budget', 'lifetime_budget', 'effective_status'])
+                campaign_name = campaign_data.get('name', campaign_name)
+            except Exception as api_get_err:
+                message = f"Erro ao buscar dados da campanha {campaign_id} na API: {api_get_err}"
+                print(f"ERRO [Exec Plano]: {message}")
+                campaign_data = None
+                outcomes = {**plan['outcomes'], **{rule_id: (False, message) for rule_id in plan_rule_ids(plan)}}
+
+            if campaign_data is not None:
+                action_params, outcomes = compute_plan_action(plan, campaign_data)
+                if action_params:
+                    print(f"  -> Aplicando Ação API: {action_params} para Campanha ID {campaign_id}")
+                    try:
+                        campaign_obj.api_update(params=action_params)
+                        wrote = True
+                        print(f"  -> Ação API aplicada com sucesso.")
+                    except Exception as api_update_err:
+                        message = f"Erro da API ao aplicar plano {action_params}: {api_update_err}"
+                        print(f"ERRO [Exec Plano]: {message}")
+                        outcomes.update({rule_id: (False, message) for rule_id in plan_rule_ids(plan)})
+                else:
+                    print(f"  -> Nenhuma chamada API necessária para Campanha ID {campaign_id}.")
     except Exception as e:
-        message = f"Erro inesperado durante execução da regra ID {rule_id} na campanha {campaign_id}: {str(e)}"
-        print(f"ERRO CRÍTICO [Exec Rule]: {message}\n{traceback.format_exc()}")
-        success = False
-
-    # 7. Logar o resultado final
-    log_rule_execution(
-        rule_id=rule_id, ad_object_id=campaign_id, ad_object_type='campaign',
-        ad_object_name=campaign_name, was_successful=success, message=message
-    )
-    return success, message
+        message = f"Erro inesperado durante execução das regras {rule_ids} na campanha {campaign_id}: {str(e)}"
+        print(f"ERRO CRÍTICO [Exec Plano]: {message}\n{traceback.format_exc()}")
+        outcomes = {rule_id: (False, message) for rule_id in rule_ids}
+
+    # Uma linha de log por regra, indicando quando a ação foi combinada com outras
+    shared = f" [plano com as regras {', '.join(str(rule_id) for rule_id in rule_ids)}]" if len(rule_ids) > 1 else ""
+    for rule_id in rule_ids:
+        success, message = outcomes[rule_id]
+        log_rule_execution(
+            rule_id=rule_id, ad_object_id=campaign_id, ad_object_type='campaign',
+            ad_object_name=campaign_name, was_successful=success, message=message + shared
+        )
+    return outcomes, wrote
 
 
 # --- Função Principal do Worker ---
-def run_automatic_rules():
-    """Verifica e executa regras automáticas agendadas PARA TODAS AS CONTAS."""
+def run_automatic_rules(change_detection=True):
+    """
+    Verifica e executa regras automáticas agendadas PARA TODAS AS CONTAS.
+    Com `change_detection`, pares regra × campanha sem mudança desde a última
+    avaliação são pulados (facebook/mudancas.py).
+    """
+    from facebook.cache_compartilhado import create_shared_cache
+    from facebook.condicoes import campaign_evaluator, condition_windows, rule_condition
+    from facebook.mudancas import CampaignFingerprints, load_fingerprints, rule_fingerprint, save_fingerprints
     start_time = time.time()
     print(f"\n--- [WORKER START - Multi-Conta] {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S %Z')} ---")
 
@@ -682,6 +531,11 @@ def run_automatic_rules():
     accounts_failed_init_count = 0
     rules_checked_count = 0
     rules_executed_count = 0
+    pairs_skipped_count = 0
+    pairs_evaluated_count = 0
+
+    # Cache de respostas da Graph API compartilhado com as réplicas do app
+    shared_cache = create_shared_cache(connection_factory=db_connection_worker)
 
     # 1. Buscar TODAS as configurações de API
     all_configs = get_all_api_configs_worker()
@@ -695,7 +549,7 @@ def run_automatic_rules():
         SELECT id, name, execution_interval_hours, last_automatic_run_at,
                is_composite, primary_metric, primary_operator, primary_value,
                secondary_metric, secondary_operator, secondary_value, join_operator,
-               action_type, action_value
+               action_type, action_value, condition_tree
         FROM rules
         WHERE execution_mode = 'automatic' AND is_active = 1 ORDER BY id
     """
@@ -711,7 +565,7 @@ def run_automatic_rules():
     # Mapeia nomes das colunas para facilitar acesso (IMPORTANTE: a ordem deve bater com o SELECT)
     rule_keys = ["id", "name", "execution_interval_hours", "last_automatic_run_at", "is_composite",
                  "primary_metric", "primary_operator", "primary_value", "secondary_metric",
-                 "secondary_operator", "secondary_value", "join_operator", "action_type", "action_value"]
+                 "secondary_operator", "secondary_value", "join_operator", "action_type", "action_value", "condition_tree"]
     all_rules = [dict(zip(rule_keys, rule_tuple)) for rule_tuple in rules_data]
 
     now_utc = datetime.now(timezone.utc)
@@ -762,6 +616,21 @@ def run_automatic_rules():
         print("INFO [Worker]: Nenhuma regra automática no horário para executar neste ciclo.")
     else:
         print(f"INFO [Worker]: {len(rules_due_to_run)} regras prontas para serem aplicadas nas contas.")
+        # Condição de cada regra e todas as janelas de métricas do ciclo (uma chamada de insights por conta)
+        conditions = {rule['id']: rule_condition(rule) for rule in rules_due_to_run}
+        cycle_windows = sorted(set().union(*(condition_windows(c) for c in conditions.values() if c is not None)))
+        print(f"INFO [Worker]: Janelas de métricas neste ciclo: {', '.join(cycle_windows) or DEFAULT_INSIGHT_WINDOW}")
+
+        # Impressões digitais da última avaliação de cada par regra × campanha
+        rule_fps = {rule['id']: rule_fingerprint(rule, conditions[rule['id']]) for rule in rules_due_to_run}
+        stored_fps = {}
+        if change_detection:
+            try:
+                stored_fps = load_fingerprints(db_connection_worker, list(rule_fps))
+                print(f"INFO [Worker]: {len(stored_fps)} avaliações anteriores carregadas para detecção de mudanças.")
+            except Exception as fp_err:
+                print(f"AVISO [Worker]: Detecção de mudanças desativada neste ciclo (falha ao ler impressões digitais): {fp_err}")
+                change_detection = False
 
         # 4. SEGUNDO LOOP: Iterar sobre as CONTAS
         for config in all_configs:
@@ -780,7 +649,7 @@ def run_automatic_rules():
                 continue # Pula para a próxima conta
 
             # 4.2. Buscar campanhas desta conta
-            campaigns_this_account = get_facebook_campaigns(current_account_id)
+            campaigns_this_account = get_facebook_campaigns(current_account_id, shared_cache, cycle_windows)
             if campaigns_this_account is None:
                 print(f"ERRO [Worker]: Falha ao buscar campanhas para {config_name}. Pulando regras para esta conta.")
                 continue
@@ -790,37 +659,76 @@ def run_automatic_rules():
             if not campaigns_to_check:
                  print(f"INFO [Worker]: Nenhuma campanha elegível em {config_name} para aplicar regras.")
             else:
+                # Métricas da conta em colunas: cada regra é avaliada de uma vez sobre todas
+                # as campanhas, e comparações repetidas entre regras reaproveitam a máscara
+                evaluator = campaign_evaluator(campaigns_to_check)
+                campaign_fps = [CampaignFingerprints(campaign) for campaign in campaigns_to_check]
+                fingerprints_to_save = []
+                matched_rules = {} # índice da campanha -> regras que atenderam a condição
+                any_write_this_account = False
+                matched_fps = {} # (rule_id, índice) -> impressão digital do par atendido
+
                 # 4.3. Iterar sobre as REGRAS QUE ESTÃO "DUE"
                 for rule in rules_due_to_run: # Usa a lista filtrada
                     rule_id = rule['id']
                     rule_name = rule['name']
                     print(f"  ---> Aplicando Regra ID {rule_id} ('{rule_name}') na Conta {config_name}")
-                    rule['is_active'] = 1 # Garante que está ativa para simulação
-
-                    # 4.4. Iterar sobre as CAMPANHAS desta conta
-                    for campaign in campaigns_to_check:
-                        campaign_id = campaign.get('id')
-                        campaign_name = campaign.get('name', f"ID {campaign_id}")
-                        # print(f"    -> Verificando Campanha ID {campaign_id} ('{campaign_name[:30]}...')") # Log muito verboso
-                        try:
-                            # Simula APENAS a regra atual na campanha atual
-                            sim_results = simulate_rule_application(campaign, [rule])
-                            # Verifica se a simulação retornou um resultado para ESTA regra
-                            if sim_results and any(s.get('rule_id') == rule_id for s in sim_results):
-                                print(f"      ✅ Condição ATENDIDA para Campanha ID {campaign_id} ('{campaign_name[:30]}...'). EXECUTANDO AÇÃO...")
-                                rules_executed_count +=1 # Conta quantas vezes uma regra é ATIVADA
-                                success_exec, msg_exec = execute_rule(campaign_id, rule_id)
-                                if success_exec:
-                                     actions_this_account += 1
-                                     print(f"      ✅ Ação executada: {msg_exec}")
-                                else:
-                                     print(f"      ❌ Falha na execução: {msg_exec}")
-                                # execute_rule já faz o log no banco
-                            # else: print(f"    -> Condição NÃO atendida para Campanha ID {campaign_id}.") # Log muito verboso
-
-                        except Exception as sim_exec_err:
-                             print(f"    -> ERRO CRÍTICO sim/exec Regra ID {rule_id} na Campanha ID {campaign_id}: {sim_exec_err}")
-                             log_rule_execution(rule_id, campaign_id, 'campaign', campaign_name, False, f"Worker sim/exec error: {str(sim_exec_err)[:150]}")
+                    condition = conditions[rule_id]
+                    if condition is None:
+                        print(f"      AVISO: Regra ID {rule_id} sem condição válida. Pulando.")
+                        continue
+
+                    # Só os pares com entradas diferentes da última avaliação
+                    pair_fps = [fps.for_rule(rule_fps[rule_id], condition) for fps in campaign_fps]
+                    changed = [i for i, campaign in enumerate(campaigns_to_check)
+                               if not change_detection or stored_fps.get((rule_id, str(campaign.get('id')))) != pair_fps[i]]
+                    pairs_skipped_count += len(campaigns_to_check) - len(changed)
+                    pairs_evaluated_count += len(changed)
+                    if not changed:
+                        print(f"      Nenhuma campanha mudou desde a última avaliação da Regra ID {rule_id}. Pulando.")
+                        continue
+                    try:
+                        mask = evaluator.mask(condition)
+                    except Exception as sim_err:
+                        print(f"    -> ERRO CRÍTICO avaliando condição da Regra ID {rule_id}: {sim_err}")
+                        continue
+                    # Pares não atendidos: avaliação concluída
+                    fingerprints_to_save.extend((rule_id, campaigns_to_check[i].get('id'), pair_fps[i], False) for i in changed if not mask[i])
+                    matched_fps.update(((rule_id, i), pair_fps[i]) for i in changed if mask[i])
+
+                    # 4.4. Campanhas que atenderam a condição: a ação entra no plano da campanha
+                    for i in (i for i in changed if mask[i]):
+                        campaign = campaigns_to_check[i]
+                        print(f"      ✅ Condição ATENDIDA para Campanha ID {campaign.get('id')} ('{campaign.get('name', '')[:30]}...').")
+                        rules_executed_count +=1 # Conta quantas vezes uma regra é ATIVADA
+                        matched_rules.setdefault(i, []).append(rule)
+
+                # 4.5. Uma ação líquida por campanha (facebook/plano_acoes.py): uma leitura e no máximo uma escrita
+                for i, rules_matched in matched_rules.items():
+                    campaign_id = campaigns_to_check[i].get('id')
+                    campaign_name = campaigns_to_check[i].get('name', f"ID {campaign_id}")
+                    outcomes, wrote = execute_campaign_plan(campaign_id, campaign_name, rules_matched)
+                    if wrote:
+                        actions_this_account += 1
+                        any_write_this_account = True
+                    for rule in rules_matched:
+                        success_exec, msg_exec = outcomes[rule['id']]
+                        if success_exec:
+                            print(f"      ✅ Regra ID {rule['id']} na Campanha ID {campaign_id}: {msg_exec}")
+                            # Falhas não gravam a impressão digital: o par é tentado de novo no próximo ciclo
+                            fingerprints_to_save.append((rule['id'], campaign_id, matched_fps[(rule['id'], i)], True))
+                        else:
+                            print(f"      ❌ Falha da Regra ID {rule['id']} na Campanha ID {campaign_id}: {msg_exec}")
+
+                # Status/orçamento mudaram: a lista de campanhas em cache (app e worker) ficou velha
+                if shared_cache and any_write_this_account:
+                    shared_cache.invalidate(current_account_id, "campaigns")
+
+                if change_detection and fingerprints_to_save:
+                    try:
+                        save_fingerprints(db_connection_worker, fingerprints_to_save)
+                    except Exception as fp_err:
+                        print(f"AVISO [Worker]: Falha ao gravar impressões digitais de {config_name} (serão reavaliadas): {fp_err}")
 
             print(f"===== Conta {config_name} processada. Ações executadas nesta conta: {actions_this_account} =====")
             total_actions_executed += actions_this_account
@@ -853,7 +761,144 @@ def run_automatic_rules():
     print(f"Contas Verificadas: {accounts_processed_count} (Falha na inicialização: {accounts_failed_init_count})")
     print(f"Total de Regras Automáticas Ativas Verificadas: {rules_checked_count}")
     print(f"Total de Ativações de Regra (condição atendida): {rules_executed_count}")
+    print(f"Pares regra × campanha avaliados: {pairs_evaluated_count} (sem mudança, pulados: {pairs_skipped_count})")
     print(f"Total de Ações de API Executadas (todas as contas): {total_actions_executed}")
+    if shared_cache:
+        cache_stats = shared_cache.stats()
+        print(f"Cache compartilhado da Graph API ({cache_stats['backend']}): {cache_stats['hits']} acertos, {cache_stats['misses']} buscas na API, {cache_stats['errors']} falhas.")
+
+
+# --- Sincronização de insights diários (base do backtest de regras) ---
+# Dias buscados por padrão em `python worker.py --sync-insights`
+SYNC_INSIGHTS_DEFAULT_DAYS = 30
+
+def upsert_daily_insights(rows):
+    """
+    Grava/atualiza linhas de campaign_daily_insights (uma por campanha e dia).
+    synced_at marca a gravação para os agregados do Dashboard (facebook/rollups.py).
+    Orçamento 0 e status None significam "desconhecido": o valor já gravado é mantido.
+    """
+    if not rows:
+        return 0
+    synced_at = datetime.now(timezone.utc)
+    with db_connection_worker() as conn_info:
+        if conn_info is None:
+            print("ERRO [Worker sync]: Sem conexão com o banco para gravar insights diários.")
+            return 0
+        conn, conn_type = conn_info
+        ph = "?" if conn_type == "sqlite" else "%s"
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(f"""
+                INSERT INTO campaign_daily_insights
+                (campaign_id, day, account_id, campaign_name, spend, impressions, clicks,
+                 purchases, purchase_value, daily_budget, status, synced_at)
+                VALUES ({ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph})
+                ON CONFLICT (campaign_id, day) DO UPDATE SET
+                    campaign_name = EXCLUDED.campaign_name, spend = EXCLUDED.spend,
+                    impressions = EXCLUDED.impressions, clicks = EXCLUDED.clicks,
+                    purchases = EXCLUDED.purchases, purchase_value = EXCLUDED.purchase_value,
+                    daily_budget = CASE WHEN EXCLUDED.daily_budget > 0 THEN EXCLUDED.daily_budget
+                                        ELSE campaign_daily_insights.daily_budget END,
+                    status = COALESCE(EXCLUDED.status, campaign_daily_insights.status),
+                    synced_at = EXCLUDED.synced_at
+            """, [tuple(row) + (synced_at,) for row in rows])
+            conn.commit()
+            return len(rows)
+        finally:
+            cursor.close()
+
+def sync_daily_insights(days=SYNC_INSIGHTS_DEFAULT_DAYS):
+    """Busca os insights diários dos últimos `days` dias (até ontem) de todas as contas."""
+    import pandas as pd
+    from facebook_business.adobjects.adaccount import AdAccount
+    from facebook.backtest import DAILY_INSIGHTS_COLUMNS
+    from facebook.cubo_metricas import METRICS_CUBE_DIR, write_partitions
+    start_time = time.time()
+    until = date.today() - timedelta(days=1)
+    since = until - timedelta(days=days - 1)
+    print(f"INFO [Worker sync]: Sincronizando insights diários de {since} a {until}...")
+    if not METRICS_CUBE_DIR:
+        print("INFO [Worker sync]: METRICS_CUBE_DIR não definido; o cubo de métricas não será gravado.")
+
+    total_rows = 0
+    for config in get_all_api_configs_worker():
+        account_id = config.get("account_id")
+        try:
+            account = AdAccount(f'act_{account_id}', api=make_api(config))
+            # Sem cache compartilhado: orçamento e status precisam ser os atuais
+            campaigns = {c["id"]: c for c in fetch_campaigns_raw(account, account_id) if c.get("id")}
+            daily = fetch_daily_insights(account, list(campaigns), since, until)
+        except Exception as e:
+            print(f"ERRO [Worker sync]: Falha ao buscar insights diários da conta {account_id}: {e}")
+            continue
+
+        rows = []
+        for insight in daily:
+            campaign = campaigns.get(insight.get("campaign_id"), {})
+            # A Graph API só expõe o orçamento/status atuais: eles valem para o último dia.
+            # Dias anteriores vão como desconhecidos e mantêm o que foi gravado quando eram o último dia
+            is_last_day = insight["day"] == until.strftime('%Y-%m-%d')
+            daily_budget = campaign.get("daily_budget") if is_last_day else None
+            rows.append((
+                insight.get("campaign_id"), insight["day"], str(account_id), insight.get("campaign_name"),
+                float(insight.get("spend") or 0), int(insight.get("impressions") or 0), int(insight.get("clicks") or 0),
+                int(insight.get("purchases") or 0), float(insight.get("purchase_value") or 0),
+                int(daily_budget) if daily_budget and str(daily_budget).isdigit() else 0,
+                campaign.get("status") if is_last_day else None,
+            ))
+        try:
+            saved = upsert_daily_insights(rows)
+        except Exception as e:
+            print(f"ERRO [Worker sync]: Falha ao gravar insights diários da conta {account_id}: {e}")
+            continue
+        print(f"INFO [Worker sync]: Conta {account_id}: {saved} linhas (campanha × dia) gravadas.")
+        total_rows += saved
+
+        # Cubo em disco (memory-map) para análises de vários meses sem consultar o banco;
+        # só com METRICS_CUBE_DIR num diretório que o app também enxerga
+        if not METRICS_CUBE_DIR:
+            continue
+        try:
+            partitions = write_partitions(pd.DataFrame(rows, columns=DAILY_INSIGHTS_COLUMNS))
+            print(f"INFO [Worker sync]: Conta {account_id}: {partitions} partições do cubo de métricas atualizadas.")
+        except Exception as e:
+            print(f"AVISO [Worker sync]: Falha ao atualizar o cubo de métricas da conta {account_id}: {e}")
+
+    print(f"INFO [Worker sync]: {total_rows} linhas sincronizadas em {time.time() - start_time:.2f} seg.")
+
+
+def load_mode_dependencies(mode):
+    """Importa os módulos do modo (MODE_DEPENDENCIES); sai com ERRO FATAL se faltar algum."""
+    for module_name in MODE_DEPENDENCIES[mode] + COMMON_DEPENDENCIES:
+        try:
+            importlib.import_module(module_name)
+        except ImportError as import_err:
+            print(f"ERRO FATAL [Worker]: Biblioteca necessária para o modo '{mode}' não encontrada: {import_err}")
+            sys.exit(1)
+
+
+def profile_connection_setup():
+    """Segundos para abrir (e fechar) uma conexão com o banco, ou None se falhar."""
+    start = time.perf_counter()
+    conn_info = get_db_connection_worker()
+    elapsed = time.perf_counter() - start
+    close_connection_worker(conn_info)
+    return elapsed if conn_info and conn_info[0] is not None else None
+
+
+def print_startup_profile(mode, mode_imports_s, connection_s, run_s):
+    """Relatório de --profile-startup: onde foi o tempo antes (e durante) o trabalho."""
+    heavy_packages = sorted({name.split(".")[0] for name in sys.modules} & {"pandas", "numpy", "facebook_business", "psycopg2", "sqlite3"})
+    print(f"\n--- [WORKER STARTUP PROFILE] modo: {mode} ---")
+    print(f"Importações do worker:     {_STARTUP_IMPORTS_S * 1000:8.1f} ms")
+    print(f"Importações do modo:       {mode_imports_s * 1000:8.1f} ms")
+    if connection_s is None:
+        print("Conexão com o banco:       falhou")
+    else:
+        print(f"Conexão com o banco:       {connection_s * 1000:8.1f} ms")
+    print(f"Execução:                  {run_s:8.2f} s")
+    print(f"Pacotes pesados carregados: {', '.join(heavy_packages) or 'nenhum'}")
 
 
 # --- Ponto de Entrada do Script ---
@@ -866,5 +911,32 @@ if __name__ == "__main__":
         sys.exit(1)
 
     print(f"INFO [Worker]: Iniciando execução do script {os.path.basename(__file__)}")
-    run_automatic_rules() # Chama a função reestruturada
+    # python worker.py [--sync-insights [dias]] [--profile-startup] [--full-evaluation]
+    profile_startup = "--profile-startup" in sys.argv
+    mode = "sync-insights" if "--sync-insights" in sys.argv else "rules"
+
+    mode_imports_start = time.perf_counter()
+    load_mode_dependencies(mode)
+    mode_imports_s = time.perf_counter() - mode_imports_start
+    connection_s = profile_connection_setup() if profile_startup else None
+
+    run_start = time.perf_counter()
+    if mode == "sync-insights":
+        # python worker.py --sync-insights [dias]: só sincroniza os insights diários
+        arg_index = sys.argv.index("--sync-insights") + 1
+        days = int(sys.argv[arg_index]) if arg_index < len(sys.argv) and sys.argv[arg_index].isdigit() else SYNC_INSIGHTS_DEFAULT_DAYS
+        sync_daily_insights(days)
+    else:
+        # --full-evaluation: reavalia todos os pares, ignorando a detecção de mudanças
+        run_automatic_rules(change_detection="--full-evaluation" not in sys.argv)
+
+    # Agregados diários do Dashboard: só o que mudou desde a última rodada
+    from facebook.rollups import refresh_rollups
+    try:
+        refresh_rollups(db_connection_worker)
+    except Exception as e:
+        print(f"AVISO [Worker]: Falha ao atualizar os agregados do Dashboard: {e}")
+
+    if profile_startup:
+        print_startup_profile(mode, mode_imports_s, connection_s, time.perf_counter() - run_start)
     print(f"INFO [Worker]: Script {os.path.basename(__file__)} concluído.")
\ No newline at end of file